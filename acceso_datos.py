@@ -0,0 +1,269 @@
+# -----------------------------------------------------------------------------
+#                       ACCESO A LOS DATOS DE INCIDENCIAS
+# -----------------------------------------------------------------------------
+# Punto unico de lectura de incidencias.db para analisis.py, graficos.py y
+# analisis_Practica2.py. Cada tabla se lee con tipos compactos:
+#   - categorias para cliente, tipo_incidencia e id_emp
+#   - int8 para es_mantenimiento, satisfaccion_cliente y nivel
+#   - fechas como datetime64, convertidas en la propia lectura bloque a bloque
+#     (hay pocas fechas distintas y to_datetime solo interpreta cada una una vez)
+# Solo se piden a SQLite las columnas necesarias y los filtros de fechas se
+# resuelven en la consulta (con los indices de fecha), no en pandas.
+#
+# AccesoDatos guarda cada lectura hasta que cambia la version de los datos, de
+# forma que todos los consumidores de un mismo proceso comparten los DataFrame.
+# Las tablas completas de tickets y contactos se abren de la instantanea
+# columnar (instantanea.py) si hay una de la version actual; si no, de SQLite.
+# Si entre una version y la siguiente no ha habido ninguna carga completa
+# (solo incrementales o lotes de la API, que anaden tickets con sus contactos
+# sin tocar los anteriores) esas dos tablas no se vuelven a leer: se les
+# anaden las filas con ids nuevos.
+
+import threading
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import conexiones
+from instantanea import instantanea
+from instrumentacion import fase
+from version_datos import leer_version
+
+RUTA_DB = conexiones.RUTA_DB
+
+# Filas por bloque: los textos se convierten a categorias bloque a bloque para
+# no tener nunca la tabla entera como objetos de Python
+TAMANO_BLOQUE = 200000
+
+CATEGORIA = "category"
+FECHA = "fecha"
+
+# Tipo de cada columna y columna de fecha por la que se filtran los rangos
+TABLAS = {
+    "tickets": {
+        "columnas": {
+            "id_ticket": "int32",
+            "cliente": CATEGORIA,
+            "fecha_apertura": FECHA,
+            "fecha_cierre": FECHA,
+            "es_mantenimiento": "int8",
+            "satisfaccion_cliente": "int8",
+            "tipo_incidencia": CATEGORIA,
+            "clave_natural": "object",
+        },
+        "fecha": "fecha_apertura",
+    },
+    "contactos_empleados": {
+        "columnas": {
+            "id_contacto": "int32",
+            "id_ticket": "int32",
+            "id_emp": CATEGORIA,
+            "fecha": FECHA,
+            "tiempo": "float64",
+        },
+        "fecha": "fecha",
+    },
+    "empleados": {
+        "columnas": {
+            "id_emp": CATEGORIA,
+            "nombre": "object",
+            "nivel": "int8",
+            "fecha_contrato": FECHA,
+        },
+        "fecha": None,
+    },
+    "clientes": {
+        "columnas": {
+            "id_cli": CATEGORIA,
+            "nombre": "object",
+            "telefono": "object",
+            "provincia": "object",
+        },
+        "fecha": None,
+    },
+    "tipos_incidentes": {
+        "columnas": {
+            "id_inci": CATEGORIA,
+            "nombre": "object",
+        },
+        "fecha": None,
+    },
+}
+
+# Columna de id creciente de las tablas que solo crecen entre cargas completas
+IDS = {"tickets": "id_ticket", "contactos_empleados": "id_contacto"}
+
+# clave_natural solo la usa la carga incremental
+POR_DEFECTO = {"tickets": [c for c in TABLAS["tickets"]["columnas"] if c != "clave_natural"]}
+
+
+# Conexion suelta para scripts y benchmarks; la aplicacion usa el pool de conexiones.py
+def conectar(ruta_db=RUTA_DB, solo_lectura=False):
+    if solo_lectura:
+        return conexiones.conectar_lectura(ruta_db)
+    return conexiones.conectar_escritura(ruta_db)
+
+
+def consulta_tabla(tabla, columnas=None, desde=None, hasta=None):
+    definicion = TABLAS[tabla]
+    if columnas is None:
+        columnas = POR_DEFECTO.get(tabla, list(definicion["columnas"]))
+    desconocidas = [c for c in columnas if c not in definicion["columnas"]]
+    if desconocidas:
+        raise KeyError(f"{tabla} no tiene las columnas {desconocidas}")
+
+    sql = f"SELECT {', '.join(columnas)} FROM {tabla}"
+    condiciones, parametros = [], []
+    if desde is not None or hasta is not None:
+        if definicion["fecha"] is None:
+            raise ValueError(f"{tabla} no tiene columna de fecha para filtrar")
+        # Se compara el texto tal cual para que SQLite use el indice de fecha
+        if desde is not None:
+            condiciones.append(f"{definicion['fecha']} >= ?")
+            parametros.append(str(pd.Timestamp(desde).date()))
+        if hasta is not None:
+            condiciones.append(f"{definicion['fecha']} <= ?")
+            parametros.append(str(pd.Timestamp(hasta).date()))
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    return sql, parametros
+
+
+def _convertir(bloque, tipos):
+    for columna in bloque.columns:
+        tipo = tipos.get(columna)
+        if tipo == FECHA:
+            bloque[columna] = pd.to_datetime(bloque[columna], format="ISO8601")
+        elif tipo == CATEGORIA:
+            bloque[columna] = bloque[columna].astype(CATEGORIA)
+        elif tipo in ("int8", "int32"):
+            serie = bloque[columna]
+            # Con nulos se usa el entero con NA de pandas
+            bloque[columna] = serie.astype(tipo.capitalize() if serie.isna().any() else tipo)
+    return bloque
+
+
+def _unir(bloques, tipos):
+    if len(bloques) == 1:
+        return bloques[0]
+    columnas = {}
+    for columna in bloques[0].columns:
+        if tipos.get(columna) == CATEGORIA:
+            columnas[columna] = pd.Series(union_categoricals([b[columna] for b in bloques], sort_categories=True))
+        else:
+            columnas[columna] = pd.concat([b[columna] for b in bloques], ignore_index=True)
+    return pd.DataFrame(columnas)
+
+
+# Ejecuta una consulta y aplica los tipos compactos indicados en 'tipos'
+# El tiempo de SQLite cuenta como fase "sql" y la conversion como "pandas"
+@fase("pandas")
+def consultar(conn, sql, parametros=(), tipos=None, tamano_bloque=TAMANO_BLOQUE):
+    tipos = tipos or {}
+    bloques = [_convertir(bloque, tipos) for bloque in
+               pd.read_sql_query(sql, conn, params=parametros, chunksize=tamano_bloque)]
+    if not bloques:
+        bloques = [_convertir(pd.read_sql_query(sql, conn, params=parametros), tipos)]
+    # Las categorias quedan ordenadas, igual que agrupar por el texto original
+    return _unir(bloques, tipos)
+
+
+def leer_tabla(conn, tabla, columnas=None, desde=None, hasta=None):
+    sql, parametros = consulta_tabla(tabla, columnas, desde, hasta)
+    return consultar(conn, sql, parametros, TABLAS[tabla]["columnas"])
+
+
+class AccesoDatos:
+    def __init__(self, ruta_db=RUTA_DB):
+        self.ruta_db = ruta_db
+        self._cache = {}
+        self._version = None
+        self._lock = threading.Lock()
+        self.instantanea = instantanea(ruta_db)
+        # Lecturas servidas desde la instantanea y desde SQLite, y tablas
+        # ampliadas con las filas nuevas
+        self.lecturas = {"instantanea": 0, "sqlite": 0, "ampliadas": 0}
+
+    def version(self):
+        with conexiones.lectura(self.ruta_db) as conn:
+            return leer_version(conn)
+
+    def tabla(self, nombre, columnas=None, desde=None, hasta=None):
+        clave = (nombre, tuple(columnas) if columnas else None, desde, hasta)
+        with conexiones.lectura(self.ruta_db) as conn, self._lock:
+            version = leer_version(conn)
+            if version != self._version:
+                self._cambiar_version(conn, version)
+            if clave not in self._cache:
+                self._cache[clave] = self._leer(conn, version, nombre, columnas, desde, hasta)
+            return self._cache[clave]
+
+    def _cambiar_version(self, conn, version):
+        anteriores, anterior = self._cache, self._version
+        self._cache = {}
+        self._version = version
+        if not anteriores or anterior is None or version < anterior:
+            return
+        completas = conn.execute(
+            "SELECT COUNT(*) FROM control_cargas WHERE id_carga > ? AND modo = 'completa'", (anterior,)
+        ).fetchone()[0]
+        if completas:
+            return
+        # Un contacto nuevo de un ticket ya leido cambia su fecha_cierre (disparador)
+        marcas = conn.execute(
+            "SELECT max_id_ticket, max_id_contacto FROM control_cargas WHERE id_carga = ?", (anterior,)
+        ).fetchone()
+        if marcas is None or conn.execute(
+            "SELECT 1 FROM contactos_empleados WHERE id_contacto > ? AND id_ticket <= ? LIMIT 1",
+            (marcas[1] or 0, marcas[0] or 0)
+        ).fetchone() is not None:
+            return
+        for clave, df in anteriores.items():
+            nombre, columnas, desde, hasta = clave
+            id_columna = IDS.get(nombre)
+            if id_columna is None or desde is not None or hasta is not None or id_columna not in df.columns:
+                continue
+            ampliada = self._ampliar(conn, nombre, columnas, df, id_columna)
+            if ampliada is not None:
+                self._cache[clave] = ampliada
+
+    # La tabla ya leida mas las filas con id mayor que su ultimo id (None si
+    # la tabla tiene menos filas que antes: se vuelve a leer entera)
+    def _ampliar(self, conn, nombre, columnas, df, id_columna):
+        ultimo = int(df[id_columna].max()) if len(df) else 0
+        if (conn.execute(f"SELECT COALESCE(MAX({id_columna}), 0) FROM {nombre}").fetchone()[0] or 0) < ultimo:
+            return None
+        sql, parametros = consulta_tabla(nombre, columnas)
+        tipos = TABLAS[nombre]["columnas"]
+        nuevas = consultar(conn, f"{sql} WHERE {id_columna} > ?", [ultimo], tipos)
+        self.lecturas["ampliadas"] += 1
+        if not len(nuevas):
+            return df
+        return _unir([df, nuevas], tipos)
+
+    def _leer(self, conn, version, nombre, columnas, desde, hasta):
+        # Los rangos de fechas los sigue resolviendo SQLite con sus indices
+        if desde is None and hasta is None:
+            pedidas = columnas or POR_DEFECTO.get(nombre, list(TABLAS[nombre]["columnas"]))
+            df = self.instantanea.leer(conn, version, nombre, pedidas)
+            if df is not None:
+                self.lecturas["instantanea"] += 1
+                return df
+        self.lecturas["sqlite"] += 1
+        return leer_tabla(conn, nombre, columnas, desde, hasta)
+
+    def vaciar(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_accesos = {}
+_lock_accesos = threading.Lock()
+
+
+# Instancia compartida por ruta de base de datos
+def acceso(ruta_db=RUTA_DB):
+    with _lock_accesos:
+        if ruta_db not in _accesos:
+            _accesos[ruta_db] = AccesoDatos(ruta_db)
+        return _accesos[ruta_db]
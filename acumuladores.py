@@ -0,0 +1,382 @@
+# -----------------------------------------------------------------------------
+#              ACUMULADORES PERSISTENTES DE LOS KPI DE analisis.py
+# -----------------------------------------------------------------------------
+# Guarda dentro de incidencias.db el estado minimo con el que se obtienen los
+# indicadores generales del dashboard sin leer tickets ni contactos enteros:
+#   - acum_clientes:  incidencias y satisfechas (satisfaccion >= 5) por cliente
+#   - acum_empleados: horas y tickets distintos por empleado
+#   - control_acumuladores (una fila): total de tickets, minimo y maximo de la
+#     duracion, y suma exacta de las horas por ticket y de sus cuadrados
+# Cada carga solo recorre las filas nuevas (id mayor que las marcas guardadas).
+# Las sumas se hacen en el mismo orden que un recalculo desde cero (contactos
+# por id_contacto y tickets por id_ticket), asi que acumular lote a lote da
+# exactamente los mismos numeros que reconstruir. Se reconstruye tras una carga
+# completa (reinicia los ids) o si algun contacto nuevo es de un ticket ya
+# acumulado (cambiaria sus horas).
+#
+# Los contactos se recorren con el cursor, sin cargarlos en memoria: por
+# id_contacto para las horas de cada empleado y, para las horas de cada
+# ticket, por id_ticket con el indice idx_contactos_ticket. En memoria solo
+# quedan los totales por empleado y los contactos del ticket en curso.
+#
+# Las medias y desviaciones por cliente se calculan al leer, con una Serie de
+# pandas por cliente en el mismo orden que analisis.py: coinciden bit a bit.
+# La media y la desviacion de horas por ticket se calculan al leer desde las
+# sumas exactas, redondeadas una sola vez. La media es la de pandas siempre
+# que su suma de las horas no redondee (p. ej. horas en medias horas); la
+# desviacion, que pandas calcula en dos pasadas con la media ya redondeada,
+# puede diferir de la suya en el ultimo bit.
+#
+# Uso:
+#   python acumuladores.py [incidencias.db] [--completo]
+
+import argparse
+import math
+import time
+from fractions import Fraction
+
+import conexiones
+
+ESQUEMA_ACUMULADORES = [
+    """
+    CREATE TABLE IF NOT EXISTS acum_clientes(
+        cliente TEXT PRIMARY KEY,
+        incidencias INTEGER,
+        satisfechas INTEGER
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS acum_empleados(
+        id_emp TEXT PRIMARY KEY,
+        horas REAL,
+        tickets INTEGER
+    ) WITHOUT ROWID;
+    """,
+    # Marcas hasta donde se ha acumulado y estado de los KPI globales
+    """
+    CREATE TABLE IF NOT EXISTS control_acumuladores(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        id_carga INTEGER,
+        max_id_ticket INTEGER,
+        max_id_contacto INTEGER,
+        n_tickets INTEGER,
+        sin_duracion INTEGER,
+        min_duracion REAL,
+        max_duracion REAL,
+        horas_n INTEGER,
+        horas_suma TEXT,
+        horas_suma2 TEXT,
+        horas_escala INTEGER,
+        horas_no_finitas REAL,
+        fecha_refresco TEXT
+    );
+    """,
+]
+
+ACUMULAR_CLIENTES = """
+    INSERT INTO acum_clientes
+    SELECT cliente, COUNT(*), COALESCE(SUM(satisfaccion_cliente >= 5), 0)
+    FROM tickets
+    WHERE id_ticket > ? AND cliente IS NOT NULL
+    GROUP BY cliente
+    ON CONFLICT(cliente) DO UPDATE SET
+        incidencias = incidencias + excluded.incidencias,
+        satisfechas = satisfechas + excluded.satisfechas
+"""
+
+DURACIONES = """
+    SELECT COUNT(*), COUNT(d), MIN(d), MAX(d)
+    FROM (SELECT julianday(fecha_cierre) - julianday(fecha_apertura) AS d
+          FROM tickets WHERE id_ticket > ?)
+"""
+
+_VACIO = {"id_carga": 0, "max_id_ticket": 0, "max_id_contacto": 0, "n_tickets": 0, "sin_duracion": 0,
+          "min_duracion": None, "max_duracion": None, "horas_n": 0, "horas_suma": "0", "horas_suma2": "0",
+          "horas_escala": 0, "horas_no_finitas": 0.0}
+
+# Filas que se piden a SQLite de cada vez al recorrer los contactos
+TAMANO_BLOQUE = 10000
+
+
+def crear_esquema_acumuladores(cursor):
+    for sentencia in ESQUEMA_ACUMULADORES:
+        cursor.execute(sentencia)
+
+
+def _existe_tabla(cursor, nombre):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+    ).fetchone() is not None
+
+
+# El control de versiones anteriores (media y M2 de Welford) se descarta y
+# se reconstruye entero
+def _migrar_control(cursor):
+    columnas = {fila[1] for fila in cursor.execute("PRAGMA table_info(control_acumuladores)")}
+    if columnas and not set(_VACIO) <= columnas:
+        cursor.execute("DROP TABLE control_acumuladores")
+
+
+def _leer_control(cursor):
+    cursor.execute("SELECT * FROM control_acumuladores WHERE id = 1")
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    nombres = [d[0] for d in cursor.description]
+    return {n: v for n, v in zip(nombres, fila) if n in _VACIO}
+
+
+def _guardar_control(cursor, control):
+    columnas = list(_VACIO)
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO control_acumuladores(id, {", ".join(columnas)}, fecha_refresco)
+        VALUES (1, {", ".join("?" * len(columnas))}, datetime('now'))
+    """, [control[c] for c in columnas])
+
+
+# Version de los datos y maximos de los ids (todo maximos de claves primarias)
+def _marcas(cursor):
+    id_carga = 0
+    if _existe_tabla(cursor, "control_cargas"):
+        id_carga = cursor.execute("SELECT COALESCE(MAX(id_carga), 0) FROM control_cargas").fetchone()[0]
+    return (id_carga,) + tuple(cursor.execute("""
+        SELECT (SELECT COALESCE(MAX(id_ticket), 0) FROM tickets),
+               (SELECT COALESCE(MAX(id_contacto), 0) FROM contactos_empleados)
+    """).fetchone())
+
+
+def _min(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+# Filas de una consulta en bloques de TAMANO_BLOQUE, sin fetchall
+def _filas(cursor, sql, parametros):
+    cursor.execute(sql, parametros)
+    while True:
+        bloque = cursor.fetchmany(TAMANO_BLOQUE)
+        if not bloque:
+            return
+        yield from bloque
+
+
+# Suma exacta de las horas por ticket y de sus cuadrados: enteros en
+# unidades de 2**-escala (y 2**-2*escala los cuadrados). Los infinitos se
+# llevan aparte y los NaN no cuentan, como en la media de pandas
+def _sumar_horas(sumas, x):
+    if math.isnan(x):
+        return
+    sumas["n"] += 1
+    if math.isinf(x):
+        sumas["no_finitas"] += x
+        return
+    numerador, denominador = x.as_integer_ratio()
+    k = denominador.bit_length() - 1
+    if k > sumas["escala"]:
+        sumas["suma"] <<= k - sumas["escala"]
+        sumas["suma2"] <<= 2 * (k - sumas["escala"])
+        sumas["escala"] = k
+    numerador <<= sumas["escala"] - k
+    sumas["suma"] += numerador
+    sumas["suma2"] += numerador * numerador
+
+
+# Suma al estado los tickets y contactos con id mayor que las marcas del
+# control. Devuelve False (sin tocar nada) si algun contacto nuevo es de un
+# ticket ya acumulado. Asi, los contactos nuevos son exactamente los de los
+# tickets nuevos y se pueden recorrer por id_ticket
+def _acumular(cursor, control):
+    marca_ticket, marca_contacto = control["max_id_ticket"], control["max_id_contacto"]
+    if cursor.execute("SELECT 1 FROM contactos_empleados WHERE id_contacto > ? AND id_ticket <= ? LIMIT 1",
+                      (marca_contacto, marca_ticket)).fetchone() is not None:
+        return False
+
+    cursor.execute(ACUMULAR_CLIENTES, (marca_ticket,))
+    n, con_duracion, minimo, maximo = cursor.execute(DURACIONES, (marca_ticket,)).fetchone()
+    control["n_tickets"] += n
+    control["sin_duracion"] += n - con_duracion
+    control["min_duracion"] = _min(control["min_duracion"], minimo)
+    control["max_duracion"] = _max(control["max_duracion"], maximo)
+
+    # Horas por empleado sumadas contacto a contacto en orden de id_contacto, como bincount
+    lectura = cursor.connection.cursor()
+    horas = dict(cursor.execute("SELECT id_emp, horas FROM acum_empleados").fetchall())
+    for id_emp, tiempo in _filas(lectura, """
+        SELECT id_emp, tiempo FROM contactos_empleados
+        WHERE id_contacto > ? AND id_emp IS NOT NULL ORDER BY id_contacto
+    """, (marca_contacto,)):
+        horas[id_emp] = horas.get(id_emp, 0.0) + (float("nan") if tiempo is None else tiempo)
+
+    # Horas de cada ticket (en orden de id_contacto dentro del ticket) y
+    # tickets distintos de cada empleado, ticket a ticket en orden de id_ticket
+    sumas = {"n": control["horas_n"], "suma": int(control["horas_suma"]), "suma2": int(control["horas_suma2"]),
+             "escala": control["horas_escala"], "no_finitas": control["horas_no_finitas"]}
+    tickets = {}
+
+    def cerrar_ticket(contactos):
+        x = 0.0
+        for _, _, tiempo in sorted(contactos):
+            x += float("nan") if tiempo is None else tiempo
+        _sumar_horas(sumas, x)
+        for id_emp in {id_emp for _, id_emp, _ in contactos if id_emp is not None}:
+            tickets[id_emp] = tickets.get(id_emp, 0) + 1
+
+    actual, contactos = None, []
+    for id_ticket, id_contacto, id_emp, tiempo in _filas(lectura, """
+        SELECT id_ticket, id_contacto, id_emp, tiempo FROM contactos_empleados
+        WHERE id_ticket > ? ORDER BY id_ticket
+    """, (marca_ticket,)):
+        if id_ticket != actual and contactos:
+            cerrar_ticket(contactos)
+            contactos = []
+        actual = id_ticket
+        contactos.append((id_contacto, id_emp, tiempo))
+    if contactos:
+        cerrar_ticket(contactos)
+
+    cursor.executemany("""
+        INSERT INTO acum_empleados VALUES (?, ?, ?)
+        ON CONFLICT(id_emp) DO UPDATE SET horas = excluded.horas, tickets = tickets + excluded.tickets
+    """, [(id_emp, horas[id_emp], n) for id_emp, n in tickets.items()])
+    control.update(horas_n=sumas["n"], horas_suma=str(sumas["suma"]), horas_suma2=str(sumas["suma2"]),
+                   horas_escala=sumas["escala"], horas_no_finitas=sumas["no_finitas"])
+    return True
+
+
+# Actualizacion dentro de una transaccion ya abierta
+def actualizar(cursor, completo=False):
+    _migrar_control(cursor)
+    crear_esquema_acumuladores(cursor)
+    id_carga, max_id_ticket, max_id_contacto = _marcas(cursor)
+    control = _leer_control(cursor)
+
+    modo = "incremental"
+    if not completo and control is not None and _existe_tabla(cursor, "control_cargas"):
+        # Una carga completa desde el ultimo refresco reinicia los ids
+        completo = cursor.execute(
+            "SELECT 1 FROM control_cargas WHERE id_carga > ? AND modo = 'completa' LIMIT 1", (control["id_carga"],)
+        ).fetchone() is not None
+    if completo or control is None or not _acumular(cursor, control):
+        cursor.execute("DELETE FROM acum_clientes")
+        cursor.execute("DELETE FROM acum_empleados")
+        control = dict(_VACIO)
+        _acumular(cursor, control)
+        modo = "completo"
+
+    control.update(id_carga=id_carga, max_id_ticket=max_id_ticket, max_id_contacto=max_id_contacto)
+    _guardar_control(cursor, control)
+    return modo
+
+
+def refrescar(conn, completo=False):
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        modo = actualizar(cursor, completo)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"modo": modo, "segundos": time.perf_counter() - inicio}
+
+
+# Para bases de datos anteriores a los acumuladores: los construye la primera vez
+def asegurar_acumuladores(conn):
+    if not _existe_tabla(conn.cursor(), "control_acumuladores"):
+        refrescar(conn)
+
+
+# Estado de los acumuladores si estan al dia con los datos; None si no
+def leer(conn):
+    cursor = conn.cursor()
+    if not _existe_tabla(cursor, "control_acumuladores"):
+        return None
+    control = _leer_control(cursor)
+    if control is None or (control["id_carga"], control["max_id_ticket"], control["max_id_contacto"]) != \
+            _marcas(cursor):
+        return None
+    control["clientes"] = cursor.execute(
+        "SELECT incidencias, satisfechas FROM acum_clientes ORDER BY cliente").fetchall()
+    control["empleados"] = cursor.execute(
+        "SELECT MIN(horas), MAX(horas), MIN(tickets), MAX(tickets) FROM acum_empleados").fetchone()
+    return control
+
+
+# Raiz cuadrada de un Fraction redondeada una sola vez a float: la parte
+# entera de la raiz lleva mas de 56 bits y un bit mas que indica si es exacta
+def _raiz(valor):
+    if valor <= 0:
+        return 0.0
+    k = max(0, (112 - valor.numerator.bit_length() + valor.denominator.bit_length()) // 2 + 1)
+    cociente, resto = divmod(valor.numerator << 2 * k, valor.denominator)
+    raiz = math.isqrt(cociente)
+    exacta = resto == 0 and raiz * raiz == cociente
+    return float(Fraction(2 * raiz + (0 if exacta else 1), 2 ** (k + 1)))
+
+
+# Los KPI de analisis.py a partir del estado leido
+def kpis(estado):
+    import numpy as np
+    import pandas as pd
+
+    # Las mismas Series de enteros (por cliente, en orden) que agrupa analisis.py
+    incidencias = pd.Series(np.array([i for i, _ in estado["clientes"]], dtype=np.int64))
+    satisfechas = pd.Series(np.array([s for _, s in estado["clientes"]], dtype=np.int64))
+    satisfechas = satisfechas[satisfechas > 0]
+
+    n, nan = estado["horas_n"], float("nan")
+    min_horas, max_horas, min_incid_emp, max_incid_emp = estado["empleados"]
+
+    # Media y varianza desde las sumas exactas; Fraction -> float redondea una sola vez
+    media_horas = std_horas = nan
+    if estado["horas_no_finitas"] != 0 or math.isnan(estado["horas_no_finitas"]):
+        media_horas = estado["horas_no_finitas"]
+    elif n:
+        escala = 2 ** estado["horas_escala"]
+        suma = Fraction(int(estado["horas_suma"]), escala)
+        media_horas = float(suma / n)
+        if n > 1:
+            suma2 = Fraction(int(estado["horas_suma2"]), escala * escala)
+            std_horas = _raiz((suma2 - suma * suma / n) / (n - 1))
+
+    # Dias completos, como .dt.days; con algun ticket sin duracion la columna es float
+    def dias(valor):
+        if valor is None:
+            return nan
+        return float(math.floor(valor)) if estado["sin_duracion"] else math.floor(valor)
+
+    return {
+        "total_incidencias": estado["n_tickets"],
+        "media_satis_5": satisfechas.mean(),
+        "std_satis_5": satisfechas.std(ddof=1),
+        "media_incid": incidencias.mean(),
+        "std_incid": incidencias.std(ddof=1),
+        "media_horas": media_horas,
+        "std_horas": std_horas,
+        "min_horas": nan if min_horas is None else min_horas,
+        "max_horas": nan if max_horas is None else max_horas,
+        "min_duracion": dias(estado["min_duracion"]),
+        "max_duracion": dias(estado["max_duracion"]),
+        "min_incid_emp": nan if min_incid_emp is None else min_incid_emp,
+        "max_incid_emp": nan if max_incid_emp is None else max_incid_emp,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza los acumuladores de los KPI de analisis.py")
+    parser.add_argument("db", nargs="?", default=conexiones.RUTA_DB)
+    parser.add_argument("--completo", action="store_true", help="reconstruye los acumuladores desde cero")
+    args = parser.parse_args()
+
+    conn = conexiones.conectar_escritura(args.db)
+    resultado = refrescar(conn, args.completo)
+    estado = leer(conn)
+    conn.close()
+    print(f"Acumuladores actualizados ({resultado['modo']}, {resultado['segundos']:.2f} s)")
+    for nombre, valor in kpis(estado).items():
+        print(f"  {nombre}: {valor}")
@@ -0,0 +1,97 @@
+# -----------------------------------------------------------------------------
+#              DESGLOSE DE INCIDENCIAS Y ACTUACIONES POR DIMENSIONES
+# -----------------------------------------------------------------------------
+# Motor generico de las agrupaciones de analisis.py (por empleado, nivel,
+# cliente, tipo de incidencia y dia de la semana). Las actuaciones de los
+# tickets elegidos se cruzan una sola vez con los atributos del ticket y del
+# empleado, y a partir de ahi cada dimension es un groupby sobre esas tablas.
+#
+# Para cada dimension:
+#   - Incidencias: tickets distintos. Si la dimension es un atributo del ticket
+#     (cliente, tipo, dia de su primera actuacion) se cuentan los tickets; si es
+#     del empleado (id_emp, nivel) se cuentan parejas empleado-ticket distintas,
+#     es decir, la suma de los tickets de cada empleado.
+#   - Actuaciones: contactos de esos tickets.
+# Con por_tipo=True se agrupa ademas por tipo_incidencia, de modo que todos los
+# tipos salen de la misma pasada.
+
+import pandas as pd
+
+# nombre: columna del ticket para Incidencias (None = parejas empleado-ticket),
+# columna de la actuacion para Actuaciones y valores que deben aparecer siempre
+DIMENSIONES = {
+    "id_emp": {"ticket": None, "actuacion": "id_emp", "dominio": None},
+    "nivel": {"ticket": None, "actuacion": "nivel", "dominio": None},
+    "cliente": {"ticket": "cliente", "actuacion": "cliente", "dominio": None},
+    "tipo_incidencia": {"ticket": "tipo_incidencia", "actuacion": "tipo_incidencia", "dominio": None},
+    "dia_semana": {"ticket": "dia_primera_actuacion", "actuacion": "dia_semana", "dominio": range(7)},
+}
+
+
+# Filtra los tickets de 'tipos' (todos si es None) y cruza sus actuaciones con
+# el cliente y tipo del ticket y el nivel del empleado
+def preparar(df_tickets, df_contactos, df_empleados, tipos=None):
+    tickets = df_tickets[["id_ticket", "cliente", "tipo_incidencia"]]
+    if tipos is not None:
+        tickets = tickets[tickets["tipo_incidencia"].isin(tipos)]
+
+    actuaciones = df_contactos[["id_contacto", "id_ticket", "id_emp", "fecha"]].merge(tickets, on="id_ticket", how="inner")
+    actuaciones = actuaciones.merge(df_empleados[["id_emp", "nivel"]], on="id_emp", how="left")
+    actuaciones["dia_semana"] = actuaciones["fecha"].dt.dayofweek
+
+    primera = actuaciones.groupby("id_ticket")["fecha"].min().dt.dayofweek
+    tickets = tickets.assign(dia_primera_actuacion=tickets["id_ticket"].map(primera).astype("Int8"))
+    return tickets, actuaciones
+
+
+def desglosar(tickets, actuaciones, dimensiones=tuple(DIMENSIONES), por_tipo=False):
+    extra = ["tipo_incidencia"] if por_tipo else []
+    parejas = None
+    resultado = {}
+    for nombre in dimensiones:
+        dimension = DIMENSIONES[nombre]
+        claves = extra + [c for c in [dimension["actuacion"]] if c not in extra]
+
+        if dimension["ticket"] is None:
+            if parejas is None:
+                parejas = actuaciones.drop_duplicates(["id_emp", "id_ticket"])
+            incidencias = parejas.groupby(claves, observed=True).size()
+        else:
+            claves_ticket = extra + [c for c in [dimension["ticket"]] if c not in extra]
+            incidencias = tickets.groupby(claves_ticket, observed=True).size()
+            incidencias.index = incidencias.index.set_names(claves)
+
+        if dimension["dominio"] is not None:
+            if por_tipo:
+                indice = pd.MultiIndex.from_product(
+                    [sorted(tickets["tipo_incidencia"].unique()), dimension["dominio"]], names=claves)
+            else:
+                indice = pd.Index(dimension["dominio"], name=claves[0])
+            incidencias = incidencias.reindex(indice).fillna(0)
+
+        actuaciones_dim = actuaciones.groupby(claves, observed=True).size().reindex(incidencias.index)
+        resultado[nombre] = pd.DataFrame({"Incidencias": incidencias, "Actuaciones": actuaciones_dim}).reset_index()
+    return resultado
+
+
+# Estadisticas basicas sobre el numero de incidencias de una agrupacion
+def estadisticas(serie, mediana=None):
+    return {
+        "Mediana": serie.median() if mediana is None else mediana,
+        "Media": serie.mean(),
+        "Varianza": serie.var(),
+        "Máximo": serie.max(),
+        "Mínimo": serie.min()
+    }
+
+
+# Las mismas estadisticas para cada tipo de un desglose hecho con por_tipo=True
+def estadisticas_por_tipo(tabla):
+    grupos = tabla.groupby("tipo_incidencia", observed=True)["Incidencias"]
+    return pd.DataFrame({
+        "Mediana": grupos.median(),
+        "Media": grupos.mean(),
+        "Varianza": grupos.var(),
+        "Máximo": grupos.max(),
+        "Mínimo": grupos.min()
+    })
@@ -0,0 +1,354 @@
+# -----------------------------------------------------------------------------
+#                      ALMACEN DE DATOS: HECHOS DIARIOS
+# -----------------------------------------------------------------------------
+# Materializa dentro de incidencias.db dos tablas de hechos agregadas por dia
+# para que el CMI no tenga que recorrer tickets y contactos_empleados en cada
+# peticion:
+#   - hechos_tickets_dia:   por fecha_apertura, cliente, tipo y mantenimiento
+#   - hechos_contactos_dia: por fecha del contacto, empleado (y su nivel),
+#                           cliente, tipo y mantenimiento del ticket
+# Ademas de los conteos se guardan sumas y sumas de cuadrados, de modo que las
+# medias y varianzas se pueden obtener sumando filas de cualquier rango.
+#
+# El refresco es incremental: solo se recalculan los dias que tienen tickets o
+# contactos nuevos desde el ultimo refresco. Tras una carga completa (que
+# reinicia los ids) se reconstruye todo. La ingesta por la API (ingesta.py) ni
+# siquiera recalcula los dias: suma los tickets de cada lote a las filas que
+# ya existen (acumular).
+#
+# Uso:
+#   python almacen.py [incidencias.db] [--completo]
+
+import argparse
+import math
+import time
+
+import conexiones
+
+ESQUEMA_ALMACEN = [
+    """
+    CREATE TABLE IF NOT EXISTS hechos_tickets_dia(
+        fecha TEXT,
+        cliente TEXT,
+        tipo_incidencia TEXT,
+        es_mantenimiento INTEGER,
+        n_tickets INTEGER,
+        n_satisfechos INTEGER,
+        suma_satisfaccion INTEGER,
+        n_cerrados INTEGER,
+        suma_duracion REAL,
+        suma_duracion2 REAL,
+        min_duracion REAL,
+        max_duracion REAL,
+        PRIMARY KEY (fecha, cliente, tipo_incidencia, es_mantenimiento)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS hechos_contactos_dia(
+        fecha TEXT,
+        id_emp TEXT,
+        nivel INTEGER,
+        cliente TEXT,
+        tipo_incidencia TEXT,
+        es_mantenimiento INTEGER,
+        n_actuaciones INTEGER,
+        suma_horas REAL,
+        suma_horas2 REAL,
+        PRIMARY KEY (fecha, id_emp, cliente, tipo_incidencia, es_mantenimiento)
+    ) WITHOUT ROWID;
+    """,
+    # Hasta donde se ha refrescado el almacen (una sola fila)
+    """
+    CREATE TABLE IF NOT EXISTS control_almacen(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        id_carga INTEGER,
+        max_id_ticket INTEGER,
+        max_id_contacto INTEGER,
+        fecha_refresco TEXT
+    );
+    """,
+]
+
+# Duracion en dias (fraccionaria) entre apertura y cierre
+_DURACION = "(julianday(fecha_cierre) - julianday(fecha_apertura))"
+
+INSERT_HECHOS_TICKETS = f"""
+    INSERT INTO hechos_tickets_dia
+    SELECT fecha_apertura, cliente, tipo_incidencia, es_mantenimiento,
+           COUNT(*),
+           SUM(satisfaccion_cliente >= 5),
+           SUM(satisfaccion_cliente),
+           COUNT({_DURACION}),
+           SUM({_DURACION}),
+           SUM({_DURACION} * {_DURACION}),
+           MIN({_DURACION}),
+           MAX({_DURACION})
+    FROM tickets
+    {{filtro}}
+    GROUP BY fecha_apertura, cliente, tipo_incidencia, es_mantenimiento
+"""
+
+INSERT_HECHOS_CONTACTOS = """
+    INSERT INTO hechos_contactos_dia
+    SELECT c.fecha, c.id_emp, MAX(e.nivel), t.cliente, t.tipo_incidencia, t.es_mantenimiento,
+           COUNT(*),
+           SUM(c.tiempo),
+           SUM(c.tiempo * c.tiempo)
+    FROM contactos_empleados c
+    JOIN tickets t ON t.id_ticket = c.id_ticket
+    LEFT JOIN empleados e ON e.id_emp = c.id_emp
+    {filtro}
+    GROUP BY c.fecha, c.id_emp, t.cliente, t.tipo_incidencia, t.es_mantenimiento
+"""
+
+
+# Lo mismo, pero solo con las filas nuevas y sumandolas a las que ya hay
+# (los minimos y maximos se combinan; NULL es "sin valor")
+def _combinar(columnas, minimos=(), maximos=()):
+    asignaciones = [f"{c} = COALESCE({c} + excluded.{c}, {c}, excluded.{c})" for c in columnas]
+    asignaciones += [f"{c} = MIN(COALESCE({c}, excluded.{c}), COALESCE(excluded.{c}, {c}))" for c in minimos]
+    asignaciones += [f"{c} = MAX(COALESCE({c}, excluded.{c}), COALESCE(excluded.{c}, {c}))" for c in maximos]
+    return ",\n        ".join(asignaciones)
+
+
+ACUMULAR_HECHOS_TICKETS = INSERT_HECHOS_TICKETS.format(filtro="WHERE id_ticket > ?") + f"""
+    ON CONFLICT(fecha, cliente, tipo_incidencia, es_mantenimiento) DO UPDATE SET
+        {_combinar(["n_tickets", "n_satisfechos", "suma_satisfaccion", "n_cerrados", "suma_duracion",
+                    "suma_duracion2"], ["min_duracion"], ["max_duracion"])}
+"""
+
+ACUMULAR_HECHOS_CONTACTOS = INSERT_HECHOS_CONTACTOS.format(filtro="WHERE c.id_contacto > ?") + f"""
+    ON CONFLICT(fecha, id_emp, cliente, tipo_incidencia, es_mantenimiento) DO UPDATE SET
+        nivel = COALESCE(excluded.nivel, nivel),
+        {_combinar(["n_actuaciones", "suma_horas", "suma_horas2"])}
+"""
+
+
+def crear_esquema_almacen(cursor):
+    for sentencia in ESQUEMA_ALMACEN:
+        cursor.execute(sentencia)
+
+
+def _existe_tabla(cursor, nombre):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+    ).fetchone() is not None
+
+
+def _reconstruir(cursor):
+    cursor.execute("DELETE FROM hechos_tickets_dia")
+    cursor.execute("DELETE FROM hechos_contactos_dia")
+    cursor.execute(INSERT_HECHOS_TICKETS.format(filtro=""))
+    cursor.execute(INSERT_HECHOS_CONTACTOS.format(filtro=""))
+
+
+# Recalcula solo los dias afectados por los tickets y contactos con id mayor
+# que las marcas anteriores. Un contacto nuevo puede mover la fecha_cierre de
+# un ticket antiguo, por eso tambien se recalcula el dia de apertura de este.
+# Los dias de contactos cuyo empleado ha cambiado de nivel (o ha desaparecido)
+# desde que se agregaron tambien se recalculan.
+def _refrescar_dias(cursor, max_id_ticket, max_id_contacto):
+    cursor.execute("DROP TABLE IF EXISTS temp.dias_tickets")
+    cursor.execute("DROP TABLE IF EXISTS temp.dias_contactos")
+    cursor.execute("""
+        CREATE TEMP TABLE dias_tickets AS
+        SELECT fecha_apertura AS fecha FROM tickets WHERE id_ticket > ?
+        UNION
+        SELECT t.fecha_apertura FROM contactos_empleados c
+        JOIN tickets t ON t.id_ticket = c.id_ticket
+        WHERE c.id_contacto > ?
+    """, (max_id_ticket, max_id_contacto))
+    cursor.execute("""
+        CREATE TEMP TABLE dias_contactos AS
+        SELECT fecha FROM contactos_empleados WHERE id_contacto > ?
+        UNION
+        SELECT h.fecha FROM hechos_contactos_dia h
+        LEFT JOIN empleados e ON e.id_emp = h.id_emp
+        WHERE h.nivel IS NOT e.nivel
+    """, (max_id_contacto,))
+
+    cursor.execute("DELETE FROM hechos_tickets_dia WHERE fecha IN (SELECT fecha FROM temp.dias_tickets)")
+    cursor.execute(INSERT_HECHOS_TICKETS.format(
+        filtro="WHERE fecha_apertura IN (SELECT fecha FROM temp.dias_tickets)"))
+    cursor.execute("DELETE FROM hechos_contactos_dia WHERE fecha IN (SELECT fecha FROM temp.dias_contactos)")
+    cursor.execute(INSERT_HECHOS_CONTACTOS.format(
+        filtro="WHERE c.fecha IN (SELECT fecha FROM temp.dias_contactos)"))
+
+    n_dias = cursor.execute(
+        "SELECT (SELECT COUNT(*) FROM temp.dias_tickets) + (SELECT COUNT(*) FROM temp.dias_contactos)"
+    ).fetchone()[0]
+    cursor.execute("DROP TABLE temp.dias_tickets")
+    cursor.execute("DROP TABLE temp.dias_contactos")
+    return n_dias
+
+
+def _marcas(cursor):
+    ultima_carga = ultima_completa = 0
+    if _existe_tabla(cursor, "control_cargas"):
+        ultima_carga, ultima_completa = cursor.execute("""
+            SELECT COALESCE(MAX(id_carga), 0),
+                   COALESCE(MAX(CASE WHEN modo = 'completa' THEN id_carga END), 0)
+            FROM control_cargas
+        """).fetchone()
+    max_id_ticket = cursor.execute("SELECT COALESCE(MAX(id_ticket), 0) FROM tickets").fetchone()[0]
+    max_id_contacto = cursor.execute("SELECT COALESCE(MAX(id_contacto), 0) FROM contactos_empleados").fetchone()[0]
+    return ultima_carga, ultima_completa, max_id_ticket, max_id_contacto
+
+
+def _guardar_control(cursor, id_carga, max_id_ticket, max_id_contacto):
+    cursor.execute("""
+        INSERT OR REPLACE INTO control_almacen(id, id_carga, max_id_ticket, max_id_contacto, fecha_refresco)
+        VALUES (1, ?, ?, ?, datetime('now'))
+    """, (id_carga, max_id_ticket, max_id_contacto))
+
+
+def _leer_control(cursor):
+    return cursor.execute(
+        "SELECT id_carga, max_id_ticket, max_id_contacto FROM control_almacen WHERE id = 1"
+    ).fetchone()
+
+
+# Refresco dentro de una transaccion ya abierta
+def actualizar(cursor, completo=False):
+    crear_esquema_almacen(cursor)
+    ultima_carga, ultima_completa, max_id_ticket, max_id_contacto = _marcas(cursor)
+    control = _leer_control(cursor)
+
+    if completo or control is None or control[0] < ultima_completa:
+        _reconstruir(cursor)
+        modo, n_dias = "completo", None
+    else:
+        n_dias = _refrescar_dias(cursor, control[1], control[2])
+        modo = "incremental"
+
+    _guardar_control(cursor, ultima_carga, max_id_ticket, max_id_contacto)
+    return modo, n_dias
+
+
+def refrescar(conn, completo=False):
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        modo, n_dias = actualizar(cursor, completo)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"modo": modo, "dias": n_dias, "segundos": time.perf_counter() - inicio}
+
+
+# Suma al almacen, dentro de la transaccion del llamador, los tickets con id
+# mayor que max_id_ticket y los contactos con id mayor que max_id_contacto.
+# Solo vale si esos contactos son todos de esos tickets (ninguno cambia la
+# fecha_cierre de un ticket anterior) y el almacen estaba al dia justo hasta
+# esas marcas; si no, se refresca como siempre.
+def acumular(cursor, max_id_ticket, max_id_contacto):
+    inicio = time.perf_counter()
+    control = _leer_control(cursor) if _existe_tabla(cursor, "control_almacen") else None
+    if control is None or (control[1], control[2]) != (max_id_ticket, max_id_contacto) or cursor.execute(
+            "SELECT 1 FROM contactos_empleados WHERE id_contacto > ? AND id_ticket <= ? LIMIT 1",
+            (max_id_contacto, max_id_ticket)).fetchone() is not None:
+        modo, n_dias = actualizar(cursor)
+        return {"modo": modo, "dias": n_dias, "segundos": time.perf_counter() - inicio}
+
+    cursor.execute(ACUMULAR_HECHOS_TICKETS, (max_id_ticket,))
+    cursor.execute(ACUMULAR_HECHOS_CONTACTOS, (max_id_contacto,))
+    # Todo son maximos de claves primarias: no recorre control_cargas
+    _guardar_control(cursor, *cursor.execute("""
+        SELECT (SELECT COALESCE(MAX(id_carga), 0) FROM control_cargas),
+               (SELECT COALESCE(MAX(id_ticket), 0) FROM tickets),
+               (SELECT COALESCE(MAX(id_contacto), 0) FROM contactos_empleados)
+    """).fetchone())
+    return {"modo": "acumulado", "dias": None, "segundos": time.perf_counter() - inicio}
+
+
+# Para bases de datos anteriores al almacen: lo construye la primera vez
+def asegurar_almacen(conn):
+    if not _existe_tabla(conn.cursor(), "control_almacen"):
+        refrescar(conn)
+
+
+# Estado del almacen para los KPI de analisis.py, o None si no esta al dia
+# con los datos
+def leer(conn):
+    cursor = conn.cursor()
+    if not _existe_tabla(cursor, "control_almacen"):
+        return None
+    ultima_carga, _, max_id_ticket, max_id_contacto = _marcas(cursor)
+    if _leer_control(cursor) != (ultima_carga, max_id_ticket, max_id_contacto):
+        return None
+    estado = dict(zip(["n_tickets", "n_cerrados", "min_duracion", "max_duracion"], cursor.execute("""
+        SELECT COALESCE(SUM(n_tickets), 0), COALESCE(SUM(n_cerrados), 0), MIN(min_duracion), MAX(max_duracion)
+        FROM hechos_tickets_dia
+    """).fetchone()))
+    estado["clientes"] = cursor.execute("""
+        SELECT SUM(n_tickets), COALESCE(SUM(n_satisfechos), 0) FROM hechos_tickets_dia
+        WHERE cliente IS NOT NULL GROUP BY cliente ORDER BY cliente
+    """).fetchall()
+    estado["horas"] = cursor.execute("""
+        SELECT MIN(horas), MAX(horas) FROM (
+            SELECT SUM(suma_horas) AS horas FROM hechos_contactos_dia
+            WHERE id_emp IS NOT NULL GROUP BY id_emp
+        )
+    """).fetchone()
+    return estado
+
+
+# Los KPI de analisis.py que se pueden sumar desde las filas diarias. Las horas
+# por ticket y los tickets distintos por empleado no: un ticket tiene contactos
+# de varios dias y las filas no guardan de que ticket es cada uno
+def kpis(estado):
+    import numpy as np
+    import pandas as pd
+
+    # Las mismas Series de enteros (por cliente, en orden) que agrupa analisis.py
+    incidencias = pd.Series(np.array([i for i, _ in estado["clientes"]], dtype=np.int64))
+    satisfechas = pd.Series(np.array([s for _, s in estado["clientes"]], dtype=np.int64))
+    satisfechas = satisfechas[satisfechas > 0]
+
+    nan = float("nan")
+    min_horas, max_horas = estado["horas"]
+
+    # Dias completos, como .dt.days; con algun ticket sin duracion la columna es float
+    def dias(valor):
+        if valor is None:
+            return nan
+        return float(math.floor(valor)) if estado["n_cerrados"] < estado["n_tickets"] else math.floor(valor)
+
+    return {
+        "total_incidencias": estado["n_tickets"],
+        "media_satis_5": satisfechas.mean(),
+        "std_satis_5": satisfechas.std(ddof=1),
+        "media_incid": incidencias.mean(),
+        "std_incid": incidencias.std(ddof=1),
+        "min_horas": nan if min_horas is None else min_horas,
+        "max_horas": nan if max_horas is None else max_horas,
+        "min_duracion": dias(estado["min_duracion"]),
+        "max_duracion": dias(estado["max_duracion"]),
+    }
+
+
+# Media y varianza (ddof=1) a partir de conteo, suma y suma de cuadrados
+def media_varianza(n, suma, suma2):
+    if not n:
+        return float("nan"), float("nan")
+    media = suma / n
+    varianza = (suma2 - suma * suma / n) / (n - 1) if n > 1 else float("nan")
+    return media, varianza
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresca las tablas de hechos del almacen de datos")
+    parser.add_argument("db", nargs="?", default=conexiones.RUTA_DB)
+    parser.add_argument("--completo", action="store_true", help="reconstruye todas las tablas de hechos")
+    args = parser.parse_args()
+
+    conn = conexiones.conectar_escritura(args.db)
+    resultado = refrescar(conn, args.completo)
+    conn.close()
+    if resultado["modo"] == "completo":
+        print(f"Almacen reconstruido en {resultado['segundos']:.2f} s")
+    else:
+        print(f"Almacen refrescado: {resultado['dias']} dias recalculados en {resultado['segundos']:.2f} s")
@@ -1,230 +1,378 @@
-import sqlite3
+import threading
 import pandas as pd
-from datetime import datetime
-
-# 1) Conectamos y leemos los datos
-conn = sqlite3.connect("incidencias.db")
-df_tickets = pd.read_sql_query("SELECT * FROM tickets", conn)
-df_contactos = pd.read_sql_query("SELECT * FROM contactos_empleados", conn)
-df_empleados = pd.read_sql_query("SELECT * FROM empleados", conn)
-conn.close()
-
-# 2) Convertimos las columnas de fecha a tipo datetime
-df_tickets["fecha_apertura"] = pd.to_datetime(df_tickets["fecha_apertura"])
-df_tickets["fecha_cierre"]   = pd.to_datetime(df_tickets["fecha_cierre"])
-df_contactos["fecha"]        = pd.to_datetime(df_contactos["fecha"])
-
-# 3) Calculamos la fecha de último contacto de cada ticket
-df_max_contact = (
-    df_contactos.groupby("id_ticket")["fecha"]
-    .max()                               # fecha máxima por ticket
-    .reset_index(name="last_contact")
-)
-
-# 4) Hacemos un merge para añadir esa columna a df_tickets
-df_tickets = df_tickets.merge(df_max_contact, on="id_ticket", how="left")
-
-# 5) Sobrescribimos fecha_cierre con la última actuación (si es mayor)
-#    Para ello, tomamos el máximo entre [fecha_cierre original, last_contact]
-df_tickets["fecha_cierre"] = df_tickets[["fecha_cierre", "last_contact"]].max(axis=1)
 
-# -----------------------------------------------------------------------------
-#                                   Análisis
-# -----------------------------------------------------------------------------
-
-# 1) Número de incidencias totales
-total_incidencias = len(df_tickets)
-
-# 2) Incidencias con satisfaccion_cliente >= 5
-df_satis_5 = df_tickets[df_tickets["satisfaccion_cliente"] >= 5]
-num_satis_5 = len(df_satis_5)
-
-# Media y desviación std del total de incidencias (con sat >=5) por cliente
-group_satis = df_satis_5.groupby("cliente").size()
-media_satis_5 = group_satis.mean()
-std_satis_5 = group_satis.std(ddof=1)
-
-# 3) Media y std de número de incidentes por cliente
-group_incidencias = df_tickets.groupby("cliente").size()
-media_incid = group_incidencias.mean()
-std_incid = group_incidencias.std(ddof=1)
-
-# 4) Sumar horas de cada incidencia
-horas_por_ticket = df_contactos.groupby("id_ticket")["tiempo"].sum().reset_index()
-horas_por_ticket.columns = ["id_ticket", "horas_totales_incidente"]
-
-media_horas = horas_por_ticket["horas_totales_incidente"].mean()
-std_horas = horas_por_ticket["horas_totales_incidente"].std(ddof=1)
-
-# 5) Mín y máx del total de horas realizadas por los empleados
-horas_por_empleado = df_contactos.groupby("id_emp")["tiempo"].sum().reset_index()
-min_horas = horas_por_empleado["tiempo"].min()
-max_horas = horas_por_empleado["tiempo"].max()
-
-# 6) Mín y máx del tiempo entre apertura y cierre en días
-#    (Ya con fecha_cierre corregida)
-df_tickets["duracion_dias"] = (df_tickets["fecha_cierre"] - df_tickets["fecha_apertura"]).dt.days
-min_duracion = df_tickets["duracion_dias"].min()
-max_duracion = df_tickets["duracion_dias"].max()
-
-# 7) Mín y máx del número de incidentes atendidos por cada empleado
-tickets_por_empleado = df_contactos.groupby("id_emp")["id_ticket"].nunique().reset_index()
-min_incid_emp = tickets_por_empleado["id_ticket"].min()
-max_incid_emp = tickets_por_empleado["id_ticket"].max()
+import acumuladores
+import agrupaciones
+import almacen
+import conexiones
+import nucleos
+from acceso_datos import acceso
+from instrumentacion import fase
+from version_datos import vigilante
 
 # -----------------------------------------------------------------------------
-# Mostramos los resultados
+# Motor de analisis: cada metrica se calcula la primera vez que se pide y se
+# guarda en cache hasta que cambia la version de los datos (ver version_datos).
+# Asi importar el modulo no cuesta nada y la aplicacion ve los datos nuevos
+# sin reiniciarse.
 # -----------------------------------------------------------------------------
-print(f"Total de incidencias: {total_incidencias}")
-print(f"Media de incidencias (con sat >= 5) por cliente: {media_satis_5:.2f}, Desv: {std_satis_5:.2f}")
-print(f"Media de incidencias por cliente: {media_incid:.2f}, Desv: {std_incid:.2f}")
-print(f"Media de horas por incidencia: {media_horas:.2f}, Desv: {std_horas:.2f}")
-print(f"Mín de horas totales por empleado: {min_horas:.2f}, Máx: {max_horas:.2f}")
-print(f"Mín de duración (días) de un ticket: {min_duracion}, Máx: {max_duracion}")
-print(f"Mín # incidencias atendidas por un empleado: {min_incid_emp}, Máx: {max_incid_emp}")
 
+# Tipo de incidencia que se analiza como fraude
+TIPO_FRAUDE = '5'
+
+
+class metrica:
+    def __init__(self, funcion):
+        self.funcion = funcion
+        self.nombre = funcion.__name__
+
+    def __get__(self, motor, tipo=None):
+        if motor is None:
+            return self
+        return motor.obtener(self.nombre, self.funcion)
+
+
+class MotorAnalisis:
+    def __init__(self, ruta_db=conexiones.RUTA_DB, intervalo_version=1.0, usar_acumuladores=True,
+                 usar_almacen=True):
+        self.ruta_db = ruta_db
+        # Los KPI generales salen de acumuladores.py mientras esten al dia y,
+        # si no, los que se pueden sumar por dias, de las tablas de hechos
+        self.usar_acumuladores = usar_acumuladores
+        self.usar_almacen = usar_almacen
+        # La version se lee a traves del vigilante compartido con las caches
+        # de paginas, que la comprueba como mucho cada 'intervalo_version' s
+        self.vigilante = vigilante(ruta_db, intervalo_version)
+        self._cache = {}
+        self._version = None
+        self._lock = threading.Lock()
+        # Un lock por metrica (ver obtener)
+        self._locks = {}
+
+    def version(self):
+        return self.vigilante.leer()
+
+    def fecha_version(self):
+        return self.vigilante.fecha()
+
+    # Vacia la cache si los datos han cambiado desde la ultima comprobacion
+    def comprobar_version(self, forzar=False):
+        version = self.vigilante.comprobar(forzar)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    # Un diccionario nuevo: lo que se este calculando con la
+                    # version anterior se guarda en el viejo
+                    self._cache = {}
+                    self._version = version
+        return version
+
+    def _lock_metrica(self, nombre):
+        with self._lock:
+            return self._locks.setdefault(nombre, threading.Lock())
+
+    # Dos hilos no calculan la misma metrica a la vez, pero una metrica lenta
+    # no bloquea las demas. Las dependencias entre metricas no tienen ciclos,
+    # asi que esperar al lock de otra dentro de un calculo no se bloquea nunca
+    def obtener(self, nombre, funcion):
+        self.comprobar_version()
+        cache = self._cache
+        if nombre in cache:
+            return cache[nombre]
+        with self._lock_metrica(nombre):
+            if nombre not in cache:
+                with fase("pandas"):
+                    cache[nombre] = funcion(self)
+            return cache[nombre]
+
+    # -------------------------------------------------------------------------
+    # 1) Lectura de las tablas
+    # -------------------------------------------------------------------------
+
+    # Las tablas se leen a traves de acceso_datos (tipos compactos y fechas ya
+    # convertidas); los groupby por columnas categoricas usan observed=True para
+    # no crear grupos vacios
+
+    @metrica
+    def df_tickets(self):
+        df = acceso(self.ruta_db).tabla("tickets")
+        # La fecha_cierre guardada ya es la de la última actuación de cada ticket
+        # (main.py la corrige al cargar y un disparador la mantiene al día)
+        return df.assign(duracion_dias=(df["fecha_cierre"] - df["fecha_apertura"]).dt.days)
+
+    @metrica
+    def df_contactos(self):
+        return acceso(self.ruta_db).tabla("contactos_empleados")
+
+    @metrica
+    def df_empleados(self):
+        return acceso(self.ruta_db).tabla("empleados", ["id_emp", "nombre", "nivel"])
+
+    # -------------------------------------------------------------------------
+    # 2) Análisis
+    # -------------------------------------------------------------------------
+
+    # KPI guardados por acumuladores.py, o None si no estan al dia con los
+    # datos (entonces se calculan con pandas)
+    @metrica
+    def kpis_acumulados(self):
+        if not self.usar_acumuladores:
+            return None
+        with conexiones.lectura(self.ruta_db) as conn:
+            estado = acumuladores.leer(conn)
+        return None if estado is None else acumuladores.kpis(estado)
+
+    # Los KPI que se pueden sumar desde las tablas de hechos diarias de
+    # almacen.py, o None si no estan al dia
+    @metrica
+    def kpis_almacen(self):
+        if not self.usar_almacen:
+            return None
+        with conexiones.lectura(self.ruta_db) as conn:
+            estado = almacen.leer(conn)
+        return None if estado is None else almacen.kpis(estado)
+
+    # Acumuladores, tablas de hechos o, si ninguno lo tiene al dia, pandas
+    def _kpi(self, nombre, calcular):
+        kpis = self.kpis_acumulados
+        if kpis is not None:
+            return kpis[nombre]
+        kpis = self.kpis_almacen
+        if kpis is not None and nombre in kpis:
+            return kpis[nombre]
+        return calcular()
+
+    # Número de incidencias totales
+    @metrica
+    def total_incidencias(self):
+        return self._kpi("total_incidencias", lambda: len(self.df_tickets))
+
+    # Incidencias por cliente, todas y las de satisfaccion_cliente >= 5, con
+    # las claves factorizadas una sola vez (ver nucleos.py)
+    @metrica
+    def conteos_cliente(self):
+        grupos = nucleos.Grupos(self.df_tickets["cliente"])
+        return pd.DataFrame({
+            "incidencias": grupos.contar(),
+            "satisfechas": grupos.contar(self.df_tickets["satisfaccion_cliente"] >= 5)
+        }, index=grupos.indice)
+
+    # Incidencias con satisfaccion_cliente >= 5 por cliente
+    @metrica
+    def group_satis(self):
+        satisfechas = self.conteos_cliente["satisfechas"]
+        return satisfechas[satisfechas > 0].rename(None)
+
+    @metrica
+    def media_satis_5(self):
+        return self._kpi("media_satis_5", lambda: self.group_satis.mean())
+
+    @metrica
+    def std_satis_5(self):
+        return self._kpi("std_satis_5", lambda: self.group_satis.std(ddof=1))
+
+    # Número de incidentes por cliente
+    @metrica
+    def group_incidencias(self):
+        return self.conteos_cliente["incidencias"].rename(None)
+
+    @metrica
+    def media_incid(self):
+        return self._kpi("media_incid", lambda: self.group_incidencias.mean())
+
+    @metrica
+    def std_incid(self):
+        return self._kpi("std_incid", lambda: self.group_incidencias.std(ddof=1))
+
+    # Horas de cada incidencia
+    @metrica
+    def horas_por_ticket(self):
+        grupos = nucleos.Grupos(self.df_contactos["id_ticket"])
+        return grupos.serie(grupos.sumar(self.df_contactos["tiempo"]), "horas_totales_incidente").reset_index()
+
+    @metrica
+    def media_horas(self):
+        return self._kpi("media_horas", lambda: self.horas_por_ticket["horas_totales_incidente"].mean())
+
+    @metrica
+    def std_horas(self):
+        return self._kpi("std_horas", lambda: self.horas_por_ticket["horas_totales_incidente"].std(ddof=1))
+
+    # Horas y tickets distintos de cada empleado en una sola factorizacion
+    @metrica
+    def por_empleado(self):
+        grupos = nucleos.Grupos(self.df_contactos["id_emp"])
+        return pd.DataFrame({
+            "tiempo": grupos.sumar(self.df_contactos["tiempo"]),
+            "id_ticket": grupos.distintos(self.df_contactos["id_ticket"])
+        }, index=grupos.indice)
+
+    # Total de horas realizadas por los empleados
+    @metrica
+    def horas_por_empleado(self):
+        return self.por_empleado["tiempo"].reset_index()
+
+    @metrica
+    def min_horas(self):
+        return self._kpi("min_horas", lambda: self.horas_por_empleado["tiempo"].min())
+
+    @metrica
+    def max_horas(self):
+        return self._kpi("max_horas", lambda: self.horas_por_empleado["tiempo"].max())
+
+    # Tiempo entre apertura y cierre en días
+    @metrica
+    def min_duracion(self):
+        return self._kpi("min_duracion", lambda: self.df_tickets["duracion_dias"].min())
+
+    @metrica
+    def max_duracion(self):
+        return self._kpi("max_duracion", lambda: self.df_tickets["duracion_dias"].max())
+
+    # Número de incidentes atendidos por cada empleado
+    @metrica
+    def tickets_por_empleado(self):
+        return self.por_empleado["id_ticket"].reset_index()
+
+    @metrica
+    def min_incid_emp(self):
+        return self._kpi("min_incid_emp", lambda: self.tickets_por_empleado["id_ticket"].min())
+
+    @metrica
+    def max_incid_emp(self):
+        return self._kpi("max_incid_emp", lambda: self.tickets_por_empleado["id_ticket"].max())
+
+    # -------------------------------------------------------------------------
+    # 3) Agrupaciones de las incidencias de fraude
+    # -------------------------------------------------------------------------
+    # Las cinco agrupaciones salen de una sola pasada del motor de agrupaciones.py,
+    # que sirve igual para cualquier tipo de incidencia (desglose(tipo)) o para
+    # todos a la vez (desglose_por_tipo).
+
+    def desglose(self, tipo):
+        def calcular(motor):
+            tickets, actuaciones = agrupaciones.preparar(motor.df_tickets, motor.df_contactos,
+                                                         motor.df_empleados, [tipo])
+            return agrupaciones.desglosar(tickets, actuaciones)
+        return self.obtener(f"desglose_{tipo}", calcular)
+
+    @metrica
+    def desglose_por_tipo(self):
+        tickets, actuaciones = agrupaciones.preparar(self.df_tickets, self.df_contactos, self.df_empleados)
+        return agrupaciones.desglosar(tickets, actuaciones, por_tipo=True)
+
+    @metrica
+    def df_fraude(self):
+        return self.df_tickets[self.df_tickets["tipo_incidencia"] == TIPO_FRAUDE]
+
+    # Incidencias y actuaciones en caso de fraude por empleado
+    @metrica
+    def group_empleado(self):
+        return self.desglose(TIPO_FRAUDE)["id_emp"]
+
+    # Incidencias y actuaciones en caso de fraude por nivel de empleado
+    @metrica
+    def group_nivel(self):
+        return self.desglose(TIPO_FRAUDE)["nivel"]
+
+    # Incidencias y actuaciones en caso de fraude por cliente
+    @metrica
+    def group_cliente(self):
+        return self.desglose(TIPO_FRAUDE)["cliente"]
+
+    # Incidencias y actuaciones en caso de fraude por tipo de incidencia
+    @metrica
+    def group_incidencia(self):
+        return self.desglose(TIPO_FRAUDE)["tipo_incidencia"]
+
+    # Incidencias y actuaciones en caso de fraude por dia de la semana
+    @metrica
+    def group_dia(self):
+        return self.desglose(TIPO_FRAUDE)["dia_semana"]
+
+    # Duración (días) de las incidencias de fraude
+    @metrica
+    def duracion_fraude(self):
+        return self.df_fraude["duracion_dias"]
+
+    @metrica
+    def estadisticas_empleado(self):
+        return agrupaciones.estadisticas(self.group_empleado["Incidencias"])
+
+    @metrica
+    def estadisticas_nivel(self):
+        # La mediana se ha calculado siempre sobre la agrupacion por empleado
+        return agrupaciones.estadisticas(self.group_nivel["Incidencias"],
+                                         mediana=self.group_empleado["Incidencias"].median())
+
+    @metrica
+    def estadisticas_cliente(self):
+        return agrupaciones.estadisticas(self.group_cliente["Incidencias"])
+
+    @metrica
+    def estadisticas_incidencia(self):
+        return agrupaciones.estadisticas(self.group_incidencia["Incidencias"])
+
+    @metrica
+    def estadisticas_dia(self):
+        return agrupaciones.estadisticas(self.group_dia["Incidencias"])
+
+    @metrica
+    def estadisticas_duracion_fraude(self):
+        return agrupaciones.estadisticas(self.duracion_fraude)
+
+
+# Calcula todas las metricas del motor (precalentado y estado compartido)
+def calcular_metricas(motor):
+    for nombre, valor in vars(MotorAnalisis).items():
+        if isinstance(valor, metrica):
+            getattr(motor, nombre)
+    return motor
+
+
+# Motor compartido por la aplicacion (estado_compartido.py lo sustituye entero
+# cuando el maestro de gunicorn calcula una version nueva)
+motor = MotorAnalisis()
 
 
 # -----------------------------------------------------------------------------
-#                                   Agrupaciones
+# Mostramos los resultados
 # -----------------------------------------------------------------------------
-
-pd.set_option('display.max_columns', None)
-pd.set_option('display.width', None)
-
-df_fraude = df_tickets[df_tickets["tipo_incidencia"] == '5']
-print(f"Numero de incidencias de fraude: {len(df_fraude)}\n")
-
-# 1) Agrupaciones y calculos de incidencias y actuaciones en caso de fraude por empleado
-
-group_fraude = df_contactos[df_contactos["id_ticket"].isin(df_fraude["id_ticket"])]
-
-group_empleado = group_fraude.groupby("id_emp")["id_ticket"].nunique().reset_index(name="Incidencias")
-group_empleado_actuaciones = group_fraude.groupby("id_emp")["id_ticket"].count().reset_index(name="Actuaciones")
-group_empleado = group_empleado.merge(group_empleado_actuaciones, on="id_emp", how="left")
-
-# Estadisticas basicas sobre el numero de incidencias de fraude por empleado
-mediana_empleado = group_empleado["Incidencias"].median()
-media_empleado = group_empleado["Incidencias"].mean()
-varianza_empleado = group_empleado["Incidencias"].var()
-max_empleado = group_empleado["Incidencias"].max()
-min_empleado = group_empleado["Incidencias"].min()
-
-print(f"Agrupacion por Empleado:\n{group_empleado}\n")
-print(f"Estadisticas basicas por empleado:")
-print(f"Mediana: {media_empleado}, Media: {mediana_empleado}, Varianza: {varianza_empleado}, Max: {max_empleado}, Min: {min_empleado}\n")
-
-
-# 2) Agrupaciones y calculos de incidencias y actuaciones en caso de fraude por nivel de empleado
-
-group_nivel = group_fraude.groupby("id_emp")["id_ticket"].nunique().reset_index(name="Incidencias")
-group_nivel_actuaciones = group_fraude.groupby("id_emp")["id_ticket"].count().reset_index(name="Actuaciones")
-group_nivel = group_nivel.merge(group_nivel_actuaciones, on="id_emp", how="left")
-group_nivel = group_nivel.merge(df_empleados[["id_emp", "nivel"]], on="id_emp", how="left")
-group_nivel = group_nivel.groupby("nivel", as_index=False)[["Incidencias", "Actuaciones"]].sum()
-
-# Estadisticas basicas sobre el numero de incidencias de fraude por nivel de empleado
-mediana_nivel = group_empleado["Incidencias"].median()
-media_nivel = group_nivel["Incidencias"].mean()
-varianza_nivel = group_nivel["Incidencias"].var()
-max_nivel = group_nivel["Incidencias"].max()
-min_nivel = group_nivel["Incidencias"].min()
-
-print(f"Agrupacion por nivel de empleado:\n{group_nivel}\n")
-print(f"Estadisticas basicas por nivel de empleado:")
-print(f"Mediana: {mediana_nivel}, Media: {media_nivel}, Varianza: {varianza_nivel}, Max: {max_nivel}, Min: {min_nivel}\n")
-
-
-# 3) Agrupaciones y calculos de incidencias y actuaciones en caso de fraude por cliente
-
-group_cliente = df_fraude.groupby("cliente")["id_ticket"].nunique().reset_index(name="Incidencias")
-group_cliente_actuaciones = group_fraude.merge(df_tickets[["id_ticket", "cliente"]], on="id_ticket", how="left")
-group_cliente_actuaciones = group_cliente_actuaciones.groupby("cliente")["id_contacto"].count().reset_index(name="Actuaciones")
-group_cliente = group_cliente.merge(group_cliente_actuaciones, on="cliente", how="left")
-
-
-# Estadisticas basicas sobre el numero de incidencias de fraude por cliente
-mediana_cliente = group_cliente["Incidencias"].median()
-media_cliente = group_cliente["Incidencias"].mean()
-varianza_cliente = group_cliente["Incidencias"].var()
-max_cliente = group_cliente["Incidencias"].max()
-min_cliente = group_cliente["Incidencias"].min()
-
-
-print(f"Agrupacion por cliente:\n{group_cliente}\n")
-print(f"Estadisticas basicas por cliente:")
-print(f"Mediana: {mediana_cliente}, Media: {media_cliente}, Varianza: {varianza_cliente}, Max: {max_cliente}, Min: {min_cliente}\n")
-
-
-# 4) Agrupaciones y calculos de incidencias y actuaciones en caso de fraude por tipo de incidencia
-
-group_incidencia = df_fraude.groupby("tipo_incidencia")["id_ticket"].nunique().reset_index(name="Incidencias")
-group_incidencia_actuaciones = group_fraude.merge(df_fraude[["id_ticket", "tipo_incidencia"]], on="id_ticket", how="inner")
-group_incidencia_actuaciones = (group_incidencia_actuaciones.groupby("tipo_incidencia")["fecha"].count().reset_index(name="Actuaciones"))
-group_incidencia = group_incidencia.merge(group_incidencia_actuaciones, on="tipo_incidencia", how="left")
-
-
-
-# Estadisticas basicas sobre el numero de incidencias de fraude por tipo de incidencia
-mediana_incidencia = group_incidencia["Incidencias"].median()
-media_incidencia= group_incidencia["Incidencias"].mean()
-varianza_incidencia = group_incidencia["Incidencias"].var()
-max_incidencia = group_incidencia["Incidencias"].max()
-min_incidencia = group_incidencia["Incidencias"].min()
-
-print(f"Agrupacion por tipo de incidencia:\n{group_incidencia}\n")
-print(f"Estadisticas basicas por tipo de incidencia:")
-print(f"Mediana: {mediana_incidencia}, Media: {media_incidencia}, Varianza: {varianza_incidencia}, Max: {max_incidencia}, Min: {min_incidencia}\n")
-
-
-# 5) Agrupaciones y calculos de incidencias y actuaciones en caso de fraude por dia de la semana
-
-group_fraude = df_contactos[df_contactos["id_ticket"].isin(df_fraude["id_ticket"])].copy()
-group_fraude_incidencias = group_fraude.groupby("id_ticket")["fecha"].min().reset_index()
-group_fraude["dia_semana"] = group_fraude["fecha"].dt.dayofweek
-group_fraude_incidencias["dia_semana"] = group_fraude_incidencias["fecha"].dt.dayofweek
-
-group_dia = group_fraude_incidencias.groupby("dia_semana")["id_ticket"].nunique().reset_index(name="Incidencias")
-group_dia_actuaciones = group_fraude.groupby("dia_semana")["id_ticket"].count().reset_index(name="Actuaciones")
-
-dias = pd.DataFrame({"dia_semana": range(0, 7)})
-group_dia = dias.merge(group_dia, on="dia_semana", how="left").fillna(0)
-group_dia_actuaciones = dias.merge(group_dia_actuaciones, on="dia_semana", how="left")
-
-group_dia = group_dia.merge(group_dia_actuaciones, on="dia_semana", how="left")
-
-
-# Estadisticas basicas sobre el numero de incidencias de fraude por día de la semana
-mediana_dia = group_dia["Incidencias"].median()
-media_dia = group_dia["Incidencias"].mean()
-varianza_dia = group_dia["Incidencias"].var()
-max_dia = group_dia["Incidencias"].max()
-min_dia = group_dia["Incidencias"].min()
-
-print(f"Agrupacion por dia de la semana:\n{group_dia}\n")
-print(f"Estadisticas basicas por dia de la semana:")
-print(f"Mediana: {mediana_dia}, Media: {media_dia}, Varianza: {varianza_dia}, Max: {max_dia}, Min: {min_dia}\n")
-
-# ----------------------------------------------------------------------
-# Duración de incidencias de fraude
-# ----------------------------------------------------------------------
-
-df_fraude.loc[:, "duracion_dias"] = (df_fraude["fecha_cierre"] - df_fraude["fecha_apertura"]).dt.days
-
-mediana_duracion_fraude = df_fraude["duracion_dias"].median()
-media_duracion_fraude = df_fraude["duracion_dias"].mean()
-varianza_duracion_fraude = df_fraude["duracion_dias"].var()
-max_duracion_fraude = df_fraude["duracion_dias"].max()
-min_duracion_fraude = df_fraude["duracion_dias"].min()
-
-print(f"\n--- Estadísticas de duración (días) de incidentes de fraude ---")
-print(f"Mediana: {mediana_duracion_fraude}")
-print(f"Media: {media_duracion_fraude}")
-print(f"Varianza: {varianza_duracion_fraude}")
-print(f"Máximo: {max_duracion_fraude}")
-print(f"Mínimo: {min_duracion_fraude}")
-
-
-__all__ = ["df_tickets", "df_contactos", "df_empleados"]
-
-conn.close()
+def imprimir_resultados(m):
+    print(f"Total de incidencias: {m.total_incidencias}")
+    print(f"Media de incidencias (con sat >= 5) por cliente: {m.media_satis_5:.2f}, Desv: {m.std_satis_5:.2f}")
+    print(f"Media de incidencias por cliente: {m.media_incid:.2f}, Desv: {m.std_incid:.2f}")
+    print(f"Media de horas por incidencia: {m.media_horas:.2f}, Desv: {m.std_horas:.2f}")
+    print(f"Mín de horas totales por empleado: {m.min_horas:.2f}, Máx: {m.max_horas:.2f}")
+    print(f"Mín de duración (días) de un ticket: {m.min_duracion}, Máx: {m.max_duracion}")
+    print(f"Mín # incidencias atendidas por un empleado: {m.min_incid_emp}, Máx: {m.max_incid_emp}")
+
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.width', None)
+
+    print(f"Numero de incidencias de fraude: {len(m.df_fraude)}\n")
+
+    agrupaciones = [
+        ("Empleado", "por empleado", m.group_empleado, m.estadisticas_empleado),
+        ("nivel de empleado", "por nivel de empleado", m.group_nivel, m.estadisticas_nivel),
+        ("cliente", "por cliente", m.group_cliente, m.estadisticas_cliente),
+        ("tipo de incidencia", "por tipo de incidencia", m.group_incidencia, m.estadisticas_incidencia),
+        ("dia de la semana", "por dia de la semana", m.group_dia, m.estadisticas_dia),
+    ]
+    for titulo, sufijo, tabla, est in agrupaciones:
+        print(f"Agrupacion por {titulo}:\n{tabla}\n")
+        print(f"Estadisticas basicas {sufijo}:")
+        print(f"Mediana: {est['Mediana']}, Media: {est['Media']}, Varianza: {est['Varianza']}, "
+              f"Max: {est['Máximo']}, Min: {est['Mínimo']}\n")
+
+    est = m.estadisticas_duracion_fraude
+    print(f"\n--- Estadísticas de duración (días) de incidentes de fraude ---")
+    print(f"Mediana: {est['Mediana']}")
+    print(f"Media: {est['Media']}")
+    print(f"Varianza: {est['Varianza']}")
+    print(f"Máximo: {est['Máximo']}")
+    print(f"Mínimo: {est['Mínimo']}")
+
+
+if __name__ == "__main__":
+    imprimir_resultados(motor)
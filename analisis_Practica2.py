@@ -1,18 +1,42 @@
 # -----------------------------------------------------------------------------
 #                                  ANALISIS PRACTICA 2
 # -----------------------------------------------------------------------------
+# Las consultas leen de las tablas de hechos diarias del almacen (almacen.py),
+# por lo que su coste depende del numero de dias y no del historico de tickets.
 
-from analisis import df_tickets, df_contactos
+import acceso_datos
+import conexiones
+
+
+def _consultar(query, params=()):
+    # El pool construye el almacen antes de la primera lectura si no existe
+    with conexiones.lectura() as conn:
+        return acceso_datos.consultar(conn, query, params)
 
 def obtener_top_clientes(top_n=10):
-    conteo_clientes = df_tickets.groupby("cliente").size().reset_index(name="n_incidencias")
-    return conteo_clientes.sort_values(by="n_incidencias", ascending=False).head(top_n)
+    return _consultar("""
+        SELECT cliente, SUM(n_tickets) AS n_incidencias
+        FROM hechos_tickets_dia
+        GROUP BY cliente
+        ORDER BY n_incidencias DESC, cliente
+        LIMIT ?
+    """, (top_n,))
 
 def obtener_top_tipos_tiempo(top_n=10):
-    df_tickets["duracion"] = (df_tickets["fecha_cierre"] - df_tickets["fecha_apertura"]).dt.total_seconds() / 3600
-    top_tipos = df_tickets.groupby("tipo_incidencia")["duracion"].mean().reset_index()
-    return top_tipos.sort_values(by="duracion", ascending=False).head(top_n)
+    # Duracion media en horas entre apertura y cierre
+    return _consultar("""
+        SELECT tipo_incidencia, SUM(suma_duracion) * 24.0 / SUM(n_cerrados) AS duracion
+        FROM hechos_tickets_dia
+        GROUP BY tipo_incidencia
+        ORDER BY duracion DESC, tipo_incidencia
+        LIMIT ?
+    """, (top_n,))
 
 def obtener_top_empleados_por_tiempo(top_n=10):
-    tiempo_empleado = df_contactos.groupby("id_emp")["tiempo"].sum().reset_index()
-    return tiempo_empleado.sort_values(by="tiempo", ascending=False).head(top_n)
+    return _consultar("""
+        SELECT id_emp, SUM(suma_horas) AS tiempo
+        FROM hechos_contactos_dia
+        GROUP BY id_emp
+        ORDER BY tiempo DESC, id_emp
+        LIMIT ?
+    """, (top_n,))
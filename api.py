@@ -0,0 +1,372 @@
+# -----------------------------------------------------------------------------
+#                        API JSON DE ANALITICA (/api/v1)
+# -----------------------------------------------------------------------------
+# Los mismos datos del dashboard en JSON para herramientas de BI. Todos los
+# filtros y agregaciones se resuelven en SQLite (sobre las tablas de hechos del
+# almacen cuando es posible) y solo viaja a Python el resultado.
+#
+# Filtros comunes (todos opcionales):
+#   desde, hasta        fechas AAAA-MM-DD: apertura del ticket, salvo en lo
+#                       que se mide por empleado (horas, actuaciones), donde
+#                       se filtra por la fecha de la actuacion
+#   tipo_incidencia     uno o varios tipos separados por comas
+#   es_mantenimiento    0 o 1
+#   top_n               numero maximo de filas del ranking
+# Los rankings se paginan por conjunto de claves: cada respuesta trae
+# 'siguiente', que se pasa como parametro 'cursor' para pedir la pagina
+# siguiente ('limite' filas por pagina).
+
+import base64
+import json
+import math
+import os
+from datetime import date
+
+from flask import Blueprint, jsonify, request
+
+import almacen
+import conexiones
+import instrumentacion
+from cache_respuestas import CacheRespuestas, cachear
+from version_datos import vigilante
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+# Con INCIDENCIAS_BOCETOS=1 los tickets distintos por empleado se estiman (ver
+# bocetos.py, que solo se importa entonces: necesita NumPy)
+BOCETOS = os.environ.get("INCIDENCIAS_BOCETOS", "0") == "1"
+
+PARAMETROS = ("desde", "hasta", "tipo_incidencia", "es_mantenimiento", "top_n", "limite", "cursor")
+
+cache = CacheRespuestas(max_entradas=256, max_bytes=16 * 1024 * 1024)
+# Misma version que el motor de analisis; la API no necesita pandas salvo en el desglose
+version = vigilante()
+cache_api = cachear(cache, version.comprobar, version.fecha, args=PARAMETROS)
+instrumentacion.registrar_cache("api", cache)
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+@api.errorhandler(ParametroInvalido)
+def parametro_invalido(error):
+    return jsonify(error=str(error)), 400
+
+
+# -----------------------------------------------------------------------------
+# Lectura de parametros
+# -----------------------------------------------------------------------------
+
+def _fecha(nombre):
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor).isoformat()
+    except ValueError:
+        raise ParametroInvalido(f"'{nombre}' debe tener el formato AAAA-MM-DD")
+
+
+def _entero(nombre, por_defecto=None, minimo=1, maximo=None):
+    valor = request.args.get(nombre)
+    if valor is None or valor == "":
+        return por_defecto
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ParametroInvalido(f"'{nombre}' debe ser un entero")
+    if numero < minimo or (maximo is not None and numero > maximo):
+        raise ParametroInvalido(f"'{nombre}' debe estar entre {minimo} y {maximo or 'infinito'}")
+    return numero
+
+
+def _filtros():
+    filtros = {"desde": _fecha("desde"), "hasta": _fecha("hasta"), "tipos": None, "mantenimiento": None}
+    tipos = request.args.get("tipo_incidencia")
+    if tipos:
+        filtros["tipos"] = [t.strip() for t in tipos.split(",") if t.strip()]
+    mantenimiento = request.args.get("es_mantenimiento")
+    if mantenimiento:
+        if mantenimiento.lower() not in ("0", "1", "true", "false"):
+            raise ParametroInvalido("'es_mantenimiento' debe ser 0 o 1")
+        filtros["mantenimiento"] = 1 if mantenimiento.lower() in ("1", "true") else 0
+    return filtros
+
+
+# Condiciones WHERE para las columnas de fecha, tipo y mantenimiento indicadas
+def _where(filtros, fecha, tipo="tipo_incidencia", mantenimiento="es_mantenimiento"):
+    condiciones, parametros = [], []
+    if filtros["desde"]:
+        condiciones.append(f"{fecha} >= ?")
+        parametros.append(filtros["desde"])
+    if filtros["hasta"]:
+        condiciones.append(f"{fecha} <= ?")
+        parametros.append(filtros["hasta"])
+    if filtros["tipos"]:
+        condiciones.append(f"{tipo} IN ({', '.join('?' * len(filtros['tipos']))})")
+        parametros.extend(filtros["tipos"])
+    if filtros["mantenimiento"] is not None:
+        condiciones.append(f"{mantenimiento} = ?")
+        parametros.append(filtros["mantenimiento"])
+    return ("WHERE " + " AND ".join(condiciones)) if condiciones else "", parametros
+
+
+def _numero(valor):
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+
+def _consultar(sql, parametros=()):
+    with conexiones.lectura() as conn:
+        cursor = conn.execute(sql, parametros)
+        columnas = [d[0] for d in cursor.description]
+        return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+# -----------------------------------------------------------------------------
+# Rankings con paginacion por conjunto de claves
+# -----------------------------------------------------------------------------
+
+def _leer_cursor():
+    valor = request.args.get("cursor")
+    if not valor:
+        return None
+    try:
+        metrica, clave, devueltas = json.loads(base64.urlsafe_b64decode(valor.encode("ascii")))
+        return metrica, clave, int(devueltas)
+    except (ValueError, TypeError):
+        raise ParametroInvalido("'cursor' no es valido")
+
+
+def _crear_cursor(metrica, clave, devueltas):
+    return base64.urlsafe_b64encode(json.dumps([metrica, clave, devueltas]).encode("utf-8")).decode("ascii")
+
+
+# 'consulta' devuelve una fila por 'clave' con su 'metrica'; se ordena por la
+# metrica de mayor a menor y, a igualdad, por la clave
+def _ranking(consulta, parametros, clave, metrica):
+    top_n = _entero("top_n")
+    limite = _entero("limite", LIMITE_POR_DEFECTO, maximo=LIMITE_MAXIMO)
+    cursor = _leer_cursor()
+
+    devueltas = cursor[2] if cursor else 0
+    if top_n is not None:
+        limite = min(limite, top_n - devueltas)
+    if limite <= 0:
+        return jsonify(datos=[], siguiente=None)
+
+    filtro = ""
+    parametros = list(parametros)
+    if cursor:
+        filtro = f"WHERE {metrica} < ? OR ({metrica} = ? AND {clave} > ?)"
+        parametros += [cursor[0], cursor[0], cursor[1]]
+    filas = _consultar(f"""
+        SELECT * FROM ({consulta})
+        {filtro}
+        ORDER BY {metrica} DESC, {clave}
+        LIMIT ?
+    """, parametros + [limite + 1])
+
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    devueltas += len(filas)
+    siguiente = None
+    if hay_mas and (top_n is None or devueltas < top_n):
+        siguiente = _crear_cursor(filas[-1][metrica], filas[-1][clave], devueltas)
+    return jsonify(datos=filas, siguiente=siguiente)
+
+
+@api.route("/clientes/top")
+@cache_api
+def top_clientes():
+    where, parametros = _where(_filtros(), "fecha")
+    return _ranking(f"""
+        SELECT cliente, SUM(n_tickets) AS n_incidencias
+        FROM hechos_tickets_dia {where}
+        GROUP BY cliente
+    """, parametros, "cliente", "n_incidencias")
+
+
+@api.route("/tipos/duracion")
+@cache_api
+def tipos_por_duracion():
+    where, parametros = _where(_filtros(), "fecha")
+    return _ranking(f"""
+        SELECT tipo_incidencia, SUM(suma_duracion) * 24.0 / SUM(n_cerrados) AS duracion_horas,
+               SUM(n_cerrados) AS n_tickets
+        FROM hechos_tickets_dia {where}
+        GROUP BY tipo_incidencia
+        HAVING SUM(n_cerrados) > 0
+    """, parametros, "tipo_incidencia", "duracion_horas")
+
+
+@api.route("/empleados/horas")
+@cache_api
+def empleados_por_horas():
+    where, parametros = _where(_filtros(), "fecha")
+    return _ranking(f"""
+        SELECT id_emp, SUM(suma_horas) AS horas, SUM(n_actuaciones) AS n_actuaciones
+        FROM hechos_contactos_dia {where}
+        GROUP BY id_emp
+    """, parametros, "id_emp", "horas")
+
+
+# -----------------------------------------------------------------------------
+# Estadisticas de analisis.py
+# -----------------------------------------------------------------------------
+
+def _media_desviacion(valores):
+    n = len(valores)
+    media, varianza = almacen.media_varianza(n, sum(valores), sum(v * v for v in valores))
+    return _numero(media), _numero(math.sqrt(varianza) if varianza == varianza else varianza)
+
+
+# Modo bocetos: horas de las tablas de hechos y tickets distintos estimados
+# uniendo los HyperLogLog de cada dia, sin recorrer los contactos. None si los
+# bocetos no estan al dia.
+def _por_empleado_bocetos(filtros):
+    import bocetos
+    where, parametros = _where(filtros, "fecha")
+    with conexiones.lectura() as conn:
+        if not bocetos.al_dia(conn):
+            return None
+        tickets = bocetos.tickets_por_empleado(conn, filtros["desde"], filtros["hasta"], filtros["tipos"],
+                                               filtros["mantenimiento"])
+        horas = conn.execute(f"SELECT id_emp, SUM(suma_horas) FROM hechos_contactos_dia {where} GROUP BY id_emp",
+                             parametros).fetchall()
+    return [{"id_emp": id_emp, "horas": h, "incidencias": tickets.get(id_emp, 0)} for id_emp, h in horas]
+
+
+@api.route("/estadisticas")
+@cache_api
+def estadisticas():
+    filtros = _filtros()
+    where_tickets, p_tickets = _where(filtros, "fecha")
+    where_contactos, p_contactos = _where(filtros, "c.fecha", "t.tipo_incidencia", "t.es_mantenimiento")
+    where_base, p_base = _where(filtros, "t.fecha_apertura", "t.tipo_incidencia", "t.es_mantenimiento")
+
+    por_cliente = _consultar(f"""
+        SELECT cliente, SUM(n_tickets) AS n, SUM(n_satisfechos) AS satisfechos,
+               MIN(min_duracion) AS min_duracion, MAX(max_duracion) AS max_duracion
+        FROM hechos_tickets_dia {where_tickets}
+        GROUP BY cliente
+    """, p_tickets)
+    horas_ticket = _consultar(f"""
+        SELECT COUNT(*) AS n, SUM(horas) AS suma, SUM(horas * horas) AS suma2
+        FROM (SELECT SUM(c.tiempo) AS horas
+              FROM tickets t JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+              {where_base}
+              GROUP BY c.id_ticket)
+    """, p_base)[0]
+    por_empleado = _por_empleado_bocetos(filtros) if BOCETOS else None
+    if por_empleado is None:
+        por_empleado = _consultar(f"""
+            SELECT c.id_emp, SUM(c.tiempo) AS horas, COUNT(DISTINCT c.id_ticket) AS incidencias
+            FROM contactos_empleados c JOIN tickets t ON t.id_ticket = c.id_ticket
+            {where_contactos}
+            GROUP BY c.id_emp
+        """, p_contactos)
+
+    incidencias = [f["n"] for f in por_cliente]
+    satisfechas = [f["satisfechos"] for f in por_cliente if f["satisfechos"]]
+    media_incid, std_incid = _media_desviacion(incidencias)
+    media_satis, std_satis = _media_desviacion(satisfechas)
+    media_horas, varianza_horas = almacen.media_varianza(horas_ticket["n"], horas_ticket["suma"] or 0,
+                                                         horas_ticket["suma2"] or 0)
+    duraciones_min = [f["min_duracion"] for f in por_cliente if f["min_duracion"] is not None]
+    duraciones_max = [f["max_duracion"] for f in por_cliente if f["max_duracion"] is not None]
+
+    return jsonify(
+        total_incidencias=sum(incidencias),
+        media_satis_5=media_satis, std_satis_5=std_satis,
+        media_incid=media_incid, std_incid=std_incid,
+        media_horas=_numero(media_horas),
+        std_horas=_numero(math.sqrt(varianza_horas) if varianza_horas == varianza_horas else varianza_horas),
+        min_horas=min((f["horas"] for f in por_empleado), default=None),
+        max_horas=max((f["horas"] for f in por_empleado), default=None),
+        min_duracion=min(duraciones_min, default=None),
+        max_duracion=max(duraciones_max, default=None),
+        min_incid_emp=min((f["incidencias"] for f in por_empleado), default=None),
+        max_incid_emp=max((f["incidencias"] for f in por_empleado), default=None),
+    )
+
+
+# Incidencias y actuaciones por dimension (las agrupaciones de fraude de
+# analisis.py para cualquier tipo); los filtros se aplican a los tickets
+_DESGLOSES = {
+    "cliente": """
+        SELECT t.cliente AS cliente, COUNT(DISTINCT t.id_ticket) AS Incidencias, COUNT(c.id_contacto) AS Actuaciones
+        FROM tickets t LEFT JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+        {where}
+        GROUP BY t.cliente ORDER BY t.cliente
+    """,
+    "tipo_incidencia": """
+        SELECT t.tipo_incidencia AS tipo_incidencia, COUNT(DISTINCT t.id_ticket) AS Incidencias,
+               COUNT(c.id_contacto) AS Actuaciones
+        FROM tickets t LEFT JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+        {where}
+        GROUP BY t.tipo_incidencia ORDER BY t.tipo_incidencia
+    """,
+    "id_emp": """
+        SELECT c.id_emp AS id_emp, COUNT(DISTINCT c.id_ticket) AS Incidencias, COUNT(*) AS Actuaciones
+        FROM tickets t JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+        {where}
+        GROUP BY c.id_emp ORDER BY c.id_emp
+    """,
+    # Como en analisis.py, las incidencias de un nivel son la suma de las de sus empleados
+    "nivel": """
+        SELECT e.nivel AS nivel, SUM(x.incidencias) AS Incidencias, SUM(x.actuaciones) AS Actuaciones
+        FROM (SELECT c.id_emp, COUNT(DISTINCT c.id_ticket) AS incidencias, COUNT(*) AS actuaciones
+              FROM tickets t JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+              {where}
+              GROUP BY c.id_emp) x
+        JOIN empleados e ON e.id_emp = x.id_emp
+        GROUP BY e.nivel ORDER BY e.nivel
+    """,
+}
+
+_DIA_SEMANA = "(CAST(strftime('%w', {fecha}) AS INTEGER) + 6) % 7"
+
+
+def _desglose_dia(where, parametros):
+    # Una incidencia cuenta en el dia de su primera actuacion
+    incidencias = _consultar(f"""
+        SELECT dia, COUNT(*) AS n FROM (
+            SELECT {_DIA_SEMANA.format(fecha="MIN(c.fecha)")} AS dia
+            FROM tickets t JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+            {where}
+            GROUP BY c.id_ticket)
+        GROUP BY dia
+    """, parametros)
+    actuaciones = _consultar(f"""
+        SELECT {_DIA_SEMANA.format(fecha="c.fecha")} AS dia, COUNT(*) AS n
+        FROM tickets t JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+        {where}
+        GROUP BY dia
+    """, parametros)
+    incidencias = {f["dia"]: f["n"] for f in incidencias}
+    actuaciones = {f["dia"]: f["n"] for f in actuaciones}
+    return [{"dia_semana": dia, "Incidencias": incidencias.get(dia, 0), "Actuaciones": actuaciones.get(dia, 0)}
+            for dia in range(7)]
+
+
+@api.route("/desglose/<dimension>")
+@cache_api
+def desglose(dimension):
+    if dimension not in _DESGLOSES and dimension != "dia_semana":
+        return jsonify(error="Dimension no valida", disponibles=list(_DESGLOSES) + ["dia_semana"]), 404
+    where, parametros = _where(_filtros(), "t.fecha_apertura", "t.tipo_incidencia", "t.es_mantenimiento")
+    if dimension == "dia_semana":
+        filas = _desglose_dia(where, parametros)
+    else:
+        filas = _consultar(_DESGLOSES[dimension].format(where=where), parametros)
+
+    import pandas as pd
+    import agrupaciones
+    resumen = agrupaciones.estadisticas(pd.Series([f["Incidencias"] for f in filas], dtype="float64"))
+    return jsonify(datos=filas, estadisticas={k: _numero(float(v)) for k, v in resumen.items()})
@@ -1,120 +1,122 @@
-from flask import Flask, render_template, request, make_response
-import analisis
-import analisis_Practica2 as analisis2
-import vulnerabilidades
-from xhtml2pdf import pisa
-from io import BytesIO
+import logging
+import os
+import re
+import time
+from flask import Blueprint, Flask, render_template, request, jsonify, send_file, url_for
+import instrumentacion
+from api import api
+from cache_respuestas import CacheRespuestas, cachear
+from informes import ERROR, PENDIENTE, GestorInformes
+from ingesta import ingesta_api
+from version_datos import vigilante
 from datetime import datetime
 
-app = Flask(__name__)
+# -----------------------------------------------------------------------------
+# La aplicacion se crea con create_app() (gunicorn: "app:create_app()", flask
+# run la encuentra sola). Importar este modulo no carga pandas, xhtml2pdf ni los
+# modulos de analisis: cada ruta los importa la primera vez que los necesita, y
+# precalentar_aplicacion() lo hace por adelantado (ver gunicorn.conf.py).
+# -----------------------------------------------------------------------------
 
-@app.route("/")
+log = logging.getLogger(__name__)
+
+panel = Blueprint("panel", __name__)
+
+# Los PDF se generan en un pool de procesos y se guardan en disco por version de los datos
+informes_pdf = GestorInformes(directorio=os.path.join(os.path.dirname(os.path.abspath(__file__)), "informes"))
+
+# Paginas ya renderizadas por ruta, argumentos y version de los datos. La
+# version es la misma que ve el motor de analisis, pero comprobarla no necesita
+# pandas, asi que una pagina en cache se sirve sin cargar nada mas
+version = vigilante()
+cache = CacheRespuestas(max_entradas=64, max_bytes=32 * 1024 * 1024)
+cache_datos = cachear(cache, version.comprobar, version.fecha)
+instrumentacion.registrar_cache("paginas", cache)
+
+
+def _motor():
+    import analisis
+    return analisis.motor
+
+
+def _practica2():
+    import analisis_Practica2
+    return analisis_Practica2
+
+
+def tabla_html(df):
+    with instrumentacion.fase("html"):
+        return df.to_html(classes="table", index=False)
+
+
+@panel.route("/")
 def index():
     return render_template("index.html")
 
-@app.route("/resultados")
+@panel.route("/resultados")
+@cache_datos
 def resultados():
-    # Variables generales de analisis.py
-    total_incid = analisis.total_incidencias
-    media_satis_5 = analisis.media_satis_5
-    std_satis_5 = analisis.std_satis_5
-    media_incid = analisis.media_incid
-    std_incid = analisis.std_incid
-    media_horas = analisis.media_horas
-    std_horas = analisis.std_horas
-    min_horas = analisis.min_horas
-    max_horas = analisis.max_horas
-    min_duracion = analisis.min_duracion
-    max_duracion = analisis.max_duracion
-    min_incid_emp = analisis.min_incid_emp
-    max_incid_emp = analisis.max_incid_emp
+    # El motor calcula cada metrica la primera vez y la reutiliza hasta que cambian los datos
+    motor = _motor()
 
     # Diccionario con los resultados de las agrupaciones
     agrupaciones = {
         "Empleado": {
-            "tabla": analisis.group_empleado.to_html(classes="table", index=False),
-            "estadisticas": {
-                "Mediana": analisis.mediana_empleado,
-                "Media": analisis.media_empleado,
-                "Varianza": analisis.varianza_empleado,
-                "Máximo": analisis.max_empleado,
-                "Mínimo": analisis.min_empleado
-            }
+            "tabla": tabla_html(motor.group_empleado),
+            "estadisticas": motor.estadisticas_empleado
         },
         "Nivel": {
-            "tabla": analisis.group_nivel.to_html(classes="table", index=False),
-            "estadisticas": {
-                "Mediana": analisis.mediana_nivel,
-                "Media": analisis.media_nivel,
-                "Varianza": analisis.varianza_nivel,
-                "Máximo": analisis.max_nivel,
-                "Mínimo": analisis.min_nivel
-            }
+            "tabla": tabla_html(motor.group_nivel),
+            "estadisticas": motor.estadisticas_nivel
         },
         "Cliente": {
-            "tabla": analisis.group_cliente.to_html(classes="table", index=False),
-            "estadisticas": {
-                "Mediana": analisis.mediana_cliente,
-                "Media": analisis.media_cliente,
-                "Varianza": analisis.varianza_cliente,
-                "Máximo": analisis.max_cliente,
-                "Mínimo": analisis.min_cliente
-            }
+            "tabla": tabla_html(motor.group_cliente),
+            "estadisticas": motor.estadisticas_cliente
         },
         "Tipo incidencia": {
-            "tabla": analisis.group_incidencia.to_html(classes="table", index=False),
-            "estadisticas": {
-                "Mediana": analisis.mediana_incidencia,
-                "Media": analisis.media_incidencia,
-                "Varianza": analisis.varianza_incidencia,
-                "Máximo": analisis.max_incidencia,
-                "Mínimo": analisis.min_incidencia
-            }
+            "tabla": tabla_html(motor.group_incidencia),
+            "estadisticas": motor.estadisticas_incidencia
         },
         "Día de la semana": {
-            "tabla": analisis.group_dia.to_html(classes="table", index=False),
-            "estadisticas": {
-                "Mediana": analisis.mediana_dia,
-                "Media": analisis.media_dia,
-                "Varianza": analisis.varianza_dia,
-                "Máximo": analisis.max_dia,
-                "Mínimo": analisis.min_dia
-            }
+            "tabla": tabla_html(motor.group_dia),
+            "estadisticas": motor.estadisticas_dia
         }
     }
 
     return render_template(
         "resultados.html",
-        total=total_incid,
-        media_satis_5=media_satis_5,
-        std_satis_5=std_satis_5,
-        media_incid=media_incid,
-        std_incid=std_incid,
-        media_horas=media_horas,
-        std_horas=std_horas,
-        min_horas=min_horas,
-        max_horas=max_horas,
-        min_duracion=min_duracion,
-        max_duracion=max_duracion,
-        min_incid_emp=min_incid_emp,
-        max_incid_emp=max_incid_emp,
+        total=motor.total_incidencias,
+        media_satis_5=motor.media_satis_5,
+        std_satis_5=motor.std_satis_5,
+        media_incid=motor.media_incid,
+        std_incid=motor.std_incid,
+        media_horas=motor.media_horas,
+        std_horas=motor.std_horas,
+        min_horas=motor.min_horas,
+        max_horas=motor.max_horas,
+        min_duracion=motor.min_duracion,
+        max_duracion=motor.max_duracion,
+        min_incid_emp=motor.min_incid_emp,
+        max_incid_emp=motor.max_incid_emp,
         agrupaciones=agrupaciones
     )
 
-@app.route("/practica2")
+@panel.route("/practica2")
+@cachear(cache, version.comprobar, version.fecha, args=("ver",))
 def practica2():
     ver = request.args.get("ver", "todo")  # Por defecto, muestra todo
+    analisis2 = _practica2()
 
     top_clientes_html = None
     top_tipos_tiempo_html = None
     tiempo_empleado_html = None
 
     if ver in ["clientes", "todo"]:
-        top_clientes_html = analisis2.obtener_top_clientes().to_html(classes="table", index=False)
+        top_clientes_html = tabla_html(analisis2.obtener_top_clientes())
     if ver in ["tipos", "todo"]:
-        top_tipos_tiempo_html = analisis2.obtener_top_tipos_tiempo().to_html(classes="table", index=False)
+        top_tipos_tiempo_html = tabla_html(analisis2.obtener_top_tipos_tiempo())
     if ver in ["empleados", "todo"]:
-        tiempo_empleado_html = analisis2.obtener_top_empleados_por_tiempo().to_html(classes="table", index=False)
+        tiempo_empleado_html = tabla_html(analisis2.obtener_top_empleados_por_tiempo())
 
     return render_template(
         "practica2.html",
@@ -124,40 +126,69 @@ def practica2():
         tiempo_empleado=tiempo_empleado_html
     )
 
-@app.route("/vulnerabilidades")
+@panel.route("/vulnerabilidades")
 def mostrar_vulnerabilidades():
+    import vulnerabilidades
+
+    # Siempre pasa por la fuente: asi se refresca la cache (y con ella el indice)
     lista_cves = vulnerabilidades.obtener_ultimas_vulnerabilidades(10)
-    return render_template("vulnerabilidades.html", cves=lista_cves)
 
-@app.route("/generar_pdf")
-def generar_pdf():
+    # Con algun filtro se busca en el indice local en lugar de mostrar las 10 ultimas
+    texto = request.args.get("q", "").strip()
+    antes = request.args.get("antes", "").strip()
+    try:
+        cvss_min = float(request.args["cvss_min"])
+    except (KeyError, ValueError):
+        cvss_min = None
+    siguiente = None
+    busqueda = bool(texto or antes or cvss_min is not None)
+    if busqueda:
+        lista_cves, siguiente = vulnerabilidades.buscar_vulnerabilidades(texto, cvss_min, antes)
+
+    return render_template(
+        "vulnerabilidades.html",
+        cves=lista_cves,
+        busqueda=busqueda,
+        q=texto,
+        cvss_min=request.args.get("cvss_min", ""),
+        siguiente=siguiente
+    )
+
+# Secciones disponibles en el informe PDF (en el orden en que aparecen)
+SECCIONES_INFORME = {
+    "actuaciones": ("Actuaciones por empleado", lambda: _motor().group_empleado),
+    "tiempo_inc": ("Tiempo medio por tipo de incidencia", lambda: _practica2().obtener_top_tipos_tiempo()),
+    "clientes_criticos": ("Clientes más críticos", lambda: _practica2().obtener_top_clientes()),
+    "tiempo_mant": ("Tiempo medio de mantenimiento", lambda: _practica2().obtener_top_empleados_por_tiempo()),
+}
+
+_ID_INFORME = re.compile(r"^\d+-[0-9a-f]{8}-[0-9a-f]{12}$")
+
+
+def _secciones_pedidas():
+    valor = request.values.get("secciones")
+    if valor is None and request.is_json:
+        valor = (request.get_json(silent=True) or {}).get("secciones")
+    if not valor:
+        return list(SECCIONES_INFORME)
+    pedidas = valor.split(",") if isinstance(valor, str) else list(valor)
+    return [seccion for seccion in SECCIONES_INFORME if seccion in pedidas]
+
+
+def _html_informe(ids):
     fecha_actual = datetime.now().strftime("%d/%m/%Y %H:%M")
 
     # Construcción dinámica de secciones del informe
-    secciones = [
-        {
-            "id": "actuaciones",
-            "titulo": "Actuaciones por empleado",
-            "contenido": analisis.group_empleado.to_html(classes="table", index=False)
-        },
-        {
-            "id": "tiempo_inc",
-            "titulo": "Tiempo medio por tipo de incidencia",
-            "contenido": analisis2.obtener_top_tipos_tiempo().to_html(classes="table", index=False)
-        },
-        {
-            "id": "clientes_criticos",
-            "titulo": "Clientes más críticos",
-            "contenido": analisis2.obtener_top_clientes().to_html(classes="table", index=False)
-        },
-        {
-            "id": "tiempo_mant",
-            "titulo": "Tiempo medio de mantenimiento",
-            "contenido": analisis2.obtener_top_empleados_por_tiempo().to_html(classes="table", index=False)
-        }
-    ]
+    secciones = []
+    for id_seccion in ids:
+        titulo, obtener_tabla = SECCIONES_INFORME[id_seccion]
+        secciones.append({
+            "id": id_seccion,
+            "titulo": titulo,
+            "contenido": tabla_html(obtener_tabla())
+        })
 
-    html = render_template(
+    return render_template(
         "informe.html",
         fecha=fecha_actual,
         secciones=secciones,
@@ -165,18 +196,116 @@ def generar_pdf():
         si_logo="static/images/SI.png"
     )
 
-    pdf = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=pdf)
 
-    if pisa_status.err:
+def _solicitar_informe(ids):
+    return informes_pdf.solicitar(version.comprobar(), version.identidad(), ids, lambda: _html_informe(ids))
+
+
+# Informe con todas las secciones; lo piden /generar_pdf y el servidor
+# asincrono (asgi.py), que espera al PDF antes de pasar la peticion a Flask
+def solicitar_informe_completo():
+    return _solicitar_informe(list(SECCIONES_INFORME))
+
+
+def _enviar_pdf(id_trabajo):
+    return send_file(informes_pdf.ruta(id_trabajo), mimetype="application/pdf",
+                     download_name="informe_CMI.pdf", conditional=True)
+
+
+@panel.route("/informes", methods=["POST"])
+def crear_informe():
+    ids = _secciones_pedidas()
+    if not ids:
+        return jsonify(error="Ninguna sección válida", disponibles=list(SECCIONES_INFORME)), 400
+
+    id_trabajo = _solicitar_informe(ids)
+    estado = informes_pdf.estado(id_trabajo)
+    respuesta = jsonify(
+        **estado,
+        url=url_for(".estado_informe", id_trabajo=id_trabajo),
+        descarga=url_for(".descargar_informe", id_trabajo=id_trabajo)
+    )
+    respuesta.status_code = 202 if estado["estado"] == PENDIENTE else 200
+    respuesta.headers["Location"] = url_for(".estado_informe", id_trabajo=id_trabajo)
+    return respuesta
+
+@panel.route("/informes/<id_trabajo>")
+def estado_informe(id_trabajo):
+    estado = informes_pdf.estado(id_trabajo) if _ID_INFORME.match(id_trabajo) else None
+    if estado is None:
+        return jsonify(error="Informe no encontrado"), 404
+    return jsonify(**estado, descarga=url_for(".descargar_informe", id_trabajo=id_trabajo))
+
+@panel.route("/informes/<id_trabajo>/pdf")
+def descargar_informe(id_trabajo):
+    estado = informes_pdf.estado(id_trabajo) if _ID_INFORME.match(id_trabajo) else None
+    if estado is None:
+        return jsonify(error="Informe no encontrado"), 404
+    if estado["estado"] == PENDIENTE:
+        return jsonify(estado), 202, {"Retry-After": "2"}
+    if estado["estado"] == ERROR:
+        return jsonify(estado), 500
+    return _enviar_pdf(id_trabajo)
+
+# Descarga directa (enlace de la pagina de Practica 2): usa el mismo sistema de
+# trabajos, asi que si el informe ya existe se sirve del disco sin renderizar
+@panel.route("/generar_pdf")
+def generar_pdf():
+    id_trabajo = solicitar_informe_completo()
+    with instrumentacion.fase("pdf"):
+        estado = informes_pdf.esperar(id_trabajo, timeout=120)
+
+    if estado["estado"] == PENDIENTE:
+        return "El informe se está generando, inténtelo de nuevo en unos segundos", 503, {"Retry-After": "5"}
+    if estado["estado"] == ERROR:
         return "Error al generar PDF", 500
 
-    response = make_response(pdf.getvalue())
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = "inline; filename=informe_CMI.pdf"
+    return _enviar_pdf(id_trabajo)
+
+
+# Modulos pesados, sin tocar la base de datos: se puede hacer antes de un fork
+# (preload de gunicorn) para que los workers compartan esas paginas de memoria
+def precargar_modulos():
+    import pandas  # noqa: F401
+    import agrupaciones  # noqa: F401
+    import analisis  # noqa: F401
+    import analisis_Practica2  # noqa: F401
+    import vulnerabilidades  # noqa: F401
+
+
+# Deja el proceso listo para la primera peticion: modulos, metricas del
+# dashboard y procesos de los PDF con xhtml2pdf cargado
+def precalentar_aplicacion():
+    inicio = time.perf_counter()
+    precargar_modulos()
+    import analisis
+    # Con el estado compartido las metricas ya vienen calculadas del maestro
+    analisis.calcular_metricas(_motor())
+    informes_pdf.precalentar()
+    log.info("aplicacion precalentada segundos=%.2f", time.perf_counter() - inicio)
+
+
+def create_app(precalentar=None):
+    app = Flask(__name__)
+
+    # Server-Timing, log por peticion, /metrics y perfilado opcional
+    instrumentacion.instalar(app)
+
+    app.register_blueprint(panel)
+
+    # API JSON para herramientas de BI
+    app.register_blueprint(api)
+
+    # Ingesta de tickets en tiempo real y avisos a los dashboards (SSE)
+    app.register_blueprint(ingesta_api)
 
-    return response
+    if precalentar is None:
+        precalentar = os.environ.get("INCIDENCIAS_PRECALENTAR") == "1"
+    if precalentar:
+        precalentar_aplicacion()
+    return app
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    create_app().run(debug=True)
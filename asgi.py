@@ -0,0 +1,331 @@
+# -----------------------------------------------------------------------------
+#                       SERVIDOR ASINCRONO (ASGI)
+# -----------------------------------------------------------------------------
+# Uso:  uvicorn asgi:app --workers 4 [--host 0.0.0.0 --port 8000]
+#
+# Con gunicorn cada peticion ocupa un worker de principio a fin, asi que unas
+# pocas peticiones lentas (/generar_pdf esperando a xhtml2pdf,
+# /vulnerabilidades esperando a la API de CVE, desgloses con pandas) dejan sin
+# sitio a las rapidas del dashboard. Aqui la misma aplicacion Flask
+# (create_app) se sirve desde un bucle asyncio:
+#   - cada grupo de rutas (GRUPOS) tiene su propio pool de hilos acotado, y
+#     las rutas lentas solo pueden ocupar los hilos de su grupo
+#   - cada grupo admite como mucho 'limite' peticiones a la vez (en curso o
+#     esperando hilo); por encima responde enseguida 503 con Retry-After en
+#     lugar de encolar sin fin
+#   - /vulnerabilidades consulta la API de CVE con httpx desde el bucle, sin
+#     ocupar ningun hilo, y despues renderiza con la cache ya lista
+#   - /generar_pdf espera con await al proceso de xhtml2pdf: mientras tanto no
+#     ocupa ningun hilo
+#   - /api/eventos (SSE) ocupa un hilo de su grupo por conexion, hasta que el
+#     cliente se desconecta
+# El trabajo con pandas, NumPy y matplotlib sigue en los hilos de cada grupo y
+# el de xhtml2pdf en los procesos de informes.GestorInformes.
+#
+# Variables de entorno: INCIDENCIAS_PRECALENTAR (1 por defecto: metricas y
+# procesos de los PDF al arrancar) e INCIDENCIAS_LIMITES, para cambiar los
+# hilos y el limite de algun grupo, p.ej. "pdf=2:4,api=4:16".
+# Necesita uvicorn y httpx (solo este modo de servir).
+
+import asyncio
+import io
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app as aplicacion
+import instrumentacion
+from informes import ERROR
+
+log = logging.getLogger(__name__)
+
+PRECALENTAR = os.environ.get("INCIDENCIAS_PRECALENTAR", "1") == "1"
+# Segundos que /generar_pdf espera al PDF, como en la ruta de Flask
+ESPERA_PDF = 120
+
+# Hilos del pool, peticiones admitidas a la vez y segundos de Retry-After
+GRUPOS = {
+    "panel": {"hilos": 8, "limite": 64, "reintentar": 1},
+    "api": {"hilos": 4, "limite": 32, "reintentar": 1},
+    "ingesta": {"hilos": 4, "limite": 64, "reintentar": 1},
+    "eventos": {"hilos": 64, "limite": 64, "reintentar": 5},
+    "vulnerabilidades": {"hilos": 2, "limite": 16, "reintentar": 5},
+    "pdf": {"hilos": 2, "limite": 8, "reintentar": 5},
+}
+
+# Grupo de cada ruta (el primero que coincide); el resto va a "panel"
+RUTAS = [
+    (re.compile(r"/generar_pdf$"), "pdf"),
+    (re.compile(r"/informes(/[^/]+/pdf)?$"), "pdf"),
+    (re.compile(r"/vulnerabilidades$"), "vulnerabilidades"),
+    (re.compile(r"/api/eventos$"), "eventos"),
+    (re.compile(r"/api/tickets(/|$)"), "ingesta"),
+    (re.compile(r"/api/v1/"), "api"),
+]
+
+
+# "pdf=2:4,api=4:16" -> {"pdf": (2, 4), "api": (4, 16)}
+def _leer_limites(texto):
+    limites = {}
+    for parte in filter(None, (p.strip() for p in texto.split(","))):
+        nombre, valores = parte.split("=")
+        hilos, limite = valores.split(":")
+        limites[nombre.strip()] = (int(hilos), int(limite))
+    return limites
+
+
+class Grupo:
+    def __init__(self, nombre, hilos, limite, reintentar):
+        self.nombre = nombre
+        self.hilos = hilos
+        self.limite = limite
+        self.reintentar = reintentar
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix=f"asgi-{nombre}")
+        # Solo se tocan desde el bucle
+        self.en_curso = 0
+        self.rechazadas = 0
+
+
+# -----------------------------------------------------------------------------
+# Puente ASGI -> WSGI
+# -----------------------------------------------------------------------------
+
+def _environ(scope, cuerpo):
+    cliente = scope.get("client") or ("", 0)
+    servidor = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI lleva la ruta como bytes en latin-1
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": servidor[0],
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": cliente[0],
+        "REMOTE_PORT": str(cliente[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(cuerpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for nombre, valor in scope["headers"]:
+        nombre = nombre.decode("latin-1").upper().replace("-", "_")
+        clave = nombre if nombre in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{nombre}"
+        valor = valor.decode("latin-1")
+        environ[clave] = f"{environ[clave]},{valor}" if clave in environ else valor
+    return environ
+
+
+def _siguiente(iterador):
+    return next(iterador, None)
+
+
+# Se ejecuta en un hilo del grupo: llama a la aplicacion WSGI y saca el primer
+# trozo del cuerpo. Si la respuesta trae Content-Length (todas menos las de
+# streaming, como SSE) saca el cuerpo entero, para no volver al pool por trozo
+def _llamar_wsgi(wsgi, environ):
+    respuesta = {}
+
+    def start_response(estado, cabeceras, exc_info=None):
+        respuesta["estado"] = int(estado.split(" ", 1)[0])
+        respuesta["cabeceras"] = cabeceras
+        return lambda datos: None
+
+    iterable = wsgi(environ, start_response)
+    iterador = iter(iterable)
+    trozo = _siguiente(iterador)
+    if trozo is not None and any(n.lower() == "content-length" for n, _ in respuesta["cabeceras"]):
+        trozos = [trozo]
+        for trozo in iterador:
+            trozos.append(trozo)
+        trozo = b"".join(trozos)
+        _cerrar(iterable)
+        iterable = iterador = None
+    return respuesta, iterable, iterador, trozo
+
+
+def _cerrar(iterable):
+    if hasattr(iterable, "close"):
+        iterable.close()
+
+
+async def _leer_cuerpo(receive):
+    partes = []
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "http.disconnect":
+            return None
+        partes.append(mensaje.get("body", b""))
+        if not mensaje.get("more_body"):
+            return b"".join(partes)
+
+
+async def _esperar_desconexion(receive, desconectado):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    desconectado.set()
+
+
+async def _responder(send, estado, cuerpo, tipo, cabeceras=()):
+    cuerpo = cuerpo.encode("utf-8")
+    await send({"type": "http.response.start", "status": estado,
+                "headers": [(b"content-type", tipo.encode("latin-1")),
+                            (b"content-length", str(len(cuerpo)).encode("latin-1")),
+                            *((n.encode("latin-1"), v.encode("latin-1")) for n, v in cabeceras)]})
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+# Respuesta de error en el formato de cada parte: JSON en la API, texto en el panel
+async def _error(send, scope, estado, mensaje, cabeceras=()):
+    if scope["path"].startswith("/api/"):
+        await _responder(send, estado, json.dumps({"error": mensaje}), "application/json", cabeceras)
+    else:
+        await _responder(send, estado, mensaje, "text/plain; charset=utf-8", cabeceras)
+
+
+# -----------------------------------------------------------------------------
+# Aplicacion ASGI
+# -----------------------------------------------------------------------------
+
+class ServidorAsgi:
+    def __init__(self, wsgi, grupos=GRUPOS, limites=None):
+        limites = _leer_limites(os.environ.get("INCIDENCIAS_LIMITES", "")) if limites is None else limites
+        self.wsgi = wsgi
+        self.grupos = {}
+        for nombre, ajustes in grupos.items():
+            hilos, limite = limites.get(nombre, (ajustes["hilos"], ajustes["limite"]))
+            self.grupos[nombre] = Grupo(nombre, hilos, limite, ajustes["reintentar"])
+        # Rutas con manejador propio; el resto pasa directamente a Flask
+        self._manejadores = {"vulnerabilidades": self._vulnerabilidades, "pdf": self._pdf}
+        instrumentacion.registrar_colector(self._metricas)
+
+    def _grupo(self, ruta):
+        for patron, nombre in RUTAS:
+            if patron.match(ruta):
+                return self.grupos[nombre]
+        return self.grupos["panel"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._ciclo_vida(receive, send)
+        if scope["type"] != "http":
+            return
+
+        grupo = self._grupo(scope["path"])
+        if grupo.en_curso >= grupo.limite:
+            grupo.rechazadas += 1
+            return await _error(send, scope, 503, "Servidor ocupado, inténtelo de nuevo en unos segundos",
+                                [("Retry-After", str(grupo.reintentar))])
+        grupo.en_curso += 1
+        try:
+            cuerpo = await _leer_cuerpo(receive)
+            if cuerpo is None:
+                return
+            manejador = self._manejadores.get(grupo.nombre, self._servir_wsgi)
+            await manejador(grupo, scope, cuerpo, receive, send)
+        finally:
+            grupo.en_curso -= 1
+
+    # Pasa la peticion a Flask en un hilo del grupo y envia la respuesta. En
+    # las de streaming cada trozo se pide al pool y se deja de pedir cuando el
+    # cliente se desconecta
+    async def _servir_wsgi(self, grupo, scope, cuerpo, receive, send):
+        bucle = asyncio.get_running_loop()
+        respuesta, iterable, iterador, trozo = await bucle.run_in_executor(
+            grupo.ejecutor, _llamar_wsgi, self.wsgi, _environ(scope, cuerpo))
+        await send({"type": "http.response.start", "status": respuesta["estado"],
+                    "headers": [(n.lower().encode("latin-1"), v.encode("latin-1"))
+                                for n, v in respuesta["cabeceras"]]})
+        if iterador is None:
+            await send({"type": "http.response.body", "body": trozo or b""})
+            return
+
+        desconectado = asyncio.Event()
+        vigia = bucle.create_task(_esperar_desconexion(receive, desconectado))
+        try:
+            while trozo is not None and not desconectado.is_set():
+                if trozo:
+                    await send({"type": "http.response.body", "body": trozo, "more_body": True})
+                trozo = await bucle.run_in_executor(grupo.ejecutor, _siguiente, iterador)
+            if not desconectado.is_set():
+                await send({"type": "http.response.body", "body": b""})
+        except OSError:
+            pass
+        finally:
+            vigia.cancel()
+            await bucle.run_in_executor(grupo.ejecutor, _cerrar, iterable)
+
+    # La consulta a la API de CVE se hace aqui con await; la pagina se
+    # renderiza despues con la cache ya lista
+    async def _vulnerabilidades(self, grupo, scope, cuerpo, receive, send):
+        import vulnerabilidades
+        await vulnerabilidades.fuente.preparar_async(grupo.ejecutor)
+        await self._servir_wsgi(grupo, scope, cuerpo, receive, send)
+
+    # /generar_pdf: se lanza el informe en un hilo y se espera a su proceso sin
+    # ocupar ninguno. Despues se envia ese informe por la ruta de descarga,
+    # aunque entretanto haya llegado otra version de los datos
+    async def _pdf(self, grupo, scope, cuerpo, receive, send):
+        if scope["path"] != "/generar_pdf":
+            return await self._servir_wsgi(grupo, scope, cuerpo, receive, send)
+        bucle = asyncio.get_running_loop()
+        # Todo lo que toma el lock del gestor de informes (o toca el disco, como
+        # la limpieza de esperar()) va al ejecutor, nunca al bucle
+        id_trabajo, futuro = await bucle.run_in_executor(grupo.ejecutor, self._solicitar_informe)
+        if futuro is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), ESPERA_PDF)
+            except asyncio.TimeoutError:
+                return await _error(send, scope, 503, "El informe se está generando, inténtelo de nuevo en unos segundos",
+                                    [("Retry-After", "5")])
+            except Exception:
+                pass
+        estado = await bucle.run_in_executor(grupo.ejecutor, aplicacion.informes_pdf.esperar, id_trabajo, 0)
+        if estado["estado"] == ERROR:
+            return await _error(send, scope, 500, "Error al generar PDF")
+        await self._servir_wsgi(grupo, dict(scope, path=f"/informes/{id_trabajo}/pdf"), cuerpo, receive, send)
+
+    def _solicitar_informe(self):
+        with self.wsgi.app_context():
+            id_trabajo = aplicacion.solicitar_informe_completo()
+        return id_trabajo, aplicacion.informes_pdf.futuro(id_trabajo)
+
+    async def _ciclo_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                if PRECALENTAR:
+                    try:
+                        await asyncio.get_running_loop().run_in_executor(
+                            self.grupos["panel"].ejecutor, aplicacion.precalentar_aplicacion)
+                    except Exception:
+                        log.exception("no se pudo precalentar la aplicacion")
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                for grupo in self.grupos.values():
+                    grupo.ejecutor.shutdown(wait=False, cancel_futures=True)
+                aplicacion.informes_pdf.cerrar()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _metricas(self):
+        grupos = list(self.grupos.values())
+        return [
+            ("incidencias_asgi_en_curso", "gauge", "Peticiones admitidas por grupo de rutas",
+             [({"grupo": g.nombre}, g.en_curso) for g in grupos]),
+            ("incidencias_asgi_limite", "gauge", "Peticiones admitidas a la vez por grupo de rutas",
+             [({"grupo": g.nombre}, g.limite) for g in grupos]),
+            ("incidencias_asgi_rechazadas_total", "counter", "Peticiones rechazadas con 503 por grupo de rutas",
+             [({"grupo": g.nombre}, g.rechazadas) for g in grupos]),
+        ]
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+app = ServidorAsgi(aplicacion.create_app(precalentar=False))
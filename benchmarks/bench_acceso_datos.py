@@ -0,0 +1,105 @@
+# -----------------------------------------------------------------------------
+#        BENCHMARK: LECTURA SELECT * FRENTE A acceso_datos (TIPOS COMPACTOS)
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_acceso_datos.py --tickets 1000000
+#
+# Genera una base de datos sintetica y lee tickets, contactos y empleados de
+# dos formas, cada una en un proceso hijo para medir su pico de memoria:
+#   - original: SELECT * de cada tabla y pd.to_datetime despues
+#   - acceso_datos: columnas necesarias, categorias, int8 y fechas convertidas
+# Tambien mide la lectura de un mes de contactos con el filtro en SQL.
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import acceso_datos
+import carga
+import generador_datos
+
+
+def _original(ruta_db):
+    conn = sqlite3.connect(ruta_db)
+    df_tickets = pd.read_sql_query("SELECT * FROM tickets", conn)
+    df_contactos = pd.read_sql_query("SELECT * FROM contactos_empleados", conn)
+    df_empleados = pd.read_sql_query("SELECT * FROM empleados", conn)
+    conn.close()
+    df_tickets["fecha_apertura"] = pd.to_datetime(df_tickets["fecha_apertura"])
+    df_tickets["fecha_cierre"] = pd.to_datetime(df_tickets["fecha_cierre"])
+    df_contactos["fecha"] = pd.to_datetime(df_contactos["fecha"])
+    return [df_tickets, df_contactos, df_empleados]
+
+
+def _acceso_datos(ruta_db):
+    conn = acceso_datos.conectar(ruta_db)
+    dfs = [acceso_datos.leer_tabla(conn, "tickets"),
+           acceso_datos.leer_tabla(conn, "contactos_empleados"),
+           acceso_datos.leer_tabla(conn, "empleados", ["id_emp", "nombre", "nivel"])]
+    conn.close()
+    return dfs
+
+
+def _un_mes_pandas(ruta_db):
+    df = _original(ruta_db)[1]
+    return [df[(df["fecha"] >= "2025-03-01") & (df["fecha"] <= "2025-03-31")]]
+
+
+def _un_mes_sql(ruta_db):
+    conn = acceso_datos.conectar(ruta_db)
+    df = acceso_datos.leer_tabla(conn, "contactos_empleados", desde="2025-03-01", hasta="2025-03-31")
+    conn.close()
+    return [df]
+
+
+LECTURAS = {
+    "original": _original,
+    "acceso_datos": _acceso_datos,
+    "un mes (pandas)": _un_mes_pandas,
+    "un mes (SQL)": _un_mes_sql,
+}
+
+
+def _ejecutar(nombre, ruta_db, cola):
+    inicio = time.perf_counter()
+    dfs = LECTURAS[nombre](ruta_db)
+    segundos = time.perf_counter() - inicio
+    memoria = sum(df.memory_usage(deep=True).sum() for df in dfs) / 2**20
+    # ru_maxrss viene en KiB en Linux
+    cola.put((segundos, memoria, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def medir(nombre, ruta_db):
+    cola = multiprocessing.Queue()
+    proceso = multiprocessing.Process(target=_ejecutar, args=(nombre, ruta_db, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_json = os.path.join(tmp, "datos.json")
+        ruta_db = os.path.join(tmp, "incidencias.db")
+        generador_datos.generar(ruta_json, args.tickets)
+        carga.cargar_streaming(ruta_json, ruta_db)
+
+        print(f"Tickets: {args.tickets}")
+        print(f"{'lectura':<18} {'seg':>8} {'DataFrames MiB':>15} {'RSS MiB':>9}")
+        for nombre in LECTURAS:
+            segundos, memoria, rss = medir(nombre, ruta_db)
+            print(f"{nombre:<18} {segundos:>8.2f} {memoria:>15.1f} {rss:>9.1f}")
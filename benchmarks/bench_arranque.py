@@ -0,0 +1,77 @@
+# -----------------------------------------------------------------------------
+#            BENCHMARK: ARRANQUE DE LA APLICACION Y PRIMERA PETICION
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_arranque.py --db incidencias.db
+#   python benchmarks/bench_arranque.py --repo /tmp/version_anterior
+#
+# Cada medida se hace en un interprete nuevo, como un worker recien arrancado:
+#   - crear: importar app y crear la aplicacion (create_app, o el 'app' de
+#     modulo en versiones anteriores a la fabrica)
+#   - primera: la primera peticion a la ruta
+#   - hasta respuesta: desde que se lanza el proceso hasta tener la respuesta
+#     (incluye arrancar Python)
+# En el modo "precalentado" create_app(precalentar=True) carga los modulos y
+# calcula las metricas antes de la primera peticion (lo que hace gunicorn.conf.py
+# en cada worker antes de aceptar trafico).
+# --repo permite medir otra copia del repositorio (p.ej. un 'git worktree' de
+# una version anterior) con la misma base de datos.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HIJO = """
+import json, os, sys, time
+inicio_padre = float(sys.argv[1])
+inicio = time.perf_counter()
+sys.path.insert(0, os.getcwd())
+import app as modulo
+if hasattr(modulo, "create_app"):
+    aplicacion = modulo.create_app(precalentar=sys.argv[3] == "precalentado")
+else:
+    aplicacion = modulo.app
+creada = time.perf_counter()
+respuesta = aplicacion.test_client().get(sys.argv[2])
+fin = time.perf_counter()
+print(json.dumps({"estado": respuesta.status_code, "crear": creada - inicio, "primera": fin - creada,
+                  "hasta_respuesta": time.time() - inicio_padre,
+                  "pandas_importado": "pandas" in sys.modules}))
+"""
+
+
+def medir(repo, ruta, modo, ruta_db):
+    entorno = dict(os.environ, INCIDENCIAS_DB=ruta_db)
+    salida = subprocess.run([sys.executable, "-c", HIJO, repr(time.time()), ruta, modo], cwd=repo, env=entorno,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo", default=RAIZ, help="copia del repositorio que se mide")
+    parser.add_argument("--db", default=os.path.join(RAIZ, "incidencias.db"))
+    parser.add_argument("--rutas", nargs="+", default=["/", "/resultados"])
+    parser.add_argument("--modos", nargs="+", default=["normal", "precalentado"])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    ruta_db = os.path.abspath(args.db)
+    print(f"Repositorio: {args.repo}")
+    print(f"{'ruta':<14} {'modo':<13} {'crear ms':>9} {'primera ms':>11} {'hasta resp. ms':>15} {'pandas':>7}")
+    for ruta in args.rutas:
+        for modo in args.modos:
+            medidas = [medir(args.repo, ruta, modo, ruta_db) for _ in range(args.repeticiones)]
+            if any(m["estado"] != 200 for m in medidas):
+                raise RuntimeError(f"{ruta} no devolvio 200: {medidas}")
+            # Medianas de las repeticiones
+            crear, primera, total = (statistics.median(m[c] for m in medidas)
+                                     for c in ("crear", "primera", "hasta_respuesta"))
+            pandas = "si" if medidas[0]["pandas_importado"] else "no"
+            print(f"{ruta:<14} {modo:<13} {crear * 1000:>9.1f} {primera * 1000:>11.1f} {total * 1000:>15.1f} {pandas:>7}")
@@ -0,0 +1,287 @@
+# -----------------------------------------------------------------------------
+#      BENCHMARK: CARGA MIXTA CON GUNICORN (SINCRONO) FRENTE A ASGI
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio, con gunicorn, uvicorn y httpx):
+#   python benchmarks/bench_asgi.py --tickets 20000 --procesos 2 --segundos 30
+#   python benchmarks/bench_asgi.py --db incidencias.db --modos asgi --retraso-cve 5
+#
+# Arranca el mismo numero de procesos con cada modo sobre una copia de la base
+# de datos:
+#   - sync: gunicorn -c gunicorn.conf.py (un worker sincrono por proceso)
+#   - asgi: uvicorn asgi:app --workers N (ver asgi.py)
+# y lanza a la vez, durante --segundos, clientes que piden sin pausa:
+#   - rutas rapidas: /resultados, /practica2 y /api/v1/clientes/top
+#   - /api/v1/estadisticas con un 'desde' al azar (consulta y pandas sin cache)
+#   - /vulnerabilidades, con la cache de CVE vacia al arrancar y una API falsa
+#     que tarda --retraso-cve segundos en responder (CVE_TTL=--ttl-cve, asi que
+#     tambien hay refrescos en segundo plano)
+#   - /generar_pdf
+# mas un cliente que envia un ticket por POST /api/tickets cada
+# --intervalo-tickets segundos: cada uno cambia la version de los datos, y con
+# ella las caches y el PDF, que hay que volver a generar.
+# De cada ruta da las peticiones, cuantas respondieron 200 y 503, y la
+# latencia p50/p99 (de todas las respuestas).
+#
+# Sin --db se genera una base de datos sintetica con --tickets tickets.
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import acumuladores
+import almacen
+import carga
+import generador_datos
+
+RAPIDAS = ["/resultados", "/practica2", "/api/v1/clientes/top"]
+LENTAS = ["/api/v1/estadisticas", "/vulnerabilidades", "/generar_pdf"]
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentil(valores, q):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def _pedir(puerto, metodo, ruta, cuerpo=None, timeout=300):
+    conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=timeout)
+    try:
+        cabeceras = {"Content-Type": "application/json"} if cuerpo is not None else {}
+        conn.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+        respuesta = conn.getresponse()
+        respuesta.read()
+        return respuesta.status
+    finally:
+        conn.close()
+
+
+# -----------------------------------------------------------------------------
+# API de CVE falsa y lenta
+# -----------------------------------------------------------------------------
+
+def _feed_cve(n):
+    return json.dumps([
+        {"cveMetadata": {"cveId": f"CVE-2026-{10000 + i}", "datePublished": f"2026-10-{1 + i % 28:02d}T00:00:00"},
+         "containers": {"cna": {"descriptions": [{"value": f"Vulnerabilidad de prueba {i} en el componente {i % 50}"}],
+                                "metrics": [{"cvssV3_1": {"baseScore": round(1 + i % 90 / 10, 1)}}]}}}
+        for i in range(n)
+    ]).encode("utf-8")
+
+
+def api_cve(retraso, n_cves):
+    cuerpo = _feed_cve(n_cves)
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(retraso)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+# -----------------------------------------------------------------------------
+# Servidores
+# -----------------------------------------------------------------------------
+
+def _precalentados(ruta_log):
+    with open(ruta_log, encoding="utf-8", errors="replace") as f:
+        return f.read().count("aplicacion precalentada")
+
+
+def arrancar(modo, n_procesos, puerto, entorno, ruta_log, timeout):
+    if modo == "sync":
+        orden = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"]
+        entorno = dict(entorno, INCIDENCIAS_WORKERS=str(n_procesos), INCIDENCIAS_BIND=f"127.0.0.1:{puerto}")
+    else:
+        orden = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(puerto),
+                 "--workers", str(n_procesos), "--no-access-log"]
+    log = open(ruta_log, "w")
+    proceso = subprocess.Popen(orden, cwd=RAIZ, env=entorno, stdout=log, stderr=subprocess.STDOUT)
+    limite = time.monotonic() + timeout
+    while _precalentados(ruta_log) < n_procesos:
+        if proceso.poll() is not None or time.monotonic() > limite:
+            proceso.kill()
+            raise RuntimeError(f"{modo} no ha arrancado, ver {ruta_log}")
+        time.sleep(0.1)
+    return proceso
+
+
+def parar(proceso):
+    proceso.send_signal(signal.SIGTERM)
+    try:
+        proceso.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+# -----------------------------------------------------------------------------
+# Clientes
+# -----------------------------------------------------------------------------
+
+def _ruta(ruta, rng):
+    if ruta == "/api/v1/estadisticas":
+        return f"{ruta}?desde=2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return ruta
+
+
+def _cliente(puerto, ruta, segundos, semilla, cola):
+    rng = random.Random(semilla)
+    muestras = []
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        inicio = time.perf_counter()
+        try:
+            estado = _pedir(puerto, "GET", _ruta(ruta, rng))
+        except OSError:
+            estado = None
+        muestras.append((estado, time.perf_counter() - inicio))
+        # Con 503 el cliente espera un poco, como haria un navegador con Retry-After
+        if estado == 503:
+            time.sleep(0.2)
+    cola.put((ruta, muestras))
+
+
+# Un ticket valido con los ids de la propia base de datos
+def _ticket(ruta_db, n):
+    conn = sqlite3.connect(ruta_db)
+    cliente, tipo = conn.execute("SELECT cliente, tipo_incidencia FROM tickets LIMIT 1").fetchone()
+    id_emp = conn.execute("SELECT id_emp FROM contactos_empleados LIMIT 1").fetchone()[0]
+    conn.close()
+    return {"cliente": cliente, "fecha_apertura": f"2026-01-{1 + n % 28:02d}", "fecha_cierre": "2026-01-30",
+            "es_mantenimiento": False, "satisfaccion_cliente": 7, "tipo_incidencia": int(tipo),
+            "contactos_con_empleados": [{"id_emp": id_emp, "fecha": "2026-01-30", "tiempo": 1.5}]}
+
+
+def _ingesta(puerto, ruta_db, segundos, intervalo, cola):
+    muestras = []
+    limite = time.monotonic() + segundos
+    n = 0
+    while time.monotonic() < limite:
+        inicio = time.perf_counter()
+        try:
+            estado = _pedir(puerto, "POST", "/api/tickets", json.dumps(_ticket(ruta_db, n)).encode("utf-8"))
+        except OSError:
+            estado = None
+        muestras.append((estado, time.perf_counter() - inicio))
+        n += 1
+        time.sleep(intervalo)
+    cola.put(("POST /api/tickets", muestras))
+
+
+def carga_mixta(puerto, ruta_db, args):
+    contexto = multiprocessing.get_context("fork")
+    cola = contexto.Queue()
+    clientes = [contexto.Process(target=_cliente, args=(puerto, ruta, args.segundos, 1000 * i + j, cola))
+                for i, (ruta, n) in enumerate([(r, args.clientes_rapidas) for r in RAPIDAS] +
+                                              [(r, args.clientes_lentas) for r in LENTAS])
+                for j in range(n)]
+    clientes.append(contexto.Process(target=_ingesta,
+                                     args=(puerto, ruta_db, args.segundos, args.intervalo_tickets, cola)))
+    for cliente in clientes:
+        cliente.start()
+    por_ruta = {}
+    for _ in clientes:
+        ruta, muestras = cola.get()
+        por_ruta.setdefault(ruta, []).extend(muestras)
+    for cliente in clientes:
+        cliente.join()
+    return por_ruta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=20000, help="tickets de la base de datos sintetica")
+    parser.add_argument("--db", help="base de datos ya cargada (se trabaja sobre una copia)")
+    parser.add_argument("--modos", nargs="+", choices=["sync", "asgi"], default=["sync", "asgi"])
+    parser.add_argument("--procesos", type=int, default=2, help="workers de gunicorn o de uvicorn")
+    parser.add_argument("--segundos", type=float, default=30)
+    parser.add_argument("--clientes-rapidas", type=int, default=2, help="clientes por cada ruta rapida")
+    parser.add_argument("--clientes-lentas", type=int, default=3, help="clientes por cada ruta lenta")
+    parser.add_argument("--intervalo-tickets", type=float, default=5)
+    parser.add_argument("--retraso-cve", type=float, default=3, help="segundos que tarda la API de CVE falsa")
+    parser.add_argument("--ttl-cve", type=float, default=10)
+    parser.add_argument("--cves", type=int, default=2000, help="entradas del feed de CVE falso")
+    parser.add_argument("--timeout", type=int, default=600, help="segundos maximos de arranque")
+    args = parser.parse_args()
+
+    api = api_cve(args.retraso_cve, args.cves)
+    with tempfile.TemporaryDirectory() as tmp:
+        original = os.path.join(tmp, "original.db")
+        if args.db:
+            origen = sqlite3.connect(args.db)
+            destino = sqlite3.connect(original)
+            origen.backup(destino)
+            origen.close()
+            destino.close()
+        else:
+            ruta_json = os.path.join(tmp, "datos.json")
+            generador_datos.generar(ruta_json, args.tickets)
+            carga.cargar_streaming(ruta_json, original)
+            os.remove(ruta_json)
+        conn = carga.conectar_escritura(original)
+        almacen.refrescar(conn)
+        acumuladores.refrescar(conn)
+        conn.close()
+
+        print(f"{args.procesos} procesos, {args.segundos:.0f} s, clientes por ruta: {args.clientes_rapidas} "
+              f"rapidas / {args.clientes_lentas} lentas, API de CVE de {args.retraso_cve:g} s, "
+              f"un ticket cada {args.intervalo_tickets:g} s")
+        print(f"{'modo':>5} {'ruta':<22} {'pet':>6} {'200':>6} {'503':>5} {'otros':>5} {'p50':>9} {'p99':>9}")
+        for modo in args.modos:
+            # Cada servidor con su copia de la base de datos y sus caches vacias
+            ruta_db = os.path.join(tmp, f"{modo}.db")
+            shutil.copy(original, ruta_db)
+            entorno = dict(os.environ, INCIDENCIAS_DB=ruta_db,
+                           INCIDENCIAS_INSTANTANEA=os.path.join(tmp, f"instantanea_{modo}"),
+                           CVE_URL=f"http://127.0.0.1:{api.server_address[1]}/api/last",
+                           CVE_TTL=str(args.ttl_cve),
+                           CVE_CACHE=os.path.join(tmp, f"cves_{modo}.json"),
+                           CVE_INDICE=os.path.join(tmp, f"cves_{modo}.db"))
+            puerto = _puerto_libre()
+            ruta_log = os.path.join(tmp, f"{modo}.log")
+            proceso = arrancar(modo, args.procesos, puerto, entorno, ruta_log, args.timeout)
+            try:
+                por_ruta = carga_mixta(puerto, ruta_db, args)
+            finally:
+                parar(proceso)
+            for ruta in RAPIDAS + LENTAS + ["POST /api/tickets"]:
+                muestras = por_ruta.get(ruta, [])
+                estados = [estado for estado, _ in muestras]
+                latencias = [segundos for _, segundos in muestras]
+                ok, ocupado = estados.count(200) + estados.count(202), estados.count(503)
+                print(f"{modo:>5} {ruta:<22} {len(muestras):>6} {ok:>6} {ocupado:>5} {len(muestras) - ok - ocupado:>5} "
+                      f"{_percentil(latencias, 0.5) * 1000:>7.0f}ms {_percentil(latencias, 0.99) * 1000:>7.0f}ms")
@@ -0,0 +1,169 @@
+# -----------------------------------------------------------------------------
+#         PRECISION Y MEMORIA: BOCETOS FRENTE AL CALCULO EXACTO
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_bocetos.py --contactos 5000000
+#   python benchmarks/bench_bocetos.py --errores 0.005 0.01 0.05 --precisiones 10 12 14
+#
+# Genera contactos sinteticos (dia, empleado, tipo, ticket, duracion del
+# ticket) y compara, para el rango completo y para los ultimos --dias-rango
+# dias:
+#   - cuantiles de la caja del boxplot (p5, q1, mediana, q3, p90) de la
+#     duracion por tipo: exactos (metodo 'lower') frente a unir los bocetos
+#     de cada dia, para cada error relativo de --errores
+#   - tickets distintos por empleado: np.unique de las parejas frente a unir
+#     los HyperLogLog de cada dia, para cada precision de --precisiones
+# De cada uno da el error relativo maximo (y medio en los distintos), el pico
+# de memoria de Python (tracemalloc, que cuenta los arrays de NumPy), los bytes
+# de los bocetos guardados y el tiempo de la consulta.
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import bocetos
+
+CUANTILES = [0.05, 0.25, 0.5, 0.75, 0.90]
+
+
+def datos_sinteticos(n_contactos, n_empleados, n_tipos, n_dias, semilla):
+    rng = np.random.default_rng(semilla)
+    n_tickets = max(1, n_contactos // 3)
+    # Cada ticket tiene un dia, un tipo y una duracion; sus contactos, empleados al azar
+    dia_ticket = rng.integers(0, n_dias, n_tickets)
+    tipo_ticket = rng.integers(0, n_tipos, n_tickets)
+    duracion = rng.lognormal(1.0, 0.8, n_tickets)
+    ticket = rng.integers(0, n_tickets, n_contactos)
+    dia = np.minimum(dia_ticket[ticket] + rng.integers(0, 5, n_contactos), n_dias - 1)
+    empleado = rng.zipf(1.3, n_contactos) % n_empleados
+    return {"dia_ticket": dia_ticket, "tipo_ticket": tipo_ticket, "duracion": duracion,
+            "ticket": ticket, "dia": dia, "empleado": empleado, "tipo": tipo_ticket[ticket]}
+
+
+# Inicio de cada grupo en unas claves ya ordenadas
+def _inicios(*claves):
+    cambios = np.zeros(len(claves[0]), dtype=bool)
+    cambios[:1] = True
+    for clave in claves:
+        cambios[1:] |= clave[1:] != clave[:-1]
+    return np.flatnonzero(cambios)
+
+
+def medir(funcion):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+# Bocetos por (dia, tipo) de la duracion de los tickets abiertos ese dia
+def bocetos_duracion(d, error):
+    orden = np.lexsort((d["tipo_ticket"], d["dia_ticket"]))
+    dias, tipos, valores = d["dia_ticket"][orden], d["tipo_ticket"][orden], d["duracion"][orden]
+    inicios = _inicios(dias, tipos)
+    fines = np.append(inicios[1:], len(valores))
+    return [(dias[a], tipos[a], bocetos.Cuantiles(error).agregar(valores[a:b]).a_bytes())
+            for a, b in zip(inicios, fines)]
+
+
+# HyperLogLog por (dia, empleado, tipo) de los tickets atendidos
+def bocetos_tickets(d, precision):
+    orden = np.lexsort((d["tipo"], d["empleado"], d["dia"]))
+    dias, empleados, tipos = d["dia"][orden], d["empleado"][orden], d["tipo"][orden]
+    inicios = _inicios(dias, empleados, tipos)
+    blobs = bocetos.hll_por_grupo(d["ticket"][orden], inicios, precision)
+    return [(dias[i], empleados[i], blob) for i, blob in zip(inicios, blobs)]
+
+
+def cuantiles_exactos(d, desde):
+    elegidos = d["dia_ticket"] >= desde
+    tipos, valores = d["tipo_ticket"][elegidos], d["duracion"][elegidos]
+    # Las listas de cada tipo, como las que recibe ax.boxplot
+    listas = [np.sort(valores[tipos == tipo]) for tipo in np.unique(tipos)]
+    return np.array([np.quantile(lista, CUANTILES, method="lower") for lista in listas])
+
+
+def cuantiles_bocetos(guardados, desde):
+    unidos = {}
+    for dia, tipo, datos in guardados:
+        if dia >= desde:
+            boceto = bocetos.Cuantiles.de_bytes(datos)
+            unidos[tipo] = unidos[tipo].unir(boceto) if tipo in unidos else boceto
+    return np.array([unidos[tipo].cuantiles(CUANTILES) for tipo in sorted(unidos)])
+
+
+def distintos_exactos(d, desde):
+    elegidos = d["dia"] >= desde
+    parejas = np.unique(d["empleado"][elegidos].astype(np.int64) << 32 | d["ticket"][elegidos])
+    return np.bincount(parejas >> 32)
+
+
+def distintos_bocetos(guardados, desde, n_empleados, precision):
+    unidos = bocetos.estimar_unidos(((empleado, datos) for dia, empleado, datos in guardados if dia >= desde),
+                                    precision)
+    return np.array([unidos.get(e, 0) for e in range(n_empleados)])
+
+
+def _error_relativo(aprox, exacto):
+    exacto = np.asarray(exacto, dtype=np.float64)
+    aprox = np.asarray(aprox, dtype=np.float64)[:len(exacto)]
+    validos = exacto != 0
+    return np.abs(aprox[validos] - exacto[validos]) / np.abs(exacto[validos])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contactos", type=int, default=2000000)
+    parser.add_argument("--empleados", type=int, default=200)
+    parser.add_argument("--tipos", type=int, default=5)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--dias-rango", type=int, default=30, help="dias del rango corto")
+    parser.add_argument("--errores", type=float, nargs="+", default=[0.005, 0.01, 0.02, 0.05])
+    parser.add_argument("--precisiones", type=int, nargs="+", default=[10, 12, 14])
+    parser.add_argument("--semilla", type=int, default=18)
+    args = parser.parse_args()
+
+    d = datos_sinteticos(args.contactos, args.empleados, args.tipos, args.dias, args.semilla)
+    rangos = [("todo", 0), (f"{args.dias_rango} dias", args.dias - args.dias_rango)]
+    print(f"{args.contactos} contactos, {len(d['duracion'])} tickets, {args.empleados} empleados, "
+          f"{args.tipos} tipos, {args.dias} dias")
+
+    print("\nCuantiles de la duracion por tipo (p5, q1, mediana, q3, p90)")
+    print(f"{'modo':>14} {'rango':>9} {'err. max':>9} {'pico':>10} {'guardado':>10} {'consulta':>9} {'construir':>9}")
+    for nombre, desde in rangos:
+        exactos, segundos, pico = medir(lambda: cuantiles_exactos(d, desde))
+        print(f"{'exacto':>14} {nombre:>9} {'-':>9} {pico / 2**20:>8.1f}MB {'-':>10} {segundos:>8.3f}s {'-':>9}")
+        for error in args.errores:
+            inicio = time.perf_counter()
+            guardados = bocetos_duracion(d, error)
+            construir = time.perf_counter() - inicio
+            aprox, segundos, pico = medir(lambda: cuantiles_bocetos(guardados, desde))
+            tamano = sum(len(datos) for _, _, datos in guardados)
+            print(f"{f'boceto {error:g}':>14} {nombre:>9} {_error_relativo(aprox, exactos).max():>9.4f} "
+                  f"{pico / 2**20:>8.1f}MB {tamano / 2**20:>8.2f}MB {segundos:>8.3f}s {construir:>8.2f}s")
+
+    print("\nTickets distintos por empleado")
+    print(f"{'modo':>14} {'rango':>9} {'err. max':>9} {'err. med':>9} {'pico':>10} {'guardado':>10} "
+          f"{'consulta':>9} {'construir':>9}")
+    for nombre, desde in rangos:
+        exactos, segundos, pico = medir(lambda: distintos_exactos(d, desde))
+        print(f"{'exacto':>14} {nombre:>9} {'-':>9} {'-':>9} {pico / 2**20:>8.1f}MB {'-':>10} {segundos:>8.3f}s "
+              f"{'-':>9}")
+        for precision in args.precisiones:
+            inicio = time.perf_counter()
+            guardados = bocetos_tickets(d, precision)
+            construir = time.perf_counter() - inicio
+            aprox, segundos, pico = medir(lambda: distintos_bocetos(guardados, desde, args.empleados, precision))
+            errores = _error_relativo(aprox, exactos)
+            tamano = sum(len(datos) for _, _, datos in guardados)
+            print(f"{f'HLL p={precision}':>14} {nombre:>9} {errores.max():>9.4f} {errores.mean():>9.4f} "
+                  f"{pico / 2**20:>8.1f}MB {tamano / 2**20:>8.2f}MB {segundos:>8.3f}s {construir:>8.2f}s")
@@ -0,0 +1,69 @@
+# -----------------------------------------------------------------------------
+#              BENCHMARK: CARGA CLASICA (main.py) FRENTE A STREAMING
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_carga.py --tamanos 10000 100000 1000000
+#
+# Cada carga se ejecuta en un proceso hijo para poder medir su pico de memoria
+# (ru_maxrss) de forma independiente.
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import carga
+import generador_datos
+import main
+
+
+def _ejecutar(modo, ruta_json, ruta_db, cola):
+    inicio = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        if modo == "clasico":
+            main.cargar_clasico(ruta_json, ruta_db)
+        else:
+            carga.cargar_streaming(ruta_json, ruta_db)
+    segundos = time.perf_counter() - inicio
+    # ru_maxrss viene en KiB en Linux
+    cola.put((segundos, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def medir(modo, ruta_json, ruta_db):
+    if os.path.exists(ruta_db):
+        os.remove(ruta_db)
+    cola = multiprocessing.Queue()
+    proceso = multiprocessing.Process(target=_ejecutar, args=(modo, ruta_json, ruta_db, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--modos", nargs="+", default=["clasico", "streaming"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'tickets':>10} {'modo':>10} {'filas':>10} {'seg':>8} {'filas/s':>10} {'RSS MiB':>8}")
+        for n in args.tamanos:
+            ruta_json = os.path.join(tmp, f"datos_{n}.json")
+            generador_datos.generar(ruta_json, n)
+            for modo in args.modos:
+                ruta_db = os.path.join(tmp, f"{modo}_{n}.db")
+                segundos, rss = medir(modo, ruta_json, ruta_db)
+                conn = sqlite3.connect(ruta_db)
+                filas = sum(conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                            for tabla in ("tickets", "contactos_empleados"))
+                conn.close()
+                print(f"{n:>10} {modo:>10} {filas:>10} {segundos:>8.2f} {filas / segundos:>10.0f} {rss:>8.1f}")
@@ -0,0 +1,197 @@
+# -----------------------------------------------------------------------------
+#        BENCHMARK DE EXTREMO A EXTREMO: CARGA, ANALISIS, GRAFICOS Y RUTAS
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_completo.py --tamanos 10000 100000 1000000 --sesgo 1.1
+#   python benchmarks/bench_completo.py --comparar benchmarks/resultados/anterior.json
+#
+# Para cada tamano genera un fichero sintetico (generador_datos, con semilla
+# fija) y mide, en un proceso hijo con su propia base de datos:
+#   - carga: generacion del JSON, carga en streaming y refresco del almacen
+#   - metrica: cada metrica del MotorAnalisis en el orden en que se definen (las
+#     que reutilizan otras ya calculadas solo miden su parte)
+#   - grafico: consulta del agregado y dibujo de cada grafico
+#   - ruta: /resultados, /practica2 y /generar_pdf, la primera vez (frio) y la
+#     segunda (servida desde la cache)
+# Los resultados se guardan en JSON (por defecto en benchmarks/resultados/) con
+# el commit y la maquina, para poder comparar versiones con --comparar.
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+RUTAS = ["/resultados", "/practica2", "/generar_pdf"]
+
+
+def _cronometrar(resultados, fase, nombre, funcion, *args):
+    inicio = time.perf_counter()
+    valor = funcion(*args)
+    resultados.append({"fase": fase, "nombre": nombre, "segundos": time.perf_counter() - inicio})
+    return valor
+
+
+def _get(cliente, ruta):
+    respuesta = cliente.get(ruta)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"{ruta} devolvio {respuesta.status_code}")
+    return respuesta
+
+
+# Se ejecuta en el proceso hijo. Los modulos del repositorio se importan aqui,
+# despues de fijar INCIDENCIAS_DB, porque leen la ruta de la base de datos al
+# importarse
+def _medir_tamano(n, args, directorio, cola):
+    try:
+        cola.put(_medir(n, args, directorio))
+    except BaseException as error:
+        # Sin esto el proceso padre se quedaria esperando en la cola
+        cola.put(error)
+        raise
+
+
+def _medir(n, args, directorio):
+    ruta_json = os.path.join(directorio, f"datos_{n}.json")
+    ruta_db = os.path.join(directorio, f"incidencias_{n}.db")
+    os.environ["INCIDENCIAS_DB"] = ruta_db
+    resultados = []
+
+    import almacen
+    import carga
+    import conexiones
+    import generador_datos
+
+    _cronometrar(resultados, "carga", "generar_json", generador_datos.generar, ruta_json, n,
+                 args.clientes, args.empleados, args.tipos, args.semilla, tuple(args.contactos), args.sesgo)
+    _cronometrar(resultados, "carga", "cargar_streaming", carga.cargar_streaming, ruta_json, ruta_db)
+    conn = conexiones.conectar_escritura(ruta_db)
+    _cronometrar(resultados, "carga", "almacen", almacen.refrescar, conn)
+    conn.close()
+
+    import analisis
+    motor = analisis.MotorAnalisis(ruta_db)
+    for nombre, valor in vars(analisis.MotorAnalisis).items():
+        if isinstance(valor, analisis.metrica):
+            _cronometrar(resultados, "metrica", nombre, getattr, motor, nombre)
+
+    import graficos
+    directorio_graficos = os.path.join(directorio, f"graficos_{n}")
+    os.makedirs(directorio_graficos, exist_ok=True)
+    for fichero, definicion in graficos.GRAFICOS.items():
+        with conexiones.lectura(ruta_db) as conn:
+            agregado = _cronometrar(resultados, "grafico", f"{fichero}:datos", definicion["datos"], conn)
+        _cronometrar(resultados, "grafico", f"{fichero}:dibujo", definicion["dibujar"],
+                     agregado, os.path.join(directorio_graficos, fichero))
+
+    import app as aplicacion
+    # Los PDF de la prueba no se mezclan con los de informes/
+    aplicacion.informes_pdf.directorio = os.path.join(directorio, f"informes_{n}")
+    cliente = aplicacion.create_app().test_client()
+    for ruta in RUTAS:
+        _cronometrar(resultados, "ruta", f"{ruta}:frio", _get, cliente, ruta)
+        _cronometrar(resultados, "ruta", f"{ruta}:caliente", _get, cliente, ruta)
+    aplicacion.informes_pdf.cerrar()
+
+    for resultado in resultados:
+        resultado["tickets"] = n
+    # ru_maxrss viene en KiB en Linux
+    return resultados, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir(n, args, directorio):
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_medir_tamano, args=(n, args, directorio, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    if isinstance(resultado, BaseException):
+        raise RuntimeError(f"fallo la medida con {n} tickets") from resultado
+    return resultado
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Compara con un fichero de resultados anterior (mismo tamano, fase y nombre).
+# Las medidas de menos de MINIMO_COMPARABLE segundos son sobre todo ruido
+MINIMO_COMPARABLE = 0.01
+
+
+def comparar(actual, ruta_anterior, umbral):
+    with open(ruta_anterior, "r", encoding="utf-8") as f:
+        anterior = json.load(f)
+    previos = {(r["tickets"], r["fase"], r["nombre"]): r["segundos"] for r in anterior["resultados"]}
+    print(f"\nComparacion con {ruta_anterior} (commit {anterior.get('commit')}):")
+    print(f"{'tickets':>10} {'medida':<40} {'antes':>9} {'ahora':>9} {'x':>6}")
+    regresiones = 0
+    for r in actual["resultados"]:
+        previo = previos.get((r["tickets"], r["fase"], r["nombre"]))
+        if previo is None or max(previo, r["segundos"]) < MINIMO_COMPARABLE:
+            continue
+        ratio = r["segundos"] / previo
+        marca = "  <-- mas lento" if ratio > umbral else ""
+        regresiones += bool(marca)
+        print(f"{r['tickets']:>10} {r['fase'] + '/' + r['nombre']:<40} {previo:>9.3f} {r['segundos']:>9.3f} "
+              f"{ratio:>6.2f}{marca}")
+    print(f"Medidas mas de {umbral:.2f} veces mas lentas: {regresiones}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--empleados", type=int, default=50)
+    parser.add_argument("--tipos", type=int, default=5)
+    parser.add_argument("--contactos", type=int, nargs=2, default=[1, 6], metavar=("MIN", "MAX"))
+    parser.add_argument("--sesgo", type=float, default=1.1)
+    parser.add_argument("--semilla", type=int, default=18)
+    parser.add_argument("--salida", help="fichero JSON de resultados (por defecto benchmarks/resultados/<commit>.json)")
+    parser.add_argument("--comparar", metavar="JSON", help="resultados anteriores con los que comparar")
+    parser.add_argument("--umbral", type=float, default=1.2, help="ratio a partir del cual se marca una regresion")
+    args = parser.parse_args()
+
+    commit = _commit()
+    documento = {
+        "commit": commit,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": {"plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "parametros": vars(args),
+        "rss_mib": {},
+        "resultados": [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.tamanos:
+            resultados, rss = medir(n, args, tmp)
+            documento["resultados"].extend(resultados)
+            documento["rss_mib"][str(n)] = rss
+            print(f"\nTickets: {n} (RSS maximo {rss:.1f} MiB)")
+            print(f"{'fase':<8} {'medida':<40} {'seg':>9}")
+            for r in resultados:
+                print(f"{r['fase']:<8} {r['nombre']:<40} {r['segundos']:>9.3f}")
+
+    salida = args.salida or os.path.join(RAIZ, "benchmarks", "resultados", f"{commit or 'sin_commit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        comparar(documento, args.comparar, args.umbral)
@@ -0,0 +1,63 @@
+# -----------------------------------------------------------------------------
+#           BENCHMARK: CONSULTAS DEL DASHBOARD CON Y SIN INDICES
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_indices.py --contactos 1000000
+#
+# Genera una base de datos sintetica con ~N contactos, la copia sin indices
+# secundarios y mide las consultas canonicas de plan_consultas.py en ambas.
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import carga
+import generador_datos
+import plan_consultas
+
+# El generador crea de 1 a 4 contactos por ticket (2.5 de media)
+CONTACTOS_POR_TICKET = 2.5
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contactos", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_json = os.path.join(tmp, "datos.json")
+        con_indices = os.path.join(tmp, "con_indices.db")
+        sin_indices = os.path.join(tmp, "sin_indices.db")
+
+        generador_datos.generar(ruta_json, int(args.contactos / CONTACTOS_POR_TICKET))
+        carga.cargar_streaming(ruta_json, con_indices)
+        shutil.copy(con_indices, sin_indices)
+
+        conn = sqlite3.connect(sin_indices)
+        for (nombre,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+        ).fetchall():
+            conn.execute(f"DROP INDEX {nombre}")
+        conn.commit()
+        conn.execute("VACUUM")
+        n_contactos = conn.execute("SELECT COUNT(*) FROM contactos_empleados").fetchone()[0]
+        tiempos_sin = plan_consultas.medir_consultas(conn)
+        conn.close()
+
+        conn = sqlite3.connect(con_indices)
+        fallos = plan_consultas.comprobar_planes(conn)
+        tiempos_con = plan_consultas.medir_consultas(conn)
+        conn.close()
+
+        print(f"Contactos: {n_contactos}")
+        print(f"{'consulta':<40} {'sin indices':>12} {'con indices':>12} {'mejora':>8}")
+        for nombre in tiempos_con:
+            sin, con = tiempos_sin[nombre] * 1000, tiempos_con[nombre] * 1000
+            print(f"{nombre:<40} {sin:>9.1f} ms {con:>9.1f} ms {sin / con:>7.1f}x")
+        for nombre, motivo in fallos:
+            print(f"REGRESION en '{nombre}': {motivo}")
@@ -0,0 +1,270 @@
+# -----------------------------------------------------------------------------
+#             PRUEBA DE CARGA: INGESTA DE TICKETS POR POST /api/tickets
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_ingesta.py --tickets 100000 --clientes-http 8 --segundos 20
+#   python benchmarks/bench_ingesta.py --db incidencias.db --por-peticion 1 10 100
+#
+# Arranca la aplicacion en un proceso aparte (servidor de desarrollo de
+# werkzeug con un hilo por peticion) sobre una copia de la base de datos y, por
+# cada tamano de peticion, lanza --clientes-http hilos que envian tickets sin
+# pausa (o a --ritmo tickets/s) durante --segundos. Por encima de lo que el
+# escritor puede escribir la cola crece hasta llenarse, asi que la latencia de
+# ingesta solo es representativa a un ritmo sostenible. Un cliente mas se queda
+# conectado a /api/eventos y
+# cuenta los avisos. Para cada tamano informa de:
+#   - tickets/s aceptados (202) y escritos en SQLite (hasta vaciar la cola)
+#   - latencia de la peticion POST (p50/p99)
+#   - latencia de ingesta: desde que el ticket entra en la cola hasta que su
+#     lote esta escrito (p50/p99 de los ultimos 10000 tickets, de
+#     /api/tickets/estado)
+#   - tamano medio de lote, rechazos por cola llena (503) y eventos SSE
+# Al terminar comprueba que las tablas de hechos acumuladas lote a lote son
+# las mismas que reconstruyendolas desde cero.
+#
+# Los tickets enviados salen de generador_datos.py con otra semilla que la de
+# la base de datos sintetica (sin --db se genera una con --tickets tickets).
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import almacen
+import carga
+import generador_datos
+
+
+# INCIDENCIAS_DB llega en el entorno: el hijo importa este modulo (y con el
+# conexiones, que la lee al importarse) antes de llamar a esta funcion
+def _servir(puerto):
+    import logging
+    logging.disable(logging.WARNING)
+    from werkzeug.serving import make_server
+    from app import create_app
+    make_server("127.0.0.1", puerto, create_app(), threaded=True).serve_forever()
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pedir(puerto, metodo, ruta, cuerpo=None):
+    conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+    try:
+        cabeceras = {"Content-Type": "application/json"} if cuerpo is not None else {}
+        conn.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+        respuesta = conn.getresponse()
+        return respuesta.status, respuesta.read()
+    finally:
+        conn.close()
+
+
+def _esperar_servidor(puerto, timeout=60):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            return json.loads(_pedir(puerto, "GET", "/api/tickets/estado")[1])
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("el servidor no ha arrancado")
+
+
+# Cuenta los eventos 'tickets' de /api/eventos hasta que se cierra el proceso
+def _escuchar_eventos(puerto, contador):
+    conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=None)
+    conn.request("GET", "/api/eventos")
+    respuesta = conn.getresponse()
+    try:
+        for linea in respuesta:
+            if linea.startswith(b"event: tickets"):
+                contador["eventos"] += 1
+    except (OSError, http.client.HTTPException):
+        pass
+
+
+def _percentil(valores, q):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def ronda(puerto, tickets, por_peticion, n_clientes, segundos, contador, ritmo=None):
+    cuerpos = [json.dumps(tickets[i:i + por_peticion]).encode("utf-8")
+               for i in range(0, len(tickets) - por_peticion + 1, por_peticion)]
+    siguiente = iter(range(len(cuerpos)))
+    lock = threading.Lock()
+    latencias, estados = [], {}
+    antes = _esperar_servidor(puerto)
+    eventos_antes = contador["eventos"]
+    limite = time.monotonic() + segundos
+
+    def cliente():
+        while time.monotonic() < limite:
+            with lock:
+                i = next(siguiente, None)
+            if i is None:
+                return
+            # Con --ritmo cada peticion tiene su momento de salida
+            if ritmo:
+                espera = inicio_ronda + i * por_peticion / ritmo - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+            inicio = time.perf_counter()
+            estado, _ = _pedir(puerto, "POST", "/api/tickets", cuerpos[i])
+            segundos_peticion = time.perf_counter() - inicio
+            with lock:
+                latencias.append(segundos_peticion)
+                estados[estado] = estados.get(estado, 0) + 1
+            if estado == 503:
+                time.sleep(1)
+
+    inicio = inicio_ronda = time.perf_counter()
+    hilos = [threading.Thread(target=cliente) for _ in range(n_clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    enviado = time.perf_counter() - inicio
+    # Hasta que el escritor vacia la cola
+    while True:
+        despues = _esperar_servidor(puerto)
+        if despues["pendientes"] == 0 and despues["recibidos"] == despues["escritos"] + despues["repetidos"] + \
+                despues["errores"]:
+            break
+        time.sleep(0.05)
+    escrito = time.perf_counter() - inicio
+    time.sleep(0.2)
+
+    aceptados = estados.get(202, 0) * por_peticion
+    escritos = despues["escritos"] - antes["escritos"]
+    lotes = despues["lotes"] - antes["lotes"]
+    return {
+        "por_peticion": por_peticion,
+        "peticiones": len(latencias),
+        "aceptados_s": aceptados / enviado,
+        "escritos_s": escritos / escrito,
+        "post_p50": _percentil(latencias, 0.50),
+        "post_p99": _percentil(latencias, 0.99),
+        "ingesta_p50": despues["latencia_p50"] or float("nan"),
+        "ingesta_p99": despues["latencia_p99"] or float("nan"),
+        "lote_medio": (despues["recibidos"] - antes["recibidos"]) / lotes if lotes else 0,
+        "rechazadas": estados.get(503, 0),
+        "otras": {estado: n for estado, n in estados.items() if estado not in (202, 503)},
+        "errores": despues["errores"] - antes["errores"],
+        "eventos": contador["eventos"] - eventos_antes,
+    }
+
+
+def _filas(conn, sql):
+    return conn.execute(sql).fetchall()
+
+
+# Las tablas de hechos acumuladas frente a reconstruirlas (en una copia)
+def comprobar_almacen(ruta_db, directorio):
+    consultas = ["SELECT * FROM hechos_tickets_dia ORDER BY 1, 2, 3, 4",
+                 "SELECT * FROM hechos_contactos_dia ORDER BY 1, 2, 3, 4, 5"]
+    conn = sqlite3.connect(ruta_db)
+    acumuladas = [_filas(conn, sql) for sql in consultas]
+    conn.close()
+    copia = os.path.join(directorio, "reconstruida.db")
+    origen = sqlite3.connect(ruta_db)
+    destino = sqlite3.connect(copia)
+    origen.backup(destino)
+    origen.close()
+    almacen.refrescar(destino, completo=True)
+    reconstruidas = [_filas(destino, sql) for sql in consultas]
+    destino.close()
+    for a, b in zip(acumuladas, reconstruidas):
+        if len(a) != len(b):
+            return False
+        for fila_a, fila_b in zip(a, b):
+            for x, y in zip(fila_a, fila_b):
+                if x != y and not (isinstance(x, float) and isinstance(y, float) and abs(x - y) <= 1e-9 * max(1, abs(y))):
+                    return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=100000, help="tickets de la base de datos sintetica")
+    parser.add_argument("--db", help="base de datos ya cargada (se trabaja sobre una copia)")
+    parser.add_argument("--por-peticion", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--clientes-http", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--ritmo", type=float, help="tickets/s enviados (por defecto, tan rapido como se pueda)")
+    parser.add_argument("--enviar", type=int, default=200000, help="tickets distintos disponibles para enviar")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_db = os.path.join(tmp, "incidencias.db")
+        if args.db:
+            origen = sqlite3.connect(args.db)
+            destino = sqlite3.connect(ruta_db)
+            origen.backup(destino)
+            origen.close()
+            destino.close()
+        else:
+            ruta_json = os.path.join(tmp, "datos.json")
+            generador_datos.generar(ruta_json, args.tickets)
+            carga.cargar_streaming(ruta_json, ruta_db)
+            os.remove(ruta_json)
+        conn = carga.conectar_escritura(ruta_db)
+        almacen.refrescar(conn)
+        n_inicial = conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+        conn.close()
+
+        ruta_enviar = os.path.join(tmp, "enviar.json")
+        generador_datos.generar(ruta_enviar, args.enviar, semilla=1018)
+        with open(ruta_enviar, encoding="utf-8") as f:
+            tickets = json.load(f)["tickets_emitidos"]
+
+        puerto = _puerto_libre()
+        contexto = multiprocessing.get_context("spawn")
+        os.environ["INCIDENCIAS_DB"] = ruta_db
+        os.environ["INCIDENCIAS_INSTANTANEA"] = os.path.join(tmp, "instantanea")
+        servidor = contexto.Process(target=_servir, args=(puerto,), daemon=True)
+        servidor.start()
+        try:
+            _esperar_servidor(puerto)
+            contador = {"eventos": 0}
+            threading.Thread(target=_escuchar_eventos, args=(puerto, contador), daemon=True).start()
+
+            print(f"Tickets iniciales: {n_inicial}; {args.clientes_http} clientes HTTP, {args.segundos:.0f} s por ronda")
+            print(f"{'por peticion':>12} {'peticiones':>10} {'acept./s':>9} {'escr./s':>9} {'POST p50':>9} "
+                  f"{'POST p99':>9} {'ingesta p50':>12} {'ingesta p99':>12} {'lote':>6} {'503':>5} {'eventos':>8}")
+            enviados = 0
+            for por_peticion in args.por_peticion:
+                # Cada ronda envia tickets que no se han enviado antes
+                r = ronda(puerto, tickets[enviados:], por_peticion, args.clientes_http, args.segundos, contador,
+                          args.ritmo)
+                enviados += r["peticiones"] * por_peticion
+                print(f"{r['por_peticion']:>12} {r['peticiones']:>10} {r['aceptados_s']:>9.0f} {r['escritos_s']:>9.0f} "
+                      f"{r['post_p50'] * 1000:>7.1f}ms {r['post_p99'] * 1000:>7.1f}ms "
+                      f"{r['ingesta_p50'] * 1000:>10.1f}ms {r['ingesta_p99'] * 1000:>10.1f}ms "
+                      f"{r['lote_medio']:>6.0f} {r['rechazadas']:>5} {r['eventos']:>8}")
+                if r["otras"]:
+                    print(f"  respuestas distintas de 202/503: {r['otras']}")
+                if r["errores"]:
+                    print(f"  {r['errores']} tickets no se pudieron escribir")
+        finally:
+            servidor.terminate()
+            servidor.join()
+
+        conn = sqlite3.connect(ruta_db)
+        n_final = conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+        conn.close()
+        print(f"Tickets escritos: {n_final - n_inicial}")
+        print("Tablas de hechos iguales a reconstruirlas:", "si" if comprobar_almacen(ruta_db, tmp) else "NO")
@@ -0,0 +1,146 @@
+# -----------------------------------------------------------------------------
+#        BENCHMARK: LECTURA DESDE SQLITE FRENTE A LA INSTANTANEA COLUMNAR
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_instantanea.py --tickets 1000000
+#   python benchmarks/bench_instantanea.py --db incidencias.db
+#
+# Lee tickets y contactos_empleados de cuatro formas, cada una en un proceso
+# hijo nuevo para medir su memoria (Linux, /proc/self/status):
+#   - read_sql_query: SELECT * y pd.to_datetime despues
+#   - acceso_datos (SQLite): lectura con tipos compactos desde SQLite
+#   - instantanea: los mismos DataFrame abiertos con mmap desde los .npy
+#   - instantanea + uso: ademas recorre todas las columnas (un groupby por
+#     cliente y otro por empleado), lo que obliga a leer todas las paginas
+# Sin --db genera una base de datos sintetica con generador_datos.py.
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import acceso_datos
+import carga
+import generador_datos
+import instantanea
+from version_datos import leer_version
+
+
+def _read_sql_query(ruta_db, ruta_instantanea):
+    conn = sqlite3.connect(ruta_db)
+    df_tickets = pd.read_sql_query("SELECT * FROM tickets", conn)
+    df_contactos = pd.read_sql_query("SELECT * FROM contactos_empleados", conn)
+    conn.close()
+    df_tickets["fecha_apertura"] = pd.to_datetime(df_tickets["fecha_apertura"])
+    df_tickets["fecha_cierre"] = pd.to_datetime(df_tickets["fecha_cierre"])
+    df_contactos["fecha"] = pd.to_datetime(df_contactos["fecha"])
+    return [df_tickets, df_contactos]
+
+
+def _sqlite(ruta_db, ruta_instantanea):
+    conn = acceso_datos.conectar(ruta_db, solo_lectura=True)
+    dfs = [acceso_datos.leer_tabla(conn, tabla) for tabla in instantanea.TABLAS]
+    conn.close()
+    return dfs
+
+
+def _instantanea(ruta_db, ruta_instantanea):
+    lector = instantanea.Instantanea(ruta_instantanea)
+    conn = acceso_datos.conectar(ruta_db, solo_lectura=True)
+    version = leer_version(conn)
+    dfs = [lector.leer(conn, version, tabla, acceso_datos.POR_DEFECTO[tabla] if tabla in acceso_datos.POR_DEFECTO
+                       else list(acceso_datos.TABLAS[tabla]["columnas"]))
+           for tabla in instantanea.TABLAS]
+    conn.close()
+    if any(df is None for df in dfs):
+        raise RuntimeError("la instantanea no corresponde a la base de datos")
+    return dfs
+
+
+def _instantanea_uso(ruta_db, ruta_instantanea):
+    df_tickets, df_contactos = _instantanea(ruta_db, ruta_instantanea)
+    df_tickets.groupby("cliente", observed=True).agg(
+        n=("id_ticket", "size"), satisfaccion=("satisfaccion_cliente", "mean"),
+        mant=("es_mantenimiento", "sum"), apertura=("fecha_apertura", "min"), cierre=("fecha_cierre", "max"),
+        tipos=("tipo_incidencia", "nunique"))
+    df_contactos.groupby("id_emp", observed=True).agg(
+        n=("id_contacto", "size"), tickets=("id_ticket", "nunique"), horas=("tiempo", "sum"), ultima=("fecha", "max"))
+    return [df_tickets, df_contactos]
+
+
+LECTURAS = {
+    "read_sql_query": _read_sql_query,
+    "acceso_datos (SQLite)": _sqlite,
+    "instantanea": _instantanea,
+    "instantanea + uso": _instantanea_uso,
+}
+
+
+# Pico de RSS del proceso y RSS actual separado en memoria propia (anonima) y
+# paginas de ficheros mapeados, que se comparten con otros procesos (MiB).
+# ru_maxrss no sirve aqui: el hijo hereda el del padre, que ha generado los datos
+def _memoria():
+    campos = {}
+    with open("/proc/self/status") as f:
+        for linea in f:
+            nombre, _, valor = linea.partition(":")
+            if nombre in ("VmHWM", "RssAnon", "RssFile"):
+                campos[nombre] = int(valor.split()[0]) / 1024
+    return campos["VmHWM"], campos["RssAnon"], campos["RssFile"]
+
+
+def _ejecutar(nombre, ruta_db, ruta_instantanea, cola):
+    inicio = time.perf_counter()
+    dfs = LECTURAS[nombre](ruta_db, ruta_instantanea)
+    segundos = time.perf_counter() - inicio
+    filas = sum(len(df) for df in dfs)
+    cola.put((segundos, filas) + _memoria())
+
+
+def medir(nombre, ruta_db, ruta_instantanea):
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_ejecutar, args=(nombre, ruta_db, ruta_instantanea, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+def comparar(ruta_db, ruta_instantanea, repeticiones):
+    resultado = instantanea.generar(ruta_db, ruta_instantanea)
+    print(f"Instantanea generada en {resultado['segundos']:.2f} s: {resultado['filas']['tickets']} tickets, "
+          f"{resultado['filas']['contactos_empleados']} contactos")
+    print(f"{'lectura':<24} {'seg':>8} {'filas':>10} {'pico RSS MiB':>13} {'propia MiB':>11} {'mapeada MiB':>12}")
+    for nombre in LECTURAS:
+        # Mediana por tiempo de las repeticiones
+        medidas = sorted(medir(nombre, ruta_db, ruta_instantanea) for _ in range(repeticiones))
+        segundos, filas, pico, propia, mapeada = medidas[len(medidas) // 2]
+        print(f"{nombre:<24} {segundos:>8.3f} {filas:>10} {pico:>13.1f} {propia:>11.1f} {mapeada:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=1000000)
+    parser.add_argument("--db", help="base de datos ya cargada (no se genera ninguna)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_instantanea = os.path.join(tmp, "instantanea")
+        if args.db:
+            ruta_db = os.path.abspath(args.db)
+        else:
+            ruta_json = os.path.join(tmp, "datos.json")
+            ruta_db = os.path.join(tmp, "incidencias.db")
+            generador_datos.generar(ruta_json, args.tickets)
+            carga.cargar_streaming(ruta_json, ruta_db)
+            print(f"Tickets: {args.tickets}")
+        comparar(ruta_db, ruta_instantanea, args.repeticiones)
@@ -0,0 +1,176 @@
+# -----------------------------------------------------------------------------
+#        MICRO-BENCHMARK: GROUPBY DE PANDAS FRENTE A LOS NUCLEOS NUMPY
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio):
+#   python benchmarks/bench_nucleos.py --tickets 1000000
+#
+# Genera tickets y contactos sinteticos con los tipos de acceso_datos y mide
+# cada estadistica del dashboard calculada como hasta ahora (uno o varios
+# groupby de pandas) y con nucleos.Grupos. Cada par de resultados se compara:
+# debe ser identico salvo media y varianza, de las que se da la diferencia
+# maxima.
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import nucleos
+
+
+def datos_sinteticos(n_tickets, semilla):
+    rng = np.random.default_rng(semilla)
+    clientes = [str(i) for i in range(1, 501)]
+    tickets = pd.DataFrame({
+        "id_ticket": np.arange(1, n_tickets + 1, dtype=np.int32),
+        "cliente": pd.Categorical.from_codes(rng.integers(0, len(clientes), n_tickets), categories=clientes),
+        "satisfaccion_cliente": rng.integers(1, 11, n_tickets).astype(np.int8),
+        "tipo_incidencia": pd.Categorical.from_codes(rng.integers(0, 5, n_tickets), categories=list("12345")),
+        "duracion_dias": rng.integers(0, 30, n_tickets),
+    })
+    # Entre 1 y 4 contactos por ticket, como generador_datos.py
+    por_ticket = rng.integers(1, 5, n_tickets)
+    n_contactos = int(por_ticket.sum())
+    empleados = [str(i) for i in range(100, 180)]
+    contactos = pd.DataFrame({
+        "id_ticket": np.repeat(tickets["id_ticket"].to_numpy(), por_ticket),
+        "id_emp": pd.Categorical.from_codes(rng.integers(0, len(empleados), n_contactos), categories=empleados),
+        "fecha": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 730, n_contactos), unit="D"),
+        "tiempo": rng.integers(1, 7, n_contactos) * 0.5,
+    })
+    # Como en agrupaciones.preparar, el dia de la semana ya viene calculado
+    contactos["dia_semana"] = contactos["fecha"].dt.dayofweek
+    return tickets, contactos
+
+
+def _clientes_pandas(t, c):
+    return (t.groupby("cliente", observed=True).size(),
+            t[t["satisfaccion_cliente"] >= 5].groupby("cliente", observed=True).size())
+
+
+def _clientes_nucleos(t, c):
+    grupos = nucleos.Grupos(t["cliente"])
+    satisfechas = grupos.serie(grupos.contar(t["satisfaccion_cliente"] >= 5))
+    return grupos.serie(grupos.contar()), satisfechas[satisfechas > 0]
+
+
+def _horas_ticket_pandas(t, c):
+    return (c.groupby("id_ticket")["tiempo"].sum(),)
+
+
+def _horas_ticket_nucleos(t, c):
+    grupos = nucleos.Grupos(c["id_ticket"])
+    return (grupos.serie(grupos.sumar(c["tiempo"]), "tiempo"),)
+
+
+def _empleados_pandas(t, c):
+    return (c.groupby("id_emp", observed=True)["tiempo"].sum(),
+            c.groupby("id_emp", observed=True)["id_ticket"].nunique(),
+            c.groupby("id_emp", observed=True)["tiempo"].min(),
+            c.groupby("id_emp", observed=True)["tiempo"].max())
+
+
+def _empleados_nucleos(t, c):
+    grupos = nucleos.Grupos(c["id_emp"])
+    return (grupos.serie(grupos.sumar(c["tiempo"]), "tiempo"),
+            grupos.serie(grupos.distintos(c["id_ticket"]), "id_ticket"),
+            grupos.serie(grupos.minimo(c["tiempo"]), "tiempo"),
+            grupos.serie(grupos.maximo(c["tiempo"]), "tiempo"))
+
+
+def _percentiles_pandas(t, c):
+    grupos = t.groupby("tipo_incidencia", observed=True)["duracion_dias"]
+    return grupos.quantile(0.05), grupos.quantile(0.90)
+
+
+def _percentiles_nucleos(t, c):
+    grupos = nucleos.Grupos(t["tipo_incidencia"])
+    percentiles = grupos.cuantiles(t["duracion_dias"], [0.05, 0.90])
+    return (grupos.serie(percentiles[:, 0], "duracion_dias"), grupos.serie(percentiles[:, 1], "duracion_dias"))
+
+
+# Reales: cuantiles ordenando los valores de cada grupo
+def _percentiles_reales_pandas(t, c):
+    grupos = c.groupby("id_emp", observed=True)["tiempo"]
+    return grupos.quantile(0.05), grupos.quantile(0.90)
+
+
+def _percentiles_reales_nucleos(t, c):
+    grupos = nucleos.Grupos(c["id_emp"])
+    percentiles = grupos.cuantiles(c["tiempo"], [0.05, 0.90])
+    return (grupos.serie(percentiles[:, 0], "tiempo"), grupos.serie(percentiles[:, 1], "tiempo"))
+
+
+def _dia_semana_pandas(t, c):
+    return (c.groupby("dia_semana").size(),)
+
+
+def _dia_semana_nucleos(t, c):
+    grupos = nucleos.Grupos(c["dia_semana"])
+    return (grupos.serie(grupos.contar()),)
+
+
+def _resumen_pandas(t, c):
+    grupos = t.groupby("tipo_incidencia", observed=True)["duracion_dias"]
+    return (grupos.size(), grupos.min(), grupos.max()), (grupos.mean(), grupos.var())
+
+
+def _resumen_nucleos(t, c):
+    resumen = nucleos.Grupos(t["tipo_incidencia"]).resumen(t["duracion_dias"])
+    return (resumen["n"], resumen["minimo"], resumen["maximo"]), (resumen["media"], resumen["varianza"])
+
+
+CASOS = {
+    "conteos por cliente": (_clientes_pandas, _clientes_nucleos),
+    "horas por ticket": (_horas_ticket_pandas, _horas_ticket_nucleos),
+    "horas/tickets/min/max empleado": (_empleados_pandas, _empleados_nucleos),
+    "p5 y p90 por tipo": (_percentiles_pandas, _percentiles_nucleos),
+    "p5 y p90 horas por empleado": (_percentiles_reales_pandas, _percentiles_reales_nucleos),
+    "actuaciones por dia semana": (_dia_semana_pandas, _dia_semana_nucleos),
+    "resumen por tipo": (_resumen_pandas, _resumen_nucleos),
+}
+
+
+def _mejor(funcion, t, c, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(t, c)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+# Comprueba que los resultados coinciden; devuelve la diferencia maxima de las
+# medias y varianzas (0 en el resto de casos)
+def comprobar(nombre, esperado, obtenido):
+    if nombre == "resumen por tipo":
+        for a, b in zip(esperado[0], obtenido[0]):
+            np.testing.assert_array_equal(a.to_numpy(), b.to_numpy())
+        return max(float(np.nanmax(np.abs(a.to_numpy() - b.to_numpy()))) for a, b in zip(esperado[1], obtenido[1]))
+    for a, b in zip(esperado, obtenido):
+        pd.testing.assert_index_equal(a.index, b.index, exact=False)
+        np.testing.assert_array_equal(a.to_numpy(), b.to_numpy())
+    return 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=1000000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    tickets, contactos = datos_sinteticos(args.tickets, args.semilla)
+    print(f"Tickets: {len(tickets)}, Contactos: {len(contactos)} (mejor de {args.repeticiones})")
+    print(f"{'estadistica':<32} {'pandas ms':>10} {'nucleos ms':>11} {'x':>6} {'dif. max':>10}")
+    for nombre, (con_pandas, con_nucleos) in CASOS.items():
+        t_pandas, esperado = _mejor(con_pandas, tickets, contactos, args.repeticiones)
+        t_nucleos, obtenido = _mejor(con_nucleos, tickets, contactos, args.repeticiones)
+        diferencia = comprobar(nombre, esperado, obtenido)
+        print(f"{nombre:<32} {t_pandas * 1000:>10.1f} {t_nucleos * 1000:>11.1f} {t_pandas / t_nucleos:>6.1f} "
+              f"{diferencia:>10.1e}")
@@ -0,0 +1,276 @@
+# -----------------------------------------------------------------------------
+#       BENCHMARK: GUNICORN CON METRICAS POR WORKER FRENTE A COMPARTIDAS
+# -----------------------------------------------------------------------------
+# Uso (desde la raiz del repositorio, con gunicorn instalado):
+#   python benchmarks/bench_workers.py --tickets 100000 --workers 1 4 16
+#   python benchmarks/bench_workers.py --db incidencias.db --modos compartido --segundos 20
+#
+# Para cada modo y numero de workers arranca gunicorn -c gunicorn.conf.py sobre
+# una copia de la base de datos:
+#   - por_worker: cada worker calcula las metricas al arrancar (post_fork)
+#   - compartido: las calcula el maestro y los workers las heredan
+#     (INCIDENCIAS_ESTADO_COMPARTIDO=1, ver estado_compartido.py)
+# y mide:
+#   - arranque: desde lanzar gunicorn hasta que todos los workers estan
+#     precalentados
+#   - memoria de maestro + workers (de /proc/<pid>/smaps_rollup): suma de RSS
+#     (cuenta varias veces lo compartido), suma de PSS (lo compartido repartido
+#     entre los procesos que lo usan: la memoria real del conjunto) y memoria
+#     privada media por worker. Los procesos de los PDF (spawn, no comparten
+#     nada) van aparte
+#   - peticiones/s y latencia p50/p99 con --clientes procesos que piden sin
+#     pausa las rutas de --rutas durante --segundos
+#   - cambio de version: envia un ticket por POST /api/tickets y mide cuanto
+#     tarda /resultados en servir la version nueva (primera respuesta con otro
+#     ETag, y 3 x workers respuestas seguidas con el nuevo), la latencia p99
+#     durante el cambio y el PSS despues
+#
+# Sin --db se genera una base de datos sintetica con --tickets tickets.
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import acumuladores
+import almacen
+import carga
+import generador_datos
+
+RUTAS = ["/resultados", "/api/v1/estadisticas", "/api/v1/clientes/top", "/api/v1/desglose/cliente"]
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pedir(puerto, metodo, ruta, cuerpo=None):
+    conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=300)
+    try:
+        cabeceras = {"Content-Type": "application/json"} if cuerpo is not None else {}
+        conn.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+        respuesta = conn.getresponse()
+        respuesta.read()
+        return respuesta.status, respuesta.getheader("ETag")
+    finally:
+        conn.close()
+
+
+def _percentil(valores, q):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def _hijos(pid):
+    hijos = []
+    for tarea in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{tarea}/children") as f:
+                hijos += [int(p) for p in f.read().split()]
+        except FileNotFoundError:
+            pass
+    return hijos
+
+
+# Rss, Pss y memoria privada de un proceso, en MiB
+def _memoria(pid):
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) >= 2 and partes[1].isdigit():
+                valores[partes[0].rstrip(":")] = int(partes[1]) / 1024
+    return {"rss": valores.get("Rss", 0), "pss": valores.get("Pss", 0),
+            "privada": valores.get("Private_Clean", 0) + valores.get("Private_Dirty", 0)}
+
+
+def medir_memoria(maestro):
+    workers = _hijos(maestro)
+    servidor = [_memoria(maestro)] + [_memoria(pid) for pid in workers]
+    pdf = [_memoria(nieto) for pid in workers for nieto in _hijos(pid)]
+    return {
+        "procesos": len(servidor),
+        "rss": sum(m["rss"] for m in servidor),
+        "pss": sum(m["pss"] for m in servidor),
+        "privada_worker": sum(m["privada"] for m in servidor[1:]) / max(1, len(workers)),
+        "pss_pdf": sum(m["pss"] for m in pdf),
+    }
+
+
+def _cliente(puerto, rutas, segundos, indice, cola):
+    latencias, errores = [], 0
+    limite = time.monotonic() + segundos
+    i = indice
+    while time.monotonic() < limite:
+        inicio = time.perf_counter()
+        try:
+            estado, _ = _pedir(puerto, "GET", rutas[i % len(rutas)])
+        except OSError:
+            estado = None
+        latencias.append(time.perf_counter() - inicio)
+        errores += estado != 200
+        i += 1
+    cola.put((latencias, errores))
+
+
+def carga_http(puerto, rutas, n_clientes, segundos):
+    contexto = multiprocessing.get_context("fork")
+    cola = contexto.Queue()
+    clientes = [contexto.Process(target=_cliente, args=(puerto, rutas, segundos, i, cola)) for i in range(n_clientes)]
+    inicio = time.perf_counter()
+    for cliente in clientes:
+        cliente.start()
+    resultados = [cola.get() for _ in clientes]
+    for cliente in clientes:
+        cliente.join()
+    duracion = time.perf_counter() - inicio
+    latencias = [x for lat, _ in resultados for x in lat]
+    return {"peticiones_s": len(latencias) / duracion, "p50": _percentil(latencias, 0.5),
+            "p99": _percentil(latencias, 0.99), "errores": sum(e for _, e in resultados)}
+
+
+def _precalentados(ruta_log):
+    with open(ruta_log, encoding="utf-8", errors="replace") as f:
+        return f.read().count("aplicacion precalentada")
+
+
+def arrancar(modo, n_workers, puerto, entorno, ruta_log, timeout):
+    entorno = dict(entorno, INCIDENCIAS_WORKERS=str(n_workers), INCIDENCIAS_BIND=f"127.0.0.1:{puerto}",
+                   INCIDENCIAS_ESTADO_COMPARTIDO="1" if modo == "compartido" else "0",
+                   INCIDENCIAS_INTERVALO_ESTADO="1", INCIDENCIAS_TIMEOUT=str(timeout))
+    inicio = time.perf_counter()
+    log = open(ruta_log, "w")
+    proceso = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=RAIZ,
+                               env=entorno, stdout=log, stderr=subprocess.STDOUT)
+    limite = time.monotonic() + timeout
+    while _precalentados(ruta_log) < n_workers:
+        if proceso.poll() is not None or time.monotonic() > limite:
+            proceso.kill()
+            raise RuntimeError(f"gunicorn no ha arrancado, ver {ruta_log}")
+        time.sleep(0.1)
+    return proceso, time.perf_counter() - inicio
+
+
+# Un ticket valido con los ids de la propia base de datos
+def _ticket(ruta_db):
+    conn = sqlite3.connect(ruta_db)
+    cliente, tipo = conn.execute("SELECT cliente, tipo_incidencia FROM tickets LIMIT 1").fetchone()
+    id_emp = conn.execute("SELECT id_emp FROM contactos_empleados LIMIT 1").fetchone()[0]
+    conn.close()
+    return {"cliente": cliente, "fecha_apertura": "2026-01-05", "fecha_cierre": "2026-01-06",
+            "es_mantenimiento": False, "satisfaccion_cliente": 7, "tipo_incidencia": int(tipo),
+            "contactos_con_empleados": [{"id_emp": id_emp, "fecha": "2026-01-06", "tiempo": 1.5}]}
+
+
+def cambiar_version(puerto, ruta_db, n_workers, timeout):
+    _, anterior = _pedir(puerto, "GET", "/resultados")
+    estado, _ = _pedir(puerto, "POST", "/api/tickets", json.dumps(_ticket(ruta_db)).encode("utf-8"))
+    if estado != 202:
+        raise RuntimeError(f"POST /api/tickets devolvio {estado}")
+    inicio = time.perf_counter()
+    primera, seguidas, latencias = None, 0, []
+    while seguidas < 3 * n_workers:
+        if time.perf_counter() - inicio > timeout:
+            raise RuntimeError("la version nueva no ha llegado a todos los workers")
+        antes = time.perf_counter()
+        try:
+            estado, etag = _pedir(puerto, "GET", "/resultados")
+        except OSError:
+            estado, etag = None, None
+        latencias.append(time.perf_counter() - antes)
+        if estado == 200 and etag != anterior:
+            primera = primera or time.perf_counter() - inicio
+            seguidas += 1
+        else:
+            seguidas = 0
+            time.sleep(0.05)
+    return {"primera": primera, "todos": time.perf_counter() - inicio, "p99": _percentil(latencias, 0.99)}
+
+
+def parar(proceso):
+    proceso.send_signal(signal.SIGTERM)
+    try:
+        proceso.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=100000, help="tickets de la base de datos sintetica")
+    parser.add_argument("--db", help="base de datos ya cargada (se trabaja sobre una copia)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--modos", nargs="+", choices=["por_worker", "compartido"],
+                        default=["por_worker", "compartido"])
+    parser.add_argument("--clientes", type=int, default=8, help="procesos que hacen peticiones")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--rutas", nargs="+", default=RUTAS)
+    parser.add_argument("--timeout", type=int, default=900, help="segundos maximos de arranque y de cambio")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = os.path.join(tmp, "original.db")
+        if args.db:
+            origen = sqlite3.connect(args.db)
+            destino = sqlite3.connect(original)
+            origen.backup(destino)
+            origen.close()
+            destino.close()
+        else:
+            ruta_json = os.path.join(tmp, "datos.json")
+            generador_datos.generar(ruta_json, args.tickets)
+            carga.cargar_streaming(ruta_json, original)
+            os.remove(ruta_json)
+        conn = carga.conectar_escritura(original)
+        almacen.refrescar(conn)
+        acumuladores.refrescar(conn)
+        conn.close()
+
+        print(f"{args.clientes} clientes HTTP, {args.segundos:.0f} s por medida, rutas: {' '.join(args.rutas)}")
+        print(f"{'modo':>11} {'workers':>7} {'arranque':>9} {'RSS':>9} {'PSS':>9} {'priv/wk':>8} {'PSS PDF':>8} "
+              f"{'pet/s':>7} {'p50':>8} {'p99':>8} {'cambio':>7} {'todos':>7} {'p99 cb':>8} {'PSS tras':>9}")
+        for modo in args.modos:
+            for n_workers in args.workers:
+                # Cada servidor con su copia de la base de datos, sin instantanea
+                ruta_db = os.path.join(tmp, f"{modo}_{n_workers}.db")
+                shutil.copy(original, ruta_db)
+                entorno = dict(os.environ, INCIDENCIAS_DB=ruta_db,
+                               INCIDENCIAS_INSTANTANEA=os.path.join(tmp, f"instantanea_{modo}_{n_workers}"))
+                puerto = _puerto_libre()
+                ruta_log = os.path.join(tmp, f"gunicorn_{modo}_{n_workers}.log")
+                proceso, arranque = arrancar(modo, n_workers, puerto, entorno, ruta_log, args.timeout)
+                try:
+                    # Una pasada para que cada worker tenga sus paginas en cache
+                    for i in range(2 * n_workers * len(args.rutas)):
+                        _pedir(puerto, "GET", args.rutas[i % len(args.rutas)])
+                    memoria = medir_memoria(proceso.pid)
+                    r = carga_http(puerto, args.rutas, args.clientes, args.segundos)
+                    cambio = cambiar_version(puerto, ruta_db, n_workers, args.timeout)
+                    # Los workers anteriores pueden tardar en salir
+                    time.sleep(2)
+                    despues = medir_memoria(proceso.pid)
+                finally:
+                    parar(proceso)
+                print(f"{modo:>11} {n_workers:>7} {arranque:>8.1f}s {memoria['rss']:>7.0f}MB {memoria['pss']:>7.0f}MB "
+                      f"{memoria['privada_worker']:>6.0f}MB {memoria['pss_pdf']:>6.0f}MB {r['peticiones_s']:>7.0f} "
+                      f"{r['p50'] * 1000:>6.1f}ms {r['p99'] * 1000:>6.1f}ms {cambio['primera']:>6.1f}s "
+                      f"{cambio['todos']:>6.1f}s {cambio['p99'] * 1000:>6.0f}ms {despues['pss']:>7.0f}MB")
+                if r["errores"]:
+                    print(f"  {r['errores']} respuestas distintas de 200")
@@ -0,0 +1,582 @@
+# -----------------------------------------------------------------------------
+#         BOCETOS: CUANTILES Y CONTEOS DE DISTINTOS APROXIMADOS POR DIA
+# -----------------------------------------------------------------------------
+# Modo opcional (INCIDENCIAS_BOCETOS=1) para volumenes en los que no caben en
+# memoria las listas de duraciones del boxplot ni los conjuntos de tickets de
+# cada empleado. Se guardan en incidencias.db resumenes de tamano acotado por
+# dia que se pueden unir para cualquier rango de fechas:
+#   - bocetos_duracion_dia: por fecha_apertura, tipo y mantenimiento, un boceto
+#     de cuantiles de la duracion en dias (cubetas logaritmicas, estilo
+#     DDSketch: cada cuantil tiene un error relativo <= INCIDENCIAS_BOCETOS_ERROR)
+#   - bocetos_tickets_dia: por fecha del contacto, empleado, tipo y
+#     mantenimiento, un HyperLogLog de los tickets atendidos (2^p registros,
+#     error tipico 1.04 / sqrt(2^p) con p = INCIDENCIAS_BOCETOS_HLL)
+# Unir dos bocetos es sumar cubetas o quedarse con el maximo de cada registro,
+# asi que el resultado no depende del orden ni de como se agrupen los dias.
+#
+# El refresco recalcula solo los dias con tickets o contactos nuevos, igual
+# que almacen.py; tras una carga completa o si cambian los parametros se
+# reconstruye todo. Con los bocetos desactivados o sin refrescar, graficos.py
+# y la API usan el calculo exacto de siempre.
+#
+# Variables de entorno:
+#   INCIDENCIAS_BOCETOS        1 para usar los bocetos (0)
+#   INCIDENCIAS_BOCETOS_ERROR  error relativo de los cuantiles (0.01)
+#   INCIDENCIAS_BOCETOS_HLL    bits de precision del HyperLogLog, 4..16 (12)
+#
+# Uso:
+#   python bocetos.py [incidencias.db] [--completo]
+
+import argparse
+import math
+import os
+import struct
+import time
+
+import numpy as np
+
+import conexiones
+
+ACTIVADOS = os.environ.get("INCIDENCIAS_BOCETOS", "0") == "1"
+ERROR_CUANTILES = float(os.environ.get("INCIDENCIAS_BOCETOS_ERROR", "0.01"))
+PRECISION_HLL = int(os.environ.get("INCIDENCIAS_BOCETOS_HLL", "12"))
+
+# Filas por fetchmany al construir los bocetos
+FILAS_POR_LECTURA = 200000
+
+# -----------------------------------------------------------------------------
+# Boceto de cuantiles
+# -----------------------------------------------------------------------------
+
+class _Cubetas:
+    def __init__(self, inicio=0, conteos=None):
+        self.inicio = inicio
+        self.conteos = np.zeros(0, dtype=np.int64) if conteos is None else conteos
+
+    def _ampliar(self, minimo, maximo):
+        if not len(self.conteos):
+            self.inicio, self.conteos = minimo, np.zeros(maximo - minimo + 1, dtype=np.int64)
+            return
+        inicio, fin = min(self.inicio, minimo), max(self.inicio + len(self.conteos) - 1, maximo)
+        if (inicio, fin) != (self.inicio, self.inicio + len(self.conteos) - 1):
+            conteos = np.zeros(fin - inicio + 1, dtype=np.int64)
+            conteos[self.inicio - inicio:self.inicio - inicio + len(self.conteos)] = self.conteos
+            self.inicio, self.conteos = inicio, conteos
+
+    def agregar(self, indices):
+        if not len(indices):
+            return
+        minimo, maximo = int(indices.min()), int(indices.max())
+        self._ampliar(minimo, maximo)
+        self.conteos += np.bincount(indices - self.inicio, minlength=len(self.conteos))
+
+    def unir(self, otras):
+        if not len(otras.conteos):
+            return
+        self._ampliar(otras.inicio, otras.inicio + len(otras.conteos) - 1)
+        desde = otras.inicio - self.inicio
+        self.conteos[desde:desde + len(otras.conteos)] += otras.conteos
+
+
+# Cuantiles con error relativo acotado: cada valor cae en la cubeta
+# ceil(log_gamma(|x|)), con gamma = (1 + error) / (1 - error), y se devuelve el
+# centro de la cubeta. Los ceros (y los valores muy pequenos) se cuentan aparte.
+class Cuantiles:
+    MINIMO = 1e-9
+
+    def __init__(self, error=None):
+        self.error = ERROR_CUANTILES if error is None else error
+        if not 0 < self.error < 1:
+            raise ValueError("el error relativo de los cuantiles debe estar entre 0 y 1")
+        self.gamma = (1 + self.error) / (1 - self.error)
+        self._log_gamma = math.log(self.gamma)
+        self.positivos, self.negativos = _Cubetas(), _Cubetas()
+        self.ceros = 0
+        self.minimo, self.maximo = math.inf, -math.inf
+
+    @property
+    def n(self):
+        return self.ceros + int(self.positivos.conteos.sum()) + int(self.negativos.conteos.sum())
+
+    def _indices(self, valores):
+        return np.ceil(np.log(valores) / self._log_gamma).astype(np.int64)
+
+    def agregar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        if not len(valores):
+            return self
+        self.minimo = min(self.minimo, float(valores.min()))
+        self.maximo = max(self.maximo, float(valores.max()))
+        positivos = valores[valores > self.MINIMO]
+        negativos = -valores[valores < -self.MINIMO]
+        self.ceros += len(valores) - len(positivos) - len(negativos)
+        self.positivos.agregar(self._indices(positivos))
+        self.negativos.agregar(self._indices(negativos))
+        return self
+
+    def unir(self, otro):
+        if otro.error != self.error:
+            raise ValueError("solo se pueden unir bocetos con el mismo error relativo")
+        self.positivos.unir(otro.positivos)
+        self.negativos.unir(otro.negativos)
+        self.ceros += otro.ceros
+        self.minimo, self.maximo = min(self.minimo, otro.minimo), max(self.maximo, otro.maximo)
+        return self
+
+    def _valores(self, cubetas):
+        indices = np.arange(cubetas.inicio, cubetas.inicio + len(cubetas.conteos))
+        return 2 * self.gamma ** indices.astype(np.float64) / (self.gamma + 1)
+
+    # Cuantiles q (0..1) sobre el rango q * (n - 1), como el metodo 'lower'
+    def cuantiles(self, qs):
+        n = self.n
+        if not n:
+            return [math.nan] * len(qs)
+        valores = np.concatenate([-self._valores(self.negativos)[::-1], [0.0], self._valores(self.positivos)])
+        conteos = np.concatenate([self.negativos.conteos[::-1], [self.ceros], self.positivos.conteos])
+        acumulados = np.cumsum(conteos)
+        posiciones = np.searchsorted(acumulados, [q * (n - 1) for q in qs], side="right")
+        resultado = [min(max(float(valores[i]), self.minimo), self.maximo) for i in posiciones]
+        # El minimo y el maximo se guardan exactos
+        return [self.minimo if q <= 0 else self.maximo if q >= 1 else r for q, r in zip(qs, resultado)]
+
+    def cuantil(self, q):
+        return self.cuantiles([q])[0]
+
+    def a_bytes(self):
+        partes = [struct.pack("<dqdd", self.error, self.ceros, self.minimo, self.maximo)]
+        for cubetas in (self.positivos, self.negativos):
+            partes.append(struct.pack("<qi", cubetas.inicio, len(cubetas.conteos)))
+            partes.append(cubetas.conteos.astype("<i8").tobytes())
+        return b"".join(partes)
+
+    @classmethod
+    def de_bytes(cls, datos):
+        error, ceros, minimo, maximo = struct.unpack_from("<dqdd", datos)
+        boceto = cls(error)
+        boceto.ceros, boceto.minimo, boceto.maximo = ceros, minimo, maximo
+        posicion = struct.calcsize("<dqdd")
+        for nombre in ("positivos", "negativos"):
+            inicio, longitud = struct.unpack_from("<qi", datos, posicion)
+            posicion += struct.calcsize("<qi")
+            conteos = np.frombuffer(datos, dtype="<i8", count=longitud, offset=posicion).astype(np.int64)
+            posicion += 8 * longitud
+            setattr(boceto, nombre, _Cubetas(inicio, conteos))
+        return boceto
+
+
+# -----------------------------------------------------------------------------
+# HyperLogLog
+# -----------------------------------------------------------------------------
+
+# splitmix64: mezcla los bits de enteros consecutivos (los ids)
+def _mezclar(valores):
+    z = np.asarray(valores).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _longitud_bits(x):
+    x = x.copy()
+    for desplazamiento in (1, 2, 4, 8, 16, 32):
+        x |= x >> np.uint64(desplazamiento)
+    return np.bitwise_count(x).astype(np.int64)
+
+
+# Registro (primeros p bits del hash) y rango (posicion del primer 1 en los
+# bits que quedan; todo ceros: el maximo) de cada valor
+def _registros(valores, p):
+    h = _mezclar(valores)
+    registros = (h >> np.uint64(64 - p)).astype(np.intp)
+    rangos = np.minimum(65 - _longitud_bits(h << np.uint64(p)), 65 - p)
+    return registros, rangos.astype(np.uint8)
+
+
+# Estimacion de cada fila de una matriz de registros
+def _estimar(registros, p):
+    m = 1 << p
+    alfa = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    # 2^-registro sumado por filas, a trozos de 2^20 registros como mucho
+    potencias = np.ldexp(1.0, -np.arange(66))
+    paso = max(1, 2**20 // m)
+    suma = np.concatenate([potencias[registros[i:i + paso]].sum(axis=1) for i in range(0, len(registros), paso)])
+    estimacion = alfa * m * m / suma
+    # Pocos elementos: recuento lineal de los registros vacios
+    vacios = np.count_nonzero(registros == 0, axis=1)
+    lineal = (estimacion <= 2.5 * m) & (vacios > 0)
+    estimacion[lineal] = m * np.log(m / vacios[lineal])
+    return estimacion
+
+
+# Conteo aproximado de enteros distintos en 2^p registros de un byte. Los
+# conjuntos pequenos se guardan como parejas (registro, rango) no nulas.
+class HyperLogLog:
+    def __init__(self, precision=None):
+        self.p = PRECISION_HLL if precision is None else precision
+        if not 4 <= self.p <= 16:
+            raise ValueError("la precision del HyperLogLog debe estar entre 4 y 16 bits")
+        self.m = 1 << self.p
+        self.registros = np.zeros(self.m, dtype=np.uint8)
+
+    def agregar(self, valores):
+        registros, rangos = _registros(valores, self.p)
+        np.maximum.at(self.registros, registros, rangos)
+        return self
+
+    def unir(self, otro):
+        if otro.p != self.p:
+            raise ValueError("solo se pueden unir HyperLogLog con la misma precision")
+        np.maximum(self.registros, otro.registros, out=self.registros)
+        return self
+
+    def estimar(self):
+        return float(_estimar(self.registros[np.newaxis], self.p)[0])
+
+    def a_bytes(self):
+        ocupados = np.flatnonzero(self.registros)
+        return _hll_bytes(self.p, ocupados, self.registros[ocupados])
+
+    @classmethod
+    def de_bytes(cls, datos):
+        formato, p = struct.unpack_from("<cB", datos)
+        boceto = cls(p)
+        if formato == b"D":
+            boceto.registros = np.frombuffer(datos, dtype=np.uint8, offset=2).copy()
+        else:
+            n = (len(datos) - 2) // 3
+            ocupados = np.frombuffer(datos, dtype="<u2", count=n, offset=2).astype(np.intp)
+            boceto.registros[ocupados] = np.frombuffer(datos, dtype=np.uint8, count=n, offset=2 + 2 * n)
+        return boceto
+
+
+def _hll_bytes(p, ocupados, rangos):
+    if 3 * len(ocupados) < (1 << p):
+        return struct.pack("<cB", b"S", p) + ocupados.astype("<u2").tobytes() + rangos.tobytes()
+    registros = np.zeros(1 << p, dtype=np.uint8)
+    registros[ocupados] = rangos
+    return struct.pack("<cB", b"D", p) + registros.tobytes()
+
+
+# Los HyperLogLog serializados de muchos grupos a la vez (los valores de cada
+# grupo, consecutivos, empiezan en 'inicios'): una sola pasada de NumPy en vez
+# de un objeto por grupo, que es lo que cuesta cuando los grupos son pequenos
+def hll_por_grupo(valores, inicios, precision=None):
+    p = HyperLogLog(precision).p
+    registros, rangos = _registros(valores, p)
+    grupos = np.repeat(np.arange(len(inicios)), np.diff(np.append(inicios, len(valores))))
+    claves = grupos.astype(np.int64) << p | registros
+    # Por cada (grupo, registro), el rango maximo: el ultimo tras ordenar
+    orden = np.lexsort((rangos, claves))
+    claves = claves[orden]
+    ultimos = np.append(claves[1:] != claves[:-1], True)
+    claves, rangos = claves[ultimos], rangos[orden][ultimos]
+    cortes = np.searchsorted(claves >> p, np.arange(len(inicios) + 1))
+    ocupados = claves & ((1 << p) - 1)
+    return [_hll_bytes(p, ocupados[a:b], rangos[a:b]) for a, b in zip(cortes[:-1], cortes[1:])]
+
+
+# Suma a la matriz de registros unos HyperLogLog dispersos (codigo de fila de
+# cada uno): se concatenan y las posiciones de sus registros y rangos se
+# calculan con NumPy, sin decodificarlos uno a uno
+def _unir_dispersos(registros, codigos, dispersos):
+    longitudes = np.array([len(datos) for datos in dispersos])
+    n = (longitudes - 2) // 3
+    inicios = np.cumsum(longitudes) - longitudes
+    bytes_ = np.frombuffer(b"".join(dispersos), dtype=np.uint8)
+    # Posicion j de cada registro dentro de su boceto
+    j = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    base, n_rep = np.repeat(inicios, n), np.repeat(n, n)
+    ocupados = bytes_[base + 2 + 2 * j].astype(np.intp) | bytes_[base + 3 + 2 * j].astype(np.intp) << 8
+    filas = np.repeat(np.asarray(codigos, dtype=np.intp), n)
+    np.maximum.at(registros.reshape(-1), filas * registros.shape[1] + ocupados, bytes_[base + 2 + 2 * n_rep + j])
+
+
+# Une por clave muchos HyperLogLog serializados y estima cada union. Los
+# dispersos (casi todos los de un dia) se procesan de BOCETOS_POR_UNION en
+# BOCETOS_POR_UNION.
+BOCETOS_POR_UNION = 20000
+
+
+def estimar_unidos(filas, precision=None):
+    p = HyperLogLog(precision).p
+    claves, codigos, densos, dispersos = {}, [], [], []
+    for clave, datos in filas:
+        formato, p_datos = struct.unpack_from("<cB", datos)
+        if p_datos != p:
+            raise ValueError("solo se pueden unir HyperLogLog con la misma precision")
+        codigo = claves.setdefault(clave, len(claves))
+        if formato == b"D":
+            densos.append((codigo, datos))
+        else:
+            codigos.append(codigo)
+            dispersos.append(datos)
+    registros = np.zeros((len(claves), 1 << p), dtype=np.uint8)
+    for codigo, datos in densos:
+        np.maximum(registros[codigo], np.frombuffer(datos, dtype=np.uint8, offset=2), out=registros[codigo])
+    for i in range(0, len(dispersos), BOCETOS_POR_UNION):
+        _unir_dispersos(registros, codigos[i:i + BOCETOS_POR_UNION], dispersos[i:i + BOCETOS_POR_UNION])
+    estimaciones = _estimar(registros, p) if claves else []
+    return dict(sorted(zip(claves, (float(e) for e in estimaciones))))
+
+
+# -----------------------------------------------------------------------------
+# Tablas de bocetos por dia
+# -----------------------------------------------------------------------------
+
+ESQUEMA_BOCETOS = [
+    """
+    CREATE TABLE IF NOT EXISTS bocetos_duracion_dia(
+        fecha TEXT,
+        tipo_incidencia TEXT,
+        es_mantenimiento INTEGER,
+        boceto BLOB,
+        PRIMARY KEY (fecha, tipo_incidencia, es_mantenimiento)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bocetos_tickets_dia(
+        fecha TEXT,
+        id_emp TEXT,
+        tipo_incidencia TEXT,
+        es_mantenimiento INTEGER,
+        boceto BLOB,
+        PRIMARY KEY (fecha, id_emp, tipo_incidencia, es_mantenimiento)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS control_bocetos(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        id_carga INTEGER,
+        max_id_ticket INTEGER,
+        max_id_contacto INTEGER,
+        error_cuantiles REAL,
+        precision_hll INTEGER,
+        fecha_refresco TEXT
+    );
+    """,
+]
+
+# Duracion en dias completos, como en el boxplot exacto de graficos.py
+DURACIONES = """
+    SELECT fecha_apertura, tipo_incidencia, es_mantenimiento,
+           CAST(julianday(fecha_cierre) - julianday(fecha_apertura) AS INTEGER)
+    FROM tickets
+    WHERE fecha_cierre IS NOT NULL {filtro}
+    ORDER BY fecha_apertura, tipo_incidencia, es_mantenimiento
+"""
+
+TICKETS = """
+    SELECT c.fecha, c.id_emp, t.tipo_incidencia, t.es_mantenimiento, c.id_ticket
+    FROM contactos_empleados c
+    JOIN tickets t ON t.id_ticket = c.id_ticket
+    WHERE c.id_emp IS NOT NULL {filtro}
+    ORDER BY c.fecha, c.id_emp, t.tipo_incidencia, t.es_mantenimiento
+"""
+
+
+def crear_esquema_bocetos(cursor):
+    for sentencia in ESQUEMA_BOCETOS:
+        cursor.execute(sentencia)
+
+
+def _existe_tabla(cursor, nombre):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+    ).fetchone() is not None
+
+
+# Recorre las filas (ordenadas por la clave) a trozos de FILAS_POR_LECTURA y
+# guarda un boceto por clave; las filas de la ultima clave de cada trozo pasan
+# al siguiente, de modo que cada clave se procesa entera una sola vez
+def _guardar(cursor, consulta, tabla, n_clave, crear):
+    insertar = f"INSERT OR REPLACE INTO {tabla} VALUES ({', '.join('?' * (n_clave + 1))})"
+    escritor = cursor.connection.cursor()
+    cursor.execute(consulta)
+    n, pendientes = 0, []
+    while True:
+        leidas = cursor.fetchmany(FILAS_POR_LECTURA)
+        filas = pendientes + leidas
+        if not filas:
+            break
+        corte = len(filas)
+        if leidas:
+            ultima = filas[-1][:n_clave]
+            while corte > 0 and filas[corte - 1][:n_clave] == ultima:
+                corte -= 1
+            if corte == 0:
+                pendientes = filas
+                continue
+        filas, pendientes = filas[:corte], filas[corte:]
+        claves = [fila[:n_clave] for fila in filas]
+        inicios = [0] + [i for i in range(1, len(claves)) if claves[i] != claves[i - 1]]
+        valores = np.array([fila[n_clave] for fila in filas])
+        escritor.executemany(insertar, [claves[i] + (datos,)
+                                        for i, datos in zip(inicios, crear(valores, np.array(inicios)))])
+        n += len(inicios)
+    return n
+
+
+def _construir(cursor, filtro_tickets="", filtro_contactos="", error=None, precision=None):
+    def cuantiles(valores, inicios):
+        return [Cuantiles(error).agregar(valores[a:b]).a_bytes()
+                for a, b in zip(inicios, np.append(inicios[1:], len(valores)))]
+
+    n = _guardar(cursor, DURACIONES.format(filtro=filtro_tickets), "bocetos_duracion_dia", 3, cuantiles)
+    return n + _guardar(cursor, TICKETS.format(filtro=filtro_contactos), "bocetos_tickets_dia", 4,
+                        lambda valores, inicios: hll_por_grupo(valores, inicios, precision))
+
+
+# Solo los dias con tickets o contactos nuevos (y el dia de apertura de los
+# tickets antiguos con contactos nuevos, cuya duracion puede cambiar)
+def _refrescar_dias(cursor, max_id_ticket, max_id_contacto, error, precision):
+    cursor.execute("DROP TABLE IF EXISTS temp.dias_bocetos_tickets")
+    cursor.execute("DROP TABLE IF EXISTS temp.dias_bocetos_contactos")
+    cursor.execute("""
+        CREATE TEMP TABLE dias_bocetos_tickets AS
+        SELECT fecha_apertura AS fecha FROM tickets WHERE id_ticket > ?
+        UNION
+        SELECT t.fecha_apertura FROM contactos_empleados c
+        JOIN tickets t ON t.id_ticket = c.id_ticket
+        WHERE c.id_contacto > ?
+    """, (max_id_ticket, max_id_contacto))
+    cursor.execute("""
+        CREATE TEMP TABLE dias_bocetos_contactos AS
+        SELECT DISTINCT fecha FROM contactos_empleados WHERE id_contacto > ?
+    """, (max_id_contacto,))
+    cursor.execute("DELETE FROM bocetos_duracion_dia WHERE fecha IN (SELECT fecha FROM temp.dias_bocetos_tickets)")
+    cursor.execute("DELETE FROM bocetos_tickets_dia WHERE fecha IN (SELECT fecha FROM temp.dias_bocetos_contactos)")
+    n = _construir(cursor,
+                   "AND fecha_apertura IN (SELECT fecha FROM temp.dias_bocetos_tickets)",
+                   "AND c.fecha IN (SELECT fecha FROM temp.dias_bocetos_contactos)",
+                   error, precision)
+    cursor.execute("DROP TABLE temp.dias_bocetos_tickets")
+    cursor.execute("DROP TABLE temp.dias_bocetos_contactos")
+    return n
+
+
+def _marcas(cursor):
+    id_carga = 0
+    if _existe_tabla(cursor, "control_cargas"):
+        id_carga = cursor.execute("SELECT COALESCE(MAX(id_carga), 0) FROM control_cargas").fetchone()[0]
+    return (id_carga,) + tuple(cursor.execute("""
+        SELECT (SELECT COALESCE(MAX(id_ticket), 0) FROM tickets),
+               (SELECT COALESCE(MAX(id_contacto), 0) FROM contactos_empleados)
+    """).fetchone())
+
+
+def _leer_control(cursor):
+    return cursor.execute("""
+        SELECT id_carga, max_id_ticket, max_id_contacto, error_cuantiles, precision_hll
+        FROM control_bocetos WHERE id = 1
+    """).fetchone()
+
+
+# Refresco dentro de una transaccion ya abierta
+def actualizar(cursor, completo=False, error=None, precision=None):
+    error = ERROR_CUANTILES if error is None else error
+    precision = PRECISION_HLL if precision is None else precision
+    crear_esquema_bocetos(cursor)
+    id_carga, max_id_ticket, max_id_contacto = _marcas(cursor)
+    control = _leer_control(cursor)
+
+    if not completo and control is not None and _existe_tabla(cursor, "control_cargas"):
+        completo = cursor.execute(
+            "SELECT 1 FROM control_cargas WHERE id_carga > ? AND modo = 'completa' LIMIT 1", (control[0],)
+        ).fetchone() is not None
+    if completo or control is None or (control[3], control[4]) != (error, precision):
+        cursor.execute("DELETE FROM bocetos_duracion_dia")
+        cursor.execute("DELETE FROM bocetos_tickets_dia")
+        modo, n = "completo", _construir(cursor, error=error, precision=precision)
+    else:
+        modo, n = "incremental", _refrescar_dias(cursor, control[1], control[2], error, precision)
+
+    cursor.execute("""
+        INSERT OR REPLACE INTO control_bocetos(id, id_carga, max_id_ticket, max_id_contacto,
+                                               error_cuantiles, precision_hll, fecha_refresco)
+        VALUES (1, ?, ?, ?, ?, ?, datetime('now'))
+    """, (id_carga, max_id_ticket, max_id_contacto, error, precision))
+    return modo, n
+
+
+def refrescar(conn, completo=False, error=None, precision=None):
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        modo, n = actualizar(cursor, completo, error, precision)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"modo": modo, "bocetos": n, "segundos": time.perf_counter() - inicio}
+
+
+# Los bocetos estan al dia con los datos (y se pueden usar en lugar del calculo exacto)
+def al_dia(conn):
+    cursor = conn.cursor()
+    if not _existe_tabla(cursor, "control_bocetos"):
+        return False
+    control = _leer_control(cursor)
+    return control is not None and tuple(control[:3]) == _marcas(cursor)
+
+
+# -----------------------------------------------------------------------------
+# Lectura: union de los bocetos de un rango de fechas
+# -----------------------------------------------------------------------------
+
+def _where(desde, hasta, tipos, mantenimiento):
+    condiciones, parametros = [], []
+    if desde:
+        condiciones.append("fecha >= ?")
+        parametros.append(desde)
+    if hasta:
+        condiciones.append("fecha <= ?")
+        parametros.append(hasta)
+    if tipos:
+        condiciones.append(f"tipo_incidencia IN ({', '.join('?' * len(tipos))})")
+        parametros.extend(tipos)
+    if mantenimiento is not None:
+        condiciones.append("es_mantenimiento = ?")
+        parametros.append(mantenimiento)
+    return ("WHERE " + " AND ".join(condiciones)) if condiciones else "", parametros
+
+
+def _unir(filas, leer):
+    unidos = {}
+    for clave, datos in filas:
+        boceto = leer(datos)
+        if clave in unidos:
+            unidos[clave].unir(boceto)
+        else:
+            unidos[clave] = boceto
+    return dict(sorted(unidos.items()))
+
+
+# Boceto de la duracion de los tickets abiertos en el rango, por tipo
+def duraciones(conn, desde=None, hasta=None, tipos=None, mantenimiento=None):
+    where, parametros = _where(desde, hasta, tipos, mantenimiento)
+    filas = conn.execute(f"SELECT tipo_incidencia, boceto FROM bocetos_duracion_dia {where}", parametros)
+    return _unir(filas, Cuantiles.de_bytes)
+
+
+# Tickets distintos (estimados) de cada empleado con contactos en el rango
+def tickets_por_empleado(conn, desde=None, hasta=None, tipos=None, mantenimiento=None):
+    where, parametros = _where(desde, hasta, tipos, mantenimiento)
+    filas = conn.execute(f"SELECT id_emp, boceto FROM bocetos_tickets_dia {where}", parametros)
+    return {id_emp: round(estimacion) for id_emp, estimacion in estimar_unidos(filas).items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresca los bocetos por dia de duraciones y tickets distintos")
+    parser.add_argument("db", nargs="?", default=conexiones.RUTA_DB)
+    parser.add_argument("--completo", action="store_true", help="reconstruye todos los bocetos")
+    args = parser.parse_args()
+
+    conn = conexiones.conectar_escritura(args.db)
+    resultado = refrescar(conn, args.completo)
+    conn.close()
+    print(f"Bocetos {'reconstruidos' if resultado['modo'] == 'completo' else 'refrescados'}: "
+          f"{resultado['bocetos']} guardados en {resultado['segundos']:.2f} s")
@@ -0,0 +1,138 @@
+# -----------------------------------------------------------------------------
+#                     CACHE DE RESPUESTAS DEL DASHBOARD
+# -----------------------------------------------------------------------------
+# Las paginas del dashboard solo cambian cuando hay una carga nueva, asi que se
+# guardan ya renderizadas con clave (ruta, argumentos, version de los datos) en
+# una cache LRU acotada por numero de entradas y por bytes.
+#
+# El ETag se obtiene de esa misma clave, de modo que una peticion condicional
+# (If-None-Match) se responde con 304 sin renderizar ni consultar la cache.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request
+
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+
+# Semilla de los ETag: INCIDENCIAS_ETAG_SEMILLA o, si no, una huella de las
+# plantillas y del codigo de la aplicacion. Es la misma en todos los workers de
+# un despliegue (un 304 vale en cualquiera) y cambia con plantillas o codigo
+# distintos, para no reutilizar lo que tengan guardado los navegadores
+def semilla_despliegue(raiz=RAIZ):
+    semilla = os.environ.get("INCIDENCIAS_ETAG_SEMILLA")
+    if semilla:
+        return semilla
+    huella = hashlib.sha1()
+    plantillas = os.path.join(raiz, "templates")
+    rutas = [os.path.join(plantillas, nombre) for nombre in os.listdir(plantillas)] if os.path.isdir(plantillas) else []
+    rutas += [os.path.join(raiz, nombre) for nombre in os.listdir(raiz) if nombre.endswith(".py")]
+    for ruta in sorted(rutas):
+        if os.path.isfile(ruta):
+            huella.update(os.path.relpath(ruta, raiz).encode("utf-8"))
+            with open(ruta, "rb") as f:
+                huella.update(f.read())
+    return huella.hexdigest()
+
+
+class CacheRespuestas:
+    def __init__(self, max_entradas=64, max_bytes=32 * 1024 * 1024, semilla=None):
+        # La semilla entra en el ETag (ver semilla_despliegue)
+        self.semilla = semilla if semilla is not None else semilla_despliegue()
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, clave, entrada):
+        tamano = len(entrada["cuerpo"])
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior["cuerpo"])
+            self._entradas[clave] = entrada
+            self._bytes += tamano
+            # Se descartan las entradas menos usadas hasta volver a los limites
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                _, descartada = self._entradas.popitem(last=False)
+                self._bytes -= len(descartada["cuerpo"])
+
+    def metricas(self):
+        with self._lock:
+            return {"aciertos": self.aciertos, "fallos": self.fallos,
+                    "entradas": len(self._entradas), "bytes": self._bytes}
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+
+# Cabeceras de la respuesta original que se conservan en la cache
+_CABECERAS = ("Content-Type", "Content-Disposition")
+
+
+# Decorador para vistas de Flask. 'obtener_version' devuelve la version actual
+# de los datos y 'obtener_fecha' (opcional) la fecha de esa version para
+# Last-Modified. Solo los argumentos de 'args' forman parte de la clave.
+def cachear(cache, obtener_version, obtener_fecha=None, args=()):
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*a, **kw):
+            version = obtener_version()
+            clave = (
+                request.path,
+                tuple((nombre, request.args.get(nombre)) for nombre in args),
+                version,
+            )
+            etag = hashlib.sha1((cache.semilla + repr(clave)).encode("utf-8")).hexdigest()[:24]
+
+            # Si el cliente ya tiene esta version no hace falta nada mas
+            if etag in request.if_none_match:
+                respuesta = make_response("", 304)
+                respuesta.set_etag(etag)
+                return respuesta
+
+            entrada = cache.obtener(clave)
+            if entrada is None:
+                original = make_response(vista(*a, **kw))
+                if original.status_code != 200:
+                    return original
+                entrada = {
+                    "cuerpo": original.get_data(),
+                    "cabeceras": {c: original.headers[c] for c in _CABECERAS if c in original.headers},
+                    "fecha": obtener_fecha() if obtener_fecha else None,
+                }
+                cache.guardar(clave, entrada)
+
+            respuesta = make_response(entrada["cuerpo"])
+            for nombre, valor in entrada["cabeceras"].items():
+                respuesta.headers[nombre] = valor
+            respuesta.set_etag(etag)
+            if entrada["fecha"] is not None:
+                respuesta.last_modified = entrada["fecha"]
+            # El navegador puede guardarla pero debe revalidar en cada uso
+            respuesta.cache_control.no_cache = True
+            return respuesta.make_conditional(request)
+        return envoltura
+    return decorador
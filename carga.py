@@ -0,0 +1,619 @@
+# -----------------------------------------------------------------------------
+#                         CARGA MASIVA DE INCIDENCIAS
+# -----------------------------------------------------------------------------
+# Cargador por lotes para ficheros datos.json de gran tamaño: recorre
+# "tickets_emitidos" de forma incremental (lector_json), asigna los id_ticket
+# de antemano e inserta con executemany dentro de una unica transaccion con
+# pragmas de SQLite ajustados para escritura masiva.
+#
+# Tambien incluye la carga incremental: un fichero delta con el mismo formato
+# se aplica sin borrar nada, actualizando las dimensiones y añadiendo solo los
+# tickets que no estuvieran ya en la base de datos. Un ticket solo se da por
+# repetido si trae el mismo identificador de origen (id_externo) o si todo el
+# registro, contactos incluidos, es identico; solo en el primer caso se le
+# añaden los contactos nuevos.
+
+import hashlib
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+import acumuladores
+import almacen
+from conexiones import RUTA_DB, conectar_escritura
+from lector_json import iterar_objeto, trozos_fichero
+
+log = logging.getLogger(__name__)
+
+TAMANO_LOTE = 10000
+
+# Tablas que se borran en una carga completa (control_cargas se conserva)
+TABLAS_DATOS = ["contactos_empleados", "tickets", "clientes", "empleados", "tipos_incidentes"]
+
+# Sentencias de creacion del esquema
+ESQUEMA = [
+    # Informacion de los clientes
+    """
+    CREATE TABLE IF NOT EXISTS clientes(
+        id_cli TEXT PRIMARY KEY,
+        nombre TEXT,
+        telefono TEXT,
+        provincia TEXT
+    );
+    """,
+
+    # Datos de cada empleado
+    """
+    CREATE TABLE IF NOT EXISTS empleados(
+        id_emp TEXT PRIMARY KEY,
+        nombre TEXT,
+        nivel INTEGER,
+        fecha_contrato TEXT
+    );
+    """,
+
+    # Tipos de incidentes
+    """
+    CREATE TABLE IF NOT EXISTS tipos_incidentes(
+        id_inci TEXT PRIMARY KEY,
+        nombre TEXT
+    );
+    """,
+
+    # Tabla principal de tickets (o incidencias). La clave natural es el
+    # identificador de origen del ticket si lo trae o, si no, una huella del
+    # registro completo (ver clave_ticket).
+    """
+    CREATE TABLE IF NOT EXISTS tickets(
+        id_ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+        cliente TEXT,
+        fecha_apertura TEXT,
+        fecha_cierre TEXT,
+        es_mantenimiento INTEGER,
+        satisfaccion_cliente INTEGER,
+        tipo_incidencia TEXT,
+        clave_natural TEXT,
+        FOREIGN KEY (cliente) REFERENCES clientes(id_cli),
+        FOREIGN KEY (tipo_incidencia) REFERENCES tipos_incidentes(id_inci)
+    );
+    """,
+
+    # Relacion de cada ticket con los empleados que lo atendieron
+    """
+    CREATE TABLE IF NOT EXISTS contactos_empleados(
+        id_contacto INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_ticket INTEGER,
+        id_emp TEXT,
+        fecha TEXT,
+        tiempo REAL,
+        FOREIGN KEY (id_ticket) REFERENCES tickets(id_ticket),
+        FOREIGN KEY (id_emp) REFERENCES empleados(id_emp)
+    );
+    """,
+
+    # Historico de cargas. Guarda la marca de agua (fecha_apertura maxima y
+    # ultimos ids) que usan las cargas incrementales.
+    """
+    CREATE TABLE IF NOT EXISTS control_cargas(
+        id_carga INTEGER PRIMARY KEY AUTOINCREMENT,
+        modo TEXT,
+        fichero TEXT,
+        fecha_carga TEXT,
+        tickets_nuevos INTEGER,
+        contactos_nuevos INTEGER,
+        hwm_fecha_apertura TEXT,
+        max_id_ticket INTEGER,
+        max_id_contacto INTEGER
+    );
+    """,
+]
+
+# Indices secundarios. Cubren los accesos del dashboard (agrupaciones por
+# cliente, tipo, mantenimiento, empleado y ticket, y filtros por fecha) para
+# que ninguna consulta tenga que recorrer la tabla completa; plan_consultas.py
+# comprueba que siga siendo asi. En las cargas masivas se crean despues de
+# insertar los datos, que es mas rapido que mantenerlos fila a fila.
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_tickets_clave ON tickets(clave_natural);",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_cliente ON tickets(cliente, satisfaccion_cliente);",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_tipo ON tickets(tipo_incidencia, fecha_apertura, fecha_cierre);",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_apertura ON tickets(fecha_apertura);",
+    """
+    CREATE INDEX IF NOT EXISTS idx_tickets_mantenimiento
+    ON tickets(es_mantenimiento, cliente, tipo_incidencia, fecha_apertura, fecha_cierre);
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_contactos_ticket ON contactos_empleados(id_ticket, fecha, tiempo, id_emp);",
+    "CREATE INDEX IF NOT EXISTS idx_contactos_empleado ON contactos_empleados(id_emp, id_ticket, tiempo);",
+    "CREATE INDEX IF NOT EXISTS idx_contactos_fecha ON contactos_empleados(fecha);",
+]
+
+# La fecha_cierre de un ticket es la de su ultima actuacion. En las cargas
+# masivas se corrige con una sola sentencia al final; despues el disparador la
+# mantiene al dia con cada contacto nuevo (los disparadores se crean tras la
+# carga masiva para no ejecutarlos fila a fila durante ella).
+CORREGIR_FECHA_CIERRE = """
+    UPDATE tickets
+    SET fecha_cierre = u.ultima_fecha
+    FROM (
+        SELECT id_ticket, MAX(fecha) AS ultima_fecha
+        FROM contactos_empleados
+        GROUP BY id_ticket
+    ) AS u
+    WHERE tickets.id_ticket = u.id_ticket
+"""
+
+DISPARADORES = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_contactos_fecha_cierre
+    AFTER INSERT ON contactos_empleados
+    BEGIN
+        UPDATE tickets
+        SET fecha_cierre = (
+            SELECT MAX(fecha) FROM contactos_empleados WHERE id_ticket = NEW.id_ticket
+        )
+        WHERE id_ticket = NEW.id_ticket;
+    END;
+    """,
+]
+
+# Pragmas para la carga: sin fsync y cache de ~256 MiB. El journal se deja en
+# WAL (ver conexiones.py) para que el dashboard pueda seguir leyendo durante la
+# carga; cambiarlo exigiria que no hubiera ningun lector conectado.
+PRAGMAS_CARGA = {
+    "synchronous": "OFF",
+    "cache_size": -262144,
+    "temp_store": "MEMORY",
+}
+
+# Las dimensiones se insertan como upsert para poder reutilizarlas en la carga incremental
+INSERT_CLIENTE = """
+    INSERT INTO clientes(id_cli, nombre, telefono, provincia)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(id_cli) DO UPDATE SET
+        nombre = excluded.nombre, telefono = excluded.telefono, provincia = excluded.provincia
+    WHERE (nombre, telefono, provincia) IS NOT (excluded.nombre, excluded.telefono, excluded.provincia)
+"""
+INSERT_EMPLEADO = """
+    INSERT INTO empleados(id_emp, nombre, nivel, fecha_contrato)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(id_emp) DO UPDATE SET
+        nombre = excluded.nombre, nivel = excluded.nivel, fecha_contrato = excluded.fecha_contrato
+    WHERE (nombre, nivel, fecha_contrato) IS NOT (excluded.nombre, excluded.nivel, excluded.fecha_contrato)
+"""
+INSERT_TIPO = """
+    INSERT INTO tipos_incidentes(id_inci, nombre)
+    VALUES (?, ?)
+    ON CONFLICT(id_inci) DO UPDATE SET nombre = excluded.nombre
+    WHERE nombre IS NOT excluded.nombre
+"""
+INSERT_TICKET = """
+    INSERT INTO tickets(id_ticket, cliente, fecha_apertura, fecha_cierre,
+                        es_mantenimiento, satisfaccion_cliente, tipo_incidencia, clave_natural)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_CONTACTO = """
+    INSERT INTO contactos_empleados(id_ticket, id_emp, fecha, tiempo)
+    VALUES (?, ?, ?, ?)
+"""
+
+
+def crear_esquema(cursor, borrar=True):
+    if borrar:
+        for tabla in TABLAS_DATOS:
+            cursor.execute(f"DROP TABLE IF EXISTS {tabla};")
+    for sentencia in ESQUEMA:
+        cursor.execute(sentencia)
+
+
+def corregir_fecha_cierre(cursor):
+    cursor.execute(CORREGIR_FECHA_CIERRE)
+
+
+def crear_indices(cursor):
+    for sentencia in INDICES:
+        cursor.execute(sentencia)
+
+
+def crear_disparadores(cursor):
+    for sentencia in DISPARADORES:
+        cursor.execute(sentencia)
+
+
+# Prefijo de las claves naturales que vienen del identificador de origen
+PREFIJO_ID = "id:"
+
+# Campos de un ticket que tienen que coincidir para añadirle contactos
+CAMPOS_IDENTIDAD = ("cliente", "fecha_apertura", "tipo_incidencia", "es_mantenimiento", "satisfaccion_cliente")
+
+
+def _satisfaccion(valor):
+    # INTEGER en la tabla: 8.0 se guarda como 8
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def _contacto(id_emp, fecha, tiempo):
+    return [str(id_emp), str(fecha), None if tiempo is None else float(tiempo)]
+
+
+# Campos que identifican el ticket normalizados como quedan en la tabla
+def identidad(cliente, fecha_apertura, tipo_incidencia, es_mantenimiento, satisfaccion_cliente):
+    return (str(cliente), str(fecha_apertura), str(tipo_incidencia),
+            1 if es_mantenimiento else 0, _satisfaccion(satisfaccion_cliente))
+
+
+def identidad_ticket(ticket):
+    return identidad(*(ticket[campo] for campo in CAMPOS_IDENTIDAD))
+
+
+# Huella del registro completo: campos del ticket, fecha_cierre tal y como se
+# guarda (la de la ultima actuacion) y la lista ordenada de contactos. Solo la
+# comparten dos tickets identicos; dos tickets distintos del mismo cliente,
+# dia y tipo tienen claves distintas. Se puede recalcular desde las columnas
+# (migrar_claves)
+def _clave(cliente, fecha_apertura, fecha_cierre, tipo_incidencia, es_mantenimiento, satisfaccion_cliente,
+           contactos):
+    contactos = sorted((_contacto(*c) for c in contactos), key=lambda c: (c[0], c[1], c[2] is None, c[2] or 0))
+    if contactos:
+        fecha_cierre = max(c[1] for c in contactos)
+    contenido = json.dumps([*identidad(cliente, fecha_apertura, tipo_incidencia, es_mantenimiento,
+                                       satisfaccion_cliente),
+                            None if fecha_cierre is None else str(fecha_cierre), contactos],
+                           separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+
+
+# Un ticket con identificador de origen (campo opcional 'id_externo') se
+# reconoce por el aunque vuelva con mas contactos; sin el, por su huella
+def clave_ticket(ticket):
+    if ticket.get("id_externo") is not None:
+        return f"{PREFIJO_ID}{ticket['id_externo']}"
+    return _clave(ticket["cliente"], ticket["fecha_apertura"], ticket["fecha_cierre"], ticket["tipo_incidencia"],
+                  ticket["es_mantenimiento"], ticket["satisfaccion_cliente"],
+                  [(c["id_emp"], c["fecha"], c["tiempo"]) for c in ticket["contactos_con_empleados"]])
+
+
+def _clave_columnas(cliente, fecha_apertura, fecha_cierre, tipo_incidencia, es_mantenimiento, satisfaccion_cliente,
+                    contactos):
+    return _clave(cliente, fecha_apertura, fecha_cierre, tipo_incidencia, es_mantenimiento, satisfaccion_cliente,
+                  json.loads(contactos))
+
+
+# Las bases de datos cargadas con otro formato de clave natural (la huella de
+# algunos campos o la del JSON tal cual) la recalculan desde las columnas y
+# los contactos. Basta con mirar un ticket sin identificador de origen:
+# despues de migrar todas las claves son del formato nuevo
+def migrar_claves(cursor):
+    consulta = """
+        SELECT clave_natural, cliente, fecha_apertura, fecha_cierre, tipo_incidencia, es_mantenimiento,
+               satisfaccion_cliente,
+               (SELECT json_group_array(json_array(id_emp, fecha, tiempo))
+                FROM contactos_empleados c WHERE c.id_ticket = tickets.id_ticket)
+        FROM tickets WHERE clave_natural IS NULL OR substr(clave_natural, 1, ?) != ?
+    """
+    prefijo = (len(PREFIJO_ID), PREFIJO_ID)
+    fila = cursor.execute(consulta + " LIMIT 1", prefijo).fetchone()
+    if fila is None or fila[0] == _clave_columnas(*fila[1:]):
+        return 0
+    cursor.connection.create_function("clave_ticket", 7, _clave_columnas, deterministic=True)
+    cursor.execute("""
+        UPDATE tickets
+        SET clave_natural = clave_ticket(
+            cliente, fecha_apertura, fecha_cierre, tipo_incidencia, es_mantenimiento, satisfaccion_cliente,
+            (SELECT json_group_array(json_array(id_emp, fecha, tiempo))
+             FROM contactos_empleados c WHERE c.id_ticket = tickets.id_ticket))
+        WHERE clave_natural IS NULL OR substr(clave_natural, 1, ?) != ?
+    """, prefijo)
+    return cursor.rowcount
+
+
+# Anota la carga en control_cargas con la nueva marca de agua
+def registrar_carga(cursor, modo, fichero, tickets_nuevos, contactos_nuevos, hwm_fecha_apertura=None):
+    if hwm_fecha_apertura is None:
+        hwm_fecha_apertura = cursor.execute("SELECT MAX(fecha_apertura) FROM tickets").fetchone()[0]
+    max_id_ticket = cursor.execute("SELECT MAX(id_ticket) FROM tickets").fetchone()[0]
+    max_id_contacto = cursor.execute("SELECT MAX(id_contacto) FROM contactos_empleados").fetchone()[0]
+    cursor.execute("""
+        INSERT INTO control_cargas(modo, fichero, fecha_carga, tickets_nuevos, contactos_nuevos,
+                                   hwm_fecha_apertura, max_id_ticket, max_id_contacto)
+        VALUES (?, ?, datetime('now'), ?, ?, ?, ?, ?)
+    """, (modo, fichero, tickets_nuevos, contactos_nuevos, hwm_fecha_apertura, max_id_ticket, max_id_contacto))
+
+
+# Pone al dia las tablas de hechos y los acumuladores de los KPI dentro de la
+# transaccion de la carga, despues de registrarla: la version nueva de los
+# datos nunca se ve con los agregados de la anterior (igual que en la ingesta
+# por la API, que los acumula en su propio lote)
+def actualizar_agregados(cursor):
+    inicio = time.perf_counter()
+    modo_almacen, n_dias = almacen.actualizar(cursor)
+    modo_acumuladores = acumuladores.actualizar(cursor)
+    return {"almacen": modo_almacen, "dias": n_dias, "acumuladores": modo_acumuladores,
+            "segundos": time.perf_counter() - inicio}
+
+
+def ultima_marca_agua(cursor):
+    fila = cursor.execute(
+        "SELECT hwm_fecha_apertura FROM control_cargas ORDER BY id_carga DESC LIMIT 1"
+    ).fetchone()
+    return fila[0] if fila else None
+
+
+@contextmanager
+def pragmas_carga(conn, pragmas=PRAGMAS_CARGA):
+    anteriores = {nombre: conn.execute(f"PRAGMA {nombre}").fetchone()[0] for nombre in pragmas}
+    for nombre, valor in pragmas.items():
+        conn.execute(f"PRAGMA {nombre} = {valor}")
+    try:
+        yield conn
+    finally:
+        for nombre, valor in anteriores.items():
+            conn.execute(f"PRAGMA {nombre} = {valor}")
+
+
+def fila_cliente(cli):
+    return cli["id_cli"], cli["nombre"], cli["telefono"], cli["provincia"]
+
+
+def fila_empleado(emp):
+    return emp["id_emp"], emp["nombre"], emp["nivel"], emp["fecha_contrato"]
+
+
+def fila_tipo(t_in):
+    return t_in["id_inci"], t_in["nombre"]
+
+
+# Convierte un ticket del JSON en su fila y las filas de sus contactos.
+# La fecha_cierre ya sale corregida con la ultima actuacion, asi que esta
+# carga no necesita pasar despues por CORREGIR_FECHA_CIERRE. 'clave' evita
+# volver a calcular la huella si ya se tiene.
+def filas_ticket(ticket, id_ticket, clave=None):
+    contactos = [
+        (id_ticket, c["id_emp"], c["fecha"], c["tiempo"])
+        for c in ticket["contactos_con_empleados"]
+    ]
+    fecha_cierre = max(c[2] for c in contactos) if contactos else ticket["fecha_cierre"]
+    fila = (
+        id_ticket,
+        ticket["cliente"],
+        ticket["fecha_apertura"],
+        fecha_cierre,
+        1 if ticket["es_mantenimiento"] else 0,
+        ticket["satisfaccion_cliente"],
+        ticket["tipo_incidencia"],
+        clave_ticket(ticket) if clave is None else clave,
+    )
+    return fila, contactos
+
+
+def cargar_streaming(ruta_json="datos.json", ruta_db=RUTA_DB, tamano_lote=TAMANO_LOTE):
+    inicio = time.perf_counter()
+    conn = conectar_escritura(ruta_db)
+    cursor = conn.cursor()
+    n_tickets = n_contactos = n_dimensiones = 0
+
+    try:
+        with pragmas_carga(conn):
+            try:
+                # El esquema se recrea dentro de la misma transaccion que los datos
+                cursor.execute("BEGIN")
+                crear_esquema(cursor)
+
+                # Los ids se asignan aqui para no depender de cursor.lastrowid
+                siguiente_id = 1
+                lote_tickets, lote_contactos = [], []
+
+                def volcar():
+                    cursor.executemany(INSERT_TICKET, lote_tickets)
+                    cursor.executemany(INSERT_CONTACTO, lote_contactos)
+                    lote_tickets.clear()
+                    lote_contactos.clear()
+
+                with open(ruta_json, "r", encoding="utf-8") as f:
+                    for clave, valor in iterar_objeto(trozos_fichero(f), ("tickets_emitidos",)):
+                        if clave == "tickets_emitidos":
+                            fila, contactos = filas_ticket(valor, siguiente_id)
+                            siguiente_id += 1
+                            lote_tickets.append(fila)
+                            lote_contactos.extend(contactos)
+                            n_tickets += 1
+                            n_contactos += len(contactos)
+                            if len(lote_tickets) >= tamano_lote:
+                                volcar()
+                        elif clave == "clientes":
+                            cursor.executemany(INSERT_CLIENTE, map(fila_cliente, valor))
+                            n_dimensiones += len(valor)
+                        elif clave == "empleados":
+                            cursor.executemany(INSERT_EMPLEADO, map(fila_empleado, valor))
+                            n_dimensiones += len(valor)
+                        elif clave == "tipos_incidentes":
+                            cursor.executemany(INSERT_TIPO, map(fila_tipo, valor))
+                            n_dimensiones += len(valor)
+                volcar()
+                crear_indices(cursor)
+                crear_disparadores(cursor)
+                registrar_carga(cursor, "completa", ruta_json, n_tickets, n_contactos)
+                agregados = actualizar_agregados(cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        conn.close()
+
+    segundos = time.perf_counter() - inicio
+    filas = n_tickets + n_contactos + n_dimensiones
+    return {
+        "tickets": n_tickets,
+        "contactos": n_contactos,
+        "dimensiones": n_dimensiones,
+        "segundos": segundos,
+        "filas_por_segundo": filas / segundos if segundos > 0 else float("inf"),
+        "agregados": agregados,
+    }
+
+
+# id_ticket e identidad de los tickets de 'claves' que ya existen en la tabla
+def ids_existentes(cursor, claves, tamano=500):
+    existentes = {}
+    for i in range(0, len(claves), tamano):
+        trozo = claves[i:i + tamano]
+        marcas = ",".join("?" * len(trozo))
+        for clave, id_ticket, *campos in cursor.execute(
+            f"SELECT clave_natural, MIN(id_ticket), {', '.join(CAMPOS_IDENTIDAD)} FROM tickets "
+            f"WHERE clave_natural IN ({marcas}) GROUP BY clave_natural", trozo
+        ):
+            existentes[clave] = (id_ticket, identidad(*campos))
+    return existentes
+
+
+def _clave_contacto(id_ticket, id_emp, fecha, tiempo):
+    return (id_ticket, *_contacto(id_emp, fecha, tiempo))
+
+
+# Contactos (id_ticket, id_emp, fecha, tiempo) ya guardados de esos tickets
+def contactos_existentes(cursor, ids_ticket, tamano=500):
+    ids_ticket = list(ids_ticket)
+    existentes = set()
+    for i in range(0, len(ids_ticket), tamano):
+        trozo = ids_ticket[i:i + tamano]
+        marcas = ",".join("?" * len(trozo))
+        existentes.update(_clave_contacto(*fila) for fila in cursor.execute(
+            f"SELECT id_ticket, id_emp, fecha, tiempo FROM contactos_empleados WHERE id_ticket IN ({marcas})", trozo
+        ))
+    return existentes
+
+
+# Filas de un lote de (clave, ticket). Los tickets nuevos reciben id desde
+# 'siguiente_id'. Los que ya estaban (en la tabla o antes en la misma carga):
+#   - con la huella del registro completo son identicos y no se escribe nada
+#   - con el mismo id_externo, si coinciden sus CAMPOS_IDENTIDAD se añaden los
+#     contactos que no tuvieran, por (id_emp, fecha, tiempo), y el disparador
+#     les corrige la fecha_cierre; si no coinciden es un conflicto y el ticket
+#     se descarta entero, sin mezclar sus contactos con los de otro
+# 'ids' (clave -> (id_ticket, identidad)) se completa lote a lote; 'buscar'
+# son las claves que pueden estar ya en la tabla. Devuelve las filas de
+# tickets y de contactos, los tickets repetidos, las claves en conflicto y el
+# siguiente id libre
+def filas_lote(cursor, lote, siguiente_id, ids, buscar):
+    ids.update(ids_existentes(cursor, [clave for clave in buscar if clave not in ids]))
+    filas_tickets, filas_contactos, ampliar, conflictos = [], [], [], []
+    n_repetidos = 0
+    for clave, ticket in lote:
+        if clave in ids:
+            id_ticket, campos = ids[clave]
+            if not clave.startswith(PREFIJO_ID):
+                n_repetidos += 1
+            elif campos == identidad_ticket(ticket):
+                n_repetidos += 1
+                ampliar.append((id_ticket, ticket))
+            else:
+                conflictos.append(clave)
+            continue
+        ids[clave] = (siguiente_id, identidad_ticket(ticket))
+        fila, contactos = filas_ticket(ticket, siguiente_id, clave)
+        siguiente_id += 1
+        filas_tickets.append(fila)
+        filas_contactos.extend(contactos)
+
+    if ampliar:
+        conocidos = contactos_existentes(cursor, {id_ticket for id_ticket, _ in ampliar})
+        conocidos.update(_clave_contacto(*contacto) for contacto in filas_contactos)
+        for id_ticket, ticket in ampliar:
+            for c in ticket["contactos_con_empleados"]:
+                contacto = (id_ticket, c["id_emp"], c["fecha"], c["tiempo"])
+                if _clave_contacto(*contacto) not in conocidos:
+                    conocidos.add(_clave_contacto(*contacto))
+                    filas_contactos.append(contacto)
+    return filas_tickets, filas_contactos, n_repetidos, conflictos, siguiente_id
+
+
+def cargar_incremental(ruta_json, ruta_db=RUTA_DB, tamano_lote=TAMANO_LOTE):
+    inicio = time.perf_counter()
+    conn = conectar_escritura(ruta_db)
+    cursor = conn.cursor()
+    n_tickets = n_contactos = n_repetidos = n_conflictos = n_dimensiones = 0
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        crear_esquema(cursor, borrar=False)
+        crear_indices(cursor)
+        crear_disparadores(cursor)
+        columnas = {fila[1] for fila in cursor.execute("PRAGMA table_info(tickets)")}
+        if "clave_natural" not in columnas:
+            raise RuntimeError("La base de datos no tiene claves naturales; recarguela con main.py")
+
+        migrar_claves(cursor)
+
+        # Los tickets abiertos despues de la marca de agua no pueden estar
+        # cargados, asi que solo se buscan en la tabla los anteriores a ella
+        marca_agua = ultima_marca_agua(cursor)
+        nueva_marca = marca_agua
+        siguiente_id = (cursor.execute("SELECT MAX(id_ticket) FROM tickets").fetchone()[0] or 0) + 1
+        ids = {}
+        lote = []
+        cambios_iniciales = conn.total_changes
+
+        def volcar():
+            nonlocal siguiente_id, n_tickets, n_contactos, n_repetidos, n_conflictos
+            # Un id_externo puede volver con cualquier fecha
+            dudosas = [clave for clave, t in lote
+                       if clave.startswith(PREFIJO_ID) or (marca_agua is not None and t["fecha_apertura"] <= marca_agua)]
+            filas_tickets, filas_contactos, repetidos, conflictos, siguiente_id = filas_lote(
+                cursor, lote, siguiente_id, ids, dudosas)
+            if conflictos:
+                log.warning("%d tickets con un id_externo ya cargado y otros datos; no se cargan: %s",
+                            len(conflictos), conflictos[:10])
+            cursor.executemany(INSERT_TICKET, filas_tickets)
+            cursor.executemany(INSERT_CONTACTO, filas_contactos)
+            n_tickets += len(filas_tickets)
+            n_contactos += len(filas_contactos)
+            n_repetidos += repetidos
+            n_conflictos += len(conflictos)
+            lote.clear()
+
+        # Los upserts solo cuentan las dimensiones que cambian de verdad
+        def dimensiones(sentencia, filas):
+            nonlocal n_dimensiones
+            cursor.executemany(sentencia, filas)
+            n_dimensiones += cursor.rowcount
+
+        with open(ruta_json, "r", encoding="utf-8") as f:
+            for clave, valor in iterar_objeto(trozos_fichero(f), ("tickets_emitidos",)):
+                if clave == "tickets_emitidos":
+                    lote.append((clave_ticket(valor), valor))
+                    if nueva_marca is None or valor["fecha_apertura"] > nueva_marca:
+                        nueva_marca = valor["fecha_apertura"]
+                    if len(lote) >= tamano_lote:
+                        volcar()
+                elif clave == "clientes":
+                    dimensiones(INSERT_CLIENTE, map(fila_cliente, valor))
+                elif clave == "empleados":
+                    dimensiones(INSERT_EMPLEADO, map(fila_empleado, valor))
+                elif clave == "tipos_incidentes":
+                    dimensiones(INSERT_TIPO, map(fila_tipo, valor))
+        volcar()
+
+        # Una segunda ejecucion con el mismo delta no cambia nada ni deja rastro
+        agregados = None
+        if conn.total_changes != cambios_iniciales:
+            registrar_carga(cursor, "incremental", ruta_json, n_tickets, n_contactos, nueva_marca)
+            agregados = actualizar_agregados(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return {
+        "tickets": n_tickets,
+        "contactos": n_contactos,
+        "dimensiones": n_dimensiones,
+        "repetidos": n_repetidos,
+        "conflictos": n_conflictos,
+        "segundos": time.perf_counter() - inicio,
+        "agregados": agregados,
+    }
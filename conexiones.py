@@ -0,0 +1,306 @@
+# -----------------------------------------------------------------------------
+#                      CONEXIONES A LA BASE DE DATOS
+# -----------------------------------------------------------------------------
+# La base de datos se usa en modo WAL: los lectores (peticiones del dashboard)
+# leen una foto consistente mientras main.py o la propia aplicacion escriben,
+# sin errores de "database is locked".
+#
+# PoolConexiones reparte:
+#   - una conexion de solo lectura por hilo, que se reutiliza entre peticiones
+#   - una unica conexion de escritura compartida, protegida por un lock
+# y guarda metricas de uso (checkouts, espera por el escritor, errores por
+# base de datos ocupada).
+#
+# La ruta se configura con la variable de entorno INCIDENCIAS_DB y la espera
+# maxima ante bloqueos con INCIDENCIAS_BUSY_TIMEOUT (segundos).
+#
+# Todas las conexiones usan CursorMedido, que mide cada consulta (ejecucion y
+# lectura de filas) y avisa a los observadores registrados con
+# observar_consultas (instrumentacion.py los usa para el tiempo de SQL de cada
+# peticion y el registro de consultas lentas).
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+RUTA_DB = os.environ.get("INCIDENCIAS_DB", "incidencias.db")
+BUSY_TIMEOUT = float(os.environ.get("INCIDENCIAS_BUSY_TIMEOUT", "30"))
+
+
+# Funciones (sql, segundos) a las que se avisa al terminar cada consulta
+_observadores = []
+
+
+def observar_consultas(funcion):
+    _observadores.append(funcion)
+    return funcion
+
+
+# Una consulta termina al leer todas sus filas, al cerrar el cursor o al
+# reutilizarlo para otra sentencia
+class CursorMedido(sqlite3.Cursor):
+    _sql = None
+    _segundos = 0.0
+
+    def _medir(self, metodo, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, *args)
+        finally:
+            self._segundos += time.perf_counter() - inicio
+
+    def _terminar(self):
+        if self._sql is None:
+            return
+        sql, segundos = self._sql, self._segundos
+        self._sql, self._segundos = None, 0.0
+        for observador in _observadores:
+            observador(sql, segundos)
+
+    def execute(self, sql, parametros=()):
+        self._terminar()
+        self._sql = sql
+        return self._medir(sqlite3.Cursor.execute, sql, parametros)
+
+    def executemany(self, sql, parametros):
+        self._terminar()
+        self._sql = sql
+        return self._medir(sqlite3.Cursor.executemany, sql, parametros)
+
+    def executescript(self, script):
+        self._terminar()
+        self._sql = script
+        return self._medir(sqlite3.Cursor.executescript, script)
+
+    def fetchone(self):
+        fila = self._medir(sqlite3.Cursor.fetchone)
+        if fila is None:
+            self._terminar()
+        return fila
+
+    def fetchmany(self, *args):
+        filas = self._medir(sqlite3.Cursor.fetchmany, *args)
+        if not filas:
+            self._terminar()
+        return filas
+
+    def fetchall(self):
+        filas = self._medir(sqlite3.Cursor.fetchall)
+        self._terminar()
+        return filas
+
+    def close(self):
+        self._terminar()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._terminar()
+        except Exception:
+            pass
+
+
+class ConexionMedida(sqlite3.Connection):
+    # Connection.execute/executemany tambien pasan por aqui
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+
+def _ocupada(error):
+    mensaje = str(error).lower()
+    return "locked" in mensaje or "busy" in mensaje
+
+
+# Conexion de escritura (tambien la usan main.py y carga.py): pone la base de
+# datos en WAL, que queda guardado en el fichero para todas las conexiones
+def conectar_escritura(ruta_db=RUTA_DB, timeout=BUSY_TIMEOUT, check_same_thread=True):
+    conn = sqlite3.connect(ruta_db, timeout=timeout, check_same_thread=check_same_thread,
+                           factory=ConexionMedida)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # En WAL basta con NORMAL: no se corrompe nada, solo se puede perder la
+    # ultima transaccion si se cae la maquina
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def conectar_lectura(ruta_db=RUTA_DB, timeout=BUSY_TIMEOUT, check_same_thread=True):
+    conn = sqlite3.connect(f"file:{ruta_db}?mode=ro", uri=True, timeout=timeout,
+                           check_same_thread=check_same_thread, factory=ConexionMedida)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+# Todos los pools vivos, para exponer sus metricas
+_todos = weakref.WeakSet()
+# Conexiones heredadas de un fork: se mantienen vivas para no cerrarlas nunca
+_heredadas = []
+
+
+class PoolConexiones:
+    def __init__(self, ruta_db=RUTA_DB, timeout=BUSY_TIMEOUT, inicializar=None):
+        self.ruta_db = ruta_db
+        self.timeout = timeout
+        # Se llama una vez con la conexion de escritura antes del primer uso
+        self._inicializar = inicializar
+        self._inicializado = False
+        self._local = threading.local()
+        self._escritor = None
+        self._lock_escritura = threading.RLock()
+        self._lock_metricas = threading.Lock()
+        self._metricas = {
+            "checkouts_lectura": 0,
+            "checkouts_escritura": 0,
+            "conexiones_lectura": 0,
+            "espera_escritura_total": 0.0,
+            "espera_escritura_max": 0.0,
+            "errores_ocupada": 0,
+        }
+        _todos.add(self)
+
+    def _sumar(self, **valores):
+        with self._lock_metricas:
+            for nombre, valor in valores.items():
+                self._metricas[nombre] += valor
+
+    def _preparar(self):
+        if self._inicializado:
+            return
+        with self._lock_escritura:
+            if self._inicializado:
+                return
+            conn = self._conexion_escritura()
+            if self._inicializar is not None:
+                self._inicializar(conn)
+                if conn.in_transaction:
+                    conn.commit()
+            self._inicializado = True
+
+    def _conexion_escritura(self):
+        if self._escritor is None:
+            # La comparten todos los hilos, pero nunca dos a la vez (lock)
+            self._escritor = conectar_escritura(self.ruta_db, self.timeout, check_same_thread=False)
+        return self._escritor
+
+    @contextmanager
+    def lectura(self):
+        self._preparar()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = conectar_lectura(self.ruta_db, self.timeout)
+            self._local.conn = conn
+            self._sumar(conexiones_lectura=1)
+        self._sumar(checkouts_lectura=1)
+        try:
+            yield conn
+        except sqlite3.OperationalError as error:
+            if _ocupada(error):
+                self._sumar(errores_ocupada=1)
+            raise
+        finally:
+            # Se cierra cualquier lectura abierta para no retener la foto del WAL
+            if conn.in_transaction:
+                conn.rollback()
+
+    @contextmanager
+    def escritura(self):
+        self._preparar()
+        inicio = time.perf_counter()
+        with self._lock_escritura:
+            espera = time.perf_counter() - inicio
+            with self._lock_metricas:
+                self._metricas["checkouts_escritura"] += 1
+                self._metricas["espera_escritura_total"] += espera
+                self._metricas["espera_escritura_max"] = max(self._metricas["espera_escritura_max"], espera)
+            conn = self._conexion_escritura()
+            try:
+                yield conn
+                if conn.in_transaction:
+                    conn.commit()
+            except sqlite3.OperationalError as error:
+                if _ocupada(error):
+                    self._sumar(errores_ocupada=1)
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+
+    # En el hijo de un fork: las conexiones heredadas no se pueden usar (SQLite
+    # no lo admite) ni cerrar sin riesgo, asi que se apartan y se abren otras
+    def _tras_fork(self):
+        _heredadas.append(self._escritor)
+        _heredadas.append(getattr(self._local, "conn", None))
+        self._escritor = None
+        self._local = threading.local()
+        self._lock_escritura = threading.RLock()
+        self._lock_metricas = threading.Lock()
+
+    def metricas(self):
+        with self._lock_metricas:
+            metricas = dict(self._metricas)
+        metricas["ruta_db"] = self.ruta_db
+        return metricas
+
+    # Cierra la conexion de escritura y la de lectura del hilo actual
+    def cerrar(self):
+        with self._lock_escritura:
+            if self._escritor is not None:
+                self._escritor.close()
+                self._escritor = None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# Antes de la primera lectura: WAL (al abrir el escritor) y almacen construido,
+# para que los lectores de solo lectura nunca tengan que escribir
+def _inicializar(conn):
+    import acumuladores
+    import almacen
+    almacen.asegurar_almacen(conn)
+    acumuladores.asegurar_acumuladores(conn)
+
+
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+# Pool compartido por ruta de base de datos
+def pool(ruta_db=None):
+    ruta_db = ruta_db or RUTA_DB
+    with _lock_pools:
+        if ruta_db not in _pools:
+            _pools[ruta_db] = PoolConexiones(ruta_db, inicializar=_inicializar)
+        return _pools[ruta_db]
+
+
+def _tras_fork():
+    for p in list(_todos):
+        p._tras_fork()
+
+
+os.register_at_fork(after_in_child=_tras_fork)
+
+
+# Metricas de todos los pools abiertos (los compartidos y los propios de otros
+# modulos, como el indice de CVE)
+def metricas():
+    return [p.metricas() for p in list(_todos)]
+
+
+@contextmanager
+def lectura(ruta_db=None):
+    with pool(ruta_db).lectura() as conn:
+        yield conn
+
+
+@contextmanager
+def escritura(ruta_db=None):
+    with pool(ruta_db).escritura() as conn:
+        yield conn
@@ -0,0 +1,114 @@
+# -----------------------------------------------------------------------------
+#              ESTADO DE ANALISIS COMPARTIDO ENTRE WORKERS
+# -----------------------------------------------------------------------------
+# Perfil de despliegue con gunicorn (INCIDENCIAS_ESTADO_COMPARTIDO=1, ver
+# gunicorn.conf.py): en lugar de que cada worker lea las tablas y calcule todas
+# las metricas del motor de analisis, lo hace una sola vez el maestro despues
+# del preload y los workers lo heredan por fork. Las paginas de esas tablas y
+# DataFrames quedan compartidas (copy-on-write) mientras nadie las escriba:
+#   - los arrays sueltos se marcan de solo lectura y los DataFrame no se
+#     modifican nunca en el sitio (copy-on-write de pandas)
+#   - gc.freeze() saca los objetos heredados de las pasadas del recolector,
+#     que si no tocaria sus cabeceras y obligaria a copiar esas paginas
+#   - el vigilante de la version queda fijado (version_datos.fijar): un worker
+#     no recalcula nada aunque haya cargas nuevas
+#
+# Cambio de version: un hilo del maestro comprueba la version cada
+# INCIDENCIAS_INTERVALO_ESTADO segundos (30). Si hay una nueva calcula un
+# motor nuevo aparte, sustituye analisis.motor de una vez y pide a gunicorn
+# que recargue (SIGHUP): con preload_app los workers nuevos salen de un fork
+# del maestro, ya con el motor nuevo, y los anteriores terminan sus peticiones
+# con la version que tenian. Ninguna peticion ve una mezcla de dos versiones.
+#
+# Mientras el maestro calcula no se hace ningun fork (os.register_at_fork),
+# para que ningun worker herede un lock tomado por ese hilo.
+
+import gc
+import logging
+import os
+import threading
+import time
+
+import conexiones
+from version_datos import vigilante
+
+log = logging.getLogger(__name__)
+
+INTERVALO = float(os.environ.get("INCIDENCIAS_INTERVALO_ESTADO", "30"))
+
+_lock_estado = threading.Lock()
+
+
+def _antes_fork():
+    _lock_estado.acquire()
+
+
+def _tras_fork_maestro():
+    _lock_estado.release()
+
+
+def _tras_fork_worker():
+    global _lock_estado
+    _lock_estado = threading.Lock()
+
+
+os.register_at_fork(before=_antes_fork, after_in_parent=_tras_fork_maestro, after_in_child=_tras_fork_worker)
+
+
+# Marca de solo lectura los arrays de NumPy de un valor del motor (los
+# diccionarios de estadisticas pueden llevarlos dentro)
+def _congelar(valor):
+    import numpy as np
+    if isinstance(valor, np.ndarray):
+        valor.setflags(write=False)
+    elif isinstance(valor, dict):
+        for v in valor.values():
+            _congelar(v)
+
+
+# Calcula un motor nuevo con todas las metricas, lo pone en analisis.motor y
+# fija el vigilante a su version. Devuelve esa version
+def cargar(ruta_db=None):
+    import analisis
+
+    ruta_db = ruta_db or conexiones.RUTA_DB
+    inicio = time.perf_counter()
+    with _lock_estado:
+        vigia = vigilante(ruta_db)
+        anterior = vigia.fijada()
+        vigia.fijar(None)
+        try:
+            motor = analisis.calcular_metricas(analisis.MotorAnalisis(ruta_db))
+        except Exception:
+            vigia.fijar(anterior)
+            raise
+        for valor in motor._cache.values():
+            _congelar(valor)
+        analisis.motor = motor
+        vigia.fijar(motor._version)
+        # Lo congelado antes (el motor anterior) vuelve a poder liberarse
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+    log.info("estado compartido cargado version=%s segundos=%.2f", motor._version, time.perf_counter() - inicio)
+    return motor._version
+
+
+# Hilo del maestro: cuando la base de datos pasa a otra version carga el
+# estado de nuevo y llama a al_cambiar(version) (gunicorn: SIGHUP a si mismo)
+def vigilar(al_cambiar, ruta_db=None, intervalo=INTERVALO):
+    vigia = vigilante(ruta_db)
+
+    def bucle():
+        while True:
+            time.sleep(intervalo)
+            try:
+                if vigia.leer() == vigia.fijada():
+                    continue
+                al_cambiar(cargar(ruta_db))
+            except Exception:
+                log.exception("no se pudo cargar el estado compartido")
+
+    hilo = threading.Thread(target=bucle, name="estado-compartido", daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,96 @@
+# -----------------------------------------------------------------------------
+#                       GENERADOR DE DATOS SINTETICOS
+# -----------------------------------------------------------------------------
+# Escribe ficheros con el mismo formato que datos.json para poder probar la
+# carga y el analisis con volumenes grandes. Los tickets se escriben uno a uno
+# para no tener todo el documento en memoria.
+#
+# Con la misma semilla y los mismos parametros el fichero es siempre identico.
+# Con sesgo > 0 los clientes, empleados y tipos de incidencia siguen una ley de
+# Zipf (unos pocos concentran la mayoria de tickets y actuaciones, como en
+# produccion); con sesgo = 0 el reparto es uniforme.
+
+import argparse
+import bisect
+import itertools
+import json
+import random
+from datetime import date, timedelta
+
+
+# Pesos acumulados de Zipf: el elemento i-esimo pesa 1 / (i + 1) ** sesgo
+def _pesos_zipf(n, sesgo):
+    if sesgo <= 0:
+        return None
+    return list(itertools.accumulate(1 / (i + 1) ** sesgo for i in range(n)))
+
+
+# Indice en [0, n) uniforme o segun los pesos acumulados
+def _elegir(rnd, n, acumulados):
+    if acumulados is None:
+        return rnd.randrange(n)
+    return bisect.bisect(acumulados, rnd.random() * acumulados[-1])
+
+
+def generar(ruta, n_tickets, n_clientes=10, n_empleados=15, n_tipos=5, semilla=18,
+            contactos_por_ticket=(1, 4), sesgo=0.0):
+    rnd = random.Random(semilla)
+    inicio = date(2025, 1, 1)
+    pesos_clientes = _pesos_zipf(n_clientes, sesgo)
+    pesos_empleados = _pesos_zipf(n_empleados, sesgo)
+    pesos_tipos = _pesos_zipf(n_tipos, sesgo)
+
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write('{\n  "tickets_emitidos": [\n')
+        for i in range(n_tickets):
+            apertura = inicio + timedelta(days=rnd.randrange(365))
+            contactos = []
+            for _ in range(rnd.randint(*contactos_por_ticket)):
+                contactos.append({
+                    "id_emp": str(101 + _elegir(rnd, n_empleados, pesos_empleados)),
+                    "fecha": (apertura + timedelta(days=rnd.randrange(5))).isoformat(),
+                    "tiempo": rnd.choice([0.5, 1.0, 1.5, 2.0, 2.5, 3.0])
+                })
+            ticket = {
+                "cliente": str(1 + _elegir(rnd, n_clientes, pesos_clientes)),
+                "fecha_apertura": apertura.isoformat(),
+                "fecha_cierre": (apertura + timedelta(days=rnd.randrange(1, 6))).isoformat(),
+                "es_mantenimiento": rnd.random() < 0.5,
+                "satisfaccion_cliente": rnd.randint(1, 10),
+                "tipo_incidencia": 1 + _elegir(rnd, n_tipos, pesos_tipos),
+                "contactos_con_empleados": contactos
+            }
+            f.write("    " + json.dumps(ticket, ensure_ascii=False))
+            f.write(",\n" if i < n_tickets - 1 else "\n")
+        f.write("  ],\n")
+
+        clientes = [
+            {"id_cli": str(i), "nombre": f"Cliente {i}", "telefono": f"600{i:06d}", "provincia": "Madrid"}
+            for i in range(1, n_clientes + 1)
+        ]
+        empleados = [
+            {"id_emp": str(100 + i), "nombre": f"Empleado {i}", "nivel": 1 + i % 3, "fecha_contrato": "2020-01-01"}
+            for i in range(1, n_empleados + 1)
+        ]
+        tipos = [{"id_inci": str(i), "nombre": f"Tipo {i}"} for i in range(1, n_tipos + 1)]
+
+        f.write('  "clientes": ' + json.dumps(clientes, ensure_ascii=False) + ",\n")
+        f.write('  "empleados": ' + json.dumps(empleados, ensure_ascii=False) + ",\n")
+        f.write('  "tipos_incidentes": ' + json.dumps(tipos, ensure_ascii=False) + "\n}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un fichero sintetico con el formato de datos.json")
+    parser.add_argument("ruta")
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--clientes", type=int, default=10)
+    parser.add_argument("--empleados", type=int, default=15)
+    parser.add_argument("--tipos", type=int, default=5)
+    parser.add_argument("--contactos", type=int, nargs=2, default=[1, 4], metavar=("MIN", "MAX"),
+                        help="actuaciones por ticket (minimo y maximo)")
+    parser.add_argument("--sesgo", type=float, default=0.0,
+                        help="exponente de Zipf para clientes, empleados y tipos (0 = uniforme)")
+    parser.add_argument("--semilla", type=int, default=18)
+    args = parser.parse_args()
+    generar(args.ruta, args.tickets, args.clientes, args.empleados, args.tipos, args.semilla,
+            tuple(args.contactos), args.sesgo)
@@ -1,140 +1,305 @@
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
 import os
-import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
-
-# 1) Conectamos y leemos los datos
-conn = sqlite3.connect("incidencias.db")
-df_tickets = pd.read_sql_query("SELECT * FROM tickets", conn)
-df_contactos = pd.read_sql_query("SELECT * FROM contactos_empleados", conn)
-df_empleados = pd.read_sql_query("SELECT * FROM empleados", conn)
-df_clientes = pd.read_sql_query("SELECT * FROM clientes", conn)
-conn.close()
-
-# 2) Convertimos las columnas de fecha a tipo datetime
-df_tickets["fecha_apertura"] = pd.to_datetime(df_tickets["fecha_apertura"])
-df_tickets["fecha_cierre"]   = pd.to_datetime(df_tickets["fecha_cierre"])
-df_contactos["fecha"]        = pd.to_datetime(df_contactos["fecha"])
-
-# 3) Calculamos la fecha de último contacto de cada ticket
-df_max_contact = (
-    df_contactos.groupby("id_ticket")["fecha"]
-    .max()                               # fecha máxima por ticket
-    .reset_index(name="last_contact")
-)
-
-# 4) Hacemos un merge para añadir esa columna a df_tickets
-df_tickets = df_tickets.merge(df_max_contact, on="id_ticket", how="left")
-
-# 5) Sobrescribimos fecha_cierre con la última actuación (si es mayor)
-#    Para ello, tomamos el máximo entre [fecha_cierre original, last_contact]
-df_tickets["fecha_cierre"] = df_tickets[["fecha_cierre", "last_contact"]].max(axis=1)
+
+import bocetos
+import conexiones
+import nucleos
+from acceso_datos import CATEGORIA, consultar
 
 # ----------------------------------------------------------------------------- #
-#                                   Graficos                                    #
+#                          Pipeline de graficos                                  #
 # ----------------------------------------------------------------------------- #
+# Cada grafico se registra con dos funciones:
+#   - datos(conn):           calcula el agregado que se representa (pequeño)
+#   - dibujar(agregado, ruta): pinta ese agregado y lo guarda como PNG
+# Los agregados se calculan en el proceso principal (casi todos desde las
+# tablas de hechos del almacen) y los dibujos se reparten en un pool de
+# procesos con el backend Agg. Si la huella del agregado (y del codigo que lo
+# dibuja) coincide con la de la ultima vez, el PNG no se vuelve a generar.
 
+DIRECTORIO = os.path.join("static", "images")
+FICHERO_HUELLAS = "huellas_graficos.json"
 
-# 1) Grafico de la media de tiempo (apertura-cierre) de los incidentes aprupados por la variable mantenimiento
-
-df_tickets["duracion_dias"] = (df_tickets["fecha_cierre"] - df_tickets["fecha_apertura"]).dt.days
+GRAFICOS = {}
 
-group_tiempo = df_tickets.groupby("es_mantenimiento")["duracion_dias"].mean().reset_index()
-group_tiempo["es_mantenimiento"] = group_tiempo["es_mantenimiento"].map({0: "No Mantenimiento", 1: "Mantenimiento"})
 
-plt.figure(figsize=(12, 6))
-plt.bar(group_tiempo["es_mantenimiento"], group_tiempo["duracion_dias"], color=["red", "blue"])
-plt.xlabel("Tipo de incidencia")
-plt.ylabel("Media de tiempo en dias")
-plt.title("Tiempo medio de resolucion de incidencias")
-plt.ylim(1)
-plt.savefig(os.path.join("static", "images", "tiempo_mant.png"))
-plt.close()
+def grafico(fichero):
+    def registrar(dibujar):
+        GRAFICOS[fichero] = {"dibujar": dibujar, "datos": None}
+        def datos(funcion):
+            GRAFICOS[fichero]["datos"] = funcion
+            return funcion
+        dibujar.datos = datos
+        return dibujar
+    return registrar
 
 
-# 2) Gráfico boxplot con los tiempos de resolución por tipo de incidente
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
 
-group_incidencias = df_tickets.groupby("tipo_incidencia")["duracion_dias"].apply(list)
 
-fig, ax = plt.subplots(figsize=(12, 6))
+# 1) Grafico de la media de tiempo (apertura-cierre) de los incidentes aprupados por la variable mantenimiento
 
-# Boxplot estándar
-ax.boxplot(
-    [group_incidencias[tipo] for tipo in group_incidencias.index],
-    vert=True,
-    patch_artist=True,
-    tick_labels=group_incidencias.index
-)
+@grafico("tiempo_mant.png")
+def dibujar_tiempo_mant(group_tiempo, ruta):
+    plt = _pyplot()
+    group_tiempo = group_tiempo.copy()
+    group_tiempo["es_mantenimiento"] = group_tiempo["es_mantenimiento"].map({0: "No Mantenimiento", 1: "Mantenimiento"})
 
-# Calculamos p5 y p90 de duracion_dias por tipo_incidencia
-percentil5 = df_tickets.groupby("tipo_incidencia")["duracion_dias"].quantile(0.05)
-percentil90 = df_tickets.groupby("tipo_incidencia")["duracion_dias"].quantile(0.90)
+    plt.figure(figsize=(12, 6))
+    plt.bar(group_tiempo["es_mantenimiento"], group_tiempo["duracion_dias"], color=["red", "blue"])
+    plt.xlabel("Tipo de incidencia")
+    plt.ylabel("Media de tiempo en dias")
+    plt.title("Tiempo medio de resolucion de incidencias")
+    plt.ylim(1)
+    plt.savefig(ruta)
+    plt.close()
 
-# Dibujamos líneas horizontales en p5 y p90 para cada grupo
-for i, tipo in enumerate(group_incidencias.index, start=1):
-    p5 = percentil5.loc[tipo]
-    p90 = percentil90.loc[tipo]
-    ax.hlines(y=p5,  xmin=i - 0.2, xmax=i + 0.2, color='red', linestyle='--')
-    ax.hlines(y=p90, xmin=i - 0.2, xmax=i + 0.2, color='red', linestyle='--')
 
-ax.set_title("Tiempo de resolución por tipo de incidencia")
-ax.set_xlabel("Tipo de incidencia")
-ax.set_ylabel("Tiempo de resolución (días)")
-plt.savefig(os.path.join("static", "images", "tipo_incidencia.png"))
-plt.close()
+@dibujar_tiempo_mant.datos
+def datos_tiempo_mant(conn):
+    return consultar(conn, """
+        SELECT es_mantenimiento, SUM(suma_duracion) / SUM(n_cerrados) AS duracion_dias
+        FROM hechos_tickets_dia
+        GROUP BY es_mantenimiento
+        ORDER BY es_mantenimiento
+    """)
 
 
+# 2) Gráfico boxplot con los tiempos de resolución por tipo de incidente
 
-# 3) Grafico de analisis de los 5 clientes mas criticos dependiendo de variables mantenimiento y tipo de incidencia
+@grafico("tipo_incidencia.png")
+def dibujar_tipo_incidencia(df_duraciones, ruta):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    if "mediana" in df_duraciones.columns:
+        # Modo bocetos: las cajas llegan ya calculadas (sin valores atipicos) y
+        # los bigotes se cortan en 1.5 veces el rango intercuartilico
+        rango = df_duraciones["q3"] - df_duraciones["q1"]
+        ax.bxp([{"label": tipo, "med": med, "q1": q1, "q3": q3, "fliers": [],
+                 "whislo": max(minimo, q1 - 1.5 * r), "whishi": min(maximo, q3 + 1.5 * r)}
+                for tipo, med, q1, q3, minimo, maximo, r in zip(
+                    df_duraciones["tipo_incidencia"], df_duraciones["mediana"], df_duraciones["q1"],
+                    df_duraciones["q3"], df_duraciones["minimo"], df_duraciones["maximo"], rango)],
+               vert=True, patch_artist=True)
+        percentiles = df_duraciones[["p5", "p90"]].to_numpy()
+    else:
+        # Los tipos se factorizan una vez para las duraciones de cada caja y los percentiles
+        grupos = nucleos.Grupos(df_duraciones["tipo_incidencia"])
+
+        # Boxplot estándar
+        ax.boxplot(
+            grupos.valores(df_duraciones["duracion_dias"]),
+            vert=True,
+            patch_artist=True,
+            tick_labels=grupos.indice
+        )
+
+        # Calculamos p5 y p90 de duracion_dias por tipo_incidencia
+        percentiles = grupos.cuantiles(df_duraciones["duracion_dias"], [0.05, 0.90])
+
+    # Dibujamos líneas horizontales en p5 y p90 para cada grupo
+    for i, (p5, p90) in enumerate(percentiles, start=1):
+        ax.hlines(y=p5,  xmin=i - 0.2, xmax=i + 0.2, color='red', linestyle='--')
+        ax.hlines(y=p90, xmin=i - 0.2, xmax=i + 0.2, color='red', linestyle='--')
+
+    ax.set_title("Tiempo de resolución por tipo de incidencia")
+    ax.set_xlabel("Tipo de incidencia")
+    ax.set_ylabel("Tiempo de resolución (días)")
+    plt.savefig(ruta)
+    plt.close()
+
+
+@dibujar_tipo_incidencia.datos
+def datos_tipo_incidencia(conn):
+    # Con los bocetos al dia basta con unir los de cada dia (ver bocetos.py)
+    if bocetos.ACTIVADOS and bocetos.al_dia(conn):
+        filas = [[tipo] + boceto.cuantiles([0, 0.05, 0.25, 0.5, 0.75, 0.90, 1])
+                 for tipo, boceto in bocetos.duraciones(conn).items()]
+        return pd.DataFrame(filas, columns=["tipo_incidencia", "minimo", "p5", "q1", "mediana", "q3", "p90", "maximo"])
+    # Necesita la distribucion completa, asi que lee solo las dos columnas
+    # que hacen falta (cubiertas por idx_tickets_tipo)
+    return consultar(conn, """
+        SELECT tipo_incidencia,
+               CAST(julianday(fecha_cierre) - julianday(fecha_apertura) AS INTEGER) AS duracion_dias
+        FROM tickets
+        ORDER BY tipo_incidencia, duracion_dias
+    """, tipos={"tipo_incidencia": CATEGORIA, "duracion_dias": "int32"})
 
-df_criticos = df_tickets[(df_tickets["es_mantenimiento"] == 1) & (df_tickets["tipo_incidencia"] != '1')]
 
-group_criticos = df_criticos.groupby("cliente")["id_ticket"].count().reset_index(name="Incidencias")
-group_criticos = group_criticos.merge(df_clientes[["id_cli", "nombre"]], left_on="cliente", right_on="id_cli", how="left")
-group_criticos = group_criticos.nlargest(5, "Incidencias")
+# 3) Grafico de analisis de los 5 clientes mas criticos dependiendo de variables mantenimiento y tipo de incidencia
 
-plt.figure(figsize=(12, 6))
-plt.bar(group_criticos["nombre"], group_criticos["Incidencias"], color=["blue", "orange", "grey", "yellow", "red"])
-plt.xlabel("Clientes")
-plt.ylabel("Numero de incidencias")
-plt.title("Top 5 clientes mas criticos")
-plt.ylim(0, max(group_criticos["Incidencias"]) + 1)
-plt.savefig(os.path.join("static", "images", "critical_clients.png"))
-plt.close()
+@grafico("critical_clients.png")
+def dibujar_clientes_criticos(group_criticos, ruta):
+    plt = _pyplot()
+    plt.figure(figsize=(12, 6))
+    plt.bar(group_criticos["nombre"], group_criticos["Incidencias"], color=["blue", "orange", "grey", "yellow", "red"])
+    plt.xlabel("Clientes")
+    plt.ylabel("Numero de incidencias")
+    plt.title("Top 5 clientes mas criticos")
+    plt.ylim(0, max(group_criticos["Incidencias"]) + 1)
+    plt.savefig(ruta)
+    plt.close()
+
+
+@dibujar_clientes_criticos.datos
+def datos_clientes_criticos(conn):
+    return consultar(conn, """
+        SELECT h.cliente, c.nombre, SUM(h.n_tickets) AS Incidencias
+        FROM hechos_tickets_dia h
+        LEFT JOIN clientes c ON c.id_cli = h.cliente
+        WHERE h.es_mantenimiento = 1 AND h.tipo_incidencia != '1'
+        GROUP BY h.cliente
+        ORDER BY Incidencias DESC, h.cliente
+        LIMIT 5
+    """)
 
 
 # 4) Grafico de analisis de las actuaciones de los empleados
 
-df_actuaciones = df_contactos.groupby("id_emp")["id_contacto"].count().reset_index(name="Actuaciones")
-group_actuaciones = df_actuaciones.merge(df_empleados[["id_emp", "nombre"]], on="id_emp", how="left")
-
-# Se pone por id de empleado por espacio y para mejorar la comprensión
-# Si se quisiera poner por nombre de empleado cambiar group_actuaciones["nombre"]
-plt.figure(figsize=(12, 6))
-plt.bar(group_actuaciones["id_emp"], group_actuaciones["Actuaciones"], color=["blue", "orange", "grey", "yellow", "red", "brown", "green"])
-plt.xlabel("Empleados")
-plt.ylabel("Numero de actuaciones")
-plt.title("Actuaciones por empleado")
-plt.ylim(10, max(group_actuaciones["Actuaciones"]) + 1)
-plt.savefig(os.path.join("static", "images", "actuaciones_empleado.png"))
-plt.close()
+@grafico("actuaciones_empleado.png")
+def dibujar_actuaciones_empleado(group_actuaciones, ruta):
+    plt = _pyplot()
+    # Se pone por id de empleado por espacio y para mejorar la comprensión
+    # Si se quisiera poner por nombre de empleado cambiar group_actuaciones["nombre"]
+    plt.figure(figsize=(12, 6))
+    plt.bar(group_actuaciones["id_emp"], group_actuaciones["Actuaciones"], color=["blue", "orange", "grey", "yellow", "red", "brown", "green"])
+    plt.xlabel("Empleados")
+    plt.ylabel("Numero de actuaciones")
+    plt.title("Actuaciones por empleado")
+    plt.ylim(10, max(group_actuaciones["Actuaciones"]) + 1)
+    plt.savefig(ruta)
+    plt.close()
+
+
+@dibujar_actuaciones_empleado.datos
+def datos_actuaciones_empleado(conn):
+    return consultar(conn, """
+        SELECT h.id_emp, e.nombre, SUM(h.n_actuaciones) AS Actuaciones
+        FROM hechos_contactos_dia h
+        LEFT JOIN empleados e ON e.id_emp = h.id_emp
+        GROUP BY h.id_emp
+        ORDER BY h.id_emp
+    """)
 
 
 # 5) Grafico de actuaciones según el día de la semana
 
-df_contactos["dia_semana"] = df_contactos["fecha"].dt.dayofweek
-group_actuaciones = df_contactos.groupby("dia_semana").size().reset_index(name="Actuaciones")
+@grafico("actuaciones_semana.png")
+def dibujar_actuaciones_semana(group_actuaciones, ruta):
+    plt = _pyplot()
+    group_actuaciones = group_actuaciones.copy()
+    group_actuaciones["Dia"] = group_actuaciones["dia_semana"].map({0: "Lunes", 1: "Martes", 2: "Miercoles", 3: "Jueves", 4: "Viernes", 5: "Sabado", 6: "Domingo"})
+
+    plt.figure(figsize=(12, 6))
+    plt.bar(group_actuaciones["Dia"], group_actuaciones["Actuaciones"], color=["blue", "orange", "grey", "yellow", "red", "brown", "green"])
+    plt.title("Actuaciones de los empleados por dia de la semana")
+    plt.xlabel("Dia de la semana")
+    plt.ylabel("Numero de actuaciones")
+    plt.ylim(25)
+    plt.savefig(ruta)
+    plt.close()
+
+
+@dibujar_actuaciones_semana.datos
+def datos_actuaciones_semana(conn):
+    # strftime('%w') empieza en domingo (0); pandas usa lunes = 0
+    return consultar(conn, """
+        SELECT (CAST(strftime('%w', fecha) AS INTEGER) + 6) % 7 AS dia_semana,
+               SUM(n_actuaciones) AS Actuaciones
+        FROM hechos_contactos_dia
+        GROUP BY dia_semana
+        ORDER BY dia_semana
+    """)
 
-group_actuaciones["Dia"] = group_actuaciones["dia_semana"].map({0: "Lunes", 1: "Martes", 2: "Miercoles", 3: "Jueves", 4: "Viernes", 5: "Sabado", 6: "Domingo"})
 
-plt.figure(figsize=(12, 6))
-plt.bar(group_actuaciones["Dia"], group_actuaciones["Actuaciones"], color=["blue", "orange", "grey", "yellow", "red", "brown", "green"])
-plt.title("Actuaciones de los empleados por dia de la semana")
-plt.xlabel("Dia de la semana")
-plt.ylabel("Numero de actuaciones")
-plt.ylim(25)
-plt.savefig(os.path.join("static", "images", "actuaciones_semana.png"))
-plt.close()
+# ----------------------------------------------------------------------------- #
+#                              Construccion                                     #
+# ----------------------------------------------------------------------------- #
 
-conn.close()
\ No newline at end of file
+# La huella cubre el agregado y el codigo que lo dibuja
+def huella(fichero, agregado):
+    h = hashlib.sha1()
+    h.update(inspect.getsource(GRAFICOS[fichero]["dibujar"]).encode("utf-8"))
+    h.update(agregado.to_csv(index=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+# Se ejecuta en los procesos del pool
+def _renderizar(fichero, agregado, ruta):
+    GRAFICOS[fichero]["dibujar"](agregado, ruta)
+    return fichero
+
+
+def _leer_huellas(directorio):
+    try:
+        with open(os.path.join(directorio, FICHERO_HUELLAS), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_huellas(directorio, huellas):
+    ruta = os.path.join(directorio, FICHERO_HUELLAS)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(huellas, f, indent=2, sort_keys=True)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def construir_graficos(ruta_db=conexiones.RUTA_DB, directorio=DIRECTORIO, paralelo=True, forzar=False, max_procesos=None):
+    inicio = time.perf_counter()
+    with conexiones.lectura(ruta_db) as conn:
+        agregados = {fichero: definicion["datos"](conn) for fichero, definicion in GRAFICOS.items()}
+
+    huellas = _leer_huellas(directorio)
+    pendientes = {}
+    for fichero, agregado in agregados.items():
+        nueva = huella(fichero, agregado)
+        if forzar or huellas.get(fichero) != nueva or not os.path.exists(os.path.join(directorio, fichero)):
+            pendientes[fichero] = nueva
+
+    os.makedirs(directorio, exist_ok=True)
+    if paralelo and len(pendientes) > 1:
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_procesos, mp_context=contexto) as pool:
+            futuros = [pool.submit(_renderizar, fichero, agregados[fichero], os.path.join(directorio, fichero))
+                       for fichero in pendientes]
+            for futuro in futuros:
+                futuro.result()
+    else:
+        for fichero in pendientes:
+            _renderizar(fichero, agregados[fichero], os.path.join(directorio, fichero))
+
+    huellas.update(pendientes)
+    _guardar_huellas(directorio, huellas)
+
+    return {
+        "generados": sorted(pendientes),
+        "sin_cambios": sorted(set(GRAFICOS) - set(pendientes)),
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera los graficos del dashboard en static/images")
+    parser.add_argument("db", nargs="?", default=conexiones.RUTA_DB)
+    parser.add_argument("--forzar", action="store_true", help="regenera todos los graficos aunque no hayan cambiado")
+    parser.add_argument("--secuencial", action="store_true", help="dibuja los graficos en este mismo proceso")
+    args = parser.parse_args()
+
+    resultado = construir_graficos(args.db, paralelo=not args.secuencial, forzar=args.forzar)
+    print(f"Graficos generados: {', '.join(resultado['generados']) or 'ninguno'}")
+    print(f"Sin cambios: {', '.join(resultado['sin_cambios']) or 'ninguno'}")
+    print(f"Tiempo: {resultado['segundos']:.2f} s")
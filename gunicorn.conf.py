@@ -0,0 +1,92 @@
+# -----------------------------------------------------------------------------
+#                        CONFIGURACION DE GUNICORN
+# -----------------------------------------------------------------------------
+# Uso:  gunicorn -c gunicorn.conf.py
+#
+# - preload_app: el maestro crea la aplicacion e importa pandas y los modulos de
+#   analisis una sola vez (sin abrir la base de datos); los workers los heredan
+#   por fork y comparten esas paginas de memoria.
+# - post_fork: cada worker calcula las metricas del dashboard y arranca los
+#   procesos de los PDF antes de aceptar peticiones, asi que la primera
+#   peticion no paga nada de eso. Se desactiva con INCIDENCIAS_PRECALENTAR=0.
+# - worker_class gthread: /resultados y /practica2 tienen abierta una conexion
+#   a /api/eventos (SSE). Con workers sync cada pagina abierta ocupaba un worker
+#   entero, el resto de peticiones esperaba y el maestro mataba al worker por
+#   timeout a mitad del flujo (perdiendo los tickets de la cola de ingesta).
+#   Con gthread cada conexion ocupa un hilo; como mucho la mitad de los hilos
+#   de un worker se dedican a eventos (INCIDENCIAS_EVENTOS_MAX) y cada conexion
+#   dura menos que el timeout (INCIDENCIAS_EVENTOS_DURACION, ver ingesta.py).
+# - INCIDENCIAS_ESTADO_COMPARTIDO=1: las metricas las calcula una sola vez el
+#   maestro antes de los fork y los workers las comparten (estado_compartido.py).
+#   Con cada version nueva de los datos el maestro las recalcula y recarga los
+#   workers (SIGHUP); hasta entonces cada worker sirve la version que heredo.
+#
+# Variables de entorno: INCIDENCIAS_BIND (127.0.0.1:8000), INCIDENCIAS_WORKERS
+# (numero de CPUs), INCIDENCIAS_HILOS (hilos por worker, 8) e
+# INCIDENCIAS_TIMEOUT (segundos, 120: el precalentado de un worker con muchos
+# datos tarda mas que los 30 s por defecto de gunicorn).
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+
+wsgi_app = "app:create_app()"
+bind = os.environ.get("INCIDENCIAS_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("INCIDENCIAS_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("INCIDENCIAS_HILOS", "8"))
+timeout = int(os.environ.get("INCIDENCIAS_TIMEOUT", "120"))
+preload_app = True
+
+PRECALENTAR = os.environ.get("INCIDENCIAS_PRECALENTAR", "1") == "1"
+ESTADO_COMPARTIDO = os.environ.get("INCIDENCIAS_ESTADO_COMPARTIDO", "0") == "1"
+PRIORIDAD_PDF = 10
+
+# ingesta.py los lee al importarse, y con preload_app eso pasa despues de este fichero
+os.environ.setdefault("INCIDENCIAS_EVENTOS_MAX", str(max(threads // 2, 1)))
+os.environ.setdefault("INCIDENCIAS_EVENTOS_DURACION", str(min(25, max(timeout // 2, 1))))
+
+
+def when_ready(server):
+    import app
+    app.precargar_modulos()
+    if not ESTADO_COMPARTIDO:
+        return
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    import estado_compartido
+    try:
+        estado_compartido.cargar()
+    except Exception:
+        # Sin datos todavia: el hilo lo intenta de nuevo en cada intervalo
+        server.log.exception("no se pudo cargar el estado compartido")
+    estado_compartido.vigilar(lambda version: os.kill(os.getpid(), signal.SIGHUP))
+
+
+def post_fork(server, worker):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    if not PRECALENTAR:
+        return
+    import app
+
+    def precalentar():
+        try:
+            app.precalentar_aplicacion()
+        except Exception:
+            # Sin datos todavia (p.ej. antes de la primera carga) el worker arranca igual
+            server.log.exception("no se pudo precalentar el worker %s", worker.pid)
+
+    # Con el estado compartido ya cargado solo quedan los procesos de los PDF:
+    # el worker atiende mientras arrancan, y en una recarga no hay un hueco
+    # sin workers entre que salen los anteriores y terminan de arrancar estos.
+    # El hilo (y los procesos que lanza, que heredan su prioridad) va con nice
+    # para no quitar CPU a las peticiones mientras arrancan todos a la vez
+    def precalentar_con_nice():
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PRIORIDAD_PDF)
+        precalentar()
+
+    if ESTADO_COMPARTIDO and app.version.fijada() is not None:
+        threading.Thread(target=precalentar_con_nice, daemon=True).start()
+    else:
+        precalentar()
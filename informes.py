@@ -0,0 +1,211 @@
+# -----------------------------------------------------------------------------
+#                  GENERACION DE INFORMES PDF EN SEGUNDO PLANO
+# -----------------------------------------------------------------------------
+# pisa.CreatePDF tarda segundos con muchos datos, asi que no se ejecuta dentro
+# de la peticion: el HTML del informe se renderiza en la peticion (necesita las
+# plantillas de Flask) y la conversion a PDF se hace en un pool de procesos.
+#
+# Cada informe se identifica por la version de los datos, la identidad de la
+# base de datos (version_datos.leer_identidad: las versiones vuelven a empezar
+# si se recrea o se cambia de fichero) y la lista de secciones. Ese
+# identificador es tambien el nombre del PDF en disco, por lo que:
+#   - dos peticiones iguales mientras se genera comparten el mismo trabajo,
+#   - un informe cuyos datos no han cambiado se sirve directamente del disco,
+#     incluso despues de reiniciar la aplicacion.
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PENDIENTE = "pendiente"
+TERMINADO = "terminado"
+ERROR = "error"
+
+
+# Se ejecuta en el proceso hijo: convierte el HTML en PDF y lo deja en 'ruta'
+def _renderizar_pdf(html, ruta):
+    from xhtml2pdf import pisa
+
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        estado = pisa.CreatePDF(html, dest=f)
+    if estado.err:
+        os.remove(temporal)
+        raise RuntimeError(f"xhtml2pdf devolvio {estado.err} errores")
+    # Se renombra al final para que nunca se sirva un PDF a medio escribir
+    os.replace(temporal, ruta)
+
+
+# Se ejecuta en los procesos del pool para que el primer informe no pague la importacion
+def _precargar():
+    import xhtml2pdf.pisa  # noqa: F401
+    return os.getpid()
+
+
+# Copia el resultado del proceso hijo en el futuro del trabajo
+def _trasladar(proceso, futuro):
+    error = proceso.exception()
+    if error is not None:
+        futuro.set_exception(error)
+    else:
+        futuro.set_result(proceso.result())
+
+
+def id_informe(version, identidad, secciones):
+    huella = hashlib.sha1(",".join(secciones).encode("utf-8")).hexdigest()[:12]
+    return f"{version}-{identidad}-{huella}"
+
+
+class GestorInformes:
+    def __init__(self, directorio="informes", max_procesos=2):
+        self.directorio = directorio
+        self.max_procesos = max_procesos
+        self._pool = None
+        self._trabajos = {}
+        self._lock = threading.Lock()
+
+    def _obtener_pool(self):
+        if self._pool is None:
+            # 'spawn' evita heredar los hilos y locks del servidor web
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    # Arranca los procesos del pool y carga xhtml2pdf en ellos
+    def precalentar(self):
+        with self._lock:
+            pool = self._obtener_pool()
+        futuros = [pool.submit(_precargar) for _ in range(self.max_procesos)]
+        return {futuro.result() for futuro in futuros}
+
+    def ruta(self, id_trabajo):
+        return os.path.join(self.directorio, f"informe_{id_trabajo}.pdf")
+
+    # Lanza (o reutiliza) el informe de esa version y secciones. 'generar_html'
+    # solo se llama si hace falta renderizar de verdad.
+    def solicitar(self, version, identidad, secciones, generar_html):
+        id_trabajo = id_informe(version, identidad, secciones)
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is not None and trabajo["estado"] != ERROR:
+                return id_trabajo
+            if os.path.exists(self.ruta(id_trabajo)):
+                self._trabajos[id_trabajo] = {"estado": TERMINADO, "error": None, "futuro": None,
+                                              "version": version, "identidad": identidad, "creado": time.time()}
+                return id_trabajo
+            # El trabajo se registra antes de renderizar el HTML para que las
+            # peticiones iguales que lleguen mientras tanto se unan a este. Su
+            # futuro se resuelve cuando termina el proceso hijo, asi que
+            # esperar() y futuro() funcionan igual desde el primer momento
+            futuro = Future()
+            self._trabajos[id_trabajo] = {"estado": PENDIENTE, "error": None, "futuro": futuro,
+                                          "version": version, "identidad": identidad, "creado": time.time()}
+        futuro.add_done_callback(lambda f: self._terminar(id_trabajo, f))
+
+        # Fuera del lock: renderizar el HTML lleva tiempo y no debe bloquear
+        # a estado(), esperar() ni a los callbacks de otros informes
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            proceso = self._enviar(generar_html(), self.ruta(id_trabajo))
+        except BaseException as error:
+            futuro.set_exception(error)
+            raise
+        proceso.add_done_callback(lambda p: _trasladar(p, futuro))
+        return id_trabajo
+
+    def _enviar(self, html, ruta):
+        with self._lock:
+            pool = self._obtener_pool()
+        try:
+            return pool.submit(_renderizar_pdf, html, ruta)
+        except BrokenProcessPool:
+            # Algun proceso hijo murio: se descarta el pool y se crea otro
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+                pool = self._obtener_pool()
+            return pool.submit(_renderizar_pdf, html, ruta)
+
+    def _terminar(self, id_trabajo, futuro):
+        error = futuro.exception()
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None or trabajo["futuro"] is not futuro:
+                return
+            trabajo["estado"] = ERROR if error else TERMINADO
+            trabajo["error"] = str(error) if error else None
+            trabajo["futuro"] = None
+            version, identidad = trabajo["version"], trabajo["identidad"]
+            if isinstance(error, BrokenProcessPool):
+                self._pool = None
+        if not error:
+            self.limpiar(version, identidad)
+
+    def estado(self, id_trabajo):
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is not None:
+                return {"id": id_trabajo, "estado": trabajo["estado"], "error": trabajo["error"]}
+        # Informes generados por un proceso anterior
+        if os.path.exists(self.ruta(id_trabajo)):
+            return {"id": id_trabajo, "estado": TERMINADO, "error": None}
+        return None
+
+    # Futuro del trabajo que genera el informe, o None si ya no esta en marcha.
+    # Permite esperarlo sin ocupar un hilo (asyncio.wrap_future en asgi.py)
+    def futuro(self, id_trabajo):
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            return trabajo["futuro"] if trabajo else None
+
+    # Espera a que termine el trabajo (o a que pase 'timeout') y devuelve su estado
+    def esperar(self, id_trabajo, timeout=None):
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            futuro = trabajo["futuro"] if trabajo else None
+        if futuro is not None:
+            try:
+                futuro.result(timeout=timeout)
+            except Exception:
+                pass
+            # El callback se ejecuta justo despues de resolver el futuro
+            if futuro.done():
+                self._terminar(id_trabajo, futuro)
+        return self.estado(id_trabajo)
+
+    # Para el pool de procesos esperando a los informes en marcha. Hace falta
+    # cuando el gestor vive dentro de un multiprocessing.Process, que al salir
+    # espera a sus hijos sin cerrar antes el pool
+    def cerrar(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    # Borra los PDF de versiones de los datos anteriores a 'version_actual' y
+    # los de otra base de datos (otra 'identidad' o sin ella en el nombre)
+    def limpiar(self, version_actual, identidad):
+        if not os.path.isdir(self.directorio):
+            return
+        for nombre in os.listdir(self.directorio):
+            if not (nombre.startswith("informe_") and nombre.endswith(".pdf")):
+                continue
+            partes = nombre[len("informe_"):-len(".pdf")].split("-")
+            if len(partes) == 3 and partes[0].isdigit() and partes[1] == identidad \
+                    and int(partes[0]) >= version_actual:
+                continue
+            try:
+                os.remove(os.path.join(self.directorio, nombre))
+            except OSError:
+                pass
+        with self._lock:
+            for id_trabajo in [i for i, t in self._trabajos.items()
+                               if (t["version"] < version_actual or t["identidad"] != identidad)
+                               and t["estado"] != PENDIENTE]:
+                del self._trabajos[id_trabajo]
@@ -0,0 +1,568 @@
+# -----------------------------------------------------------------------------
+#                 INGESTA EN TIEMPO REAL (POST /api/tickets)
+# -----------------------------------------------------------------------------
+# Los tickets llegan por HTTP con el mismo formato que tickets_emitidos (uno
+# suelto o una lista, con sus contactos_con_empleados). Se validan todos y se
+# dejan en una cola en memoria: la peticion responde 202 sin esperar a SQLite.
+# Un unico hilo escritor vacia la cola por lotes, en cuanto junta TAMANO_LOTE
+# tickets o el mas antiguo lleva INTERVALO segundos esperando, y en una sola
+# transaccion:
+#   - los tickets que ya estaban (misma clave_natural que en carga.py) no se
+#     vuelven a escribir; a los que traen id_externo se les añaden los
+#     contactos nuevos, y si el id_externo ya estaba con otros datos el ticket
+#     es un conflicto: no se escribe y se cuenta en /api/tickets/estado
+#   - inserta tickets y contactos con executemany
+#   - anota el lote en control_cargas (modo 'api'): cambia la version de los
+#     datos y con ella las caches del dashboard, y acceso_datos solo tiene que
+#     leer las filas nuevas
+#   - suma los tickets del lote a las tablas de hechos (almacen.acumular) y
+#     a los acumuladores de los KPI (acumuladores.actualizar)
+# Despues avisa a los dashboards conectados a GET /api/eventos (Server-Sent
+# Events); ese flujo avisa tambien de los cambios de version que vienen de
+# otros procesos (otros workers, main.py).
+#
+# La cola es de cada proceso y no se guarda en disco: lo aceptado y aun no
+# escrito se pierde si el proceso muere (al salir de forma normal se vacia).
+# Con la cola llena se responde 503 con Retry-After. Un id_externo que ya esta
+# en la base de datos (o repetido en la misma peticion) con otros datos se
+# rechaza con 409 antes de encolar nada.
+#
+# Variables de entorno:
+#   INCIDENCIAS_INGESTA_LOTE           tickets por lote (500)
+#   INCIDENCIAS_INGESTA_INTERVALO      espera maxima de un ticket en la cola (0.05 s)
+#   INCIDENCIAS_INGESTA_MAX_PENDIENTES tickets en la cola como maximo (20000)
+#   INCIDENCIAS_EVENTOS_DURACION       segundos que dura cada conexion de
+#                                      /api/eventos antes de que el cliente
+#                                      reconecte (25, menos que el timeout de gunicorn)
+#   INCIDENCIAS_EVENTOS_MAX            conexiones de /api/eventos por proceso
+#                                      (0: sin limite); con mas se responde 503
+#                                      y la pagina pasa a consultar /api/tickets/estado
+
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import date
+
+from flask import Blueprint, Response, jsonify, request
+
+import acumuladores
+import almacen
+import carga
+import conexiones
+import instrumentacion
+from version_datos import vigilante
+
+log = logging.getLogger(__name__)
+
+TAMANO_LOTE = int(os.environ.get("INCIDENCIAS_INGESTA_LOTE", "500"))
+INTERVALO = float(os.environ.get("INCIDENCIAS_INGESTA_INTERVALO", "0.05"))
+MAX_PENDIENTES = int(os.environ.get("INCIDENCIAS_INGESTA_MAX_PENDIENTES", "20000"))
+DURACION_EVENTOS = float(os.environ.get("INCIDENCIAS_EVENTOS_DURACION", "25"))
+MAX_EVENTOS = int(os.environ.get("INCIDENCIAS_EVENTOS_MAX", "0"))
+
+# Tickets por peticion como maximo
+MAX_POR_PETICION = 1000
+
+# Latencias (encolado -> escrito) guardadas para los percentiles de /api/tickets/estado
+MUESTRAS_LATENCIA = 10000
+
+ingesta_api = Blueprint("ingesta", __name__, url_prefix="/api")
+
+
+class TicketInvalido(ValueError):
+    pass
+
+
+class ColaLlena(RuntimeError):
+    pass
+
+
+class BaseNoPreparada(RuntimeError):
+    pass
+
+
+# -----------------------------------------------------------------------------
+# Validacion
+# -----------------------------------------------------------------------------
+
+CAMPOS_TICKET = ("cliente", "fecha_apertura", "fecha_cierre", "es_mantenimiento", "satisfaccion_cliente",
+                 "tipo_incidencia", "contactos_con_empleados")
+CAMPOS_CONTACTO = ("id_emp", "fecha", "tiempo")
+# Identificador del ticket en el sistema de origen (ver carga.clave_ticket)
+OPCIONALES_TICKET = ("id_externo",)
+
+_FECHA = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _fecha(valor, campo):
+    if not isinstance(valor, str) or not _FECHA.match(valor):
+        raise TicketInvalido(f"'{campo}' debe ser una fecha AAAA-MM-DD")
+    try:
+        date.fromisoformat(valor)
+    except ValueError:
+        raise TicketInvalido(f"'{campo}' no es una fecha valida")
+    return valor
+
+
+# Los ids pueden venir como texto o como numero (tipo_incidencia es un numero
+# en datos.json); se comparan con las dimensiones como texto
+def _id(valor, campo, existentes):
+    if isinstance(valor, bool) or not isinstance(valor, (str, int)) or valor == "":
+        raise TicketInvalido(f"'{campo}' debe ser un identificador")
+    if existentes is not None and str(valor) not in existentes:
+        raise TicketInvalido(f"{campo} '{valor}' no existe")
+    return valor
+
+
+def _campos(objeto, campos, que, opcionales=()):
+    if not isinstance(objeto, dict):
+        raise TicketInvalido(f"cada {que} debe ser un objeto JSON")
+    faltan = [c for c in campos if c not in objeto]
+    if faltan:
+        raise TicketInvalido(f"al {que} le faltan los campos {faltan}")
+    sobran = [c for c in objeto if c not in campos and c not in opcionales]
+    if sobran:
+        raise TicketInvalido(f"campos desconocidos en el {que}: {sobran}")
+
+
+# Comprueba un ticket sin modificarlo: la clave_natural se calcula sobre sus
+# campos tal y como llegan, igual que en las cargas desde fichero.
+# 'dimensiones' tiene los ids de clientes, empleados y tipos (None: sin comprobar)
+def validar_ticket(ticket, dimensiones=None):
+    dimensiones = dimensiones or {}
+    _campos(ticket, CAMPOS_TICKET, "ticket", OPCIONALES_TICKET)
+    if ticket.get("id_externo") is not None:
+        _id(ticket["id_externo"], "id_externo", None)
+    _id(ticket["cliente"], "cliente", dimensiones.get("clientes"))
+    _id(ticket["tipo_incidencia"], "tipo_incidencia", dimensiones.get("tipos"))
+    apertura = _fecha(ticket["fecha_apertura"], "fecha_apertura")
+    if ticket["fecha_cierre"] is not None and _fecha(ticket["fecha_cierre"], "fecha_cierre") < apertura:
+        raise TicketInvalido("'fecha_cierre' es anterior a 'fecha_apertura'")
+    if not isinstance(ticket["es_mantenimiento"], bool) and ticket["es_mantenimiento"] not in (0, 1):
+        raise TicketInvalido("'es_mantenimiento' debe ser true/false")
+    satisfaccion = ticket["satisfaccion_cliente"]
+    if isinstance(satisfaccion, bool) or not isinstance(satisfaccion, int) or not 1 <= satisfaccion <= 10:
+        raise TicketInvalido("'satisfaccion_cliente' debe ser un entero entre 1 y 10")
+
+    contactos = ticket["contactos_con_empleados"]
+    if not isinstance(contactos, list):
+        raise TicketInvalido("'contactos_con_empleados' debe ser una lista")
+    for contacto in contactos:
+        _campos(contacto, CAMPOS_CONTACTO, "contacto")
+        _id(contacto["id_emp"], "id_emp", dimensiones.get("empleados"))
+        _fecha(contacto["fecha"], "fecha")
+        tiempo = contacto["tiempo"]
+        if isinstance(tiempo, bool) or not isinstance(tiempo, (int, float)) or not 0 <= tiempo < float("inf"):
+            raise TicketInvalido("'tiempo' debe ser un numero de horas no negativo")
+    return ticket
+
+
+# Ids de las dimensiones, leidos de nuevo cuando cambia la version
+_dimensiones = (None, None)
+_lock_dimensiones = threading.Lock()
+
+
+def dimensiones(ruta_db=None):
+    global _dimensiones
+    version = vigilante(ruta_db).comprobar()
+    with _lock_dimensiones:
+        if _dimensiones[0] != version:
+            with conexiones.lectura(ruta_db) as conn:
+                _dimensiones = (version, {
+                    "clientes": {fila[0] for fila in conn.execute("SELECT id_cli FROM clientes")},
+                    "empleados": {fila[0] for fila in conn.execute("SELECT id_emp FROM empleados")},
+                    "tipos": {fila[0] for fila in conn.execute("SELECT id_inci FROM tipos_incidentes")},
+                })
+        return _dimensiones[1]
+
+
+# Tickets cuyo id_externo ya esta cargado, o antes en la misma peticion, con
+# otros datos: [(indice, mensaje)]. Los que estan en la cola todavia no se ven
+# aqui; esos los descarta el escritor y los cuenta como conflictos
+def conflictos(tickets, ruta_db=None):
+    claves = {}
+    for i, ticket in enumerate(tickets):
+        if ticket.get("id_externo") is not None:
+            claves.setdefault(carga.clave_ticket(ticket), []).append(i)
+    if not claves:
+        return []
+    with conexiones.lectura(ruta_db) as conn:
+        cargados = carga.ids_existentes(conn.cursor(), list(claves))
+    encontrados = []
+    for clave, indices in claves.items():
+        identidad = cargados[clave][1] if clave in cargados else carga.identidad_ticket(tickets[indices[0]])
+        for i in indices:
+            if carga.identidad_ticket(tickets[i]) != identidad:
+                encontrados.append((i, f"el id_externo '{tickets[i]['id_externo']}' ya existe con otro cliente, "
+                                       "fecha de apertura, tipo, mantenimiento o satisfaccion"))
+    return sorted(encontrados)
+
+
+# -----------------------------------------------------------------------------
+# Cola y escritor
+# -----------------------------------------------------------------------------
+
+def _percentil(valores, q):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+class Ingesta:
+    def __init__(self, ruta_db=None, tamano_lote=TAMANO_LOTE, intervalo=INTERVALO, max_pendientes=MAX_PENDIENTES):
+        self.ruta_db = ruta_db or conexiones.RUTA_DB
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self._iniciar_estado()
+
+    # Las tablas de control, indices y disparador de las cargas, por si la
+    # base de datos es anterior a ellas. Sin claves naturales no se pueden
+    # reconocer los repetidos, igual que en la carga incremental
+    def preparar(self):
+        if self._preparada:
+            return
+        with conexiones.escritura(self.ruta_db) as conn:
+            cursor = conn.cursor()
+            columnas = {fila[1] for fila in cursor.execute("PRAGMA table_info(tickets)")}
+            if "clave_natural" not in columnas:
+                raise BaseNoPreparada("La base de datos no tiene claves naturales; recarguela con main.py")
+            carga.crear_esquema(cursor, borrar=False)
+            carga.crear_indices(cursor)
+            carga.crear_disparadores(cursor)
+            carga.migrar_claves(cursor)
+        self._preparada = True
+
+    def _iniciar_estado(self):
+        self._preparada = False
+        # (momento de llegada, ticket) en orden de llegada
+        self._pendientes = deque()
+        self._condicion = threading.Condition()
+        self._hilo = None
+        self._escribiendo = False
+        self._parar = False
+        self._suscriptores = set()
+        self._lock_suscriptores = threading.Lock()
+        self._latencias = deque(maxlen=MUESTRAS_LATENCIA)
+        self._metricas = {"recibidos": 0, "escritos": 0, "repetidos": 0, "conflictos": 0, "lotes": 0,
+                          "errores": 0, "rechazados": 0, "segundos_escritura": 0.0}
+        self._ultimo_lote = None
+
+    # En el hijo de un fork no existe el hilo escritor y los locks pueden
+    # haberse copiado cogidos: se empieza de cero (lo pendiente es del padre)
+    def _tras_fork(self):
+        self._iniciar_estado()
+
+    # Encola tickets ya validados; todos o ninguno
+    def encolar(self, tickets):
+        llegada = time.perf_counter()
+        with self._condicion:
+            if len(self._pendientes) + len(tickets) > self.max_pendientes:
+                self._metricas["rechazados"] += len(tickets)
+                raise ColaLlena(f"hay {len(self._pendientes)} tickets pendientes de escribir")
+            estaba_vacia = not self._pendientes
+            self._pendientes.extend((llegada, ticket) for ticket in tickets)
+            self._metricas["recibidos"] += len(tickets)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._parar = False
+                self._hilo = threading.Thread(target=self._escribir, name="ingesta", daemon=True)
+                self._hilo.start()
+            # El escritor solo necesita despertar para empezar a contar el
+            # intervalo o cuando ya hay un lote completo
+            if estaba_vacia or len(self._pendientes) >= self.tamano_lote:
+                self._condicion.notify()
+            return len(self._pendientes)
+
+    def _siguiente_lote(self):
+        with self._condicion:
+            while not self._pendientes and not self._parar:
+                self._condicion.wait()
+            if not self._pendientes:
+                return []
+            limite = self._pendientes[0][0] + self.intervalo
+            while len(self._pendientes) < self.tamano_lote and not self._parar:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                self._condicion.wait(restante)
+            self._escribiendo = True
+            return [self._pendientes.popleft() for _ in range(min(len(self._pendientes), self.tamano_lote))]
+
+    def _escribir(self):
+        while True:
+            lote = self._siguiente_lote()
+            if not lote:
+                return
+            try:
+                evento = self._volcar(lote)
+            except Exception:
+                log.exception("no se pudo escribir un lote de %d tickets", len(lote))
+                with self._condicion:
+                    self._metricas["errores"] += len(lote)
+                evento = None
+            with self._condicion:
+                self._escribiendo = False
+                self._condicion.notify_all()
+            if evento is not None:
+                self._publicar(evento)
+
+    def _volcar(self, lote):
+        inicio = time.perf_counter()
+        tickets = [ticket for _, ticket in lote]
+        claves = [carga.clave_ticket(ticket) for ticket in tickets]
+        with conexiones.escritura(self.ruta_db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            max_id_ticket, max_id_contacto = cursor.execute("""
+                SELECT (SELECT COALESCE(MAX(id_ticket), 0) FROM tickets),
+                       (SELECT COALESCE(MAX(id_contacto), 0) FROM contactos_empleados)
+            """).fetchone()
+            filas_tickets, filas_contactos, repetidos, en_conflicto, _ = carga.filas_lote(
+                cursor, list(zip(claves, tickets)), max_id_ticket + 1, {}, claves)
+            version = None
+            if filas_tickets or filas_contactos:
+                cursor.executemany(carga.INSERT_TICKET, filas_tickets)
+                cursor.executemany(carga.INSERT_CONTACTO, filas_contactos)
+                carga.registrar_carga(cursor, "api", None, len(filas_tickets), len(filas_contactos))
+                almacen.acumular(cursor, max_id_ticket, max_id_contacto)
+                acumuladores.actualizar(cursor)
+                version = cursor.execute("SELECT MAX(id_carga) FROM control_cargas").fetchone()[0]
+        escrito = time.perf_counter()
+        if en_conflicto:
+            log.warning("%d tickets con un id_externo ya cargado y otros datos; no se escriben: %s",
+                        len(en_conflicto), en_conflicto[:10])
+
+        # Las caches de este proceso pasan a la nueva version sin esperar al intervalo del vigilante
+        if version is not None:
+            vigilante(self.ruta_db).comprobar(forzar=True)
+
+        evento = {
+            "version": version,
+            "tickets": len(filas_tickets),
+            "contactos": len(filas_contactos),
+            "repetidos": repetidos,
+            "conflictos": len(en_conflicto),
+            "segundos": round(escrito - inicio, 4),
+        }
+        with self._condicion:
+            self._metricas["escritos"] += evento["tickets"]
+            self._metricas["repetidos"] += evento["repetidos"]
+            self._metricas["conflictos"] += evento["conflictos"]
+            self._metricas["lotes"] += 1
+            self._metricas["segundos_escritura"] += escrito - inicio
+            self._latencias.extend(escrito - llegada for llegada, _ in lote)
+            self._ultimo_lote = evento
+        return evento if version is not None else None
+
+    # Espera a que la cola quede vacia y el lote en curso escrito
+    def vaciar(self, timeout=None):
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._condicion:
+            while self._pendientes or self._escribiendo:
+                if self._hilo is None or not self._hilo.is_alive():
+                    return False
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._condicion.wait(restante)
+        return True
+
+    # Escribe lo pendiente y para el escritor
+    def cerrar(self, timeout=30):
+        with self._condicion:
+            self._parar = True
+            self._condicion.notify_all()
+            hilo = self._hilo
+        if hilo is not None and hilo.is_alive():
+            hilo.join(timeout)
+
+    def estado(self):
+        with self._condicion:
+            latencias = list(self._latencias)
+            estado = dict(self._metricas, pendientes=len(self._pendientes), ultimo_lote=self._ultimo_lote)
+        estado["latencia_p50"] = _percentil(latencias, 0.50)
+        estado["latencia_p99"] = _percentil(latencias, 0.99)
+        estado["suscriptores"] = len(self._suscriptores)
+        return estado
+
+    # -------------------------------------------------------------------------
+    # Suscriptores (una cola por conexion de /api/eventos)
+    # -------------------------------------------------------------------------
+
+    # Devuelve None si ya hay 'limite' suscriptores (0: sin limite)
+    def suscribir(self, limite=0):
+        cola = queue.Queue(maxsize=100)
+        with self._lock_suscriptores:
+            if limite and len(self._suscriptores) >= limite:
+                return None
+            self._suscriptores.add(cola)
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock_suscriptores:
+            self._suscriptores.discard(cola)
+
+    def _publicar(self, evento):
+        with self._lock_suscriptores:
+            suscriptores = list(self._suscriptores)
+        for cola in suscriptores:
+            try:
+                cola.put_nowait(evento)
+            except queue.Full:
+                # Un cliente que no lee pierde eventos, pero no frena al escritor
+                pass
+
+
+_ingestas = {}
+_lock_ingestas = threading.Lock()
+
+
+# Instancia compartida por ruta de base de datos
+def ingesta(ruta_db=None):
+    ruta_db = ruta_db or conexiones.RUTA_DB
+    with _lock_ingestas:
+        if ruta_db not in _ingestas:
+            _ingestas[ruta_db] = Ingesta(ruta_db)
+        return _ingestas[ruta_db]
+
+
+def _tras_fork():
+    for instancia in list(_ingestas.values()):
+        instancia._tras_fork()
+
+
+def _cerrar_todas():
+    for instancia in list(_ingestas.values()):
+        instancia.cerrar()
+
+
+os.register_at_fork(after_in_child=_tras_fork)
+atexit.register(_cerrar_todas)
+
+
+@instrumentacion.registrar_colector
+def _metricas_ingesta():
+    estados = [(ruta, instancia.estado()) for ruta, instancia in list(_ingestas.items())]
+    contadores = [
+        ("incidencias_ingesta_recibidos_total", "counter", "Tickets aceptados por POST /api/tickets", "recibidos"),
+        ("incidencias_ingesta_escritos_total", "counter", "Tickets escritos en SQLite", "escritos"),
+        ("incidencias_ingesta_repetidos_total", "counter", "Tickets que ya estaban cargados", "repetidos"),
+        ("incidencias_ingesta_conflictos_total", "counter",
+         "Tickets no escritos porque su id_externo ya estaba con otros datos", "conflictos"),
+        ("incidencias_ingesta_errores_total", "counter", "Tickets de lotes que no se pudieron escribir", "errores"),
+        ("incidencias_ingesta_rechazados_total", "counter", "Tickets rechazados con la cola llena", "rechazados"),
+        ("incidencias_ingesta_lotes_total", "counter", "Lotes escritos", "lotes"),
+        ("incidencias_ingesta_pendientes", "gauge", "Tickets en la cola", "pendientes"),
+    ]
+    return [(nombre, tipo, ayuda, [({"db": ruta}, estado[clave]) for ruta, estado in estados])
+            for nombre, tipo, ayuda, clave in contadores]
+
+
+# -----------------------------------------------------------------------------
+# Rutas
+# -----------------------------------------------------------------------------
+
+@ingesta_api.errorhandler(TicketInvalido)
+def ticket_invalido(error):
+    return jsonify(error=str(error)), 400
+
+
+@ingesta_api.route("/tickets", methods=["POST"])
+def recibir_tickets():
+    datos = request.get_json(silent=True)
+    if datos is None:
+        raise TicketInvalido("se esperaba un ticket o una lista de tickets en JSON")
+    tickets = datos if isinstance(datos, list) else [datos]
+    if not tickets:
+        raise TicketInvalido("la lista de tickets esta vacia")
+    if len(tickets) > MAX_POR_PETICION:
+        return jsonify(error=f"como maximo {MAX_POR_PETICION} tickets por peticion"), 413
+
+    # Se valida todo antes de encolar nada
+    ids = dimensiones()
+    errores = []
+    for i, ticket in enumerate(tickets):
+        try:
+            validar_ticket(ticket, ids)
+        except TicketInvalido as error:
+            errores.append({"indice": i, "error": str(error)})
+    if errores:
+        return jsonify(error="hay tickets no validos; no se ha aceptado ninguno", detalles=errores[:50]), 400
+
+    try:
+        instancia = ingesta()
+        instancia.preparar()
+        choques = conflictos(tickets, instancia.ruta_db)
+        if choques:
+            return jsonify(error="hay tickets en conflicto; no se ha aceptado ninguno",
+                           detalles=[{"indice": i, "error": mensaje} for i, mensaje in choques[:50]]), 409
+        pendientes = instancia.encolar(tickets)
+    except ColaLlena as error:
+        return jsonify(error=str(error)), 503, {"Retry-After": "1"}
+    except BaseNoPreparada as error:
+        return jsonify(error=str(error)), 503
+    return jsonify(aceptados=len(tickets), pendientes=pendientes), 202
+
+
+@ingesta_api.route("/tickets/estado")
+def estado_ingesta():
+    # La version es la de la base de datos, igual en todos los workers: la
+    # consultan las paginas que no tienen /api/eventos
+    return jsonify(dict(ingesta().estado(), version=vigilante().comprobar()))
+
+
+# Segundos entre comprobaciones de la version y entre comentarios de latido
+COMPROBAR_VERSION = 1.0
+LATIDO = 15.0
+
+
+def _evento(tipo, datos):
+    return f"event: {tipo}\ndata: {json.dumps(datos)}\n\n"
+
+
+@ingesta_api.route("/eventos")
+def eventos():
+    instancia = ingesta()
+    cola = instancia.suscribir(MAX_EVENTOS)
+    if cola is None:
+        return jsonify(error="demasiadas conexiones a /api/eventos"), 503, {"Retry-After": "30"}
+    version = vigilante()
+
+    # Cada conexion termina a los DURACION_EVENTOS segundos y el navegador
+    # vuelve a conectar pasado el 'retry': asi ninguna peticion se acerca al
+    # timeout del worker y los hilos se reparten entre todas las paginas abiertas
+    def flujo():
+        try:
+            ultima = version.comprobar()
+            yield "retry: 3000\n" + _evento("version", {"version": ultima})
+            enviado = time.monotonic()
+            fin = enviado + DURACION_EVENTOS
+            while time.monotonic() < fin:
+                try:
+                    evento = cola.get(timeout=min(COMPROBAR_VERSION, max(fin - time.monotonic(), 0)))
+                    ultima = max(ultima, evento["version"])
+                    yield _evento("tickets", evento)
+                    enviado = time.monotonic()
+                    continue
+                except queue.Empty:
+                    pass
+                actual = version.comprobar()
+                if actual != ultima:
+                    ultima = actual
+                    yield _evento("version", {"version": actual})
+                    enviado = time.monotonic()
+                elif time.monotonic() - enviado >= LATIDO:
+                    yield ": latido\n\n"
+                    enviado = time.monotonic()
+        finally:
+            instancia.desuscribir(cola)
+
+    return Response(flujo(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,219 @@
+# -----------------------------------------------------------------------------
+#                  INSTANTANEA COLUMNAR DE TICKETS Y CONTACTOS
+# -----------------------------------------------------------------------------
+# Tras cada carga, main.py guarda tickets y contactos_empleados columna a
+# columna en ficheros .npy, ya con los tipos de acceso_datos:
+#   - fechas como datetime64
+#   - categorias como codigos enteros (las categorias van en meta.json)
+#   - enteros con nulos como valores + mascara de nulos
+# Los analisis abren esos ficheros con np.load(mmap_mode="r"): la tabla no pasa
+# por SQLite ni por objetos de Python, las paginas se leen del disco cuando se
+# usan y todos los procesos que abren la misma instantanea las comparten.
+#
+# Cada instantanea va en un directorio por version de los datos (v<id_carga>,
+# ver version_datos) que se escribe aparte y se renombra al terminar. Ademas de
+# la version guarda una huella (fecha de la carga y ultimos ids de tickets y
+# contactos) para no servir una instantanea de otra base de datos con la misma
+# version ni una a la que le faltan filas escritas despues. Si no hay
+# instantanea valida de la version actual acceso_datos lee de SQLite.
+#
+# El directorio se configura con INCIDENCIAS_INSTANTANEA (por defecto
+# <base de datos sin extension>_instantanea).
+#
+# Uso:
+#   python instantanea.py [incidencias.db]
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import conexiones
+from version_datos import leer_fecha_version, leer_version
+
+log = logging.getLogger(__name__)
+
+TABLAS = ("tickets", "contactos_empleados")
+
+CATEGORIA = "category"
+FECHA = "fecha"
+
+
+def directorio(ruta_db=None):
+    ruta_db = ruta_db or conexiones.RUTA_DB
+    return os.environ.get("INCIDENCIAS_INSTANTANEA") or os.path.splitext(ruta_db)[0] + "_instantanea"
+
+
+def huella(conn):
+    fecha = leer_fecha_version(conn)
+    return [leer_version(conn), fecha.isoformat() if fecha else None,
+            conn.execute("SELECT MAX(id_ticket) FROM tickets").fetchone()[0],
+            conn.execute("SELECT MAX(id_contacto) FROM contactos_empleados").fetchone()[0]]
+
+
+def _fichero(base, tabla, columna, sufijo=""):
+    return os.path.join(base, f"{tabla}.{columna}{sufijo}.npy")
+
+
+# Guarda una columna y devuelve su descripcion para meta.json
+def _guardar_columna(base, tabla, columna, serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        np.save(_fichero(base, tabla, columna), serie.cat.codes.to_numpy())
+        return {"tipo": CATEGORIA, "categorias": serie.cat.categories.tolist()}
+    if pd.api.types.is_datetime64_dtype(serie.dtype):
+        np.save(_fichero(base, tabla, columna), serie.to_numpy())
+        return {"tipo": FECHA}
+    if isinstance(serie.dtype, pd.api.extensions.ExtensionDtype):
+        # Entero con NA de pandas (Int8, Int32...)
+        tipo = serie.dtype.numpy_dtype
+        np.save(_fichero(base, tabla, columna), serie.to_numpy(dtype=tipo, na_value=0))
+        np.save(_fichero(base, tabla, columna, ".nulos"), serie.isna().to_numpy())
+        return {"tipo": str(tipo), "nulos": True}
+    if serie.dtype == object:
+        return None
+    np.save(_fichero(base, tabla, columna), serie.to_numpy())
+    return {"tipo": str(serie.dtype)}
+
+
+def escribir(tablas, huella_datos, ruta_directorio):
+    version = huella_datos[0]
+    os.makedirs(ruta_directorio, exist_ok=True)
+    final = os.path.join(ruta_directorio, f"v{version}")
+    temporal = f"{final}.tmp{os.getpid()}"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    meta = {"version": version, "huella": huella_datos, "creada": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "tablas": {}}
+    for tabla, df in tablas.items():
+        columnas = {}
+        for columna in df.columns:
+            descripcion = _guardar_columna(temporal, tabla, columna, df[columna])
+            # Las columnas de texto libre no se guardan: esas lecturas van a SQLite
+            if descripcion is not None:
+                columnas[columna] = descripcion
+        meta["tablas"][tabla] = {"filas": len(df), "columnas": columnas}
+    with open(os.path.join(temporal, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    # El directorio aparece completo o no aparece
+    shutil.rmtree(final, ignore_errors=True)
+    os.rename(temporal, final)
+
+    # Las versiones anteriores se borran; un proceso que aun las tenga
+    # mapeadas sigue leyendo sus paginas hasta que las suelte
+    for nombre in os.listdir(ruta_directorio):
+        if nombre.startswith("v") and nombre != f"v{version}" and ".tmp" not in nombre:
+            shutil.rmtree(os.path.join(ruta_directorio, nombre), ignore_errors=True)
+    return final
+
+
+# Lee las tablas de SQLite con los tipos de acceso_datos y guarda la instantanea.
+# Version y tablas se leen en la misma transaccion, asi que corresponden entre si
+def generar(ruta_db=None, ruta_directorio=None):
+    import acceso_datos
+
+    ruta_db = ruta_db or conexiones.RUTA_DB
+    ruta_directorio = ruta_directorio or directorio(ruta_db)
+    inicio = time.perf_counter()
+    conn = conexiones.conectar_lectura(ruta_db)
+    try:
+        conn.execute("BEGIN")
+        huella_datos = huella(conn)
+        tablas = {tabla: acceso_datos.leer_tabla(conn, tabla) for tabla in TABLAS}
+        conn.rollback()
+    finally:
+        conn.close()
+    ruta = escribir(tablas, huella_datos, ruta_directorio)
+    return {"version": huella_datos[0], "ruta": ruta, "filas": {t: len(df) for t, df in tablas.items()},
+            "segundos": time.perf_counter() - inicio}
+
+
+# Vista ndarray normal sobre el fichero mapeado (el mapa sigue vivo en .base)
+def _mapear(ruta):
+    return np.load(ruta, mmap_mode="r").view(np.ndarray)
+
+
+def _abrir_columna(base, tabla, columna, descripcion):
+    valores = _mapear(_fichero(base, tabla, columna))
+    if descripcion["tipo"] == CATEGORIA:
+        return pd.Categorical.from_codes(valores, categories=descripcion["categorias"], validate=False)
+    if descripcion.get("nulos"):
+        nulos = _mapear(_fichero(base, tabla, columna, ".nulos"))
+        return pd.arrays.IntegerArray(valores, nulos)
+    return valores
+
+
+class Instantanea:
+    def __init__(self, ruta_directorio):
+        self.ruta_directorio = ruta_directorio
+        # Ultima meta.json valida: (version, meta). Si no la hay se vuelve a
+        # buscar en cada lectura, porque main.py la escribe despues de la carga
+        self._meta = (None, None)
+        self._lock = threading.Lock()
+
+    def _leer_meta(self, conn, version):
+        with self._lock:
+            if self._meta[0] == version:
+                return self._meta[1]
+            try:
+                with open(os.path.join(self.ruta_directorio, f"v{version}", "meta.json"), encoding="utf-8") as f:
+                    meta = json.load(f)
+            except FileNotFoundError:
+                return None
+            if meta.get("huella") != huella(conn):
+                log.warning("instantanea v%s desactualizada, se lee de SQLite", version)
+                return None
+            self._meta = (version, meta)
+            return meta
+
+    # DataFrame de la tabla en la version actual de conn, o None si la
+    # instantanea no existe, no corresponde a los datos o no tiene todas las
+    # columnas pedidas
+    def leer(self, conn, version, tabla, columnas):
+        meta = self._leer_meta(conn, version)
+        if meta is None or tabla not in meta["tablas"]:
+            return None
+        disponibles = meta["tablas"][tabla]["columnas"]
+        if any(columna not in disponibles for columna in columnas):
+            return None
+        base = os.path.join(self.ruta_directorio, f"v{version}")
+        try:
+            datos = {columna: _abrir_columna(base, tabla, columna, disponibles[columna]) for columna in columnas}
+        except (OSError, ValueError):
+            # Borrada por una version mas nueva mientras se abria, o incompleta
+            log.warning("instantanea %s de %s ilegible, se lee de SQLite", base, tabla, exc_info=True)
+            return None
+        if any(len(valores) != meta["tablas"][tabla]["filas"] for valores in datos.values()):
+            return None
+        return pd.DataFrame(datos, copy=False)
+
+
+_instantaneas = {}
+_lock_instantaneas = threading.Lock()
+
+
+# Instancia compartida por directorio
+def instantanea(ruta_db=None):
+    ruta_directorio = directorio(ruta_db)
+    with _lock_instantaneas:
+        if ruta_directorio not in _instantaneas:
+            _instantaneas[ruta_directorio] = Instantanea(ruta_directorio)
+        return _instantaneas[ruta_directorio]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera la instantanea columnar de tickets y contactos")
+    parser.add_argument("db", nargs="?", default=conexiones.RUTA_DB)
+    args = parser.parse_args()
+
+    resultado = generar(args.db)
+    print(f"Instantanea v{resultado['version']} en {resultado['ruta']}: "
+          f"{resultado['filas']['tickets']} tickets, {resultado['filas']['contactos_empleados']} contactos "
+          f"({resultado['segundos']:.2f} s)")
@@ -0,0 +1,382 @@
+# -----------------------------------------------------------------------------
+#                  INSTRUMENTACION DE LA APLICACION (TIEMPOS)
+# -----------------------------------------------------------------------------
+# Para saber en que se va el tiempo de cada peticion:
+#   - Fases: el codigo marca sus partes con 'with fase("pandas")'. El tiempo de
+#     cada fase es exclusivo (una fase anidada no cuenta en la de fuera), y las
+#     consultas SQL se suman solas a la fase "sql" (conexiones.CursorMedido).
+#     Lo que no cae en ninguna fase se informa como "resto".
+#   - Cada respuesta lleva una cabecera Server-Timing con las fases y se escribe
+#     una linea de log en JSON con ruta, estado, duracion y fases.
+#   - /metrics publica en formato de texto de Prometheus contadores e
+#     histogramas de latencia por ruta, el tiempo por fase, las consultas SQL y
+#     lo que aporten los colectores registrados (pools, caches...).
+#   - Las consultas que tardan mas de INCIDENCIAS_SQL_LENTA segundos (0.2 por
+#     defecto) se registran en el log y en /metrics/consultas_lentas.
+#   - Con INCIDENCIAS_PERFILES=<directorio> cada peticion se perfila por
+#     muestreo (cada INCIDENCIAS_PERFIL_INTERVALO segundos) y se guarda en ese
+#     directorio en formato de pilas plegadas (flamegraph.pl, speedscope).
+# Las metricas y los perfiles son de cada proceso.
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import conexiones
+
+log = logging.getLogger(__name__)
+
+UMBRAL_LENTA = float(os.environ.get("INCIDENCIAS_SQL_LENTA", "0.2"))
+DIRECTORIO_PERFILES = os.environ.get("INCIDENCIAS_PERFILES")
+INTERVALO_PERFIL = float(os.environ.get("INCIDENCIAS_PERFIL_INTERVALO", "0.005"))
+# Por defecto /metrics solo responde a peticiones desde la propia maquina
+METRICAS_PUBLICAS = os.environ.get("INCIDENCIAS_METRICAS_PUBLICAS") == "1"
+
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_LENTAS = 100
+
+
+# -----------------------------------------------------------------------------
+# Fases de una peticion
+# -----------------------------------------------------------------------------
+
+class Medicion:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.fases = defaultdict(float)
+        # [nombre, inicio, segundos de las fases anidadas]
+        self.pila = []
+        self.consultas = 0
+
+    def entrar(self, nombre):
+        self.pila.append([nombre, time.perf_counter(), 0.0])
+
+    def salir(self):
+        nombre, inicio, anidadas = self.pila.pop()
+        segundos = time.perf_counter() - inicio
+        self.fases[nombre] += segundos - anidadas
+        if self.pila:
+            self.pila[-1][2] += segundos
+
+    # Tiempo ya medido por otro lado (p.ej. una consulta) dentro de la fase actual
+    def sumar(self, nombre, segundos):
+        self.fases[nombre] += segundos
+        if self.pila:
+            self.pila[-1][2] += segundos
+
+    def resumen(self):
+        total = time.perf_counter() - self.inicio
+        fases = dict(self.fases)
+        fases["resto"] = max(total - sum(fases.values()), 0.0)
+        return total, fases
+
+
+_medicion = ContextVar("medicion", default=None)
+
+
+@contextmanager
+def fase(nombre):
+    medicion = _medicion.get()
+    if medicion is None:
+        yield
+        return
+    medicion.entrar(nombre)
+    try:
+        yield
+    finally:
+        medicion.salir()
+
+
+# -----------------------------------------------------------------------------
+# Registro de metricas
+# -----------------------------------------------------------------------------
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    partes = []
+    for nombre, valor in etiquetas.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+class Registro:
+    def __init__(self, cubetas=CUBETAS):
+        self.cubetas = cubetas
+        self._lock = threading.Lock()
+        self._peticiones = Counter()
+        # ruta -> [cuentas por cubeta, suma, n]
+        self._latencias = {}
+        self._fases = Counter()
+        self._sql = {"consultas": 0, "segundos": 0.0, "lentas": 0}
+        self.lentas = deque(maxlen=MAX_LENTAS)
+        # Funciones que devuelven [(nombre, tipo, ayuda, [(etiquetas, valor)])]
+        self._colectores = []
+
+    def observar_peticion(self, ruta, metodo, estado, segundos, fases):
+        with self._lock:
+            self._peticiones[(ruta, metodo, str(estado))] += 1
+            cuentas, suma, n = self._latencias.get(ruta) or ([0] * len(self.cubetas), 0.0, 0)
+            for i, limite in enumerate(self.cubetas):
+                if segundos <= limite:
+                    cuentas[i] += 1
+            self._latencias[ruta] = (cuentas, suma + segundos, n + 1)
+            for nombre, valor in fases.items():
+                self._fases[(ruta, nombre)] += valor
+
+    def observar_consulta(self, sql, segundos, lenta=None):
+        with self._lock:
+            self._sql["consultas"] += 1
+            self._sql["segundos"] += segundos
+            if lenta is not None:
+                self._sql["lentas"] += 1
+                self.lentas.append(lenta)
+
+    def registrar_colector(self, funcion):
+        self._colectores.append(funcion)
+        return funcion
+
+    def texto(self):
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda, muestras):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, valor in muestras:
+                lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+
+        with self._lock:
+            peticiones = dict(self._peticiones)
+            latencias = {ruta: (list(c), s, n) for ruta, (c, s, n) in self._latencias.items()}
+            fases = dict(self._fases)
+            sql = dict(self._sql)
+
+        metrica("incidencias_peticiones_total", "counter", "Peticiones atendidas por ruta, metodo y estado",
+                [({"ruta": r, "metodo": m, "estado": e}, n) for (r, m, e), n in sorted(peticiones.items())])
+
+        lineas.append("# HELP incidencias_peticion_segundos Duracion de las peticiones por ruta")
+        lineas.append("# TYPE incidencias_peticion_segundos histogram")
+        for ruta, (cuentas, suma, n) in sorted(latencias.items()):
+            for limite, cuenta in zip(self.cubetas, cuentas):
+                lineas.append(f"incidencias_peticion_segundos_bucket{_etiquetas({'ruta': ruta, 'le': limite})} {cuenta}")
+            lineas.append(f"incidencias_peticion_segundos_bucket{_etiquetas({'ruta': ruta, 'le': '+Inf'})} {n}")
+            lineas.append(f"incidencias_peticion_segundos_sum{_etiquetas({'ruta': ruta})} {suma}")
+            lineas.append(f"incidencias_peticion_segundos_count{_etiquetas({'ruta': ruta})} {n}")
+
+        metrica("incidencias_fase_segundos_total", "counter", "Tiempo exclusivo por ruta y fase",
+                [({"ruta": r, "fase": f}, s) for (r, f), s in sorted(fases.items())])
+        metrica("incidencias_sql_consultas_total", "counter", "Consultas SQL ejecutadas", [({}, sql["consultas"])])
+        metrica("incidencias_sql_segundos_total", "counter", "Tiempo total en consultas SQL", [({}, sql["segundos"])])
+        metrica("incidencias_sql_lentas_total", "counter", f"Consultas de mas de {UMBRAL_LENTA} s",
+                [({}, sql["lentas"])])
+
+        for colector in self._colectores:
+            try:
+                for nombre, tipo, ayuda, muestras in colector():
+                    metrica(nombre, tipo, ayuda, muestras)
+            except Exception:
+                log.exception("fallo un colector de metricas")
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+registrar_colector = registro.registrar_colector
+
+
+@conexiones.observar_consultas
+def _al_terminar_consulta(sql, segundos):
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.sumar("sql", segundos)
+        medicion.consultas += 1
+    lenta = None
+    if segundos >= UMBRAL_LENTA:
+        texto = " ".join(sql.split())[:500]
+        lenta = {"fecha": datetime.now().isoformat(timespec="seconds"), "segundos": round(segundos, 4),
+                 "sql": texto, "hilo": threading.current_thread().name}
+        log.warning("consulta lenta segundos=%.3f sql=%r", segundos, texto)
+    registro.observar_consulta(sql, segundos, lenta)
+
+
+@registrar_colector
+def _metricas_pools():
+    pools = conexiones.metricas()
+    contadores = [
+        ("incidencias_db_checkouts_lectura_total", "counter", "Usos de conexiones de lectura", "checkouts_lectura"),
+        ("incidencias_db_checkouts_escritura_total", "counter", "Usos de la conexion de escritura", "checkouts_escritura"),
+        ("incidencias_db_conexiones_lectura", "gauge", "Conexiones de lectura abiertas", "conexiones_lectura"),
+        ("incidencias_db_espera_escritura_segundos_total", "counter", "Espera por la conexion de escritura",
+         "espera_escritura_total"),
+        ("incidencias_db_espera_escritura_max_segundos", "gauge", "Mayor espera por la conexion de escritura",
+         "espera_escritura_max"),
+        ("incidencias_db_errores_ocupada_total", "counter", "Errores por base de datos ocupada", "errores_ocupada"),
+    ]
+    return [(nombre, tipo, ayuda, [({"db": p["ruta_db"]}, p[clave]) for p in pools])
+            for nombre, tipo, ayuda, clave in contadores]
+
+
+# Aciertos, fallos y tamano de una CacheRespuestas
+def registrar_cache(nombre, cache):
+    @registrar_colector
+    def colector():
+        m = cache.metricas()
+        return [
+            ("incidencias_cache_aciertos_total", "counter", "Aciertos de la cache de respuestas",
+             [({"cache": nombre}, m["aciertos"])]),
+            ("incidencias_cache_fallos_total", "counter", "Fallos de la cache de respuestas",
+             [({"cache": nombre}, m["fallos"])]),
+            ("incidencias_cache_entradas", "gauge", "Entradas en la cache de respuestas",
+             [({"cache": nombre}, m["entradas"])]),
+            ("incidencias_cache_bytes", "gauge", "Bytes en la cache de respuestas",
+             [({"cache": nombre}, m["bytes"])]),
+        ]
+    return colector
+
+
+# -----------------------------------------------------------------------------
+# Perfilador por muestreo
+# -----------------------------------------------------------------------------
+
+class Muestreador(threading.Thread):
+    def __init__(self, id_hilo, intervalo=INTERVALO_PERFIL):
+        super().__init__(name="perfilador", daemon=True)
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            marco = sys._current_frames().get(self.id_hilo)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                marco = marco.f_back
+            if pila:
+                self.muestras[";".join(reversed(pila))] += 1
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+
+    # Una linea por pila: "funcion_externa;...;funcion_interna muestras"
+    def guardar(self, directorio, nombre):
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, nombre)
+        with open(ruta, "w", encoding="utf-8") as f:
+            for pila, n in self.muestras.most_common():
+                f.write(f"{pila} {n}\n")
+        return ruta
+
+
+def _nombre_perfil(metodo, ruta, segundos):
+    ruta = re.sub(r"[^A-Za-z0-9]+", "_", ruta).strip("_") or "raiz"
+    return f"{datetime.now():%Y%m%d-%H%M%S-%f}_{metodo}_{ruta}_{segundos * 1000:.0f}ms.txt"
+
+
+# -----------------------------------------------------------------------------
+# Integracion con Flask
+# -----------------------------------------------------------------------------
+
+def instalar(app, directorio_perfiles=DIRECTORIO_PERFILES):
+    from flask import Response, abort, g, jsonify, request
+    from flask.signals import before_render_template, template_rendered
+
+    def ruta_actual():
+        return request.url_rule.rule if request.url_rule is not None else "sin_ruta"
+
+    @app.before_request
+    def empezar():
+        g.medicion = Medicion()
+        g.token_medicion = _medicion.set(g.medicion)
+        g.muestreador = None
+        if directorio_perfiles:
+            g.muestreador = Muestreador(threading.get_ident())
+            g.muestreador.start()
+
+    def terminar(estado):
+        medicion = g.pop("medicion", None)
+        if medicion is None:
+            return None
+        # Fases que se quedaron abiertas por una excepcion
+        while medicion.pila:
+            medicion.salir()
+        total, fases = medicion.resumen()
+        ruta = ruta_actual()
+        registro.observar_peticion(ruta, request.method, estado, total, fases)
+        log.info(json.dumps({
+            "evento": "peticion",
+            "metodo": request.method,
+            "ruta": ruta,
+            "path": request.path,
+            "estado": estado,
+            "ms": round(total * 1000, 2),
+            "fases_ms": {nombre: round(s * 1000, 2) for nombre, s in fases.items()},
+            "consultas": medicion.consultas,
+        }, ensure_ascii=False))
+
+        muestreador = g.pop("muestreador", None)
+        if muestreador is not None:
+            muestreador.detener()
+        # Las peticiones mas cortas que el intervalo no dejan ninguna muestra
+        if muestreador is not None and muestreador.muestras:
+            ruta_perfil = muestreador.guardar(directorio_perfiles, _nombre_perfil(request.method, request.path, total))
+            log.info("perfil guardado ruta=%r muestras=%d", ruta_perfil, sum(muestreador.muestras.values()))
+        return total, fases
+
+    @app.after_request
+    def cabecera(respuesta):
+        resultado = terminar(respuesta.status_code)
+        if resultado is not None:
+            total, fases = resultado
+            partes = [f"{nombre};dur={s * 1000:.2f}" for nombre, s in fases.items() if s > 0]
+            partes.append(f"total;dur={total * 1000:.2f}")
+            respuesta.headers["Server-Timing"] = ", ".join(partes)
+        return respuesta
+
+    @app.teardown_request
+    def limpiar(error=None):
+        # Si la vista lanzo una excepcion after_request no llega a ejecutarse
+        terminar(500)
+        token = g.pop("token_medicion", None)
+        if token is not None:
+            _medicion.reset(token)
+
+    def empezar_plantilla(emisor, template, context, **extra):
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion.entrar("plantilla")
+
+    def terminar_plantilla(emisor, template, context, **extra):
+        medicion = _medicion.get()
+        if medicion is not None and medicion.pila and medicion.pila[-1][0] == "plantilla":
+            medicion.salir()
+
+    before_render_template.connect(empezar_plantilla, app, weak=False)
+    template_rendered.connect(terminar_plantilla, app, weak=False)
+
+    def solo_local():
+        if not METRICAS_PUBLICAS and request.remote_addr not in ("127.0.0.1", "::1"):
+            abort(403)
+
+    @app.route("/metrics")
+    def metricas():
+        solo_local()
+        return Response(registro.texto(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/consultas_lentas")
+    def consultas_lentas():
+        solo_local()
+        return jsonify(umbral=UMBRAL_LENTA, consultas=list(registro.lentas))
+
+    return app
@@ -0,0 +1,125 @@
+# -----------------------------------------------------------------------------
+#                       LECTURA INCREMENTAL DE FICHEROS JSON
+# -----------------------------------------------------------------------------
+# json.load necesita tener todo el documento en memoria. Aqui lo leemos por
+# trozos y vamos decodificando cada valor con JSONDecoder.raw_decode, de forma
+# que los arrays grandes (p.ej. "tickets_emitidos") se recorren elemento a
+# elemento sin materializarlos nunca completos.
+
+import json
+
+TAMANO_TROZO = 1 << 20  # 1 MiB de texto por lectura
+
+_ESPACIOS = " \t\n\r"
+
+
+class _Lector:
+    def __init__(self, trozos):
+        self.trozos = iter(trozos)
+        self.buffer = ""
+        self.pos = 0
+        self.fin = False
+        self.decoder = json.JSONDecoder()
+
+    # Añade el siguiente trozo al buffer descartando lo ya consumido
+    def _leer_mas(self):
+        if self.fin:
+            return False
+        trozo = next(self.trozos, None)
+        if trozo is None or trozo == "":
+            self.fin = True
+            return False
+        if isinstance(trozo, bytes):
+            trozo = trozo.decode("utf-8")
+        self.buffer = self.buffer[self.pos:] + trozo
+        self.pos = 0
+        return True
+
+    def _saltar_espacios(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _ESPACIOS:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._leer_mas():
+                return
+
+    def siguiente_caracter(self):
+        self._saltar_espacios()
+        if self.pos >= len(self.buffer):
+            raise ValueError("Fin inesperado del documento JSON")
+        return self.buffer[self.pos]
+
+    def esperar(self, caracter):
+        if self.siguiente_caracter() != caracter:
+            raise ValueError(f"Se esperaba '{caracter}' en la posicion {self.pos} del buffer")
+        self.pos += 1
+
+    # Decodifica un valor completo; si el buffer se corta a mitad del valor
+    # se piden mas trozos y se reintenta desde el mismo punto
+    def valor(self):
+        self._saltar_espacios()
+        while True:
+            try:
+                valor, fin = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._leer_mas():
+                    raise
+                continue
+            # Un numero al final del buffer podria continuar en el siguiente trozo
+            if fin == len(self.buffer) and not self.fin and self._leer_mas():
+                continue
+            self.pos = fin
+            return valor
+
+    # Recorre los elementos de un array cuyo '[' ya se ha consumido
+    def elementos(self):
+        if self.siguiente_caracter() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.valor()
+            separador = self.siguiente_caracter()
+            self.pos += 1
+            if separador == "]":
+                return
+            if separador != ",":
+                raise ValueError(f"Separador inesperado '{separador}' dentro de un array")
+
+
+def trozos_fichero(f, tamano=TAMANO_TROZO):
+    while True:
+        trozo = f.read(tamano)
+        if not trozo:
+            return
+        yield trozo
+
+
+# Recorre un objeto JSON de primer nivel devolviendo pares (clave, valor).
+# Para las claves indicadas en 'claves_streaming' (que deben ser arrays) se
+# devuelve un par por cada elemento en lugar del array completo.
+def iterar_objeto(trozos, claves_streaming=()):
+    lector = _Lector(trozos)
+    lector.esperar("{")
+    if lector.siguiente_caracter() == "}":
+        return
+    while True:
+        clave = lector.valor()
+        lector.esperar(":")
+        if clave in claves_streaming:
+            lector.esperar("[")
+            for elemento in lector.elementos():
+                yield clave, elemento
+        else:
+            yield clave, lector.valor()
+        separador = lector.siguiente_caracter()
+        lector.pos += 1
+        if separador == "}":
+            return
+        if separador != ",":
+            raise ValueError(f"Separador inesperado '{separador}' dentro de un objeto")
+
+
+# Recorre elemento a elemento un array JSON de primer nivel
+def iterar_array(trozos):
+    lector = _Lector(trozos)
+    lector.esperar("[")
+    yield from lector.elementos()
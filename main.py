@@ -1,173 +1,177 @@
+import argparse      # Para elegir el modo de carga desde la linea de comandos
 import json          # Para trabajar con el contenido del archivo JSON
-import sqlite3       # Para conectarnos y gestionar la base de datos SQLite
 import pandas as pd  # Para analizar y manejar los datos de forma más cómoda
 
-# Establecemos conexión con la base de datos (se crea si no existe)
-conn = sqlite3.connect("incidencias.db")
-cursor = conn.cursor()
-
-# Borramos las tablas si ya existían para comenzar con una base limpia
-cursor.execute("DROP TABLE IF EXISTS contactos_empleados;")
-cursor.execute("DROP TABLE IF EXISTS tickets;")
-cursor.execute("DROP TABLE IF EXISTS clientes;")
-cursor.execute("DROP TABLE IF EXISTS empleados;")
-cursor.execute("DROP TABLE IF EXISTS tipos_incidentes;")
-
-# Creamos la tabla que guarda la información de los clientes
-cursor.execute("""
-CREATE TABLE clientes(
-    id_cli TEXT PRIMARY KEY,
-    nombre TEXT,
-    telefono TEXT,
-    provincia TEXT
-);
-""")
-
-# Creamos la tabla que guarda los datos de cada empleado
-cursor.execute("""
-CREATE TABLE empleados(
-    id_emp TEXT PRIMARY KEY,
-    nombre TEXT,
-    nivel INTEGER,
-    fecha_contrato TEXT
-);
-""")
-
-# Creamos la tabla que define los tipos de incidentes
-cursor.execute("""
-CREATE TABLE tipos_incidentes(
-    id_inci TEXT PRIMARY KEY,
-    nombre TEXT
-);
-""")
-
-# Creamos la tabla principal de tickets (o incidencias)
-cursor.execute("""
-CREATE TABLE tickets(
-    id_ticket INTEGER PRIMARY KEY AUTOINCREMENT,
-    cliente TEXT,
-    fecha_apertura TEXT,
-    fecha_cierre TEXT,
-    es_mantenimiento INTEGER,
-    satisfaccion_cliente INTEGER,
-    tipo_incidencia TEXT,
-    FOREIGN KEY (cliente) REFERENCES clientes(id_cli),
-    FOREIGN KEY (tipo_incidencia) REFERENCES tipos_incidentes(id_inci)
-);
-""")
-
-# Creamos la tabla que relaciona cada ticket con los empleados que lo atendieron
-cursor.execute("""
-CREATE TABLE contactos_empleados(
-    id_contacto INTEGER PRIMARY KEY AUTOINCREMENT,
-    id_ticket INTEGER,
-    id_emp TEXT,
-    fecha TEXT,
-    tiempo REAL,
-    FOREIGN KEY (id_ticket) REFERENCES tickets(id_ticket),
-    FOREIGN KEY (id_emp) REFERENCES empleados(id_emp)
-);
-""")
-
-# Abrimos el archivo JSON para leer la información de clientes, empleados, etc.
-with open("datos.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-# Insertamos la información de los clientes en la tabla 'clientes'
-for cli in data["clientes"]:
-    cursor.execute("""
-        INSERT INTO clientes(id_cli, nombre, telefono, provincia)
-        VALUES (?, ?, ?, ?)
-    """, (
-        cli["id_cli"],
-        cli["nombre"],
-        cli["telefono"],
-        cli["provincia"]
-    ))
-
-# Insertamos la información de los empleados en la tabla 'empleados'
-for emp in data["empleados"]:
-    cursor.execute("""
-        INSERT INTO empleados(id_emp, nombre, nivel, fecha_contrato)
-        VALUES (?, ?, ?, ?)
-    """, (
-        emp["id_emp"],
-        emp["nombre"],
-        emp["nivel"],
-        emp["fecha_contrato"]
-    ))
-
-# Insertamos los distintos tipos de incidentes
-for t_in in data["tipos_incidentes"]:
-    cursor.execute("""
-        INSERT INTO tipos_incidentes(id_inci, nombre)
-        VALUES (?, ?)
-    """, (
-        t_in["id_inci"],
-        t_in["nombre"]
-    ))
-
-# Insertamos cada ticket en la tabla 'tickets'
-for ticket in data["tickets_emitidos"]:
-    cursor.execute("""
-        INSERT INTO tickets(cliente, fecha_apertura, fecha_cierre,
-                            es_mantenimiento, satisfaccion_cliente, tipo_incidencia)
-        VALUES(?, ?, ?, ?, ?, ?)
-    """, (
-        ticket["cliente"],
-        ticket["fecha_apertura"],
-        ticket["fecha_cierre"],
-        1 if ticket["es_mantenimiento"] else 0,
-        ticket["satisfaccion_cliente"],
-        ticket["tipo_incidencia"]
-    ))
-    # Obtenemos el ID que se generó automáticamente para este ticket
-    id_ticket = cursor.lastrowid
-
-    # Insertamos la relación de cada empleado con el ticket correspondiente
-    for contacto in ticket["contactos_con_empleados"]:
+import bocetos       # Cuantiles y tickets distintos aproximados por dia (opcional)
+import carga         # Cargador por lotes para ficheros grandes
+import conexiones    # Ruta de la base de datos y conexiones en modo WAL
+import graficos      # Pipeline de graficos del dashboard
+import instantanea   # Copia columnar de tickets y contactos para los analisis
+
+
+def cargar_clasico(ruta_json="datos.json", ruta_db=conexiones.RUTA_DB):
+    # Establecemos conexión con la base de datos (se crea si no existe)
+    conn = conexiones.conectar_escritura(ruta_db)
+    cursor = conn.cursor()
+
+    # Borramos las tablas si ya existían y las creamos de nuevo para comenzar con una base limpia
+    carga.crear_esquema(cursor)
+
+    # Abrimos el archivo JSON para leer la información de clientes, empleados, etc.
+    with open(ruta_json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    # Insertamos la información de los clientes en la tabla 'clientes'
+    for cli in data["clientes"]:
         cursor.execute("""
-            INSERT INTO contactos_empleados(id_ticket, id_emp, fecha, tiempo)
+            INSERT INTO clientes(id_cli, nombre, telefono, provincia)
             VALUES (?, ?, ?, ?)
         """, (
-            id_ticket,
-            contacto["id_emp"],
-            contacto["fecha"],
-            contacto["tiempo"]
+            cli["id_cli"],
+            cli["nombre"],
+            cli["telefono"],
+            cli["provincia"]
         ))
 
-# Obtenemos el query necesario para obtener la ultima fecha de actuacion para actualizarla despues
-query_ultima_actuacion = """
-    SELECT id_ticket, MAX(fecha) AS ultima_fecha
-    FROM contactos_empleados
-    GROUP BY id_ticket
-    """
-
-df_ultima_actuacion = pd.read_sql_query(query_ultima_actuacion, conn)
-
-# Actualizamos la fecha_cierre en la tabla tickets con la ultima actuacion para cada ticket
-for index, row in df_ultima_actuacion.iterrows():
-    cursor.execute("""
-        UPDATE tickets
-        SET fecha_cierre = ?
-        WHERE id_ticket = ?
-    """, (
-        row["ultima_fecha"],
-        row["id_ticket"]
-    ))
-
-
-# Guardamos todos los cambios en la base de datos
-conn.commit()
-print("Datos insertados correctamente.")
-
-# Leemos los datos de las tablas con Pandas para realizar alguna verificación
-df_tickets = pd.read_sql_query("SELECT * FROM tickets;", conn)
-df_contactos = pd.read_sql_query("SELECT * FROM contactos_empleados;", conn)
-
-# Mostramos un conteo básico de tickets como ejemplo
-print("\n=== Conteo de Tickets ===")
-print(f"Número total de tickets: {len(df_tickets)}")
-
-# Cerramos la conexión para liberar recursos
-conn.close()
+    # Insertamos la información de los empleados en la tabla 'empleados'
+    for emp in data["empleados"]:
+        cursor.execute("""
+            INSERT INTO empleados(id_emp, nombre, nivel, fecha_contrato)
+            VALUES (?, ?, ?, ?)
+        """, (
+            emp["id_emp"],
+            emp["nombre"],
+            emp["nivel"],
+            emp["fecha_contrato"]
+        ))
+
+    # Insertamos los distintos tipos de incidentes
+    for t_in in data["tipos_incidentes"]:
+        cursor.execute("""
+            INSERT INTO tipos_incidentes(id_inci, nombre)
+            VALUES (?, ?)
+        """, (
+            t_in["id_inci"],
+            t_in["nombre"]
+        ))
+
+    # Insertamos cada ticket en la tabla 'tickets'
+    for ticket in data["tickets_emitidos"]:
+        cursor.execute("""
+            INSERT INTO tickets(cliente, fecha_apertura, fecha_cierre,
+                                es_mantenimiento, satisfaccion_cliente, tipo_incidencia, clave_natural)
+            VALUES(?, ?, ?, ?, ?, ?, ?)
+        """, (
+            ticket["cliente"],
+            ticket["fecha_apertura"],
+            ticket["fecha_cierre"],
+            1 if ticket["es_mantenimiento"] else 0,
+            ticket["satisfaccion_cliente"],
+            ticket["tipo_incidencia"],
+            carga.clave_ticket(ticket)
+        ))
+        # Obtenemos el ID que se generó automáticamente para este ticket
+        id_ticket = cursor.lastrowid
+
+        # Insertamos la relación de cada empleado con el ticket correspondiente
+        for contacto in ticket["contactos_con_empleados"]:
+            cursor.execute("""
+                INSERT INTO contactos_empleados(id_ticket, id_emp, fecha, tiempo)
+                VALUES (?, ?, ?, ?)
+            """, (
+                id_ticket,
+                contacto["id_emp"],
+                contacto["fecha"],
+                contacto["tiempo"]
+            ))
+
+    # Creamos los indices una vez insertados los datos
+    carga.crear_indices(cursor)
+
+    # Actualizamos la fecha_cierre de cada ticket con su ultima actuacion en una sola sentencia
+    # y creamos el disparador que la mantiene al dia cuando lleguen contactos nuevos
+    carga.corregir_fecha_cierre(cursor)
+    carga.crear_disparadores(cursor)
+
+    # Anotamos la carga (y su marca de agua) para las cargas incrementales posteriores
+    carga.registrar_carga(cursor, "completa", ruta_json, len(data["tickets_emitidos"]),
+                          cursor.execute("SELECT COUNT(*) FROM contactos_empleados").fetchone()[0])
+
+    # Las tablas de hechos y los acumuladores, en la misma transaccion que la carga
+    agregados = carga.actualizar_agregados(cursor)
+
+    # Guardamos todos los cambios en la base de datos
+    conn.commit()
+    print("Datos insertados correctamente.")
+
+    # Leemos los datos de las tablas con Pandas para realizar alguna verificación
+    df_tickets = pd.read_sql_query("SELECT * FROM tickets;", conn)
+
+    # Mostramos un conteo básico de tickets como ejemplo
+    print("\n=== Conteo de Tickets ===")
+    print(f"Número total de tickets: {len(df_tickets)}")
+
+    # Cerramos la conexión para liberar recursos
+    conn.close()
+    return agregados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga datos.json en la base de datos de incidencias")
+    parser.add_argument("--json", default="datos.json", help="fichero JSON de entrada")
+    parser.add_argument("--db", default=conexiones.RUTA_DB, help="base de datos SQLite de destino (INCIDENCIAS_DB)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="lectura en streaming e inserción por lotes para ficheros de gran tamaño")
+    parser.add_argument("--incremental", metavar="DELTA",
+                        help="aplica un fichero delta sin borrar las tablas (solo añade lo nuevo)")
+    parser.add_argument("--lote", type=int, default=carga.TAMANO_LOTE,
+                        help="filas de tickets por executemany en los modos streaming e incremental")
+    parser.add_argument("--sin-graficos", action="store_true",
+                        help="no regenera los graficos de static/images despues de la carga")
+    parser.add_argument("--sin-instantanea", action="store_true",
+                        help="no genera la instantanea columnar (los analisis leeran de SQLite)")
+    args = parser.parse_args()
+
+    if args.incremental:
+        resultado = carga.cargar_incremental(args.incremental, args.db, args.lote)
+        print(f"Carga incremental: {resultado['tickets']} tickets y {resultado['contactos']} contactos nuevos, "
+              f"{resultado['repetidos']} tickets ya cargados, {resultado['dimensiones']} dimensiones actualizadas "
+              f"({resultado['segundos']:.2f} s)")
+        if resultado["conflictos"]:
+            print(f"{resultado['conflictos']} tickets no cargados: su id_externo ya estaba con otros datos")
+    elif args.streaming:
+        resultado = carga.cargar_streaming(args.json, args.db, args.lote)
+        print("Datos insertados correctamente.")
+        print(f"Tickets: {resultado['tickets']}, Contactos: {resultado['contactos']}, "
+              f"Dimensiones: {resultado['dimensiones']}")
+        print(f"Tiempo: {resultado['segundos']:.2f} s ({resultado['filas_por_segundo']:.0f} filas/s)")
+    else:
+        resultado = {"agregados": cargar_clasico(args.json, args.db)}
+
+    # Las tablas de hechos del almacen y los acumuladores de los KPI se actualizan
+    # dentro de la transaccion de cada carga
+    agregados = resultado["agregados"]
+    if agregados is None:
+        print("Almacen de datos y acumuladores sin cambios")
+    else:
+        print(f"Almacen de datos ({agregados['almacen']}) y acumuladores de KPI ({agregados['acumuladores']}) "
+              f"actualizados ({agregados['segundos']:.2f} s)")
+
+    # En modo bocetos, los de los dias con datos nuevos (hasta entonces los
+    # graficos calculan sus cuantiles de forma exacta, ver bocetos.al_dia)
+    if bocetos.ACTIVADOS:
+        conn = conexiones.conectar_escritura(args.db)
+        resultado = bocetos.refrescar(conn)
+        print(f"Bocetos actualizados ({resultado['modo']}, {resultado['segundos']:.2f} s)")
+        conn.close()
+
+    # Instantanea de la version recien cargada, que los analisis abren con mmap
+    if not args.sin_instantanea:
+        resultado = instantanea.generar(args.db)
+        print(f"Instantanea v{resultado['version']} generada en {resultado['ruta']} ({resultado['segundos']:.2f} s)")
+
+    # Regeneramos solo los graficos cuyos datos han cambiado, antes de que el dashboard los sirva
+    if not args.sin_graficos:
+        resultado = graficos.construir_graficos(args.db)
+        print(f"Graficos: {len(resultado['generados'])} generados, {len(resultado['sin_cambios'])} sin cambios "
+              f"({resultado['segundos']:.2f} s)")
@@ -0,0 +1,236 @@
+# -----------------------------------------------------------------------------
+#                 NUCLEOS NUMPY PARA ESTADISTICAS POR GRUPO
+# -----------------------------------------------------------------------------
+# Grupos factoriza una columna de claves una sola vez (codigos 0..k-1 en el
+# mismo orden que groupby(sort=True, observed=True), sin las claves nulas) y a
+# partir de ahi cada estadistica es una pasada de NumPy:
+#   - conteos, sumas y sumas de cuadrados con np.bincount
+#   - minimos y maximos con reduceat sobre las filas ordenadas por grupo (el
+#     orden depende solo de las claves y se calcula una vez)
+#   - distintos contando parejas (grupo, valor) unicas
+#   - cuantiles sobre los valores ordenados dentro de cada grupo
+# Asi varias metricas sobre las mismas claves (p.ej. horas y tickets por
+# empleado) no vuelven a calcular el hash de las claves en cada groupby.
+#
+# Conteos, distintos, minimos, maximos y cuantiles (interpolacion lineal, como
+# groupby.quantile) coinciden exactamente con pandas. Las sumas de reales se
+# hacen en el orden de las filas: con valores como los de las horas (multiplos
+# de 0.5) son exactas igual que en pandas; con reales cualesquiera pueden
+# diferir en el ultimo decimal, igual que media y varianza (ddof=1, NaN con un
+# solo elemento), que se calculan en dos pasadas como Series.var. Los valores
+# no pueden tener nulos (las columnas del dashboard no los tienen).
+
+import numpy as np
+import pandas as pd
+
+
+def _numeros(valores):
+    if isinstance(valores, (pd.Series, pd.Index)):
+        return valores.to_numpy()
+    return np.asarray(valores)
+
+
+# Mascara booleana; los NA cuentan como False (igual que al filtrar en pandas)
+def _mascara(mascara):
+    if isinstance(mascara, pd.Series):
+        return mascara.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(mascara, dtype=bool)
+
+
+# Las parejas (grupo, valor) de enteros se marcan en un mapa de bits si este no
+# ocupa mas de estos bytes por fila (o 16 MiB)
+BYTES_POR_FILA = 32
+MINIMO_BYTES = 2**24
+
+
+def _factorizar(claves):
+    # Categorias: sus codigos ya son los de groupby; solo se quitan las no usadas
+    if isinstance(claves.dtype, pd.CategoricalDtype):
+        codigos = np.asarray(claves.cat.codes if isinstance(claves, pd.Series) else claves.codes)
+        nulos = (codigos < 0).any()
+        presentes = np.bincount(codigos[codigos >= 0] if nulos else codigos,
+                                minlength=len(claves.dtype.categories)) > 0
+        etiquetas = pd.CategoricalIndex(pd.Categorical.from_codes(np.flatnonzero(presentes), dtype=claves.dtype))
+        if presentes.all():
+            return codigos, etiquetas
+        nuevos = np.cumsum(presentes) - 1
+        return np.where(codigos >= 0, nuevos[codigos], -1), etiquetas
+    valores = claves
+    if isinstance(claves.dtype, np.dtype):
+        valores = _numeros(claves)
+    # Enteros en un rango pequeno (ids): la propia clave desplazada es el codigo
+    if valores.dtype.kind in "iu" and len(valores):
+        minimo, maximo = int(valores.min()), int(valores.max())
+        if maximo - minimo < 4 * len(valores):
+            denso = valores.astype(np.int64) - minimo
+            presentes = np.bincount(denso, minlength=maximo - minimo + 1) > 0
+            nuevos = np.cumsum(presentes) - 1
+            etiquetas = np.flatnonzero(presentes) + minimo
+            return nuevos[denso], pd.Index(etiquetas.astype(valores.dtype))
+    codigos, etiquetas = pd.factorize(valores, sort=True)
+    return codigos, pd.Index(etiquetas)
+
+
+class Grupos:
+    def __init__(self, claves):
+        codigos, etiquetas = _factorizar(claves)
+        self.indice = etiquetas.rename(getattr(claves, "name", None))
+        self.k = len(self.indice)
+        # Filas con clave nula: no pertenecen a ningun grupo
+        self._validas = None if len(codigos) == 0 or codigos.min() >= 0 else codigos >= 0
+        codigos = codigos if self._validas is None else codigos[self._validas]
+        # Con pocos grupos los codigos caben en int16 y NumPy los ordena por radix
+        self.codigos = codigos.astype(np.int16 if self.k < 2**15 else np.int64)
+        self.n = np.bincount(self.codigos, minlength=self.k)
+        self.inicios = np.cumsum(self.n) - self.n
+        self._orden = None
+
+    # Filas ordenadas por grupo (orden estable); se calcula una vez y sirve
+    # para todas las columnas
+    @property
+    def orden(self):
+        if self._orden is None:
+            self._orden = np.argsort(self.codigos, kind="stable")
+        return self._orden
+
+    def _filtrar(self, valores, mascara=None):
+        valores = _numeros(valores)
+        if self._validas is not None:
+            valores = valores[self._validas]
+        if mascara is None:
+            return self.codigos, valores
+        mascara = _mascara(mascara)
+        if self._validas is not None:
+            mascara = mascara[self._validas]
+        return self.codigos[mascara], valores[mascara]
+
+    def serie(self, valores, nombre=None):
+        return pd.Series(valores, index=self.indice, name=nombre)
+
+    def contar(self, mascara=None):
+        if mascara is None:
+            return self.n
+        # La mascara como pesos evita copiar las filas elegidas
+        mascara = _mascara(mascara)
+        if self._validas is not None:
+            mascara = mascara[self._validas]
+        return np.bincount(self.codigos, weights=mascara, minlength=self.k).astype(np.int64)
+
+    def sumar(self, valores, mascara=None):
+        codigos, valores = self._filtrar(valores, mascara)
+        return np.bincount(codigos, weights=valores.astype(np.float64), minlength=self.k)
+
+    def sumar_cuadrados(self, valores, mascara=None):
+        codigos, valores = self._filtrar(valores, mascara)
+        valores = valores.astype(np.float64)
+        return np.bincount(codigos, weights=valores * valores, minlength=self.k)
+
+    # Media y varianza por grupo (dos pasadas, como Series.var)
+    def media_varianza(self, valores, ddof=1):
+        codigos, valores = self._filtrar(valores)
+        valores = valores.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            media = np.bincount(codigos, weights=valores, minlength=self.k) / self.n
+            desviacion = valores - media[codigos]
+            varianza = np.bincount(codigos, weights=desviacion * desviacion, minlength=self.k) / (self.n - ddof)
+        varianza[self.n <= ddof] = np.nan
+        return media, varianza
+
+    # Valores en segmentos contiguos por grupo (todo grupo tiene algun valor)
+    def _por_grupo(self, valores):
+        return self._filtrar(valores)[1][self.orden]
+
+    # Lo mismo pero ademas de menor a mayor dentro de cada grupo: se ordenan
+    # los valores y despues, de forma estable, los codigos
+    def _ordenados(self, valores):
+        valores = self._filtrar(valores)[1]
+        por_valor = np.argsort(valores, kind="stable")
+        return valores[por_valor[np.argsort(self.codigos[por_valor], kind="stable")]]
+
+    def minimo(self, valores):
+        return np.minimum.reduceat(self._por_grupo(valores), self.inicios) if self.k else self.n
+
+    def maximo(self, valores):
+        return np.maximum.reduceat(self._por_grupo(valores), self.inicios) if self.k else self.n
+
+    # Enteros desplazados a 0..rango-1 (otros tipos se factorizan antes)
+    def _enteros(self, valores):
+        valores = _numeros(valores)
+        if valores.dtype.kind not in "iu":
+            valores = pd.factorize(valores)[0]
+        valores = self._filtrar(valores)[1]
+        if not len(valores):
+            return valores.astype(np.int64), 0, 1
+        minimo = int(valores.min())
+        return valores.astype(np.int64) - minimo, minimo, int(valores.max()) - minimo + 1
+
+    def _cabe_mapa(self, rango):
+        return self.k * rango <= max(BYTES_POR_FILA * len(self.codigos), MINIMO_BYTES)
+
+    # Valores distintos por grupo: parejas (grupo, valor) unicas contadas por grupo
+    def distintos(self, valores):
+        desplazados, _, rango = self._enteros(valores)
+        parejas = self.codigos.astype(np.int64) * rango + desplazados
+        if self._cabe_mapa(rango):
+            mapa = np.zeros(self.k * rango, dtype=bool)
+            mapa[parejas] = True
+            return mapa.reshape(self.k, rango).sum(axis=1)
+        return np.bincount(pd.unique(parejas) // rango, minlength=self.k)
+
+    # Cuantiles por grupo con interpolacion lineal: una fila por grupo y una
+    # columna por cuantil
+    def cuantiles(self, valores, qs):
+        posiciones = [q * (self.n - 1) for q in qs]
+        elegir = self._elegir_histograma(valores)
+        if elegir is None:
+            ordenados = self._ordenados(valores)
+            def elegir(rangos):
+                return ordenados[self.inicios + rangos].astype(np.float64)
+        resultado = np.empty((self.k, len(qs)))
+        for j, posicion in enumerate(posiciones):
+            bajo = np.floor(posicion).astype(np.int64)
+            inferior = elegir(bajo)
+            superior = elegir(np.minimum(bajo + 1, self.n - 1))
+            resultado[:, j] = inferior + (superior - inferior) * (posicion - bajo)
+        return resultado
+
+    # Pocos valores distintos (dias, horas...): en vez de ordenar se cuenta
+    # cada valor por grupo y el de cada rango sale del histograma acumulado
+    def _elegir_histograma(self, valores):
+        numeros = _numeros(valores)
+        if numeros.dtype.kind in "iu":
+            desplazados, minimo, rango = self._enteros(numeros)
+            if not self._cabe_mapa(rango):
+                return None
+            unicos = np.arange(minimo, minimo + rango, dtype=np.float64)
+        else:
+            # Los reales se sustituyen por su posicion entre los valores distintos
+            desplazados, unicos = pd.factorize(self._filtrar(numeros)[1], sort=True)
+            rango = len(unicos)
+            if not self._cabe_mapa(rango) or rango > len(desplazados) // 16:
+                return None
+            unicos = np.asarray(unicos, dtype=np.float64)
+        histograma = np.bincount(self.codigos.astype(np.int64) * rango + desplazados, minlength=self.k * rango)
+        acumulado = np.cumsum(histograma.reshape(self.k, rango), axis=1)
+
+        def elegir(rangos):
+            return unicos[[np.searchsorted(acumulado[g], rangos[g], side="right") for g in range(self.k)]]
+        return elegir
+
+    # Listas de valores de cada grupo (ordenados), p.ej. para un boxplot
+    def valores(self, valores):
+        return np.split(self._ordenados(valores), self.inicios[1:])
+
+    # Varias estadisticas de una columna a la vez
+    def resumen(self, valores):
+        media, varianza = self.media_varianza(valores)
+        por_grupo = self._por_grupo(valores)
+        return pd.DataFrame({
+            "n": self.n,
+            "suma": self.sumar(valores),
+            "suma2": self.sumar_cuadrados(valores),
+            "media": media,
+            "varianza": varianza,
+            "minimo": np.minimum.reduceat(por_grupo, self.inicios),
+            "maximo": np.maximum.reduceat(por_grupo, self.inicios),
+        }, index=self.indice)
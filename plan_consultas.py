@@ -0,0 +1,120 @@
+# -----------------------------------------------------------------------------
+#                  COMPROBACION DE LOS PLANES DE CONSULTA
+# -----------------------------------------------------------------------------
+# Ejecuta EXPLAIN QUERY PLAN sobre las consultas canonicas del dashboard y
+# falla si alguna deja de usar su indice y pasa a recorrer la tabla completa.
+#
+# Uso:
+#   python plan_consultas.py [incidencias.db] [--tiempos]
+# Devuelve codigo de salida 1 si algun plan ha empeorado.
+# tests/test_plan_consultas.py ejecuta comprobar_planes en cada pasada de pytest.
+
+import argparse
+import re
+import sys
+import time
+
+import conexiones
+
+# (nombre, consulta, parametros, indice que debe aparecer en el plan)
+CONSULTAS = [
+    ("incidencias por cliente",
+     "SELECT cliente, COUNT(*) FROM tickets GROUP BY cliente",
+     (), "idx_tickets_cliente"),
+    ("incidencias satisfechas por cliente",
+     "SELECT cliente, COUNT(*) FROM tickets WHERE satisfaccion_cliente >= 5 GROUP BY cliente",
+     (), "idx_tickets_cliente"),
+    ("duracion por tipo de incidencia",
+     """SELECT tipo_incidencia, AVG(julianday(fecha_cierre) - julianday(fecha_apertura))
+        FROM tickets GROUP BY tipo_incidencia""",
+     (), "idx_tickets_tipo"),
+    ("duracion por mantenimiento",
+     """SELECT es_mantenimiento, AVG(julianday(fecha_cierre) - julianday(fecha_apertura))
+        FROM tickets GROUP BY es_mantenimiento""",
+     (), "idx_tickets_mantenimiento"),
+    ("clientes criticos",
+     """SELECT cliente, COUNT(*) FROM tickets
+        WHERE es_mantenimiento = 1 AND tipo_incidencia != '1' GROUP BY cliente""",
+     (), "idx_tickets_mantenimiento"),
+    ("tickets en un rango de fechas",
+     "SELECT COUNT(*) FROM tickets WHERE fecha_apertura BETWEEN ? AND ?",
+     ("2025-01-01", "2025-01-31"), "idx_tickets_apertura"),
+    ("ticket por clave natural",
+     "SELECT id_ticket FROM tickets WHERE clave_natural = ?",
+     ("",), "idx_tickets_clave"),
+    ("horas por ticket",
+     "SELECT id_ticket, SUM(tiempo) FROM contactos_empleados GROUP BY id_ticket",
+     (), "idx_contactos_ticket"),
+    ("ultima actuacion de un ticket",
+     "SELECT MAX(fecha) FROM contactos_empleados WHERE id_ticket = ?",
+     (1,), "idx_contactos_ticket"),
+    ("horas e incidencias por empleado",
+     """SELECT id_emp, SUM(tiempo), COUNT(DISTINCT id_ticket), COUNT(*)
+        FROM contactos_empleados GROUP BY id_emp""",
+     (), "idx_contactos_empleado"),
+    ("contactos de un dia (refresco del almacen)",
+     "SELECT COUNT(*) FROM contactos_empleados WHERE fecha IN (?, ?)",
+     ("2025-01-01", "2025-01-02"), "idx_contactos_fecha"),
+    ("actuaciones de fraude",
+     """SELECT c.id_emp, c.id_ticket, c.fecha FROM tickets t
+        JOIN contactos_empleados c ON c.id_ticket = t.id_ticket
+        WHERE t.tipo_incidencia = ?""",
+     ("5",), "idx_tickets_tipo"),
+]
+
+# "SCAN tabla" sin "USING ... INDEX" es un recorrido completo de la tabla
+_RECORRIDO_COMPLETO = re.compile(r"^SCAN (\w+)( AS \w+)?$")
+
+
+def plan(conn, consulta, parametros=()):
+    return [fila[3] for fila in conn.execute("EXPLAIN QUERY PLAN " + consulta, parametros)]
+
+
+def comprobar_planes(conn, consultas=CONSULTAS):
+    fallos = []
+    for nombre, consulta, parametros, indice in consultas:
+        detalles = plan(conn, consulta, parametros)
+        recorridos = [d for d in detalles if _RECORRIDO_COMPLETO.match(d)]
+        if recorridos:
+            fallos.append((nombre, f"recorrido completo: {'; '.join(recorridos)}"))
+        elif not any(indice in d for d in detalles):
+            fallos.append((nombre, f"no usa {indice}: {'; '.join(detalles)}"))
+    return fallos
+
+
+def medir_consultas(conn, consultas=CONSULTAS, repeticiones=3):
+    tiempos = {}
+    for nombre, consulta, parametros, _ in consultas:
+        mejor = float("inf")
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            conn.execute(consulta, parametros).fetchall()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        tiempos[nombre] = mejor
+    return tiempos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comprueba los planes de las consultas del dashboard")
+    parser.add_argument("db", nargs="?", default=conexiones.RUTA_DB)
+    parser.add_argument("--tiempos", action="store_true", help="mide ademas el tiempo de cada consulta")
+    args = parser.parse_args()
+
+    conn = conexiones.conectar_lectura(args.db)
+    fallos = comprobar_planes(conn)
+    for nombre, consulta, parametros, _ in CONSULTAS:
+        print(f"{nombre}:")
+        for detalle in plan(conn, consulta, parametros):
+            print(f"    {detalle}")
+    if args.tiempos:
+        print()
+        for nombre, segundos in medir_consultas(conn).items():
+            print(f"{nombre:<40} {segundos * 1000:>10.1f} ms")
+    conn.close()
+
+    if fallos:
+        print()
+        for nombre, motivo in fallos:
+            print(f"REGRESION en '{nombre}': {motivo}")
+        sys.exit(1)
+    print("\nTodos los planes usan sus indices.")
@@ -0,0 +1,71 @@
+// Avisos en vivo desde /api/eventos (Server-Sent Events): tickets recibidos por
+// POST /api/tickets y cambios de version de los datos (por ejemplo una carga
+// con main.py). La pagina no se recarga sola; se avisa y se ofrece recargarla.
+// Si el servidor no admite mas conexiones de eventos (503) o el navegador no
+// tiene EventSource, se consulta la version en /api/tickets/estado cada poco.
+(function () {
+    var aviso = document.getElementById("en-vivo");
+    if (!aviso) {
+        return;
+    }
+    var texto = aviso.querySelector("span");
+    var total = document.getElementById("total-incidencias");
+    var nuevos = 0;
+    var version = null;
+    var CONSULTA_MS = 15000;
+
+    function mostrar(mensaje) {
+        texto.textContent = mensaje;
+        aviso.hidden = false;
+    }
+
+    function nuevaVersion(actual) {
+        // La primera version es la de la conexion, no un cambio
+        if (version !== null && actual !== version) {
+            mostrar("Los datos han cambiado.");
+        }
+        version = actual;
+    }
+
+    function consultar() {
+        fetch("/api/tickets/estado", {cache: "no-store"})
+            .then(function (respuesta) {
+                return respuesta.ok ? respuesta.json() : null;
+            })
+            .then(function (datos) {
+                if (datos) {
+                    nuevaVersion(datos.version);
+                }
+            })
+            .catch(function () {})
+            .then(function () {
+                setTimeout(consultar, CONSULTA_MS);
+            });
+    }
+
+    if (!window.EventSource) {
+        consultar();
+        return;
+    }
+
+    var fuente = new EventSource("/api/eventos");
+    fuente.addEventListener("tickets", function (e) {
+        var datos = JSON.parse(e.data);
+        nuevos += datos.tickets;
+        version = datos.version;
+        if (total) {
+            total.textContent = Number(total.textContent) + datos.tickets;
+        }
+        mostrar(nuevos + " tickets nuevos desde que se abrió la página.");
+    });
+    fuente.addEventListener("version", function (e) {
+        nuevaVersion(JSON.parse(e.data).version);
+    });
+    // Al terminar cada conexion el navegador reconecta solo; si la respuesta
+    // no es un flujo de eventos (p.ej. 503) la cierra y no lo vuelve a intentar
+    fuente.addEventListener("error", function () {
+        if (fuente.readyState === EventSource.CLOSED) {
+            consultar();
+        }
+    });
+})();
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+import generador_datos  # noqa: E402
+
+
+# Genera un fichero con el formato de datos.json en el directorio temporal
+@pytest.fixture
+def fichero_datos(tmp_path):
+    def generar(nombre, n_tickets, **opciones):
+        ruta = str(tmp_path / nombre)
+        generador_datos.generar(ruta, n_tickets, **opciones)
+        return ruta
+    return generar
@@ -0,0 +1,125 @@
+# Propiedad de acumuladores.py: tras cualquier secuencia de cargas el estado
+# acumulado es identico, bit a bit, al de reconstruirlo desde cero, y los KPI
+# que se leen de el son los que calcula MotorAnalisis con pandas
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+
+import pytest
+
+import acumuladores
+import carga
+import generador_datos
+from analisis import MotorAnalisis
+from ingesta import Ingesta
+
+CASOS = 12
+PASOS = 4
+TICKETS = 1500
+
+
+@pytest.fixture(autouse=True)
+def sin_instantanea(tmp_path, monkeypatch):
+    # MotorAnalisis lee de SQLite la base de datos de cada paso
+    monkeypatch.setenv("INCIDENCIAS_INSTANTANEA", str(tmp_path / "sin_instantanea"))
+
+
+def _generar(ruta, rnd, n_tickets):
+    generador_datos.generar(
+        ruta, rnd.randint(0, n_tickets), n_clientes=rnd.randint(1, 40), n_empleados=rnd.randint(1, 25),
+        semilla=rnd.randrange(10 ** 6), contactos_por_ticket=(0, rnd.randint(1, 6)),
+        sesgo=rnd.choice([0.0, 1.0, 1.5]))
+
+
+# Estado completo de los acumuladores; repr distingue cualquier bit de los float
+def _estado(conn):
+    consultas = ["SELECT * FROM acum_clientes ORDER BY cliente",
+                 "SELECT * FROM acum_empleados ORDER BY id_emp",
+                 "SELECT id_carga, max_id_ticket, max_id_contacto, n_tickets, sin_duracion, min_duracion, "
+                 "max_duracion, horas_n, horas_suma, horas_suma2, horas_escala, horas_no_finitas "
+                 "FROM control_acumuladores"]
+    return [repr(conn.execute(sql).fetchall()) for sql in consultas]
+
+
+def _reconstruido(ruta_db, directorio):
+    copia = os.path.join(directorio, "reconstruida.db")
+    if os.path.exists(copia):
+        os.remove(copia)
+    origen, destino = sqlite3.connect(ruta_db), sqlite3.connect(copia)
+    origen.backup(destino)
+    origen.close()
+    acumuladores.refrescar(destino, completo=True)
+    estado = _estado(destino)
+    destino.close()
+    return estado
+
+
+def _comprobar(ruta_db, directorio, paso):
+    conn = sqlite3.connect(ruta_db)
+    acumulado = _estado(conn)
+    estado = acumuladores.leer(conn)
+    conn.close()
+    assert estado is not None, f"tras {paso}: los acumuladores no estan al dia"
+    assert acumulado == _reconstruido(ruta_db, directorio), f"tras {paso}: distinto de reconstruir"
+
+    motor = MotorAnalisis(ruta_db, usar_acumuladores=False, usar_almacen=False)
+    motor.comprobar_version(forzar=True)
+    for nombre, valor in acumuladores.kpis(estado).items():
+        esperado = getattr(motor, nombre)
+        if nombre == "std_horas" and not math.isnan(esperado):
+            # pandas la calcula en dos pasadas con la media redondeada
+            assert valor == pytest.approx(esperado, rel=1e-15, abs=0), f"tras {paso}: {nombre}"
+        else:
+            assert str(valor) == str(esperado), f"tras {paso}: {nombre}"
+
+
+@pytest.mark.parametrize("semilla", range(CASOS))
+def test_acumular_es_reconstruir(semilla, tmp_path):
+    rnd = random.Random(semilla)
+    ruta_db = str(tmp_path / "incidencias.db")
+    ruta_json = str(tmp_path / "datos.json")
+    _generar(ruta_json, rnd, TICKETS)
+    carga.cargar_streaming(ruta_json, ruta_db)
+    _comprobar(ruta_db, str(tmp_path), "la carga completa")
+
+    for _ in range(PASOS):
+        paso = rnd.choice(["incremental", "incremental", "api", "api", "ticket antiguo"])
+        if paso == "incremental":
+            _generar(ruta_json, rnd, TICKETS // 4)
+            carga.cargar_incremental(ruta_json, ruta_db)
+        elif paso == "api":
+            _generar(ruta_json, rnd, 200)
+            with open(ruta_json, encoding="utf-8") as f:
+                tickets = json.load(f)["tickets_emitidos"]
+            Ingesta(ruta_db)._volcar([(time.monotonic(), ticket) for ticket in tickets])
+        else:
+            # Un contacto nuevo de un ticket ya acumulado obliga a reconstruir
+            conn = carga.conectar_escritura(ruta_db)
+            id_ticket = conn.execute("SELECT MAX(id_ticket) FROM tickets").fetchone()[0]
+            if id_ticket is None:
+                conn.close()
+                continue
+            conn.execute("INSERT INTO contactos_empleados(id_ticket, id_emp, fecha, tiempo) VALUES (?, ?, ?, ?)",
+                         (rnd.randint(1, id_ticket), "101", "2026-01-01", rnd.choice([0.1, 1.0, 2.5])))
+            cursor = conn.cursor()
+            carga.registrar_carga(cursor, "incremental", None, 0, 1)
+            carga.actualizar_agregados(cursor)
+            conn.commit()
+            conn.close()
+        _comprobar(ruta_db, str(tmp_path), paso)
+
+
+def test_raiz_redondea_una_vez():
+    from decimal import Decimal, localcontext
+    from fractions import Fraction
+
+    rnd = random.Random(18)
+    with localcontext() as contexto:
+        contexto.prec = 80
+        for _ in range(2000):
+            valor = Fraction(rnd.randrange(1, 10 ** rnd.randint(1, 30)), rnd.randrange(1, 10 ** rnd.randint(1, 30)))
+            exacta = (Decimal(valor.numerator) / Decimal(valor.denominator)).sqrt()
+            assert acumuladores._raiz(valor) == float(exacta)
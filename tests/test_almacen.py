@@ -0,0 +1,86 @@
+# Las tablas de hechos de almacen.py: los KPI que se leen de ellas son los que
+# calcula MotorAnalisis con pandas, y un refresco incremental deja las mismas
+# filas que reconstruirlas, tambien cuando solo cambia el nivel de un empleado
+import json
+import sqlite3
+
+import pytest
+
+import almacen
+import carga
+from analisis import MotorAnalisis
+
+
+@pytest.fixture(autouse=True)
+def sin_instantanea(tmp_path, monkeypatch):
+    monkeypatch.setenv("INCIDENCIAS_INSTANTANEA", str(tmp_path / "sin_instantanea"))
+
+
+def _hechos(conn):
+    return [repr(conn.execute(f"SELECT * FROM {tabla} ORDER BY 1, 2, 3, 4, 5").fetchall())
+            for tabla in ("hechos_tickets_dia", "hechos_contactos_dia")]
+
+
+def _reconstruido(ruta_db, directorio):
+    origen, destino = sqlite3.connect(ruta_db), sqlite3.connect(str(directorio / "reconstruida.db"))
+    origen.backup(destino)
+    origen.close()
+    almacen.refrescar(destino, completo=True)
+    hechos = _hechos(destino)
+    destino.close()
+    return hechos
+
+
+@pytest.mark.parametrize("semilla", range(4))
+def test_kpis_del_almacen_son_los_de_pandas(semilla, fichero_datos, tmp_path):
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(fichero_datos("datos.json", 1500, n_clientes=12, semilla=semilla,
+                                         contactos_por_ticket=(0, 4)), ruta_db)
+    carga.cargar_incremental(fichero_datos("delta.json", 300, n_clientes=15, semilla=semilla + 100), ruta_db)
+
+    conn = sqlite3.connect(ruta_db)
+    estado = almacen.leer(conn)
+    conn.close()
+    assert estado is not None
+
+    motor = MotorAnalisis(ruta_db, usar_acumuladores=False)
+    pandas = MotorAnalisis(ruta_db, usar_acumuladores=False, usar_almacen=False)
+    assert motor.kpis_almacen is not None
+    for nombre, valor in almacen.kpis(estado).items():
+        assert str(valor) == str(getattr(pandas, nombre)), nombre
+        assert str(getattr(motor, nombre)) == str(valor), nombre
+
+
+def test_almacen_desfasado_no_se_usa(fichero_datos, tmp_path):
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(fichero_datos("datos.json", 200), ruta_db)
+
+    conn = sqlite3.connect(ruta_db)
+    conn.execute("INSERT INTO contactos_empleados(id_ticket, id_emp, fecha, tiempo) VALUES (1, '101', '2026-01-01', 2.0)")
+    conn.commit()
+    assert almacen.leer(conn) is None
+    conn.close()
+
+
+def test_cambio_de_nivel_refresca_sus_dias(fichero_datos, tmp_path):
+    ruta_db = str(tmp_path / "incidencias.db")
+    ruta_json = fichero_datos("datos.json", 500, n_empleados=6)
+    carga.cargar_streaming(ruta_json, ruta_db)
+
+    with open(ruta_json, encoding="utf-8") as f:
+        empleado = json.load(f)["empleados"][0]
+    empleado["nivel"] += 1
+    delta = tmp_path / "delta.json"
+    delta.write_text(json.dumps({"empleados": [empleado], "tickets_emitidos": []}), encoding="utf-8")
+
+    resultado = carga.cargar_incremental(str(delta), ruta_db)
+    assert resultado["dimensiones"] == 1
+    assert resultado["agregados"]["almacen"] == "incremental"
+
+    conn = sqlite3.connect(ruta_db)
+    niveles = conn.execute("SELECT DISTINCT nivel FROM hechos_contactos_dia WHERE id_emp = ?",
+                           (empleado["id_emp"],)).fetchall()
+    hechos = _hechos(conn)
+    conn.close()
+    assert niveles == [(empleado["nivel"],)]
+    assert hechos == _reconstruido(ruta_db, tmp_path)
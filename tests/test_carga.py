@@ -0,0 +1,92 @@
+import json
+import sqlite3
+
+import carga
+
+
+def _contar(ruta_db, tabla):
+    conn = sqlite3.connect(ruta_db)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _contactos(ruta_json):
+    with open(ruta_json, encoding="utf-8") as f:
+        return sum(len(t["contactos_con_empleados"]) for t in json.load(f)["tickets_emitidos"])
+
+
+def _escribir(ruta, tickets, base):
+    with open(base, encoding="utf-8") as f:
+        datos = json.load(f)
+    datos["tickets_emitidos"] = tickets
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f)
+    return ruta
+
+
+# Dos ficheros generados por separado comparten muchos (cliente, dia, tipo,
+# mantenimiento, satisfaccion), pero ninguno de sus tickets es el mismo
+def test_delta_independiente_no_pierde_tickets(fichero_datos, tmp_path):
+    base = fichero_datos("base.json", 20000, semilla=1)
+    delta = fichero_datos("delta.json", 2000, semilla=2)
+    ruta_db = str(tmp_path / "incidencias.db")
+
+    carga.cargar_streaming(base, ruta_db)
+    resultado = carga.cargar_incremental(delta, ruta_db)
+
+    assert resultado["tickets"] == 2000
+    assert resultado["repetidos"] == 0
+    assert resultado["contactos"] == _contactos(delta)
+    assert _contar(ruta_db, "tickets") == 22000
+    assert _contar(ruta_db, "contactos_empleados") == _contactos(base) + _contactos(delta)
+
+
+def test_repetir_delta_no_cambia_nada(fichero_datos, tmp_path):
+    base = fichero_datos("base.json", 2000, semilla=1)
+    delta = fichero_datos("delta.json", 500, semilla=2)
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(base, ruta_db)
+    carga.cargar_incremental(delta, ruta_db)
+
+    resultado = carga.cargar_incremental(delta, ruta_db)
+
+    assert (resultado["tickets"], resultado["contactos"], resultado["repetidos"]) == (0, 0, 500)
+    assert resultado["agregados"] is None
+    assert _contar(ruta_db, "tickets") == 2500
+
+
+# Las bases de datos con claves de otro formato se migran antes de comparar
+def test_migrar_claves_reconoce_los_tickets_cargados(fichero_datos, tmp_path):
+    base = fichero_datos("base.json", 1000, semilla=1)
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(base, ruta_db)
+    conn = sqlite3.connect(ruta_db)
+    conn.execute("UPDATE tickets SET clave_natural = 'antigua-' || id_ticket")
+    conn.commit()
+    conn.close()
+
+    resultado = carga.cargar_incremental(base, ruta_db)
+
+    assert (resultado["tickets"], resultado["repetidos"]) == (0, 1000)
+
+
+def test_id_externo_anade_contactos_y_rechaza_conflictos(fichero_datos, tmp_path):
+    base = fichero_datos("base.json", 100, semilla=1)
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(base, ruta_db)
+    with open(base, encoding="utf-8") as f:
+        ticket = dict(json.load(f)["tickets_emitidos"][0], id_externo="T-1")
+    contacto = {"id_emp": "101", "fecha": ticket["fecha_apertura"], "tiempo": 9.5}
+
+    primero = _escribir(str(tmp_path / "uno.json"), [ticket], base)
+    assert carga.cargar_incremental(primero, ruta_db)["tickets"] == 1
+
+    ampliado = dict(ticket, contactos_con_empleados=ticket["contactos_con_empleados"] + [contacto])
+    distinto = dict(ticket, id_externo="T-1", satisfaccion_cliente=ticket["satisfaccion_cliente"] % 10 + 1)
+    segundo = _escribir(str(tmp_path / "dos.json"), [ampliado, distinto], base)
+    resultado = carga.cargar_incremental(segundo, ruta_db)
+
+    assert (resultado["tickets"], resultado["contactos"], resultado["repetidos"], resultado["conflictos"]) == (0, 1, 1, 1)
+    assert _contar(ruta_db, "tickets") == 101
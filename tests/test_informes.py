@@ -0,0 +1,53 @@
+import os
+import sqlite3
+
+import carga
+from informes import GestorInformes, id_informe
+from version_datos import leer_identidad
+
+SECCIONES = ["actuaciones", "tiempo_inc"]
+
+
+def _identidad(ruta_db):
+    conn = sqlite3.connect(ruta_db)
+    try:
+        return leer_identidad(conn, ruta_db)
+    finally:
+        conn.close()
+
+
+# Una base de datos recreada vuelve a la version 1: su informe no puede ser
+# el que quedo en disco de la anterior
+def test_base_recreada_no_reutiliza_informes(fichero_datos, tmp_path):
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(fichero_datos("uno.json", 50, semilla=1), ruta_db)
+    anterior = _identidad(ruta_db)
+    os.remove(ruta_db)
+    carga.cargar_streaming(fichero_datos("dos.json", 60, semilla=2), ruta_db)
+
+    assert _identidad(ruta_db) != anterior
+    assert id_informe(1, _identidad(ruta_db), SECCIONES) != id_informe(1, anterior, SECCIONES)
+
+
+def test_identidad_depende_del_fichero(fichero_datos, tmp_path):
+    datos = fichero_datos("datos.json", 50, semilla=1)
+    carga.cargar_streaming(datos, str(tmp_path / "a.db"))
+    sqlite3.connect(str(tmp_path / "a.db")).backup(sqlite3.connect(str(tmp_path / "b.db")))
+
+    assert _identidad(str(tmp_path / "a.db")) != _identidad(str(tmp_path / "b.db"))
+
+
+def test_limpiar_borra_versiones_anteriores_y_otras_bases(tmp_path):
+    gestor = GestorInformes(str(tmp_path))
+    nombres = {
+        "actual": f"informe_{id_informe(5, 'aaaaaaaa', SECCIONES)}.pdf",
+        "anterior": f"informe_{id_informe(4, 'aaaaaaaa', SECCIONES)}.pdf",
+        "otra base": f"informe_{id_informe(7, 'bbbbbbbb', SECCIONES)}.pdf",
+        "sin identidad": "informe_6-0123456789ab.pdf",
+    }
+    for nombre in nombres.values():
+        (tmp_path / nombre).write_bytes(b"%PDF")
+
+    gestor.limpiar(5, "aaaaaaaa")
+
+    assert sorted(os.listdir(tmp_path)) == [nombres["actual"]]
@@ -0,0 +1,61 @@
+import json
+import sqlite3
+
+import pytest
+from flask import Flask
+
+import carga
+import conexiones
+import ingesta
+
+
+@pytest.fixture
+def cliente(fichero_datos, tmp_path, monkeypatch):
+    base = fichero_datos("base.json", 200, semilla=1)
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(base, ruta_db)
+    monkeypatch.setattr(conexiones, "RUTA_DB", ruta_db)
+    aplicacion = Flask(__name__)
+    aplicacion.register_blueprint(ingesta.ingesta_api)
+    with open(base, encoding="utf-8") as f:
+        tickets = json.load(f)["tickets_emitidos"]
+    yield aplicacion.test_client(), tickets, ruta_db
+    ingesta.ingesta(ruta_db).cerrar()
+
+
+def _tickets(ruta_db):
+    conn = sqlite3.connect(ruta_db)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+    finally:
+        conn.close()
+
+
+# Tickets distintos con el mismo cliente, dia, tipo, mantenimiento y
+# satisfaccion son tickets nuevos, no contactos de otro
+def test_tickets_parecidos_se_escriben_todos(cliente):
+    http, tickets, ruta_db = cliente
+    parecido = dict(tickets[0], contactos_con_empleados=[
+        {"id_emp": "101", "fecha": tickets[0]["fecha_apertura"], "tiempo": 7.5}])
+
+    respuesta = http.post("/api/tickets", json=[parecido, tickets[1]])
+    assert respuesta.status_code == 202
+    ingesta.ingesta(ruta_db).vaciar(timeout=10)
+
+    estado = ingesta.ingesta(ruta_db).estado()
+    assert (estado["escritos"], estado["repetidos"]) == (1, 1)
+    assert _tickets(ruta_db) == 201
+
+
+def test_id_externo_en_conflicto_se_rechaza(cliente):
+    http, tickets, ruta_db = cliente
+    ticket = dict(tickets[0], id_externo="T-1")
+    assert http.post("/api/tickets", json=ticket).status_code == 202
+    ingesta.ingesta(ruta_db).vaciar(timeout=10)
+
+    distinto = dict(ticket, satisfaccion_cliente=ticket["satisfaccion_cliente"] % 10 + 1)
+    respuesta = http.post("/api/tickets", json=[tickets[1], distinto])
+
+    assert respuesta.status_code == 409
+    assert respuesta.get_json()["detalles"][0]["indice"] == 1
+    assert _tickets(ruta_db) == 201
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+import carga
+from plan_consultas import comprobar_planes
+
+
+def _base(ruta_db, indices=True):
+    conn = sqlite3.connect(ruta_db)
+    cursor = conn.cursor()
+    carga.crear_esquema(cursor)
+    if indices:
+        carga.crear_indices(cursor)
+    return conn
+
+
+@pytest.fixture
+def conn_vacia(tmp_path):
+    conn = _base(str(tmp_path / "vacia.db"))
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def conn_con_datos(fichero_datos, tmp_path):
+    ruta_db = str(tmp_path / "incidencias.db")
+    carga.cargar_streaming(fichero_datos("datos.json", 2000, semilla=1, sesgo=1.1), ruta_db)
+    conn = sqlite3.connect(ruta_db)
+    conn.execute("ANALYZE")
+    yield conn
+    conn.close()
+
+
+def test_planes_sin_datos_usan_sus_indices(conn_vacia):
+    assert comprobar_planes(conn_vacia) == []
+
+
+# Con estadisticas de ANALYZE el planificador podria preferir recorrer la tabla
+def test_planes_con_datos_usan_sus_indices(conn_con_datos):
+    assert comprobar_planes(conn_con_datos) == []
+
+
+def test_sin_indices_se_detecta_la_regresion(tmp_path):
+    conn = _base(str(tmp_path / "sin_indices.db"), indices=False)
+    try:
+        fallos = dict(comprobar_planes(conn))
+    finally:
+        conn.close()
+    assert "incidencias por cliente" in fallos
+    assert fallos["incidencias por cliente"].startswith("recorrido completo")
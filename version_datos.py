@@ -0,0 +1,118 @@
+# -----------------------------------------------------------------------------
+#                           VERSION DE LOS DATOS
+# -----------------------------------------------------------------------------
+# Cada carga que hace main.py queda anotada en control_cargas con un id
+# creciente. Ese id (la "generacion" de los datos) es lo que usan las caches
+# del dashboard para saber si tienen que volver a calcular.
+#
+# VigilanteVersion lee esa version como mucho una vez por intervalo y la
+# comparten el motor de analisis y las caches de paginas, de modo que ambos
+# cambian de version a la vez. No depende de pandas, asi que la aplicacion
+# puede comprobar la version (y servir paginas cacheadas) sin cargarlo.
+#
+# Un vigilante se puede fijar a una version (fijar): comprobar la devuelve
+# siempre, aunque haya cargas nuevas. Asi un worker de gunicorn con el estado
+# compartido (estado_compartido.py) sirve la version que heredo hasta que lo
+# reemplaza otro con la siguiente.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import conexiones
+
+
+def leer_version(conn):
+    try:
+        return conn.execute("SELECT COALESCE(MAX(id_carga), 0) FROM control_cargas").fetchone()[0]
+    except sqlite3.OperationalError:
+        # Base de datos anterior a control_cargas
+        return 0
+
+
+# Momento (UTC) de la carga que dio lugar a la version actual (o a 'version')
+def leer_fecha_version(conn, version=None):
+    try:
+        fila = conn.execute(
+            "SELECT fecha_carga FROM control_cargas WHERE id_carga <= COALESCE(?, id_carga) "
+            "ORDER BY id_carga DESC LIMIT 1", (version,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if fila is None or fila[0] is None:
+        return None
+    return datetime.strptime(fila[0], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+# Identidad de la base de datos: su ruta resuelta y su primera carga (momento,
+# fichero y tickets y contactos que trajo). Las versiones vuelven a empezar en 1 si se recrea la base de datos o
+# se apunta a otra, asi que lo que se guarda fuera de ella por version (los
+# PDF de informes.py) necesita tambien esto para no servir datos de otra
+def leer_identidad(conn, ruta_db):
+    try:
+        fila = conn.execute("SELECT * FROM control_cargas ORDER BY id_carga LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        fila = None
+    contenido = f"{os.path.realpath(ruta_db)}|{fila!r}"
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:8]
+
+
+class VigilanteVersion:
+    def __init__(self, ruta_db=None, intervalo=1.0):
+        self.ruta_db = ruta_db
+        # Segundos entre lecturas de la version
+        self.intervalo = intervalo
+        self._version = None
+        self._ultima_comprobacion = 0.0
+        self._fija = None
+        self._lock = threading.Lock()
+
+    def leer(self):
+        with conexiones.lectura(self.ruta_db) as conn:
+            return leer_version(conn)
+
+    def comprobar(self, forzar=False):
+        if self._fija is not None:
+            return self._fija
+        ahora = time.monotonic()
+        if not forzar and self._version is not None and ahora - self._ultima_comprobacion < self.intervalo:
+            return self._version
+        with self._lock:
+            self._version = self.leer()
+            self._ultima_comprobacion = ahora
+            return self._version
+
+    # None vuelve a seguir la version de la base de datos
+    def fijar(self, version):
+        with self._lock:
+            self._fija = version
+            if version is not None:
+                self._version = version
+
+    def fijada(self):
+        return self._fija
+
+    def fecha(self):
+        with conexiones.lectura(self.ruta_db) as conn:
+            return leer_fecha_version(conn, self._fija)
+
+    # Se lee cada vez: la base de datos se puede recrear sin que cambie la version
+    def identidad(self):
+        with conexiones.lectura(self.ruta_db) as conn:
+            return leer_identidad(conn, self.ruta_db or conexiones.RUTA_DB)
+
+
+_vigilantes = {}
+_lock_vigilantes = threading.Lock()
+
+
+# Vigilante compartido por ruta de base de datos
+def vigilante(ruta_db=None, intervalo=1.0):
+    ruta_db = ruta_db or conexiones.RUTA_DB
+    with _lock_vigilantes:
+        if ruta_db not in _vigilantes:
+            _vigilantes[ruta_db] = VigilanteVersion(ruta_db, intervalo)
+        return _vigilantes[ruta_db]
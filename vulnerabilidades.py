@@ -1,83 +1,540 @@
+# -----------------------------------------------------------------------------
+#                     ULTIMAS VULNERABILIDADES (CIRCL CVE)
+# -----------------------------------------------------------------------------
+# La pagina /vulnerabilidades ya no espera a cve.circl.lu: las CVE se guardan en
+# una cache con caducidad (TTL) que tambien se escribe en disco, de modo que un
+# reinicio no obliga a consultar la API otra vez.
+#   - Si la cache esta vigente se sirve directamente.
+#   - Si ha caducado se sirve igualmente y se refresca en un hilo aparte
+#     (stale-while-revalidate); solo hay un refresco en marcha a la vez.
+#   - Entre dos consultas a la API pasan al menos INTERVALO_MINIMO segundos,
+#     tambien cuando la API falla, para no insistir sobre un servicio caido.
+# Solo se espera a la API cuando no hay nada en memoria ni en disco.
+#
+# Ademas, cada respuesta de la API se recorre elemento a elemento (lector_json)
+# y se guarda normalizada en un indice SQLite con FTS5 (IndiceCVE), de modo que
+# se conserva el historico y /vulnerabilidades puede buscar por palabras,
+# filtrar por CVSS y paginar por fecha sin volver a pedir nada a la API.
+#
+# Configuracion por variables de entorno: CVE_URL, CVE_TTL (segundos),
+# CVE_CACHE (fichero de la cache en disco) y CVE_INDICE (base de datos del
+# indice).
+
+import asyncio
+import codecs
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def obtener_ultimas_vulnerabilidades(n=10):
+from conexiones import PoolConexiones
+from lector_json import TAMANO_TROZO, iterar_array, trozos_fichero
+
+log = logging.getLogger(__name__)
+
+URL_CVE = os.environ.get("CVE_URL", "https://cve.circl.lu/api/last")
+TTL_CVE = float(os.environ.get("CVE_TTL", "900"))
+RUTA_CACHE = os.environ.get("CVE_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "cves.json"))
+RUTA_INDICE = os.environ.get("CVE_INDICE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "cves.db"))
+
+INTERVALO_MINIMO = 30
+# (conexion, lectura) en segundos
+TIMEOUT = (3.05, 10)
+# CVE validas que se guardan (la pagina muestra las 10 primeras)
+MAX_CVES = 100
+# Filas por insercion en el indice y por pagina de busqueda
+TAMANO_LOTE = 500
+TAMANO_PAGINA = 25
+# Por orden de preferencia, igual que en la pagina original
+# Respuestas de la API que se reintentan
+REINTENTAR = (429, 502, 503, 504)
+VERSIONES_CVSS = (("cvssV3_1", "3.1"), ("cvssV4_0", "4.0"), ("cvssV3_0", "3.0"), ("cvssV2_0", "2.0"))
+
+
+def _fuente(cve):
+    # Clasificación por fuente
+    if "cveMetadata" in cve:
+        return "NVD/MITRE"
+    if cve.get("id", "").startswith("GHSA"):
+        return "GitHub Advisory"
+    if "schema_version" in cve and "summary" in cve:
+        return "Otro feed estructurado (OSS Index, distro advisory...)"
+    return "Fuente desconocida"
+
+
+# Puntuacion y version CVSS de la primera metrica de un registro CVE 5
+def _cvss(cve):
+    metrics = cve.get("containers", {}).get("cna", {}).get("metrics", [])
+    if metrics and isinstance(metrics[0], dict):
+        for clave, version in VERSIONES_CVSS:
+            if clave in metrics[0]:
+                return metrics[0][clave].get("baseScore", "N/A"), version
+    return "N/A", None
+
+
+# Extrae id, resumen, fecha y CVSS de una entrada del feed; None si le falta algo
+def parsear_cve(cve):
+    # Inicialización por defecto
+    cve_id = cve.get("cveMetadata", {}).get("cveId", "N/A")
+    publicado = cve.get("cveMetadata", {}).get("datePublished", "Fecha no disponible")
+
+    descriptions = (
+        cve.get("containers", {})
+           .get("cna", {})
+           .get("descriptions", [])
+    )
+    if descriptions and isinstance(descriptions[0], dict):
+        resumen = descriptions[0].get("value", "Sin descripción")
+    else:
+        resumen = "Sin descripción"
+
+    cvss_score, _ = _cvss(cve)
+
+    # Validación
+    faltan = [campo for campo, falta in (("id", cve_id == "N/A"),
+                                         ("resumen", resumen == "Sin descripción"),
+                                         ("fecha", publicado == "Fecha no disponible")) if falta]
+    if faltan:
+        log.debug("cve omitida fuente=%r faltan=%s", _fuente(cve), ",".join(faltan))
+        return None
+    return {
+        "cve_id": cve_id,
+        "resumen": resumen,
+        "publicado": publicado[:10],
+        "cvss": cvss_score
+    }
+
+
+def parsear_cves(data, n=MAX_CVES):
+    validos = []
+    for cve in data:
+        entrada = parsear_cve(cve)
+        if entrada is not None:
+            validos.append(entrada)
+            if len(validos) == n:
+                break
+    return validos
+
+
+# Fila del indice para cualquier entrada del feed (tambien avisos GHSA y otros
+# feeds con id/published/summary); None si no tiene id, fecha o resumen
+def normalizar_cve(cve):
+    fuente = _fuente(cve)
+    if "cveMetadata" in cve:
+        entrada = parsear_cve(cve)
+        if entrada is None:
+            return None
+        publicado = cve["cveMetadata"]["datePublished"]
+        puntuacion, version = _cvss(cve)
+        cve_id, resumen = entrada["cve_id"], entrada["resumen"]
+    else:
+        cve_id = cve.get("id")
+        publicado = cve.get("published")
+        resumen = cve.get("summary") or cve.get("details")
+        puntuacion, version = "N/A", None
+        if not (cve_id and publicado and resumen):
+            log.debug("cve omitida fuente=%r id=%r", fuente, cve_id)
+            return None
     try:
-        url = "https://cve.circl.lu/api/last"
-        response = requests.get(url, timeout=10)
-
-        if response.status_code == 200:
-            data = response.json()
-            validos = []
-
-            for cve in data:
-                # Inicialización por defecto
-                cve_id = cve.get("cveMetadata", {}).get("cveId", "N/A")
-                publicado = cve.get("cveMetadata", {}).get("datePublished", "Fecha no disponible")
-
-                descriptions = (
-                    cve.get("containers", {})
-                       .get("cna", {})
-                       .get("descriptions", [])
-                )
-                if descriptions and isinstance(descriptions[0], dict):
-                    resumen = descriptions[0].get("value", "Sin descripción")
-                else:
-                    resumen = "Sin descripción"
-
-                cvss_score = "N/A"
-                metrics = cve.get("containers", {}).get("cna", {}).get("metrics", [])
-                if metrics:
-                    if "cvssV3_1" in metrics[0]:
-                        cvss_score = metrics[0]["cvssV3_1"].get("baseScore", "N/A")
-                    elif "cvssV4_0" in metrics[0]:
-                        cvss_score = metrics[0]["cvssV4_0"].get("baseScore", "N/A")
-
-                # Validación
-                if cve_id != "N/A" and resumen != "Sin descripción" and publicado != "Fecha no disponible":
-                    print(f"CVE válida: {cve_id} | CVSS: {cvss_score} | Fecha: {publicado}")
-                    validos.append({
-                        "cve_id": cve_id,
-                        "resumen": resumen,
-                        "publicado": publicado[:10],
-                        "cvss": cvss_score
-                    })
-                else:
-                    # Clasificación por fuente
-                    if "cveMetadata" in cve:
-                        fuente = "NVD/MITRE"
-                    elif cve.get("id", "").startswith("GHSA"):
-                        fuente = "GitHub Advisory"
-                    elif "schema_version" in cve and "summary" in cve:
-                        fuente = "Otro feed estructurado (OSS Index, distro advisory...)"
-                    else:
-                        fuente = "Fuente desconocida"
-
-                    print(f"Entrada omitida ({fuente})")
-                    if cve_id == "N/A":
-                        print("   - Falta de ID (cveMetadata → cveId)")
-                    if resumen == "Sin descripción":
-                        print("   - Falta de resumen (containers → cna → descriptions)")
-                    if publicado == "Fecha no disponible":
-                        print("   - Falta de fecha (cveMetadata → datePublished)")
-
-
-                if len(validos) == n:
-                    break
-
-            return validos
+        puntuacion = float(puntuacion)
+    except (TypeError, ValueError):
+        puntuacion, version = None, None
+    return {
+        "cve_id": cve_id,
+        # AAAA-MM-DDTHH:MM:SS, para que el orden de texto sea el cronologico
+        "publicado": publicado[:19],
+        "cvss": puntuacion,
+        "version_cvss": version,
+        "resumen": resumen,
+        "fuente": fuente,
+    }
+
+
+# -----------------------------------------------------------------------------
+#                         INDICE LOCAL DE CVE (FTS5)
+# -----------------------------------------------------------------------------
+# Tabla cves con una fila por CVE (la ultima version vista) y un indice FTS5 de
+# contenido externo sobre el resumen, mantenido con triggers.
+
+ESQUEMA_INDICE = """
+CREATE TABLE IF NOT EXISTS cves (
+    cve_id       TEXT PRIMARY KEY,
+    publicado    TEXT NOT NULL,
+    cvss         REAL,
+    version_cvss TEXT,
+    resumen      TEXT NOT NULL,
+    fuente       TEXT NOT NULL,
+    indexado     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cves_publicado ON cves (publicado, cve_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS cves_fts USING fts5 (
+    resumen, content='cves', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS cves_ai AFTER INSERT ON cves BEGIN
+    INSERT INTO cves_fts (rowid, resumen) VALUES (new.rowid, new.resumen);
+END;
+CREATE TRIGGER IF NOT EXISTS cves_ad AFTER DELETE ON cves BEGIN
+    INSERT INTO cves_fts (cves_fts, rowid, resumen) VALUES ('delete', old.rowid, old.resumen);
+END;
+CREATE TRIGGER IF NOT EXISTS cves_au AFTER UPDATE OF resumen ON cves BEGIN
+    INSERT INTO cves_fts (cves_fts, rowid, resumen) VALUES ('delete', old.rowid, old.resumen);
+    INSERT INTO cves_fts (rowid, resumen) VALUES (new.rowid, new.resumen);
+END;
+"""
+
+SQL_INSERTAR = """
+INSERT INTO cves (cve_id, publicado, cvss, version_cvss, resumen, fuente, indexado)
+VALUES (:cve_id, :publicado, :cvss, :version_cvss, :resumen, :fuente, :indexado)
+ON CONFLICT (cve_id) DO UPDATE SET
+    publicado = excluded.publicado,
+    cvss = excluded.cvss,
+    version_cvss = excluded.version_cvss,
+    resumen = excluded.resumen,
+    fuente = excluded.fuente,
+    indexado = excluded.indexado
+"""
+
+
+def _crear_indice(conn):
+    conn.executescript(ESQUEMA_INDICE)
+
 
+# Texto libre -> consulta FTS5: cada palabra entre comillas (sin operadores) y
+# como prefijo, todas obligatorias
+def consulta_fts(texto):
+    palabras = texto.split()
+    return " ".join('"{}"*'.format(palabra.replace('"', '""')) for palabra in palabras)
+
+
+class IndiceCVE:
+    def __init__(self, ruta_db=RUTA_INDICE):
+        self.ruta_db = ruta_db
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _conexiones(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.ruta_db)), exist_ok=True)
+                    self._pool = PoolConexiones(self.ruta_db, inicializar=_crear_indice)
+        return self._pool
+
+    def _insertar(self, filas):
+        with self._conexiones().escritura() as conn:
+            conn.executemany(SQL_INSERTAR, filas)
+
+    # Guarda las entradas (crudas, tal como vienen del feed) por lotes;
+    # devuelve cuantas se han indexado
+    def indexar(self, cves):
+        indexado = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        lote = []
+        total = 0
+        for cve in cves:
+            fila = normalizar_cve(cve)
+            if fila is None:
+                continue
+            fila["indexado"] = indexado
+            lote.append(fila)
+            if len(lote) == TAMANO_LOTE:
+                self._insertar(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            self._insertar(lote)
+            total += len(lote)
+        return total
+
+    # Busca por palabras del resumen y CVSS minimo, de la mas reciente a la mas
+    # antigua. 'antes' es el cursor de la pagina anterior ("publicado|cve_id") o
+    # una fecha AAAA-MM-DD. Devuelve (filas, cursor de la pagina siguiente)
+    def buscar(self, texto="", cvss_min=None, antes=None, limite=TAMANO_PAGINA):
+        condiciones = []
+        params = []
+        consulta = consulta_fts(texto or "")
+        if consulta:
+            sql = "SELECT c.* FROM cves_fts JOIN cves AS c ON c.rowid = cves_fts.rowid"
+            condiciones.append("cves_fts MATCH ?")
+            params.append(consulta)
         else:
-            return [{
-                "cve_id": "Error",
-                "resumen": f"Error al obtener CVEs (status {response.status_code})",
-                "publicado": "",
-                "cvss": ""
-            }]
-
-    except Exception as e:
-        return [{
-            "cve_id": "Excepción",
-            "resumen": str(e),
-            "publicado": "",
-            "cvss": ""
-        }]
+            sql = "SELECT c.* FROM cves AS c"
+        if cvss_min is not None:
+            condiciones.append("c.cvss >= ?")
+            params.append(cvss_min)
+        if antes:
+            publicado, _, cve_id = antes.partition("|")
+            condiciones.append("(c.publicado, c.cve_id) < (?, ?)")
+            params.extend([publicado, cve_id])
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY c.publicado DESC, c.cve_id DESC LIMIT ?"
+        params.append(limite + 1)
+
+        with self._conexiones().lectura() as conn:
+            conn.row_factory = sqlite3.Row
+            try:
+                filas = [dict(fila) for fila in conn.execute(sql, params)]
+            finally:
+                conn.row_factory = None
+
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = f"{filas[-1]['publicado']}|{filas[-1]['cve_id']}"
+        for fila in filas:
+            # Mismo formato que la lista de ultimas CVE
+            fila["publicado"] = fila["publicado"][:10]
+            fila["cvss"] = "N/A" if fila["cvss"] is None else fila["cvss"]
+        return filas, siguiente
+
+    def contar(self):
+        with self._conexiones().lectura() as conn:
+            return conn.execute("SELECT COUNT(*) FROM cves").fetchone()[0]
+
+
+# Recorre el feed guardando en 'validos' las primeras n entradas para la pagina
+# mientras el resto sigue hacia el indice
+def _recorrer(cves, validos, n=MAX_CVES):
+    for cve in cves:
+        if len(validos) < n:
+            entrada = parsear_cve(cve)
+            if entrada is not None:
+                validos.append(entrada)
+        yield cve
+
+
+def _error(cve_id, resumen):
+    return [{"cve_id": cve_id, "resumen": resumen, "publicado": "", "cvss": ""}]
+
+
+class FuenteCVE:
+    def __init__(self, url=URL_CVE, ttl=TTL_CVE, ruta_cache=RUTA_CACHE,
+                 intervalo_minimo=INTERVALO_MINIMO, timeout=TIMEOUT, indice=None):
+        self.url = url
+        self.ttl = ttl
+        self.ruta_cache = ruta_cache
+        self.intervalo_minimo = intervalo_minimo
+        self.timeout = timeout
+        self.indice = indice
+        self._cves = None
+        self._obtenido = 0.0
+        self._ultimo_intento = 0.0
+        self._ultimo_error = None
+        self._refresco = None
+        # Consulta en marcha y cliente del servidor asincrono
+        self._tarea_async = None
+        self._cliente_async = None
+        self._lock = threading.Lock()
+        # Solo una consulta a la API a la vez
+        self._lock_refresco = threading.Lock()
+        self._sesion = self._crear_sesion()
+
+    @staticmethod
+    def _crear_sesion():
+        # Sesion reutilizable (keep-alive) con reintentos ante errores temporales
+        sesion = requests.Session()
+        reintentos = Retry(total=2, backoff_factor=0.5, status_forcelist=REINTENTAR,
+                           allowed_methods=("GET",))
+        sesion.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=reintentos))
+        sesion.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=reintentos))
+        sesion.headers["Accept"] = "application/json"
+        return sesion
+
+    def _leer_disco(self):
+        try:
+            with open(self.ruta_cache, "r", encoding="utf-8") as f:
+                guardado = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            log.warning("cache de cves ilegible ruta=%r error=%r", self.ruta_cache, error)
+            return
+        if guardado.get("url") != self.url:
+            return
+        self._cves = guardado["cves"]
+        self._obtenido = guardado["obtenido"]
+        log.info("cves cargadas de disco n=%d edad=%.0fs", len(self._cves), time.time() - self._obtenido)
+
+    def _guardar_disco(self, cves, obtenido):
+        os.makedirs(os.path.dirname(self.ruta_cache) or ".", exist_ok=True)
+        temporal = f"{self.ruta_cache}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"url": self.url, "obtenido": obtenido, "cves": cves}, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta_cache)
+
+    # Recorre el feed (trozos de bytes) y, si hay indice, guarda cada entrada en
+    # el en la misma pasada. Devuelve las CVE de la pagina y las indexadas
+    def _procesar(self, trozos):
+        cves = []
+        entradas = _recorrer(iterar_array(codecs.iterdecode(trozos, "utf-8")), cves)
+        if self.indice is None:
+            for _ in entradas:
+                pass
+            return cves, 0
+        return cves, self.indice.indexar(entradas)
+
+    def _fallo(self, error, inicio):
+        self._ultimo_error = str(error)
+        log.warning("error al obtener cves url=%r error=%r segundos=%.2f",
+                    self.url, error, time.perf_counter() - inicio)
+
+    # Consulta la API y actualiza la cache; devuelve True si lo ha conseguido.
+    # La respuesta se decodifica por trozos segun llega y, si hay indice, cada
+    # entrada se guarda en el en la misma pasada
+    def refrescar(self):
+        inicio = time.perf_counter()
+        self._ultimo_intento = time.time()
+        try:
+            with self._sesion.get(self.url, timeout=self.timeout, stream=True) as respuesta:
+                respuesta.raise_for_status()
+                cves, indexadas = self._procesar(respuesta.iter_content(TAMANO_TROZO))
+        except (requests.RequestException, ValueError, sqlite3.Error) as error:
+            self._fallo(error, inicio)
+            return False
+        self._guardar(cves, indexadas, inicio)
+        return True
+
+    def _guardar(self, cves, indexadas, inicio):
+        obtenido = time.time()
+        with self._lock:
+            self._cves = cves
+            self._obtenido = obtenido
+            self._ultimo_error = None
+        try:
+            self._guardar_disco(cves, obtenido)
+        except OSError as error:
+            log.warning("no se pudo guardar la cache de cves ruta=%r error=%r", self.ruta_cache, error)
+        log.info("cves actualizadas url=%r n=%d indexadas=%d segundos=%.2f",
+                 self.url, len(cves), indexadas, time.perf_counter() - inicio)
+
+    # Cliente httpx del servidor asincrono, creado dentro de su bucle
+    def _cliente(self):
+        import httpx
+        if self._cliente_async is None:
+            self._cliente_async = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                transport=httpx.AsyncHTTPTransport(retries=2),
+                headers={"Accept": "application/json"},
+            )
+        return self._cliente_async
+
+    # La respuesta de la API en trozos, con los mismos reintentos que la sesion
+    # de requests ante 429 y 5xx temporales (los de conexion los hace httpx)
+    async def _descargar(self):
+        for intento in range(3):
+            async with self._cliente().stream("GET", self.url) as respuesta:
+                if respuesta.status_code in REINTENTAR and intento < 2:
+                    await asyncio.sleep(0.5 * 2 ** intento)
+                    continue
+                respuesta.raise_for_status()
+                return [trozo async for trozo in respuesta.aiter_bytes(TAMANO_TROZO)]
+
+    # Como refrescar, pero la consulta a la API no ocupa ningun hilo: solo
+    # recorrer e indexar la respuesta va al 'ejecutor'
+    async def refrescar_async(self, ejecutor=None):
+        import httpx
+        inicio = time.perf_counter()
+        self._ultimo_intento = time.time()
+        try:
+            trozos = await self._descargar()
+            cves, indexadas = await asyncio.get_running_loop().run_in_executor(ejecutor, self._procesar, trozos)
+        except (httpx.HTTPError, ValueError, sqlite3.Error) as error:
+            self._fallo(error, inicio)
+            return False
+        await asyncio.get_running_loop().run_in_executor(ejecutor, self._guardar, cves, indexadas, inicio)
+        return True
+
+    # Para el servidor asincrono (asgi.py): deja la cache lista para que
+    # obtener() no espere a la API. En frio espera a la consulta con await (las
+    # peticiones que llegan mientras tanto esperan a la misma); caducada, la
+    # lanza en segundo plano como tarea del bucle
+    async def preparar_async(self, ejecutor=None):
+        bucle = asyncio.get_running_loop()
+        if self._cves is None:
+            await bucle.run_in_executor(ejecutor, self._cargar_disco)
+        tarea = self._tarea_async
+        libre = (tarea is None or tarea.done()) and time.time() - self._ultimo_intento >= self.intervalo_minimo
+        if self._cves is None:
+            if libre:
+                tarea = self._tarea_async = bucle.create_task(self.refrescar_async(ejecutor))
+            if tarea is not None and not tarea.done():
+                await asyncio.shield(tarea)
+        elif libre and time.time() - self._obtenido > self.ttl:
+            self._tarea_async = bucle.create_task(self.refrescar_async(ejecutor))
+
+    def _refrescar_exclusivo(self):
+        with self._lock_refresco:
+            self.refrescar()
+
+    def _refrescar_en_segundo_plano(self):
+        with self._lock:
+            if self._refresco is not None and self._refresco.is_alive():
+                return
+            if time.time() - self._ultimo_intento < self.intervalo_minimo:
+                return
+            self._ultimo_intento = time.time()
+            self._refresco = threading.Thread(target=self._refrescar_exclusivo, name="refresco-cves", daemon=True)
+            self._refresco.start()
+
+    def _cargar_disco(self):
+        with self._lock:
+            if self._cves is None:
+                self._leer_disco()
+
+    def obtener(self, n=10):
+        if self._cves is None:
+            self._cargar_disco()
+
+        if self._cves is None:
+            # Arranque en frio sin nada guardado: no queda mas remedio que esperar
+            with self._lock_refresco:
+                if self._cves is None and time.time() - self._ultimo_intento >= self.intervalo_minimo:
+                    self.refrescar()
+            if self._cves is None:
+                return _error("Error", f"Error al obtener CVEs ({self._ultimo_error})")
+        elif time.time() - self._obtenido > self.ttl:
+            self._refrescar_en_segundo_plano()
+        return self._cves[:n]
+
+    def estado(self):
+        return {
+            "url": self.url,
+            "n_cves": len(self._cves or []),
+            "edad": time.time() - self._obtenido if self._cves is not None else None,
+            "ttl": self.ttl,
+            "ultimo_error": self._ultimo_error,
+            "n_indexadas": self.indice.contar() if self.indice is not None else None,
+        }
+
+
+# Indice y fuente compartidos por la aplicacion
+indice = IndiceCVE()
+fuente = FuenteCVE(indice=indice)
+
+
+def obtener_ultimas_vulnerabilidades(n=10):
+    return fuente.obtener(n)
+
+
+def buscar_vulnerabilidades(texto="", cvss_min=None, antes=None, limite=TAMANO_PAGINA):
+    return indice.buscar(texto, cvss_min, antes, limite)
+
+
+# Indexa un volcado del feed guardado en disco (un array JSON), p.ej.:
+#   python vulnerabilidades.py last.json
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    for ruta in sys.argv[1:]:
+        inicio = time.perf_counter()
+        with open(ruta, "r", encoding="utf-8") as f:
+            total = indice.indexar(iterar_array(trozos_fichero(f)))
+        print(f"{ruta}: {total} CVE indexadas en {time.perf_counter() - inicio:.2f} s")
+    print(f"Total en el indice ({indice.ruta_db}): {indice.contar()}")